@@ -0,0 +1,366 @@
+# analysis_daemon.py 是常驻的分析服务：进程内保持 TraceFormatter 的节点连接，
+# 并缓存合约字节码、基本块和整合约静态CFG（按 proxy_detection.code_key），通过本地HTTP（TCP或Unix socket）接收交易哈希，
+# 返回结构化的CFG（CFG.to_dict）。只涉及已见过合约的交易只需获取trace和构建动态CFG。
+# 请求进入有界队列，队列满时立即返回 503（Retry-After），由调用方重试，服务端不会无限堆积任务。
+# 用法：python analysis_daemon.py --provider http://127.0.0.1:8545 --port 8600
+#      curl -X POST localhost:8600/analyze -d '{"tx_hash": "0x...", "wait": true}'
+
+import argparse
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Optional, Tuple
+from basic_block import Block, BasicBlockProcessor
+from cfg_transaction import CFGConstructor
+from cfg_contract import ContractCFGConnector
+from call_frames import CallFrameIndex
+from cfg_static_complete import StaticCompleteCFGBuilder
+from evm_information import TraceFormatter
+from parallel_static_cfg import CFGShape, static_cfg_shape, assemble_static_cfg
+from proxy_detection import code_key
+
+DEFAULT_QUEUE_SIZE = 16
+# 缓存的代码（基本块 + 静态CFG结构）数量上限，超过时淘汰最久未使用的
+DEFAULT_MAX_CODES = 2048
+# 保留的已完成任务数
+MAX_FINISHED_JOBS = 256
+
+
+@dataclass
+class _CodeEntry:
+    """一份代码的缓存：首次分块的地址、基本块、静态CFG结构（首次需要时构建）"""
+    address: str
+    bytecode: str
+    blocks: List[Block]
+    static_shape: Optional[CFGShape] = None
+
+
+@dataclass
+class Job:
+    job_id: str
+    tx_hash: str
+    options: Dict
+    status: str = "queued"     # queued / running / done / failed
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    done: threading.Event = field(default_factory=threading.Event)
+
+    def to_dict(self) -> Dict:
+        data = {"job_id": self.job_id, "tx_hash": self.tx_hash, "status": self.status}
+        if self.error is not None:
+            data["error"] = self.error
+        if self.result is not None:
+            data["result"] = self.result
+        return data
+
+
+class QueueFullError(Exception):
+    """队列已满（调用方应稍后重试）"""
+
+
+class AnalysisService:
+    """
+    常驻分析服务：submit() 把交易放入有界队列，后台线程依次分析；
+    字节码按地址缓存（同一地址的代码视为不变），基本块和静态CFG按 code_key 缓存。
+    """
+    def __init__(self, formatter: TraceFormatter, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 max_codes: int = DEFAULT_MAX_CODES, workers: int = 1):
+        self.formatter = formatter
+        self.processor = BasicBlockProcessor()
+        self.max_codes = max_codes
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=queue_size)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._codes: "OrderedDict[str, _CodeEntry]" = OrderedDict()   # code_key -> 缓存
+        self._address_keys: Dict[str, str] = {}                        # 地址 -> code_key
+        self._lock = threading.Lock()
+        self.stats = {"jobs_done": 0, "jobs_failed": 0, "rejected": 0, "code_hits": 0, "code_misses": 0,
+                      "static_hits": 0, "static_misses": 0}
+        # 单个节点的 web3 provider 不保证线程安全，多个 worker 时RPC请求串行化；多节点连接池自身控制并发
+        self._rpc_lock = threading.Lock() if formatter.rpc_pool is None else nullcontext()
+        self._workers = [threading.Thread(target=self._worker, name=f"analysis-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for worker in self._workers:
+            worker.start()
+
+    # ------------------------- 任务队列 -------------------------
+    def submit(self, tx_hash: str, options: Optional[Dict] = None) -> Job:
+        job = Job(uuid.uuid4().hex[:12], tx_hash, options or {})
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._count("rejected")
+            raise QueueFullError(f"队列已满（{self._queue.maxsize} 个任务）")
+        with self._lock:
+            self._jobs[job.job_id] = job
+        return job
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def job(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            job.status = "running"
+            try:
+                job.result = self.analyze(job.tx_hash, **job.options)
+                job.status = "done"
+                self._count("jobs_done")
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+                job.status = "failed"
+                self._count("jobs_failed")
+            finally:
+                job.done.set()
+                self._queue.task_done()
+                self._forget_finished_jobs()
+
+    def _forget_finished_jobs(self) -> None:
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.done.is_set()]
+            for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self._jobs[job_id]
+
+    # ------------------------- 缓存 -------------------------
+    def _code_entry(self, address: str) -> Tuple[str, _CodeEntry]:
+        """
+        地址对应的 (code_key, 缓存)；未见过的地址获取字节码，未见过的代码分块。
+        锁只保护缓存的读写，分块在锁外进行（同一份代码被并发分块时保留先写入的结果）。
+        """
+        with self._lock:
+            key = self._address_keys.get(address)
+            entry = self._codes.get(key) if key is not None else None
+            if entry is not None:
+                self._codes.move_to_end(key)
+                self.stats["code_hits"] += 1
+                return key, entry
+        with self._rpc_lock:
+            bytecode = self.formatter.get_contract_bytecode(address)["bytecode"]
+        key = code_key(bytecode)
+        with self._lock:
+            self._address_keys[address] = key
+            entry = self._codes.get(key)
+            if entry is not None:
+                self.stats["code_hits"] += 1
+                self._codes.move_to_end(key)
+                return key, entry
+        blocks = self.processor.process_contract({"address": address, "bytecode": bytecode})
+        with self._lock:
+            self._address_keys[address] = key
+            entry = self._codes.get(key)
+            if entry is None:
+                self.stats["code_misses"] += 1
+                entry = self._codes[key] = _CodeEntry(address, bytecode, blocks)
+                while len(self._codes) > self.max_codes:
+                    evicted, _ = self._codes.popitem(last=False)
+                    self._address_keys = {a: k for a, k in self._address_keys.items() if k != evicted}
+            else:
+                self.stats["code_hits"] += 1
+            self._codes.move_to_end(key)
+        return key, entry
+
+    @staticmethod
+    def _blocks_for(entry: _CodeEntry, address: str) -> List[Block]:
+        if address == entry.address:
+            return entry.blocks
+        return [block.with_address(address) for block in entry.blocks]
+
+    def _static_cfg(self, entry: _CodeEntry, address: str, blocks: List[Block]):
+        """
+        缓存的静态CFG结构按地址组装；未缓存时在锁外构建，在锁内写入（并发构建同一份代码时保留先写入的结果）
+        """
+        with self._lock:
+            shape = entry.static_shape
+            if shape is not None:
+                self.stats["static_hits"] += 1
+        if shape is None:
+            cfg = StaticCompleteCFGBuilder(entry.bytecode, entry.blocks).build_static_cfg()
+            built = static_cfg_shape(cfg, [])
+            with self._lock:
+                if entry.static_shape is None:
+                    self.stats["static_misses"] += 1
+                    entry.static_shape = built
+                    if address == entry.address:
+                        return cfg
+                else:
+                    self.stats["static_hits"] += 1
+                shape = entry.static_shape
+        return assemble_static_cfg(shape, entry.address, address, blocks)[0]
+
+    # ------------------------- 分析 -------------------------
+    def analyze(self, tx_hash: str, static: bool = True, instructions: bool = False) -> Dict:
+        """分析一笔交易，返回交易级CFG、合约级CFG和（可选）静态CFG的结构化表示以及各阶段耗时"""
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        with self._rpc_lock:
+            trace = self.formatter.get_standardized_trace(tx_hash)
+        timings["trace_fetch"] = time.perf_counter() - start
+
+        stage = time.perf_counter()
+        addresses = sorted(self.formatter.extract_contracts_from_trace(trace))
+        entries: Dict[str, Tuple[str, _CodeEntry]] = {address: self._code_entry(address) for address in addresses}
+        blocks_by_address = {address: self._blocks_for(entry, address) for address, (_, entry) in entries.items()}
+        timings["code"] = time.perf_counter() - stage
+
+        stage = time.perf_counter()
+        all_blocks = [block for address in addresses for block in blocks_by_address[address]]
+        tx_cfg = CFGConstructor(all_blocks).construct_cfg(trace)
+        frame_index = CallFrameIndex.from_trace(trace)
+        contract_cfgs = {
+            address: ContractCFGConnector(blocks_by_address[address]).connect_contract_cfg(
+                frame_index.contract_steps(trace["steps"], address))
+            for address in addresses if blocks_by_address[address]
+        }
+        timings["dynamic_cfg"] = time.perf_counter() - stage
+
+        result = {
+            "tx_hash": tx_hash,
+            "steps": len(trace["steps"]),
+            "frames": trace.get("frames", []),
+            "contracts": {address: {"code_key": key} for address, (key, _) in entries.items()},
+            "transaction_cfg": tx_cfg.to_dict(instructions),
+            "contract_cfgs": {address: cfg.to_dict(instructions) for address, cfg in contract_cfgs.items()},
+        }
+        if static:
+            stage = time.perf_counter()
+            result["static_cfgs"] = {
+                address: self._static_cfg(entry, address, blocks_by_address[address]).to_dict(instructions)
+                for address, (_, entry) in entries.items() if blocks_by_address[address]
+            }
+            timings["static_cfg"] = time.perf_counter() - stage
+        timings["total"] = time.perf_counter() - start
+        result["timings"] = {name: round(seconds, 4) for name, seconds in timings.items()}
+        return result
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "queue": self._queue.qsize(),
+                "queue_size": self._queue.maxsize,
+                "cached_codes": len(self._codes),
+                "cached_addresses": len(self._address_keys),
+                "static_cfgs": sum(1 for entry in self._codes.values() if entry.static_shape is not None),
+                **self.stats,
+                "rpc": self.formatter.rpc_stats,
+                "endpoints": self.formatter.endpoint_stats(),
+            }
+
+
+# ------------------------- HTTP 接口 -------------------------
+def _make_handler(service: AnalysisService):
+    class AnalysisHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass  # 不逐条打印请求日志（Unix socket 下也没有客户端地址）
+
+        def _send(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send(200, {"ok": True})
+            elif self.path == "/stats":
+                self._send(200, service.status())
+            elif self.path.startswith("/jobs/"):
+                job = service.job(self.path[len("/jobs/"):])
+                if job is None:
+                    self._send(404, {"error": "未知的任务"})
+                else:
+                    self._send(200, job.to_dict())
+            else:
+                self._send(404, {"error": "未知的路径"})
+
+        def do_POST(self):
+            if self.path != "/analyze":
+                self._send(404, {"error": "未知的路径"})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                tx_hash = request["tx_hash"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                self._send(400, {"error": "请求体应为 {\"tx_hash\": \"0x...\"}"})
+                return
+            timeout = request.get("timeout")
+            if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))
+                                        or timeout < 0):
+                self._send(400, {"error": "timeout 应为非负的秒数"})
+                return
+            options = {"static": bool(request.get("static", True)),
+                       "instructions": bool(request.get("instructions", False))}
+            try:
+                job = service.submit(tx_hash, options)
+            except QueueFullError as e:
+                self._send(503, {"error": str(e)}, {"Retry-After": "1"})
+                return
+            if not request.get("wait"):
+                self._send(202, job.to_dict())
+                return
+            if not job.done.wait(timeout=timeout):
+                self._send(202, job.to_dict())  # 等待超时，之后通过 /jobs/<id> 查询
+                return
+            self._send(200 if job.status == "done" else 500, job.to_dict())
+
+    return AnalysisHandler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(service: AnalysisService, host: str = "127.0.0.1", port: int = 8600,
+                  unix_socket: Optional[str] = None) -> socketserver.BaseServer:
+    handler = _make_handler(service)
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        return ThreadingUnixHTTPServer(unix_socket, handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="常驻的交易CFG分析服务")
+    parser.add_argument("--provider", default="http://127.0.0.1:8545", help="以太坊节点URL（多个节点用逗号分隔）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--unix", help="监听 Unix socket（指定时忽略 --host/--port）")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="排队任务上限，满时返回503")
+    parser.add_argument("--max-codes", type=int, default=DEFAULT_MAX_CODES, help="缓存的代码数量上限")
+    parser.add_argument("--workers", type=int, default=1, help="分析线程数")
+    args = parser.parse_args()
+
+    formatter = TraceFormatter(args.provider, rpc_store=os.environ.get("EVM_CFG_RPC_STORE"),
+                               rpc_mode=os.environ.get("EVM_CFG_RPC_MODE", "auto"))
+    service = AnalysisService(formatter, queue_size=args.queue_size, max_codes=args.max_codes, workers=args.workers)
+    server = create_server(service, args.host, args.port, args.unix)
+    print(f"分析服务已启动: {args.unix or f'http://{args.host}:{args.port}'}（队列上限 {args.queue_size}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix and os.path.exists(args.unix):
+            os.remove(args.unix)
+
+
+if __name__ == "__main__":
+    main()
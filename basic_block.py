@@ -1,6 +1,8 @@
 from typing import List, Dict
 from pyevmasm import disassemble_all # 用于反汇编EVM字节码
 from evm_information import ContractBytecode
+from code_section import CodeSection, detect_code_section
+from proxy_detection import code_key
 
 
 class Block:
@@ -15,10 +17,22 @@ class Block:
     def __repr__(self) -> str:
         return f"Block(start_pc={self.start_pc}, end_pc={self.end_pc}, terminator={self.terminator})"
 
+    def with_address(self, address: str) -> "Block":
+        """代码相同的另一个合约使用的块：共享指令列表，只替换地址"""
+        block = Block(start_pc=self.start_pc, address=address)
+        block.end_pc = self.end_pc
+        block.instructions = self.instructions
+        block.terminator = self.terminator
+        return block
+
 
 class BasicBlockProcessor:
     """分块处理器（支持特殊结尾和JUMPDEST开头分块）"""
-    def __init__(self):
+    def __init__(self, strip_non_code: bool = True):
+        # 是否在分块前去掉代码区之后的元数据/数据（见 code_section.py），代码区的PC不受影响
+        self.strip_non_code = strip_non_code
+        # 合约地址 -> 跳过的非代码区信息：{"bytes", "metadata_bytes", "data_bytes", "blocks"}
+        self.skipped: Dict[str, Dict] = {}
         # 特殊结尾指令：遇到这些指令时，当前块结束
         self.split_triggers = {
             "JUMP", "JUMPI", "CALL", "CALLCODE", "DELEGATECALL", "STATICCALL",
@@ -95,19 +109,55 @@ class BasicBlockProcessor:
 # 上面这一段代码先是定义了一个名为`split_into_blocks`的方法，该方法接收两个参数：`address`和`instructions`。`address`是合约地址，`instructions`是一个包含合约指令的列表。这个方法的主要目的是将合约指令分割成多个基本块（BasicBlock）。
 # 接着, 代码遍历指令列表，检查每条指令是否是`JUMPDEST`。如果是，并且当前块不是第一条指令，则会将当前块保存到`blocks`列表中，并初始化一个新的块。然后，将当前指令添加到当前块中。
 # 接下来，代码检查当前指令是否是`JUMP`或`JUMPI`，如果是，则将当前块标记为终止块，并保存到`blocks`列表中。然后，根据跳转目标创建一个新的块。
+    def code_section(self, bytecode: str) -> CodeSection:
+        """识别代码区；不去除非代码区时整个字节码都视为代码"""
+        if self.strip_non_code:
+            return detect_code_section(bytecode)
+        size = len(bytecode) // 2 - 1 if bytecode and bytecode != "0x" else 0
+        return CodeSection(total_size=size, code_end=size, metadata_size=0, data_size=0)
+
     def process_contract(self, contract: ContractBytecode) -> List[Block]:
-        """处理单个合约，返回基本块列表"""
-        instructions = self.bytecode_to_opcodes(contract["bytecode"])
+        """处理单个合约，返回基本块列表（只包含代码区的块）"""
+        bytecode = contract["bytecode"]
+        section = self.code_section(bytecode)
+        instructions = self.bytecode_to_opcodes(section.code_bytecode(bytecode))
+        if section.skipped_bytes:
+            # 统计被跳过的区域原本会产生多少个块（只反汇编尾部，开销很小）
+            tail = self.bytecode_to_opcodes("0x" + bytecode[2 + 2 * section.code_end:])
+            self.skipped[contract["address"]] = {
+                "bytes": section.skipped_bytes,
+                "metadata_bytes": section.metadata_size,
+                "data_bytes": section.data_size,
+                "blocks": len(self.split_into_blocks(contract["address"], tail)),
+            }
         return self.split_into_blocks(contract["address"], instructions)
 
     def process_multiple_contracts(self, contracts: List[ContractBytecode]) -> List[Block]:
-        """批量处理合约"""
+        """批量处理合约（代码相同的合约和 EIP-1167 最小代理只分块一次，见 proxy_detection.code_key）"""
         all_blocks = []
+        processed: Dict[str, ContractBytecode] = {}  # code_key -> 第一个处理的合约
+        blocks_by_key: Dict[str, List[Block]] = {}
         for contract in contracts:
             try:
+                key = code_key(contract["bytecode"])
+                if key in blocks_by_key:
+                    source = processed[key]
+                    blocks = [block.with_address(contract["address"]) for block in blocks_by_key[key]]
+                    if source["address"] in self.skipped:
+                        self.skipped[contract["address"]] = self.skipped[source["address"]]
+                    all_blocks.extend(blocks)
+                    print(f"合约 {contract['address']} 与 {source['address']} 代码相同，复用 {len(blocks)} 个基本块")
+                    continue
                 blocks = self.process_contract(contract)
+                processed[key] = contract
+                blocks_by_key[key] = blocks
                 all_blocks.extend(blocks)
-                print(f"合约 {contract['address']} 分块完成，共 {len(blocks)} 个基本块")
+                skipped = self.skipped.get(contract["address"])
+                if skipped:
+                    print(f"合约 {contract['address']} 分块完成，共 {len(blocks)} 个基本块"
+                          f"（跳过非代码区 {skipped['bytes']} 字节，约 {skipped['blocks']} 个块）")
+                else:
+                    print(f"合约 {contract['address']} 分块完成，共 {len(blocks)} 个基本块")
             except Exception as e:
                 print(f"合约 {contract['address']} 处理失败: {str(e)}")
         return all_blocks
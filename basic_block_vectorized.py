@@ -0,0 +1,195 @@
+# basic_block_vectorized.py 提供基于 NumPy 的基本块划分（leader位图）；
+# 与 BasicBlockProcessor.split_into_blocks 的结果完全一致（包括 JUMPDEST_PREV / NORMAL_END 终止标记），
+# 但不逐条指令创建对象：先在解码后的opcode数组上计算块起点掩码，再用 nonzero 得到块边界，
+# 块以视图的形式按需生成，只有访问到的块才会创建指令列表。
+
+from typing import List, Dict, Tuple, Optional, Sequence
+import numpy as np
+from pyevmasm.evmasm import instruction_tables, DEFAULT_FORK
+from basic_block import BasicBlockProcessor
+from evm_information import ContractBytecode
+from code_section import strip_non_code
+
+
+class OpcodeTable:
+    """opcode字节 -> (名称编号, 操作数长度)，名称与 pyevmasm 反汇编结果一致"""
+    def __init__(self, fork: str = DEFAULT_FORK):
+        table = instruction_tables[fork]
+        self.names: List[str] = []
+        name_ids: Dict[str, int] = {}
+        self.byte_to_id = np.zeros(256, dtype=np.int16)
+        self.operand_size = [0] * 256
+        for value in range(256):
+            try:
+                instruction = table[value]
+                name, size = instruction.name, instruction.operand_size
+            except KeyError:
+                name, size = "INVALID", 0  # 未定义的opcode按INVALID处理
+            if name not in name_ids:
+                name_ids[name] = len(self.names)
+                self.names.append(name)
+            self.byte_to_id[value] = name_ids[name]
+            self.operand_size[value] = size
+        self.name_ids = name_ids
+
+    def ids_for(self, names) -> np.ndarray:
+        return np.array(sorted(self.name_ids[n] for n in names if n in self.name_ids), dtype=np.int16)
+
+
+_DEFAULT_TABLE: Optional[OpcodeTable] = None
+
+
+def default_opcode_table() -> OpcodeTable:
+    global _DEFAULT_TABLE
+    if _DEFAULT_TABLE is None:
+        _DEFAULT_TABLE = OpcodeTable()
+    return _DEFAULT_TABLE
+
+
+class DecodedCode:
+    """解码后的指令数组：pcs[i] 为第i条指令的PC，op_ids[i] 为其名称编号"""
+    def __init__(self, pcs: np.ndarray, op_ids: np.ndarray, table: OpcodeTable):
+        self.pcs = pcs
+        self.op_ids = op_ids
+        self.table = table
+
+    def __len__(self) -> int:
+        return len(self.pcs)
+
+    @classmethod
+    def from_bytecode(cls, bytecode: str, table: Optional[OpcodeTable] = None) -> "DecodedCode":
+        """与 bytecode_to_opcodes 相同的反汇编规则（末尾被截断的PUSH丢弃）"""
+        table = table or default_opcode_table()
+        code = bytes.fromhex(bytecode[2:]) if bytecode and bytecode != "0x" else b""
+        operand_size = table.operand_size
+        pcs = []
+        pc, length = 0, len(code)
+        while pc < length:
+            size = operand_size[code[pc]]
+            if pc + size >= length and size:
+                break
+            pcs.append(pc)
+            pc += 1 + size
+        pcs_array = np.array(pcs, dtype=np.int64)
+        opcodes = np.frombuffer(code, dtype=np.uint8)[pcs_array] if pcs else np.zeros(0, dtype=np.uint8)
+        return cls(pcs_array, table.byte_to_id[opcodes], table)
+
+    @classmethod
+    def from_instructions(cls, instructions: List[Dict], table: Optional[OpcodeTable] = None) -> "DecodedCode":
+        """从 bytecode_to_opcodes 的输出构建数组"""
+        table = table or default_opcode_table()
+        pcs = np.array([int(instr["pc"], 16) for instr in instructions], dtype=np.int64)
+        op_ids = np.array([table.name_ids.get(instr["opcode"], table.name_ids["INVALID"])
+                           for instr in instructions], dtype=np.int16)
+        return cls(pcs, op_ids, table)
+
+
+class BlockView:
+    """
+    基本块视图：与 Block 具有相同的属性（address/start_pc/end_pc/terminator/instructions），
+    instructions 在首次访问时才从共享数组中生成。
+    """
+    __slots__ = ("address", "start_pc", "end_pc", "terminator", "_code", "_start", "_end", "_instructions")
+
+    def __init__(self, address: str, code: DecodedCode, start: int, end: int, terminator: str):
+        self.address = address
+        self._code = code
+        self._start = start          # 指令下标范围 [start, end)
+        self._end = end
+        self.start_pc = f"0x{int(code.pcs[start]):x}"
+        self.end_pc = f"0x{int(code.pcs[end - 1]):x}"
+        self.terminator = terminator
+        self._instructions = None
+
+    @property
+    def instructions(self) -> List[Tuple[str, str]]:
+        if self._instructions is None:
+            names = self._code.table.names
+            pcs = self._code.pcs[self._start:self._end].tolist()
+            ids = self._code.op_ids[self._start:self._end].tolist()
+            self._instructions = [(f"0x{pc:x}", names[op]) for pc, op in zip(pcs, ids)]
+        return self._instructions
+
+    @instructions.setter
+    def instructions(self, value: List[Tuple[str, str]]) -> None:
+        self._instructions = value
+
+    def __repr__(self) -> str:
+        return f"Block(start_pc={self.start_pc}, end_pc={self.end_pc}, terminator={self.terminator})"
+
+
+class LazyBlockList(Sequence):
+    """按块边界数组按需生成 BlockView 的只读序列"""
+    def __init__(self, address: str, code: DecodedCode, starts: np.ndarray, ends: np.ndarray, terminators: List[str]):
+        self.address = address
+        self.code = code
+        self.starts = starts
+        self.ends = ends
+        self.terminators = terminators
+        self._views: Dict[int, BlockView] = {}
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        view = self._views.get(index)
+        if view is None:
+            view = BlockView(self.address, self.code, int(self.starts[index]), int(self.ends[index]),
+                             self.terminators[index])
+            self._views[index] = view
+        return view
+
+
+class VectorizedBlockSplitter:
+    """leader位图分块器，分块规则取自 BasicBlockProcessor（split_triggers / start_triggers）"""
+    def __init__(self, processor: Optional[BasicBlockProcessor] = None, table: Optional[OpcodeTable] = None):
+        processor = processor or BasicBlockProcessor()
+        self.table = table or default_opcode_table()
+        self.split_ids = self.table.ids_for(processor.split_triggers)
+        self.start_ids = self.table.ids_for(processor.start_triggers)
+        self.strip_non_code = processor.strip_non_code
+
+    def split(self, address: str, code: DecodedCode) -> LazyBlockList:
+        n = len(code)
+        if n == 0:
+            return LazyBlockList(address, code, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), [])
+
+        is_split = np.isin(code.op_ids, self.split_ids)
+        # 块起点：第一条指令、每个JUMPDEST、每条终止指令的下一条指令
+        leaders = np.isin(code.op_ids, self.start_ids)
+        leaders[0] = True
+        leaders[1:] |= is_split[:-1]
+
+        starts = np.nonzero(leaders)[0]
+        ends = np.empty_like(starts)
+        ends[:-1] = starts[1:]
+        ends[-1] = n
+
+        # 终止标记：最后一条指令是终止指令则取其名称；否则被下一个JUMPDEST截断，或者是代码末尾
+        last_ids = code.op_ids[ends - 1]
+        last_is_split = is_split[ends - 1]
+        names = self.table.names
+        terminators = [
+            names[op] if split else ("JUMPDEST_PREV" if end < n else "NORMAL_END")
+            for op, split, end in zip(last_ids.tolist(), last_is_split.tolist(), ends.tolist())
+        ]
+        return LazyBlockList(address, code, starts, ends, terminators)
+
+    def split_bytecode(self, address: str, bytecode: str) -> LazyBlockList:
+        return self.split(address, DecodedCode.from_bytecode(bytecode, self.table))
+
+    def split_instructions(self, address: str, instructions: List[Dict]) -> LazyBlockList:
+        """与 split_into_blocks 相同的输入（bytecode_to_opcodes 的输出）"""
+        return self.split(address, DecodedCode.from_instructions(instructions, self.table))
+
+    def process_contract(self, contract: ContractBytecode) -> LazyBlockList:
+        bytecode = contract["bytecode"]
+        if self.strip_non_code:
+            bytecode = strip_non_code(bytecode)
+        return self.split_bytecode(contract["address"], bytecode)
@@ -0,0 +1,69 @@
+# batch_runner.py 负责模式提取工具（find_call_nodes.py / find_trace_opcode.py）的批处理：
+# 展开目录/通配符输入，用进程池并行处理每个文件，结果以JSONL流式写出，并报告吞吐量。
+
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, Dict, Optional
+
+
+def expand_inputs(inputs: Iterable[str], pattern: str, exclude: Optional[Callable[[str], bool]] = None) -> List[str]:
+    """
+    把命令行输入展开为文件列表：
+    - 目录：递归匹配 pattern（例如 Result/ 下所有 trace.json）
+    - 含通配符的路径：glob 展开
+    - 普通文件：原样保留
+    """
+    files: List[str] = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matched = glob.glob(os.path.join(item, "**", pattern), recursive=True)
+        elif glob.has_magic(item):
+            matched = glob.glob(item, recursive=True)
+        else:
+            matched = [item]
+        files.extend(sorted(matched))
+    files = list(dict.fromkeys(files))  # 去重并保持顺序
+    if exclude is not None:
+        files = [f for f in files if not exclude(f)]
+    return files
+
+
+def run_batch(worker: Callable[..., List[Dict]], files: List[str], output: Optional[str] = None,
+              workers: Optional[int] = None, worker_args: tuple = ()) -> Dict:
+    """
+    并行处理 files，worker(file, *worker_args) 返回该文件的结果记录列表；
+    每条记录写成一行JSON（output为None时写到标准输出），返回吞吐量统计。
+    """
+    start = time.perf_counter()
+    total_bytes = sum(os.path.getsize(f) for f in files if os.path.exists(f))
+    record_count = 0
+
+    out = open(output, "w", encoding="utf-8") if output else sys.stdout
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map 保持输入顺序，结果按文件逐个流式写出
+            iterator = executor.map(worker, files, *[[arg] * len(files) for arg in worker_args], chunksize=1)
+            for records in iterator:
+                for record in records:
+                    out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                record_count += len(records)
+    finally:
+        if output:
+            out.close()
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "files": len(files),
+        "records": record_count,
+        "bytes": total_bytes,
+        "seconds": round(elapsed, 3),
+        "files_per_second": round(len(files) / elapsed, 2) if elapsed > 0 else 0.0,
+        "mb_per_second": round(total_bytes / 1024 / 1024 / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    print(f"处理 {stats['files']} 个文件，输出 {stats['records']} 条记录，用时 {stats['seconds']}s "
+          f"（{stats['files_per_second']} 文件/s，{stats['mb_per_second']} MB/s）", file=sys.stderr)
+    return stats
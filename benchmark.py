@@ -0,0 +1,356 @@
+# benchmark.py 负责可复现的性能基准测试；
+# 直接回放 Result/ 下保存的 blocks.json / trace.json（不需要连接节点），
+# 分阶段计时：字节码解码、基本块划分、动态CFG、静态CFG、DOT渲染，并按合约规模分组统计；
+# 结果可以保存为基线，之后与基线比较，超过阈值的阶段视为性能回退（退出码为1）。
+# --startup 单独检查离线工具的启动开销：每个模块在新的解释器中导入，超过预算或导入了 web3 时退出码为1。
+#
+# 注意：blocks.json 中没有PUSH的操作数，回放时用0填充操作数重建字节码，
+# 因此静态CFG的跳转目标与真实合约不同，但各阶段的计算量（指令数、块数、跳转数）保持一致。
+
+import argparse
+import gc
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List, Dict, Callable, Optional, Tuple
+from basic_block import Block, BasicBlockProcessor
+from cfg_transaction import CFGConstructor
+from cfg_contract import ContractCFGConnector, render_contract
+from cfg_static_complete import StaticCompleteCFGBuilder, render_static_complete
+from result_store import load_result_blocks
+from stack_store import load_trace
+
+try:
+    from basic_block_vectorized import VectorizedBlockSplitter, DecodedCode
+except ImportError:  # 未安装NumPy时跳过向量化分块阶段
+    VectorizedBlockSplitter = None
+
+DEFAULT_BASELINE_PATH = "benchmark_baseline.json"
+DEFAULT_THRESHOLD = 0.20  # 比基线慢20%以上视为回退
+
+# 离线工具（不连接节点）的导入时间预算（秒），以及不允许在导入时加载的重依赖
+STARTUP_BUDGET = 0.3
+STARTUP_MODULES = [
+    "basic_block", "cfg_transaction", "cfg_contract", "cfg_static_complete", "parallel_static_cfg",
+    "opcode_index", "corpus_index", "find_call_nodes", "find_trace_opcode", "trace_compression",
+    "cfg_incremental", "proxy_detection", "result_store", "graph_render", "static_coverage", "cfg_similarity",
+    "cfg_analytics",
+]
+STARTUP_FORBIDDEN = ["web3"]
+
+# 按指令数划分的合约规模
+SIZE_BUCKETS = [("small", 1000), ("medium", 5000), ("large", 20000), ("xlarge", float("inf"))]
+STAGES = ["decode", "split", "split_vectorized", "dynamic_cfg", "static_cfg", "render"]
+
+_OPCODE_BYTES: Dict[str, int] = {}
+
+
+def _opcode_byte(name: str) -> int:
+    """opcode名称 -> 字节值（未知名称按INVALID处理）"""
+    if not _OPCODE_BYTES:
+        from pyevmasm.evmasm import instruction_tables, DEFAULT_FORK
+        table = instruction_tables[DEFAULT_FORK]
+        for value in range(256):
+            try:
+                _OPCODE_BYTES.setdefault(table[value].name, value)
+            except Exception:
+                continue
+    return _OPCODE_BYTES.get(name, 0xfe)
+
+
+def reconstruct_bytecode(blocks: List[Block]) -> str:
+    """根据基本块中的 (pc, opcode) 重建字节码，PUSH操作数以0填充，PC与原合约一致"""
+    instructions = sorted({int(pc, 16): opcode for block in blocks for pc, opcode in block.instructions}.items())
+    if not instructions:
+        return "0x"
+    last_pc, last_opcode = instructions[-1]
+    length = last_pc + 1 + (int(last_opcode[4:]) if last_opcode.startswith("PUSH") and last_opcode[4:].isdigit() else 0)
+    code = bytearray(length)
+    for pc, opcode in instructions:
+        code[pc] = _opcode_byte(opcode)
+    return "0x" + code.hex()
+
+
+def blocks_equal(expected: List[Block], actual) -> bool:
+    """逐块比较两种分块结果（地址、PC范围、终止标记和指令列表）"""
+    if len(expected) != len(actual):
+        return False
+    for a, b in zip(expected, actual):
+        if (a.address, a.start_pc, a.end_pc, a.terminator) != (b.address, b.start_pc, b.end_pc, b.terminator):
+            return False
+        if list(a.instructions) != list(b.instructions):
+            return False
+    return True
+
+
+def size_bucket(instruction_count: int) -> str:
+    for name, upper in SIZE_BUCKETS:
+        if instruction_count < upper:
+            return name
+    return SIZE_BUCKETS[-1][0]
+
+
+class ContractCase:
+    """一个基准测试用例：一个合约（按重建后的字节码去重）以及可选的执行步骤"""
+    def __init__(self, address: str, bytecode: str, steps: List[Dict], source: str):
+        self.address = address
+        self.bytecode = bytecode
+        self.steps = steps
+        self.source = source
+        self.instruction_count = 0
+        self.bucket = ""
+
+
+def load_cases(root: str, limit: Optional[int] = None) -> List[ContractCase]:
+    """从结果目录加载用例；相同代码只保留一份（优先保留带trace的）"""
+    cases: Dict[str, ContractCase] = {}
+    for name in sorted(os.listdir(root)):
+        result_dir = os.path.join(root, name)
+        blocks = load_result_blocks(result_dir) if os.path.isdir(result_dir) else []
+        if not blocks:
+            continue
+        blocks_by_address: Dict[str, List[Block]] = {}
+        for block in blocks:
+            blocks_by_address.setdefault(block.address, []).append(block)
+
+        steps_by_address: Dict[str, List[Dict]] = {}
+        trace_path = os.path.join(result_dir, "trace.json")
+        if os.path.exists(trace_path):
+            for step in load_trace(trace_path)["steps"]:
+                steps_by_address.setdefault(step["address"], []).append(step)
+
+        for address, blocks in sorted(blocks_by_address.items()):
+            bytecode = reconstruct_bytecode(blocks)
+            key = hashlib.sha256(bytecode.encode()).hexdigest()
+            steps = steps_by_address.get(address, [])
+            if key not in cases or (steps and not cases[key].steps):
+                cases[key] = ContractCase(address, bytecode, steps, result_dir)
+
+    ordered = sorted(cases.values(), key=lambda c: (len(c.bytecode), c.address))
+    if limit:
+        ordered = ordered[-limit:]  # 保留最大的若干个合约
+    return ordered
+
+
+def _time_stage(func: Callable, repeat: int) -> Tuple[float, object]:
+    """重复执行并取最短耗时（减少噪声），返回 (秒, 最后一次的结果)"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+        finally:
+            gc.enable()
+    return best, result
+
+
+def _memory_stage(func: Callable) -> float:
+    """单独执行一次，记录tracemalloc峰值（MB）"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024 / 1024, 3)
+
+
+def benchmark_case(case: ContractCase, processor: BasicBlockProcessor, out_dir: str,
+                   repeat: int, measure_memory: bool) -> Dict:
+    """对单个合约依次执行各阶段，返回 stage -> {seconds, peak_mb}"""
+    results: Dict[str, Dict] = {}
+    state: Dict[str, object] = {}
+
+    def decode():
+        return processor.bytecode_to_opcodes(case.bytecode)
+
+    def split():
+        return processor.split_into_blocks(case.address, state["instructions"])
+
+    splitter = VectorizedBlockSplitter(processor) if VectorizedBlockSplitter else None
+
+    def split_vectorized():
+        return splitter.split(case.address, state["decoded"])
+
+    def dynamic_cfg():
+        if not case.steps:
+            return None
+        trace = {"tx_hash": "benchmark", "steps": case.steps}
+        CFGConstructor(state["blocks"]).construct_cfg(trace)
+        return ContractCFGConnector(state["blocks"]).connect_contract_cfg(case.steps)
+
+    def static_cfg():
+        return StaticCompleteCFGBuilder(case.bytecode, state["blocks"]).build_static_cfg()
+
+    def render():
+        render_static_complete(state["static_cfg"], os.path.join(out_dir, "static.dot"))
+        if state.get("dynamic_cfg") is not None:
+            render_contract(state["dynamic_cfg"], os.path.join(out_dir, "contract.dot"))
+
+    stage_funcs = {"decode": decode, "split": split, "split_vectorized": split_vectorized,
+                   "dynamic_cfg": dynamic_cfg, "static_cfg": static_cfg, "render": render}
+    result_keys = {"decode": "instructions", "split": "blocks", "dynamic_cfg": "dynamic_cfg",
+                   "static_cfg": "static_cfg"}
+
+    for stage in STAGES:
+        if stage == "dynamic_cfg" and not case.steps:
+            continue
+        if stage == "split_vectorized":
+            if splitter is None:
+                continue
+            state["decoded"] = DecodedCode.from_instructions(state["instructions"])
+        seconds, result = _time_stage(stage_funcs[stage], repeat)
+        if stage in result_keys:
+            state[result_keys[stage]] = result
+        if stage == "split_vectorized" and not blocks_equal(state["blocks"], result):
+            raise AssertionError(f"向量化分块结果与 split_into_blocks 不一致: {case.address}")
+        results[stage] = {"seconds": round(seconds, 6)}
+        if measure_memory:
+            results[stage]["peak_mb"] = _memory_stage(stage_funcs[stage])
+
+    case.instruction_count = len(state["instructions"])
+    case.bucket = size_bucket(case.instruction_count)
+    return results
+
+
+def run_benchmark(root: str, repeat: int = 3, limit: Optional[int] = None,
+                  measure_memory: bool = True, verbose: bool = True) -> Dict:
+    """回放整个结果目录，返回包含环境信息、逐合约结果与分组汇总的报告"""
+    processor = BasicBlockProcessor()
+    cases = load_cases(root, limit)
+    per_contract = []
+    buckets: Dict[str, Dict[str, Dict]] = {}
+
+    # 渲染输出写到临时目录，关闭渲染函数自身的打印
+    with tempfile.TemporaryDirectory() as out_dir:
+        for case in cases:
+            stdout = sys.stdout
+            sys.stdout = open(os.devnull, "w")
+            try:
+                stages = benchmark_case(case, processor, out_dir, repeat, measure_memory)
+            finally:
+                sys.stdout.close()
+                sys.stdout = stdout
+            per_contract.append({
+                "address": case.address,
+                "source": case.source,
+                "instructions": case.instruction_count,
+                "steps": len(case.steps),
+                "bucket": case.bucket,
+                "stages": stages,
+            })
+            bucket = buckets.setdefault(case.bucket, {})
+            for stage, values in stages.items():
+                summary = bucket.setdefault(stage, {"contracts": 0, "seconds": 0.0, "peak_mb": 0.0})
+                summary["contracts"] += 1
+                summary["seconds"] = round(summary["seconds"] + values["seconds"], 6)
+                summary["peak_mb"] = max(summary["peak_mb"], values.get("peak_mb", 0.0))
+            if verbose:
+                timings = "  ".join(f"{stage}={values['seconds'] * 1000:.1f}ms" for stage, values in stages.items())
+                print(f"[{case.bucket:>6}] {case.address[:10]}... {case.instruction_count:>6} 条指令  {timings}")
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "contracts": per_contract,
+        "buckets": buckets,
+    }
+
+
+def compare_with_baseline(report: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """逐个 (规模, 阶段) 比较总耗时，返回超过阈值的回退描述"""
+    regressions = []
+    for bucket, stages in report["buckets"].items():
+        for stage, current in stages.items():
+            base = baseline.get("buckets", {}).get(bucket, {}).get(stage)
+            if not base or base["seconds"] <= 0:
+                continue
+            ratio = current["seconds"] / base["seconds"]
+            status = "回退" if ratio > 1 + threshold else ("提升" if ratio < 1 - threshold else "持平")
+            print(f"[{bucket:>6}] {stage:<12} 基线 {base['seconds']:.4f}s -> 当前 {current['seconds']:.4f}s "
+                  f"({ratio:.2f}x) {status}")
+            if ratio > 1 + threshold:
+                regressions.append(f"{bucket}/{stage}: {ratio:.2f}x")
+    return regressions
+
+
+def measure_startup(modules: List[str] = STARTUP_MODULES, budget: float = STARTUP_BUDGET) -> List[str]:
+    """在新的解释器中逐个导入模块并计时，返回超过预算或加载了禁止依赖的模块描述"""
+    script = ("import sys, time, json; start = time.perf_counter(); import {module}; "
+              "print(json.dumps([time.perf_counter() - start, [m for m in {forbidden!r} if m in sys.modules]]))")
+    failures = []
+    for module in modules:
+        completed = subprocess.run([sys.executable, "-c", script.format(module=module, forbidden=STARTUP_FORBIDDEN)],
+                                   capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        if completed.returncode != 0:
+            failures.append(f"{module}: 导入失败")
+            print(f"{module:<22} 导入失败: {completed.stderr.strip().splitlines()[-1:]}")
+            continue
+        seconds, loaded = json.loads(completed.stdout.strip().splitlines()[-1])
+        status = "超出预算" if seconds > budget else "正常"
+        if loaded:
+            status = f"加载了 {', '.join(loaded)}"
+        print(f"{module:<22} {seconds * 1000:7.1f}ms  {status}")
+        if seconds > budget or loaded:
+            failures.append(f"{module}: {seconds * 1000:.0f}ms" + (f"（{', '.join(loaded)}）" if loaded else ""))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放 Result/ 数据的性能基准测试")
+    parser.add_argument("root", nargs="?", default="Result", help="结果目录")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段重复次数（取最短耗时）")
+    parser.add_argument("--limit", type=int, default=None, help="只测试最大的N个合约")
+    parser.add_argument("--no-memory", action="store_true", help="不统计内存峰值")
+    parser.add_argument("--output", help="把完整报告保存为JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="基线文件路径")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="回退阈值（比例）")
+    parser.add_argument("--startup", action="store_true", help=f"只检查离线工具的导入时间（预算 {STARTUP_BUDGET}s）")
+    args = parser.parse_args()
+
+    if args.startup:
+        failures = measure_startup()
+        if failures:
+            print(f"{len(failures)} 个模块超出启动预算: {', '.join(failures)}")
+            sys.exit(1)
+        print("所有离线工具都在启动预算内")
+        return
+
+    report = run_benchmark(args.root, repeat=args.repeat, limit=args.limit, measure_memory=not args.no_memory)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"基线已保存到: {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.threshold)
+        if regressions:
+            print(f"发现 {len(regressions)} 处性能回退: {', '.join(regressions)}")
+            sys.exit(1)
+        print("未发现性能回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# call_frames.py 负责交易的调用栈帧树；
+# 每个栈帧记录：调用类型、msg.sender、执行的代码地址、读写存储的地址（DELEGATECALL/CALLCODE 时为调用方）、
+# 父帧中发起调用的步骤以及 [start_step, end_step) 步骤范围（包含子帧）；
+# 栈帧树在标准化trace时建立（TraceFormatter._standardize_struct_logs，保存在 trace["frames"] 中），
+# 某个栈帧或某个合约的步骤直接按范围切片得到，不必逐步比较地址；各栈帧的步骤互不重叠，可以分别（并行）建图。
+
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Tuple, Optional
+from evm_information import StandardizedTrace, StandardizedStep
+
+CALL_OPCODES = {"CALL", "CALLCODE", "DELEGATECALL", "STATICCALL"}
+CREATE_OPCODES = {"CREATE", "CREATE2"}
+HALT_OPCODES = {"STOP", "RETURN", "REVERT", "INVALID", "SELFDESTRUCT"}
+
+
+@dataclass
+class CallFrame:
+    frame_id: int
+    parent: Optional[int]
+    depth: int                   # 根帧为1
+    call_type: str               # ROOT / CALL / STATICCALL / DELEGATECALL / CALLCODE / CREATE / CREATE2
+    caller: str                  # msg.sender（DELEGATECALL 沿用父帧的 msg.sender）；根帧未知时为空
+    code_address: str            # 执行的代码所在地址（即步骤的 address）；CREATE 的初始化代码没有地址，为空
+    storage_address: str         # 读写存储的账户；CREATE 为新合约地址（返回后才知道，失败时为空）
+    call_step: Optional[int]     # 父帧中发起调用的步骤下标
+    start_step: int
+    end_step: int = -1           # 不含，包括所有子帧的步骤
+    children: List[int] = field(default_factory=list)
+
+
+class CallFrameBuilder:
+    """按步骤顺序建立栈帧树：enter() 进入被调用的帧，leave() 返回父帧，finish() 结束所有帧"""
+    def __init__(self, initial_address: str, sender: str = ""):
+        root = CallFrame(0, None, 1, "ROOT", sender, initial_address, initial_address, None, 0)
+        self.frames: List[CallFrame] = [root]
+        self._open: List[CallFrame] = [root]
+
+    @property
+    def current(self) -> CallFrame:
+        return self._open[-1]
+
+    @property
+    def depth(self) -> int:
+        return len(self._open)
+
+    def enter(self, step_idx: int, call_type: str, code_address: str, call_step: Optional[int]) -> CallFrame:
+        parent = self.current
+        if call_type in {"DELEGATECALL", "CALLCODE"}:
+            storage_address = parent.storage_address
+        elif call_type in CREATE_OPCODES:
+            storage_address = ""
+        else:
+            storage_address = code_address
+        caller = parent.caller if call_type == "DELEGATECALL" else parent.storage_address
+        frame = CallFrame(len(self.frames), parent.frame_id, parent.depth + 1, call_type, caller,
+                          code_address, storage_address, call_step, step_idx)
+        parent.children.append(frame.frame_id)
+        self.frames.append(frame)
+        self._open.append(frame)
+        return frame
+
+    def leave(self, step_idx: int, created_address: str = "") -> None:
+        """结束当前帧（根帧不结束）；CREATE 帧返回后父帧栈顶为新合约地址，由调用方传入"""
+        if len(self._open) <= 1:
+            return
+        frame = self._open.pop()
+        frame.end_step = step_idx
+        if frame.call_type in CREATE_OPCODES:
+            frame.storage_address = created_address
+
+    def finish(self, step_count: int) -> "CallFrameIndex":
+        while len(self._open) > 1:
+            self.leave(step_count)
+        self._open[0].end_step = step_count
+        return CallFrameIndex(self.frames)
+
+
+class CallFrameIndex:
+    """栈帧树的查询：栈帧/合约 -> 步骤范围"""
+    def __init__(self, frames: List[CallFrame]):
+        self.frames = frames
+        self._contract_ranges: Optional[Dict[str, List[Tuple[int, int]]]] = None
+
+    @property
+    def root(self) -> CallFrame:
+        return self.frames[0]
+
+    def own_ranges(self, frame_id: int) -> List[Tuple[int, int]]:
+        """栈帧自身执行的步骤范围（去掉子帧的部分），按步骤顺序"""
+        frame = self.frames[frame_id]
+        ranges, position = [], frame.start_step
+        for child_id in frame.children:
+            child = self.frames[child_id]
+            if child.start_step > position:
+                ranges.append((position, child.start_step))
+            position = max(position, child.end_step)
+        if frame.end_step > position:
+            ranges.append((position, frame.end_step))
+        return ranges
+
+    def contract_ranges(self, address: str) -> List[Tuple[int, int]]:
+        """执行 address 代码的所有步骤范围（跨栈帧，按步骤顺序，相邻范围合并）"""
+        if self._contract_ranges is None:
+            grouped: Dict[str, List[Tuple[int, int]]] = {}
+            for frame in self.frames:
+                grouped.setdefault(frame.code_address, []).extend(self.own_ranges(frame.frame_id))
+            self._contract_ranges = {}
+            for code_address, ranges in grouped.items():
+                merged: List[Tuple[int, int]] = []
+                for start, end in sorted(ranges):
+                    if merged and merged[-1][1] == start:
+                        merged[-1] = (merged[-1][0], end)
+                    else:
+                        merged.append((start, end))
+                self._contract_ranges[code_address] = merged
+        return self._contract_ranges.get(address, [])
+
+    def frame_steps(self, steps: List[StandardizedStep], frame_id: int) -> List[StandardizedStep]:
+        return [step for start, end in self.own_ranges(frame_id) for step in steps[start:end]]
+
+    def contract_steps(self, steps: List[StandardizedStep], address: str) -> List[StandardizedStep]:
+        """与 [s for s in steps if s["address"] == address] 相同，但只切片不比较"""
+        return [step for start, end in self.contract_ranges(address) for step in steps[start:end]]
+
+    def frames_of(self, address: str) -> List[CallFrame]:
+        return [frame for frame in self.frames if frame.code_address == address]
+
+    def to_list(self) -> List[Dict]:
+        return [asdict(frame) for frame in self.frames]
+
+    @classmethod
+    def from_list(cls, data: List[Dict]) -> "CallFrameIndex":
+        return cls([CallFrame(**item) for item in data])
+
+    @classmethod
+    def from_steps(cls, steps: List[StandardizedStep]) -> "CallFrameIndex":
+        """
+        从已标准化的步骤重建（没有保存 frames 的旧trace）：调用指令之后地址改变视为进入被调用的帧，
+        其他地址改变视为返回到该地址所在的上层帧。
+        """
+        builder = CallFrameBuilder(steps[0]["address"] if steps else "")
+        for idx in range(1, len(steps)):
+            address, previous = steps[idx]["address"], steps[idx - 1]
+            if address == builder.current.code_address:
+                continue
+            if previous["opcode"] in CALL_OPCODES | CREATE_OPCODES:
+                builder.enter(idx, previous["opcode"], address, idx - 1)
+                continue
+            while builder.depth > 1 and builder.current.code_address != address:
+                builder.leave(idx)
+            if builder.current.code_address != address:
+                builder.enter(idx, "CALL", address, idx - 1)  # 无法判断来源的切换
+        return builder.finish(len(steps))
+
+    @classmethod
+    def from_trace(cls, trace: StandardizedTrace) -> "CallFrameIndex":
+        if trace.get("frames"):
+            return cls.from_list(trace["frames"])
+        return cls.from_steps(trace["steps"])
+
+    def __repr__(self) -> str:
+        return f"CallFrameIndex(frames={len(self.frames)}, max_depth={max(f.depth for f in self.frames)})"
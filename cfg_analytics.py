@@ -0,0 +1,456 @@
+# cfg_analytics.py 负责在CFG的CSR邻接表（CFG.to_csr / CSRGraph）上运行图算法：
+#   - 强连通分量（迭代Tarjan，分量按逆拓扑序编号）；
+#   - 支配树（Cooper-Harvey-Kennedy 迭代算法，按逆后序求不动点）；
+#   - 循环嵌套（回边 u->h 且 h 支配 u 的自然循环，同一头节点的循环合并；不属于任何自然循环的环为不可归约的强连通分量）；
+#   - 可达性：单次查询按层BFS（每层的后继用NumPy一次取出），全体查询在强连通分量的凝聚图上按位集合传递闭包；
+#   - 最短路径：多源BFS，例如从任一含CALL的块到任一含SSTORE的块；
+# 遍历时邻接表转为Python列表（逐节点访问比NumPy标量索引快得多），批量的集合运算用NumPy。
+# 命令行对结果目录中的所有静态CFG批量分析：python cfg_analytics.py Result -o analytics.jsonl
+
+import argparse
+import os
+import time
+from typing import List, Dict, Tuple, Optional, Iterable
+import numpy as np
+from batch_runner import run_batch
+from cfg_similarity import GraphShape, parse_static_cfg_dot
+from cfg_structure import CSRGraph
+from result_store import result_static_dots
+
+ENTRY_PC = "0x0"
+DEFAULT_SOURCE_OPCODES = ["CALL", "CALLCODE", "DELEGATECALL", "STATICCALL"]
+DEFAULT_TARGET_OPCODES = ["SSTORE"]
+
+
+def csr_from_shape(shape: GraphShape) -> CSRGraph:
+    """静态CFG的抽象表示（cfg_similarity.parse_static_cfg_dot / cfg_shape）-> CSR，入口块（PC 0x0）编号为 0"""
+    nodes, edges = shape
+    node_ids = sorted(nodes, key=lambda pc: int(pc, 16))
+    return CSRGraph.from_edges(node_ids, edges)
+
+
+def blocks_with(shape: GraphShape, csr: CSRGraph, opcodes: Iterable[str]) -> np.ndarray:
+    """包含 opcodes 中任一指令的块的编号"""
+    opcodes = set(opcodes)
+    nodes = shape[0]
+    return np.array([idx for idx, node_id in enumerate(csr.node_ids) if opcodes.intersection(nodes[node_id])],
+                    dtype=np.int32)
+
+
+# ------------------------- 强连通分量 -------------------------
+def strongly_connected_components(csr: CSRGraph) -> np.ndarray:
+    """每个节点所属的强连通分量编号；Tarjan 先完成的分量编号小，即编号为凝聚图的逆拓扑序（后继分量编号更小）"""
+    n = csr.n_nodes
+    indptr, indices = csr.indptr.tolist(), csr.indices.tolist()
+    index = [-1] * n
+    lowlink = [0] * n
+    on_stack = [False] * n
+    component = [-1] * n
+    stack: List[int] = []
+    counter = n_components = 0
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        work = [(root, indptr[root])]
+        index[root] = lowlink[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        while work:
+            node, position = work[-1]
+            if position < indptr[node + 1]:
+                work[-1] = (node, position + 1)
+                succ = indices[position]
+                if index[succ] == -1:
+                    index[succ] = lowlink[succ] = counter
+                    counter += 1
+                    stack.append(succ)
+                    on_stack[succ] = True
+                    work.append((succ, indptr[succ]))
+                elif on_stack[succ] and index[succ] < lowlink[node]:
+                    lowlink[node] = index[succ]
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                if lowlink[node] < lowlink[parent]:
+                    lowlink[parent] = lowlink[node]
+            if lowlink[node] == index[node]:
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component[member] = n_components
+                    if member == node:
+                        break
+                n_components += 1
+    return np.asarray(component, dtype=np.int32)
+
+
+def cyclic_components(csr: CSRGraph, components: np.ndarray) -> np.ndarray:
+    """含环的强连通分量编号（多于一个节点，或有自环）"""
+    sizes = np.bincount(components)
+    sources = np.repeat(np.arange(csr.n_nodes, dtype=np.int32), np.diff(csr.indptr))
+    self_loops = components[sources[sources == csr.indices]]
+    return np.union1d(np.flatnonzero(sizes > 1), self_loops).astype(np.int32)
+
+
+# ------------------------- 支配树 -------------------------
+def reverse_postorder(csr: CSRGraph, entry: int = 0) -> List[int]:
+    """从 entry 可达节点的逆后序"""
+    indptr, indices = csr.indptr.tolist(), csr.indices.tolist()
+    visited = [False] * csr.n_nodes
+    order: List[int] = []
+    visited[entry] = True
+    work = [(entry, indptr[entry])]
+    while work:
+        node, position = work[-1]
+        if position < indptr[node + 1]:
+            work[-1] = (node, position + 1)
+            succ = indices[position]
+            if not visited[succ]:
+                visited[succ] = True
+                work.append((succ, indptr[succ]))
+            continue
+        work.pop()
+        order.append(node)
+    order.reverse()
+    return order
+
+
+def dominator_tree(csr: CSRGraph, entry: int = 0) -> np.ndarray:
+    """每个节点的直接支配节点（idom[entry] == entry，从入口不可达的节点为 -1）"""
+    order = reverse_postorder(csr, entry)
+    rpo_number = [-1] * csr.n_nodes
+    for number, node in enumerate(order):
+        rpo_number[node] = number
+    predecessors = csr.transpose()
+    pred_indptr, pred_indices = predecessors.indptr.tolist(), predecessors.indices.tolist()
+    idom = [-1] * csr.n_nodes
+    idom[entry] = entry
+    changed = True
+    while changed:
+        changed = False
+        for node in order[1:]:
+            new_idom = -1
+            for position in range(pred_indptr[node], pred_indptr[node + 1]):
+                pred = pred_indices[position]
+                if idom[pred] == -1:
+                    continue
+                if new_idom == -1:
+                    new_idom = pred
+                    continue
+                a, b = pred, new_idom  # 沿支配树向上求两者的最近公共祖先
+                while a != b:
+                    while rpo_number[a] > rpo_number[b]:
+                        a = idom[a]
+                    while rpo_number[b] > rpo_number[a]:
+                        b = idom[b]
+                new_idom = a
+            if idom[node] != new_idom:
+                idom[node] = new_idom
+                changed = True
+    return np.asarray(idom, dtype=np.int32)
+
+
+def dominator_depths(idom: np.ndarray, entry: int = 0) -> np.ndarray:
+    """每个节点在支配树中的深度（入口为 0，不可达为 -1）"""
+    parents = idom.tolist()
+    depths = [-1] * len(parents)
+    depths[entry] = 0
+    for node in range(len(parents)):
+        path = []
+        while depths[node] == -1 and parents[node] != -1:
+            path.append(node)
+            node = parents[node]
+        base = depths[node]
+        if base == -1:
+            continue
+        for offset, member in enumerate(reversed(path), 1):
+            depths[member] = base + offset
+    return np.asarray(depths, dtype=np.int32)
+
+
+def _dominance_intervals(idom: np.ndarray, entry: int) -> Tuple[List[int], List[int]]:
+    """支配树的DFS进入/离开序号：a 支配 b 当且仅当 enter[a] <= enter[b] 且 leave[b] <= leave[a]"""
+    n = len(idom)
+    children: List[List[int]] = [[] for _ in range(n)]
+    for node, parent in enumerate(idom.tolist()):
+        if parent != -1 and node != entry:
+            children[parent].append(node)
+    enter, leave = [-1] * n, [-1] * n
+    counter = 0
+    work = [(entry, 0)]
+    enter[entry] = counter
+    while work:
+        node, position = work[-1]
+        if position < len(children[node]):
+            work[-1] = (node, position + 1)
+            child = children[node][position]
+            counter += 1
+            enter[child] = counter
+            work.append((child, 0))
+            continue
+        work.pop()
+        counter += 1
+        leave[node] = counter
+    return enter, leave
+
+
+# ------------------------- 循环嵌套 -------------------------
+class Loop:
+    def __init__(self, loop_id: int, header: int, body: np.ndarray, back_edges: List[Tuple[int, int]]):
+        self.loop_id = loop_id
+        self.header = header
+        self.body = body            # 循环体节点编号（含头节点）
+        self.back_edges = back_edges
+        self.parent: Optional[int] = None
+        self.depth = 1              # 最外层为 1
+
+    def to_dict(self, csr: CSRGraph) -> Dict:
+        return {"header": csr.node_ids[self.header], "blocks": len(self.body), "depth": self.depth,
+                "parent": self.parent, "back_edges": len(self.back_edges)}
+
+    def __repr__(self) -> str:
+        return f"Loop(id={self.loop_id}, header={self.header}, blocks={len(self.body)}, depth={self.depth})"
+
+
+class LoopNest:
+    """自然循环及其嵌套关系；node_loop[i] 为节点 i 所在的最内层循环（-1 表示不在循环中）"""
+    def __init__(self, loops: List[Loop], node_loop: np.ndarray, irreducible: np.ndarray):
+        self.loops = loops
+        self.node_loop = node_loop
+        self.irreducible = irreducible  # 含环但不属于任何自然循环的强连通分量中的节点
+
+    def loop_depths(self) -> np.ndarray:
+        depths = np.array([0] + [loop.depth for loop in self.loops], dtype=np.int32)
+        return depths[self.node_loop + 1]
+
+    @property
+    def max_depth(self) -> int:
+        return max((loop.depth for loop in self.loops), default=0)
+
+    def __repr__(self) -> str:
+        return f"LoopNest(loops={len(self.loops)}, max_depth={self.max_depth}, irreducible={len(self.irreducible)})"
+
+
+def loop_nesting(csr: CSRGraph, idom: Optional[np.ndarray] = None, entry: int = 0,
+                 components: Optional[np.ndarray] = None) -> LoopNest:
+    if idom is None:
+        idom = dominator_tree(csr, entry)
+    if components is None:
+        components = strongly_connected_components(csr)
+    enter, leave = _dominance_intervals(idom, entry)
+    indptr, indices = csr.indptr.tolist(), csr.indices.tolist()
+    idom_list = idom.tolist()
+
+    back_edges: Dict[int, List[Tuple[int, int]]] = {}
+    for source in range(csr.n_nodes):
+        if idom_list[source] == -1:
+            continue
+        for position in range(indptr[source], indptr[source + 1]):
+            header = indices[position]
+            if enter[header] <= enter[source] and leave[source] <= leave[header]:
+                back_edges.setdefault(header, []).append((source, header))
+
+    predecessors = csr.transpose()
+    pred_indptr, pred_indices = predecessors.indptr.tolist(), predecessors.indices.tolist()
+    loops: List[Loop] = []
+    for header, edges in back_edges.items():
+        # 循环体：不经过头节点能到达回边源节点的所有节点（沿前驱反向搜索）
+        in_body = {header}
+        pending = [source for source, _ in edges if source != header]
+        in_body.update(pending)
+        while pending:
+            node = pending.pop()
+            for position in range(pred_indptr[node], pred_indptr[node + 1]):
+                pred = pred_indices[position]
+                if pred not in in_body and idom_list[pred] != -1:
+                    in_body.add(pred)
+                    pending.append(pred)
+        loops.append(Loop(len(loops), header, np.fromiter(sorted(in_body), dtype=np.int32), edges))
+
+    # 不同头节点的自然循环要么不相交要么嵌套：从大到小依次覆盖，每个节点最终记录最内层循环
+    node_loop = np.full(csr.n_nodes, -1, dtype=np.int32)
+    for loop in sorted(loops, key=lambda item: len(item.body), reverse=True):
+        parent = int(node_loop[loop.header])
+        if parent != -1:
+            loop.parent = parent
+            loop.depth = loops[parent].depth + 1
+        node_loop[loop.body] = loop.loop_id
+
+    cyclic = cyclic_components(csr, components)
+    in_cycles = np.isin(components, cyclic)
+    irreducible = np.flatnonzero(in_cycles & (node_loop == -1) & (idom != -1)).astype(np.int32)
+    return LoopNest(loops, node_loop, irreducible)
+
+
+# ------------------------- 可达性与最短路径 -------------------------
+def _expand(csr: CSRGraph, frontier: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """frontier 中所有节点的出边：(源节点, 目标节点)，一次性用NumPy取出"""
+    starts = csr.indptr[frontier]
+    counts = csr.indptr[frontier + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.empty(0, dtype=np.int32)
+        return empty, empty
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+    return np.repeat(frontier, counts), csr.indices[offsets]
+
+
+def _bfs(csr: CSRGraph, sources: Iterable[int], stop: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """按层BFS，返回 (距离, 前驱)；不可达节点距离为 -1；stop 中的节点被访问到的那一层结束后停止"""
+    distance = np.full(csr.n_nodes, -1, dtype=np.int32)
+    parent = np.full(csr.n_nodes, -1, dtype=np.int32)
+    frontier = np.unique(np.asarray(list(sources), dtype=np.int32))
+    distance[frontier] = 0
+    level = 0
+    while len(frontier):
+        if stop is not None and (distance[stop] != -1).any():
+            break
+        level += 1
+        origins, targets = _expand(csr, frontier)
+        fresh = distance[targets] == -1
+        targets, first = np.unique(targets[fresh], return_index=True)
+        distance[targets] = level
+        parent[targets] = origins[fresh][first]
+        frontier = targets
+    return distance, parent
+
+
+def reachable_from(csr: CSRGraph, sources: Iterable[int]) -> np.ndarray:
+    """从 sources（含自身）可达的节点的布尔掩码"""
+    return _bfs(csr, sources)[0] != -1
+
+
+def shortest_path(csr: CSRGraph, sources: Iterable[int], targets: Iterable[int]) -> Optional[List[int]]:
+    """从任一 sources 到任一 targets 的最短路径（按边数，节点编号列表）；不可达返回 None"""
+    targets = np.asarray(list(targets), dtype=np.int32)
+    if not len(targets):
+        return None
+    distance, parent = _bfs(csr, sources, stop=targets)
+    reached = targets[distance[targets] != -1]
+    if not len(reached):
+        return None
+    node = int(reached[np.argmin(distance[reached])])
+    path = [node]
+    while parent[node] != -1:
+        node = int(parent[node])
+        path.append(node)
+    path.reverse()
+    return path
+
+
+class ReachabilityIndex:
+    """
+    全体可达性查询：在强连通分量的凝聚图上计算传递闭包，每个分量一个位集合（Python int）；
+    分量按逆拓扑序编号，按编号从小到大合并后继分量的位集合即可，一次建立后 reaches(u, v) 为 O(1)。
+    """
+    def __init__(self, csr: CSRGraph, components: Optional[np.ndarray] = None):
+        if components is None:
+            components = strongly_connected_components(csr)
+        self.csr = csr
+        self.components = components
+        n_components = int(components.max()) + 1 if len(components) else 0
+        sources = np.repeat(np.arange(csr.n_nodes, dtype=np.int32), np.diff(csr.indptr))
+        pairs = np.unique(np.stack([components[sources], components[csr.indices]], axis=1), axis=0)
+        pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+        successors: List[List[int]] = [[] for _ in range(n_components)]
+        for source, target in pairs.tolist():
+            successors[source].append(target)
+        closure = [0] * n_components
+        for component in range(n_components):
+            bits = 1 << component
+            for succ in successors[component]:
+                bits |= closure[succ]
+            closure[component] = bits
+        self.closure = closure
+
+    def reaches(self, source: int, target: int) -> bool:
+        return bool(self.closure[self.components[source]] >> int(self.components[target]) & 1)
+
+    def reachable_set(self, source: int) -> np.ndarray:
+        """从 source 可达的节点编号（含自身）"""
+        bits = self.closure[self.components[source]]
+        n_components = len(self.closure)
+        mask = np.frombuffer(bits.to_bytes((n_components + 7) // 8, "little"), dtype=np.uint8)
+        component_mask = np.unpackbits(mask, bitorder="little")[:n_components].astype(bool)
+        return np.flatnonzero(component_mask[self.components]).astype(np.int32)
+
+
+# ------------------------- 汇总 -------------------------
+def analyze_shape(shape: GraphShape, source_opcodes: Iterable[str] = DEFAULT_SOURCE_OPCODES,
+                  target_opcodes: Iterable[str] = DEFAULT_TARGET_OPCODES) -> Dict:
+    """一个静态CFG的汇总指标：强连通分量、支配树、循环嵌套，以及 source 块到 target 块的可达性和最短路径"""
+    start = time.perf_counter()
+    csr = csr_from_shape(shape)
+    if csr.n_nodes == 0:
+        return {"blocks": 0, "edges": 0}
+    entry = csr.index_of(ENTRY_PC) if ENTRY_PC in shape[0] else 0
+    components = strongly_connected_components(csr)
+    idom = dominator_tree(csr, entry)
+    nest = loop_nesting(csr, idom, entry, components)
+    sources = blocks_with(shape, csr, source_opcodes)
+    targets = blocks_with(shape, csr, target_opcodes)
+    reachable_targets = 0
+    if len(sources) and len(targets):
+        reachable_targets = int(reachable_from(csr, sources)[targets].sum())
+    path = shortest_path(csr, sources, targets) if len(sources) else None
+    component_sizes = np.bincount(components)
+    return {
+        "blocks": csr.n_nodes,
+        "edges": csr.n_edges,
+        "unreachable_blocks": int((idom == -1).sum()),
+        "sccs": len(component_sizes),
+        "cyclic_sccs": len(cyclic_components(csr, components)),
+        "largest_scc": int(component_sizes.max()),
+        "dominator_depth": int(dominator_depths(idom, entry).max()),
+        "loops": len(nest.loops),
+        "max_loop_depth": nest.max_depth,
+        "irreducible_blocks": len(nest.irreducible),
+        "outer_loops": [loop.to_dict(csr) for loop in nest.loops if loop.parent is None],
+        "source_blocks": len(sources),
+        "target_blocks": len(targets),
+        "reachable_target_blocks": reachable_targets,
+        "shortest_path": [csr.node_ids[node] for node in path] if path else None,
+        "ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def process_result_dir(result_dir: str, source_opcodes: List[str], target_opcodes: List[str]) -> List[Dict]:
+    """batch_runner 的工作函数：结果目录中的每个静态CFG一条记录"""
+    tx_hash = "0x" + os.path.basename(os.path.normpath(result_dir))
+    records = []
+    for short_addr, dot in result_static_dots(result_dir):
+        record = {"tx_hash": tx_hash, "contract": short_addr}
+        record.update(analyze_shape(parse_static_cfg_dot(dot), source_opcodes, target_opcodes))
+        records.append(record)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="静态CFG的图分析（强连通分量、支配树、循环嵌套、可达性、最短路径）")
+    parser.add_argument("inputs", nargs="*", default=["Result"],
+                        help="结果目录，或包含结果目录的根目录（默认 Result）")
+    parser.add_argument("--source", action="append", default=[],
+                        help=f"路径起点块包含的opcode（可多次指定，默认 {'/'.join(DEFAULT_SOURCE_OPCODES)}）")
+    parser.add_argument("--target", action="append", default=[],
+                        help=f"路径终点块包含的opcode（可多次指定，默认 {'/'.join(DEFAULT_TARGET_OPCODES)}）")
+    parser.add_argument("-o", "--output", help="JSONL输出路径（默认输出到标准输出）")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="进程数（默认CPU核数）")
+    args = parser.parse_args()
+
+    result_dirs: List[str] = []
+    for item in args.inputs:
+        if result_static_dots(item):
+            result_dirs.append(item)
+            continue
+        for name in sorted(os.listdir(item)):
+            path = os.path.join(item, name)
+            if os.path.isdir(path):
+                result_dirs.append(path)
+    run_batch(process_result_dir, result_dirs, output=args.output, workers=args.workers,
+              worker_args=(args.source or DEFAULT_SOURCE_OPCODES, args.target or DEFAULT_TARGET_OPCODES))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,11 @@
 # 包含连接逻辑
 # 包含Transaction Execution CFG渲染
 
-from typing import List, Dict, Tuple, Optional, Set
+from typing import List, Dict, Tuple, Optional, Set, Iterable, Iterator
 from evm_information import StandardizedStep
 from basic_block import Block
 from cfg_structure import CFG, BlockNode, Edge
+from trace_compression import CompressedTrace
 
 
 class ContractCFGConnector:
@@ -45,16 +46,38 @@ class ContractCFGConnector:
         cfg = CFG(tx_hash=f"contract_{self.contract_address}")
         if not self.contract_blocks or not contract_steps:
             return cfg
+        first_step = contract_steps[0]
+        return self._connect_from_transitions(
+            cfg, first_step["address"], first_step["pc"], self._step_transitions(contract_steps)
+        )
 
+    def connect_contract_cfg_from_compressed(self, compressed: CompressedTrace) -> CFG:
+        """在块序列形式的trace上构建合约内部CFG，结果与 connect_contract_cfg(该合约的步骤) 相同"""
+        cfg = CFG(tx_hash=f"contract_{self.contract_address}")
+        first = compressed.first_step(self.contract_address) if self.contract_blocks else None
+        if first is None:
+            return cfg
+        return self._connect_from_transitions(
+            cfg, first[0], first[1], compressed.transitions(self.split_opcodes, self.contract_address)
+        )
+
+    def _step_transitions(self, contract_steps: List[StandardizedStep]) -> Iterator[Tuple[int, str, str, str]]:
+        """遇到分块触发指令时切换到下一个块：(下一步骤的下标, 分块指令, 下一步骤的地址, 下一步骤的pc)"""
+        for current_step_idx, current_step in enumerate(contract_steps):
+            if current_step["opcode"] in self.split_opcodes:
+                if current_step_idx + 1 >= len(contract_steps):
+                    break  # 已到步骤末尾
+                next_step = contract_steps[current_step_idx + 1]
+                yield current_step_idx + 1, current_step["opcode"], next_step["address"], next_step["pc"]
+
+    def _connect_from_transitions(self, cfg: CFG, first_address: str, first_pc: str,
+                                  transitions: Iterable[Tuple[int, str, str, str]]) -> CFG:
         processed_nodes: Dict[Tuple[str, str], BlockNode] = {}  # 复用节点
-        current_step_idx = 0  # 当前处理的步骤索引
 
         # 处理第一个块
-        first_step = contract_steps[current_step_idx]
         try:
-            pc_key = (first_step["address"], first_step["pc"])
-            start_pc = self.pc_to_start_pc[pc_key]
-            current_base_block = self._find_base_block(first_step["address"], start_pc)
+            start_pc = self.pc_to_start_pc[(first_address, first_pc)]
+            current_base_block = self._find_base_block(first_address, start_pc)
         except (KeyError, ValueError) as e:
             raise RuntimeError(f"初始化初始化第一个块失败：{e}")
 
@@ -64,48 +87,34 @@ class ContractCFGConnector:
         processed_nodes[current_node_key] = current_node
         cfg.add_node(current_node)
 
-        # 遍历步骤，按块实时处理
-        while current_step_idx < len(contract_steps):
-            current_step = contract_steps[current_step_idx]
-            current_opcode = current_step["opcode"]
-
-            # 遇到分块触发指令时，切换到下一个块
-            if current_opcode in self.split_opcodes:
-                if current_step_idx + 1 >= len(contract_steps):
-                    break  # 已到步骤末尾
-
-                next_step = contract_steps[current_step_idx + 1]
-                try:
-                    next_pc_key = (next_step["address"], next_step["pc"])
-                    next_start_pc = self.pc_to_start_pc[next_pc_key]
-                    next_base_block = self._find_base_block(next_step["address"], next_start_pc)
-                except (KeyError, ValueError) as e:
-                    print(f"警告：步骤 {current_step_idx + 1} 对应的下一个块未找到：{e}")
-                    current_step_idx += 1
-                    continue
-
-                # 复用或创建下一个节点
-                next_node_key = (next_base_block.address, next_base_block.start_pc)
-                if next_node_key in processed_nodes:
-                    next_node = processed_nodes[next_node_key]
-                else:
-                    next_node = BlockNode(next_base_block)
-                    processed_nodes[next_node_key] = next_node
-                    cfg.add_node(next_node)
-
-                # 创建边
-                edge_type = self._get_edge_type(current_opcode)
-                cfg.add_edge(
-                    source=current_node,
-                    target=next_node,
-                    edge_type=edge_type
-                )
-
-                # 更新当前节点和块
-                current_node = next_node
-                current_base_block = next_base_block
-
-            current_step_idx += 1
+        # 按块切换实时处理
+        for next_step_idx, current_opcode, next_address, next_pc in transitions:
+            try:
+                next_start_pc = self.pc_to_start_pc[(next_address, next_pc)]
+                next_base_block = self._find_base_block(next_address, next_start_pc)
+            except (KeyError, ValueError) as e:
+                print(f"警告：步骤 {next_step_idx} 对应的下一个块未找到：{e}")
+                continue
+
+            # 复用或创建下一个节点
+            next_node_key = (next_base_block.address, next_base_block.start_pc)
+            if next_node_key in processed_nodes:
+                next_node = processed_nodes[next_node_key]
+            else:
+                next_node = BlockNode(next_base_block)
+                processed_nodes[next_node_key] = next_node
+                cfg.add_node(next_node)
+
+            # 创建边
+            edge_type = self._get_edge_type(current_opcode)
+            cfg.add_edge(
+                source=current_node,
+                target=next_node,
+                edge_type=edge_type
+            )
+
+            # 更新当前节点
+            current_node = next_node
 
         return cfg
 
@@ -0,0 +1,246 @@
+# cfg_incremental.py 负责静态CFG的增量重建与差异比较；
+# 每个基本块计算一个指纹：指令序列的哈希，其中指向JUMPDEST块的PUSH常量（跳转目标）被抽象掉，
+# 因此代码插入/删除导致的整体PC偏移不会改变未修改块的指纹。
+# 合约升级后，用 difflib 把新旧两版的块指纹序列对齐：对齐且跳转目标一致的块直接复用上一版的后继，
+# 只对变化的区域重新做跳转解析（StaticCompleteCFGBuilder._successors）。
+# 快照同时可用于比较两个版本的CFG：python cfg_incremental.py diff old.json new.json
+
+import difflib
+import hashlib
+import json
+import os
+import sys
+from typing import List, Dict, Tuple, Optional
+from basic_block import Block, BasicBlockProcessor
+from cfg_structure import CFG
+from cfg_static_complete import StaticCompleteCFGBuilder
+from proxy_detection import code_hash
+
+DEFAULT_SNAPSHOT_DIR = "static_cfg_cache"
+
+# 顺序流类型的边：目标总是下一个块
+_FALLTHROUGH_EDGES = {"CONDITION_FALSE", "SEQUENCE", "CALL", "DELEGATECALL", "STATICCALL", "CREATE"}
+# 跳转类型的边：目标由栈值分析得到
+_JUMP_EDGES = {"CONDITION_TRUE", "JUMP"}
+
+
+def block_fingerprints(builder: StaticCompleteCFGBuilder) -> Tuple[List[str], List[List[int]]]:
+    """
+    每个块的指纹，以及块内被抽象的跳转常量所指向的块编号（按出现顺序）。
+    指纹只依赖opcode序列和非跳转目标的PUSH常量。
+    """
+    blocks = builder.contract_blocks
+    jumpdest_index = {
+        int(block.start_pc, 16): idx for idx, block in enumerate(blocks)
+        if block.instructions and block.instructions[0][1] == "JUMPDEST"
+    }
+    fingerprints: List[str] = []
+    refs: List[List[int]] = []
+    for block in blocks:
+        parts: List[str] = []
+        block_refs: List[int] = []
+        for pc, opcode in block.instructions:
+            if opcode.startswith("PUSH"):
+                instr = builder.sva.instr_by_pc.get(int(pc, 16))
+                operand = instr.operand if instr is not None else None
+                if operand in jumpdest_index:
+                    parts.append(f"{opcode}:@")
+                    block_refs.append(jumpdest_index[operand])
+                else:
+                    parts.append(f"{opcode}:{operand:x}" if operand is not None else opcode)
+            else:
+                parts.append(opcode)
+        fingerprints.append(hashlib.sha1("|".join(parts).encode()).hexdigest()[:16])
+        refs.append(block_refs)
+    return fingerprints, refs
+
+
+def take_snapshot(builder: StaticCompleteCFGBuilder) -> Dict:
+    """记录当前版本的块指纹和每个块的后继（块编号 + 边类型），作为下一次增量重建的基础"""
+    blocks = builder.contract_blocks
+    index_by_pc = {block.start_pc: idx for idx, block in enumerate(blocks)}
+    fingerprints, refs = block_fingerprints(builder)
+    return {
+        "address": builder.contract_address,
+        "code_hash": code_hash(builder.contract_bytecode),
+        "blocks": [
+            {
+                "start_pc": block.start_pc,
+                "fingerprint": fingerprints[idx],
+                "refs": refs[idx],
+                "successors": [[index_by_pc[target.start_pc], edge_type]
+                               for target, edge_type in builder._successors(block)],
+            }
+            for idx, block in enumerate(blocks)
+        ],
+    }
+
+
+def align_blocks(old_fingerprints: List[str], new_fingerprints: List[str]) -> Dict[int, int]:
+    """
+    按指纹对齐两版的块：旧块编号 -> 新块编号（保持顺序的最长匹配）。
+    使用 difflib 的默认 autojunk：大量重复的指纹（如只有 JUMPDEST 的块）不作为锚点，只随相邻匹配一起扩展，
+    否则对齐本身会比重新解析还慢；对齐质量只影响复用率，不影响结果的正确性。
+    """
+    matcher = difflib.SequenceMatcher(None, old_fingerprints, new_fingerprints)
+    mapping: Dict[int, int] = {}
+    for old_start, new_start, size in matcher.get_matching_blocks():
+        for offset in range(size):
+            mapping[old_start + offset] = new_start + offset
+    return mapping
+
+
+def seed_from_snapshot(builder: StaticCompleteCFGBuilder, snapshot: Dict) -> Dict:
+    """
+    用上一版快照预填 builder 的后继缓存，之后 build_static_cfg 只对未复用的块做跳转解析。
+
+    复用条件（保证与重新解析的结果相同）：
+    1. 块指纹相同，且块内所有跳转常量指向的旧块都对齐到了新块中对应常量指向的块；
+    2. 顺序流后继对齐后仍是紧随其后的块；
+    3. 跳转后继来自块内的跳转常量（而不是运算结果）；未解析出目标的 JUMP/JUMPI 重新解析。
+
+    Returns:
+        Dict: {"reused", "recomputed", "changed_blocks", "added_blocks", "removed_blocks"}
+    """
+    blocks = builder.contract_blocks
+    fingerprints, refs = block_fingerprints(builder)
+    old_blocks = snapshot["blocks"]
+    mapping = align_blocks([b["fingerprint"] for b in old_blocks], fingerprints)
+    matched_new = set(mapping.values())
+
+    reused = 0
+    for old_idx, new_idx in mapping.items():
+        old = old_blocks[old_idx]
+        if [mapping.get(ref) for ref in old["refs"]] != refs[new_idx]:
+            continue
+        block = blocks[new_idx]
+        terminator = block.instructions[-1][1] if block.instructions else None
+        successors: List[Tuple[Block, str]] = []
+        has_jump_edge = False
+        for target_idx, edge_type in old["successors"]:
+            mapped = mapping.get(target_idx)
+            if mapped is None:
+                break
+            if edge_type in _FALLTHROUGH_EDGES and mapped != new_idx + 1:
+                break
+            if edge_type in _JUMP_EDGES:
+                if target_idx not in old["refs"]:
+                    break
+                has_jump_edge = True
+            successors.append((blocks[mapped], edge_type))
+        else:
+            if terminator in {"JUMP", "JUMPI"} and not has_jump_edge:
+                continue
+            builder._successor_cache[block.start_pc] = successors
+            reused += 1
+
+    return {
+        "reused": reused,
+        "recomputed": len(blocks) - reused,
+        "changed_blocks": [blocks[idx].start_pc for idx in range(len(blocks)) if idx not in matched_new],
+        "added_blocks": len(blocks) - len(matched_new),
+        "removed_blocks": len(old_blocks) - len(mapping),
+    }
+
+
+def diff_snapshots(old: Dict, new: Dict) -> Dict:
+    """
+    比较两个版本的静态CFG：按指纹对齐块，列出新增/删除的块和边（边以两端块的 start_pc 表示）。
+    """
+    old_blocks, new_blocks = old["blocks"], new["blocks"]
+    mapping = align_blocks([b["fingerprint"] for b in old_blocks], [b["fingerprint"] for b in new_blocks])
+    matched_new = set(mapping.values())
+
+    def edge_set(blocks: List[Dict], to_new: Optional[Dict[int, int]]) -> set:
+        edges = set()
+        for idx, block in enumerate(blocks):
+            for target_idx, edge_type in block["successors"]:
+                if to_new is None:
+                    edges.add((idx, target_idx, edge_type))
+                elif idx in to_new and target_idx in to_new:
+                    edges.add((to_new[idx], to_new[target_idx], edge_type))
+                else:
+                    edges.add((("old", idx), ("old", target_idx), edge_type))
+        return edges
+
+    old_edges = edge_set(old_blocks, mapping)
+    new_edges = edge_set(new_blocks, None)
+
+    def pc_of(ref) -> str:
+        return old_blocks[ref[1]]["start_pc"] if isinstance(ref, tuple) else new_blocks[ref]["start_pc"]
+
+    return {
+        "old_code_hash": old.get("code_hash"),
+        "new_code_hash": new.get("code_hash"),
+        "unchanged_blocks": len(mapping),
+        "removed_blocks": [b["start_pc"] for idx, b in enumerate(old_blocks) if idx not in mapping],
+        "added_blocks": [b["start_pc"] for idx, b in enumerate(new_blocks) if idx not in matched_new],
+        "removed_edges": sorted((pc_of(s), pc_of(t), e) for s, t, e in old_edges - new_edges),
+        "added_edges": sorted((pc_of(s), pc_of(t), e) for s, t, e in new_edges - old_edges),
+    }
+
+
+class SnapshotCache:
+    """按合约地址保存最近一次构建的快照：<root>/<address>.json"""
+    def __init__(self, root: str = DEFAULT_SNAPSHOT_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, address: str) -> str:
+        return os.path.join(self.root, f"{address.lower()}.json")
+
+    def load(self, address: str) -> Optional[Dict]:
+        try:
+            with open(self._path(address), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, snapshot: Dict) -> None:
+        tmp_path = f"{self._path(snapshot['address'])}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(tmp_path, self._path(snapshot["address"]))
+
+
+def build_static_cfg_incremental(builder: StaticCompleteCFGBuilder, cache: SnapshotCache) -> Tuple[CFG, Optional[Dict]]:
+    """
+    构建静态CFG：缓存中有该地址上一版的快照时复用未变化的块，构建后更新快照。
+
+    Returns:
+        (CFG, 复用报告)；没有旧快照时报告为 None。
+    """
+    snapshot = cache.load(builder.contract_address)
+    report = seed_from_snapshot(builder, snapshot) if snapshot else None
+    cfg = builder.build_static_cfg()
+    new_snapshot = take_snapshot(builder)
+    if snapshot is None or snapshot.get("code_hash") != new_snapshot["code_hash"]:
+        cache.save(new_snapshot)
+    return cfg, report
+
+
+def snapshot_from_bytecode(bytecode: str, address: str = "0x0") -> Dict:
+    """直接从字节码生成快照（diff 工具用）"""
+    blocks = BasicBlockProcessor().process_contract({"address": address, "bytecode": bytecode})
+    builder = StaticCompleteCFGBuilder(bytecode, blocks)
+    return take_snapshot(builder)
+
+
+def _load_snapshot_arg(path: str) -> Dict:
+    """快照文件（.json）或字节码文件（十六进制文本）"""
+    with open(path, encoding="utf-8") as f:
+        content = f.read().strip()
+    if path.endswith(".json"):
+        return json.loads(content)
+    return snapshot_from_bytecode(content if content.startswith("0x") else "0x" + content)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "diff":
+        print("用法: python cfg_incremental.py diff <旧快照.json|旧字节码文件> <新快照.json|新字节码文件>")
+        sys.exit(1)
+    result = diff_snapshots(_load_snapshot_arg(sys.argv[2]), _load_snapshot_arg(sys.argv[3]))
+    print(f"未变化的块: {result['unchanged_blocks']}，删除 {len(result['removed_blocks'])} 个块，"
+          f"新增 {len(result['added_blocks'])} 个块，删除 {len(result['removed_edges'])} 条边，"
+          f"新增 {len(result['added_edges'])} 条边")
+    print(json.dumps(result, indent=2))
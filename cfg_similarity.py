@@ -0,0 +1,260 @@
+# cfg_similarity.py 负责静态CFG的相似度索引（MinHash + LSH，SQLite持久化）；
+# 每个静态CFG被表示为结构特征（shingle）集合：
+#   - 块：opcode序列（不含PUSH常量，PC偏移不影响）；
+#   - 边：(源块, 边类型, 目标块)；
+#   - 路径：沿边的三个连续块（块的 3-gram）；
+# 集合用 64 个哈希函数压缩为 MinHash 签名，签名分成 16 段（每段 4 个值）写入 LSH 桶表。
+# 查询时只比较至少有一段完全相同的候选，不需要与库中的每个CFG两两比较；
+# 新合约处理完后直接追加（main.py 第9.3步），也可以从已有的 Result/ 目录导入：python cfg_similarity.py ingest
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from typing import List, Dict, Tuple, Optional, Set, Iterable
+from cfg_structure import CFG
+from result_store import result_static_dots, read_static_cfg_dot, result_code_keys
+
+DEFAULT_SIMILARITY_DB_PATH = "similarity.db"
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+_PRIME = (1 << 31) - 1  # 保证 a*x+b 在 uint64 中不溢出
+_PERMUTATIONS = None  # (a, b)，首次计算签名时生成；NumPy 同时延迟导入，main.py 等导入本模块时不加载
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cfg_signatures (
+    code_key   TEXT PRIMARY KEY,
+    address    TEXT,
+    source     TEXT,
+    n_nodes    INTEGER,
+    n_edges    INTEGER,
+    n_shingles INTEGER,
+    signature  BLOB NOT NULL,
+    added_at   REAL
+);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band     INTEGER NOT NULL,
+    bucket   INTEGER NOT NULL,
+    code_key TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, code_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_lsh_buckets_code_key ON lsh_buckets(code_key);
+"""
+
+# 图的抽象表示：节点 -> opcode序列，边 (源, 目标, 类型)
+GraphShape = Tuple[Dict[str, Tuple[str, ...]], List[Tuple[str, str, str]]]
+
+
+def cfg_shape(cfg: CFG) -> GraphShape:
+    nodes = {node.start_pc: tuple(opcode for _, opcode in node.instructions) for node in cfg.nodes}
+    edges = [(edge.source.start_pc, edge.target.start_pc, edge.edge_type) for edge in cfg.edges]
+    return nodes, edges
+
+
+def shingles(shape: GraphShape) -> Set[str]:
+    """图的结构特征集合；引用已移除节点的边（见 remove_unreachable_instruction_blocks）不计入"""
+    nodes, edges = shape
+    tokens = {node: hashlib.blake2b("|".join(ops).encode(), digest_size=6).hexdigest()
+              for node, ops in nodes.items()}
+    result = {f"B:{token}" for token in tokens.values()}
+    successors: Dict[str, Set[str]] = {}
+    for src, dst, edge_type in edges:
+        if src not in tokens or dst not in tokens:
+            continue
+        result.add(f"E:{tokens[src]}:{edge_type}:{tokens[dst]}")
+        successors.setdefault(src, set()).add(dst)
+    for src, mids in successors.items():
+        for mid in mids:
+            for dst in successors.get(mid, ()):
+                result.add(f"P:{tokens[src]}:{tokens[mid]}:{tokens[dst]}")
+    return result
+
+
+def _permutations():
+    global _PERMUTATIONS
+    if _PERMUTATIONS is None:
+        import numpy as np
+        # 固定种子：签名必须在不同进程、不同时间之间可比较
+        rng = np.random.default_rng(0x5eed)
+        _PERMUTATIONS = (rng.integers(1, _PRIME, size=NUM_PERMUTATIONS, dtype=np.uint64),
+                         rng.integers(0, _PRIME, size=NUM_PERMUTATIONS, dtype=np.uint64))
+    return _PERMUTATIONS
+
+
+def minhash(features: Iterable[str]) -> "np.ndarray":
+    """MinHash 签名（NUM_PERMUTATIONS 个 uint32）；空集合的签名全为 _PRIME"""
+    import numpy as np
+    perm_a, perm_b = _permutations()
+    values = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(f.encode(), digest_size=8).digest(), "little") % _PRIME for f in features),
+        dtype=np.uint64)
+    if values.size == 0:
+        return np.full(NUM_PERMUTATIONS, _PRIME, dtype=np.uint32)
+    hashed = (perm_a[:, None] * values[None, :] + perm_b[:, None]) % _PRIME
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def band_buckets(signature: "np.ndarray") -> List[int]:
+    """每段签名的桶编号（有符号64位，直接存入SQLite INTEGER）"""
+    return [
+        int.from_bytes(hashlib.blake2b(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes(),
+                                       digest_size=8).digest(), "little", signed=True)
+        for band in range(BANDS)
+    ]
+
+
+def estimate_similarity(a: "np.ndarray", b: "np.ndarray") -> float:
+    """由签名估计的 Jaccard 相似度"""
+    return float((a == b).sum()) / NUM_PERMUTATIONS
+
+
+class SimilarityIndex:
+    """静态CFG相似度索引（SQLite，可增量插入）"""
+    def __init__(self, db_path: str = DEFAULT_SIMILARITY_DB_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def has_code(self, code_key: str) -> bool:
+        row = self.conn.execute("SELECT 1 FROM cfg_signatures WHERE code_key = ?", (code_key,)).fetchone()
+        return row is not None
+
+    def add_shape(self, code_key: str, shape: GraphShape, address: Optional[str] = None,
+                  source: Optional[str] = None, features: Optional[Set[str]] = None) -> "np.ndarray":
+        """插入（或替换）一个CFG的签名，返回签名"""
+        features = shingles(shape) if features is None else features
+        signature = minhash(features)
+        with self.conn:
+            self.conn.execute("DELETE FROM lsh_buckets WHERE code_key = ?", (code_key,))
+            self.conn.execute("INSERT OR REPLACE INTO cfg_signatures VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                              (code_key, address, source, len(shape[0]), len(shape[1]), len(features),
+                               signature.tobytes(), time.time()))
+            self.conn.executemany("INSERT OR IGNORE INTO lsh_buckets VALUES (?, ?, ?)",
+                                  [(band, bucket, code_key) for band, bucket in enumerate(band_buckets(signature))])
+        return signature
+
+    def add_cfg(self, code_key: str, cfg: CFG, address: Optional[str] = None,
+                source: Optional[str] = None) -> "np.ndarray":
+        return self.add_shape(code_key, cfg_shape(cfg), address, source or cfg.tx_hash)
+
+    def query(self, signature: "np.ndarray", k: int = 10, min_similarity: float = 0.0,
+              exclude: Optional[str] = None) -> List[Tuple[str, float, Optional[str]]]:
+        """
+        近邻查询：只取与签名至少有一段落入同一桶的候选，按估计的相似度排序。
+        返回 [(code_key, 相似度, 首次记录的地址), ...]
+        """
+        import numpy as np
+        candidates: Set[str] = set()
+        for band, bucket in enumerate(band_buckets(signature)):
+            rows = self.conn.execute("SELECT code_key FROM lsh_buckets WHERE band = ? AND bucket = ?",
+                                     (band, bucket)).fetchall()
+            candidates.update(row[0] for row in rows)
+        candidates.discard(exclude)
+        results: List[Tuple[str, float, Optional[str]]] = []
+        for code_key in candidates:
+            address, blob = self.conn.execute(
+                "SELECT address, signature FROM cfg_signatures WHERE code_key = ?", (code_key,)).fetchone()
+            similarity = estimate_similarity(signature, np.frombuffer(blob, dtype=np.uint32))
+            if similarity >= min_similarity:
+                results.append((code_key, similarity, address))
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results[:k]
+
+    def query_cfg(self, cfg: CFG, k: int = 10, min_similarity: float = 0.0,
+                  exclude: Optional[str] = None) -> List[Tuple[str, float, Optional[str]]]:
+        return self.query(minhash(shingles(cfg_shape(cfg))), k, min_similarity, exclude)
+
+    def __repr__(self) -> str:
+        count = self.conn.execute("SELECT COUNT(*) FROM cfg_signatures").fetchone()[0]
+        return f"SimilarityIndex(db={self.db_path}, cfgs={count})"
+
+
+# ------------------------- 从已有结果导入 -------------------------
+_DOT_NODE = re.compile(r'^\s*"block_([0-9a-f]+)" \[label="(.*?)", fillcolor=', re.S | re.M)
+_DOT_EDGE = re.compile(r'^\s*"block_([0-9a-f]+)" -> "block_([0-9a-f]+)" \[label="#\d+ \((\w+)\)"', re.M)
+_DOT_INSTRUCTION = re.compile(r"^0x[0-9a-f]+: (\w+)$", re.M)
+
+
+def parse_static_cfg_dot(content: str) -> GraphShape:
+    """从 render_static_complete 生成的DOT文本还原图的抽象表示"""
+    nodes = {f"0x{pc}": tuple(_DOT_INSTRUCTION.findall(label.split("---------", 1)[-1]))
+             for pc, label in _DOT_NODE.findall(content)}
+    edges = [(f"0x{src}", f"0x{dst}", edge_type) for src, dst, edge_type in _DOT_EDGE.findall(content)]
+    return nodes, edges
+
+
+def load_static_cfg_dot(path: str) -> GraphShape:
+    """DOT文件路径；交易目录中的静态CFG只保存在结果库中时也可以按 contract_<addr>_static_cfg.dot 给出"""
+    return parse_static_cfg_dot(read_static_cfg_dot(path))
+
+
+def ingest_result_dir(index: SimilarityIndex, result_dir: str, force: bool = False) -> int:
+    """导入 Result/<tx>/ 下的静态CFG，按 code_key（result_code_keys）去重，返回新导入的数量"""
+    code_keys = result_code_keys(result_dir)
+    by_short = {address.lower().replace("0x", "", 1)[:8]: address for address in code_keys}
+    source = "0x" + os.path.basename(os.path.normpath(result_dir))
+    count = 0
+    for short_addr, dot in result_static_dots(result_dir):
+        address = by_short.get(short_addr)
+        if address is None:
+            continue  # 没有对应基本块的DOT无法确定代码
+        key = code_keys[address]
+        if not force and index.has_code(key):
+            continue
+        index.add_shape(key, parse_static_cfg_dot(dot), address, source)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="静态CFG相似度索引（MinHash + LSH）")
+    parser.add_argument("--db", default=DEFAULT_SIMILARITY_DB_PATH, help="SQLite数据库路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = sub.add_parser("ingest", help="从结果目录导入静态CFG")
+    ingest_parser.add_argument("root", nargs="?", default="Result")
+    ingest_parser.add_argument("--force", action="store_true", help="重新导入已存在的代码")
+
+    query_parser = sub.add_parser("query", help="查询与某个静态CFG（DOT文件）相似的已知合约")
+    query_parser.add_argument("dot")
+    query_parser.add_argument("-k", type=int, default=10, help="返回的最大数量")
+    query_parser.add_argument("--min-similarity", type=float, default=0.0)
+
+    sub.add_parser("stats", help="索引统计")
+
+    args = parser.parse_args()
+    index = SimilarityIndex(args.db)
+    try:
+        if args.command == "ingest":
+            start = time.perf_counter()
+            count = 0
+            for name in sorted(os.listdir(args.root)):
+                result_dir = os.path.join(args.root, name)
+                if os.path.isdir(result_dir):
+                    count += ingest_result_dir(index, result_dir, force=args.force)
+            print(f"新导入 {count} 个静态CFG，用时 {time.perf_counter() - start:.2f}s，{index}")
+        elif args.command == "query":
+            start = time.perf_counter()
+            signature = minhash(shingles(load_static_cfg_dot(args.dot)))
+            results = index.query(signature, args.k, args.min_similarity)
+            print(f"找到 {len(results)} 个相似的CFG，用时 {(time.perf_counter() - start) * 1000:.1f}ms")
+            for code_key, similarity, address in results:
+                print(f"{similarity:.3f}  {address}  {code_key}")
+        else:
+            buckets = index.conn.execute("SELECT COUNT(DISTINCT band || ':' || bucket) FROM lsh_buckets").fetchone()[0]
+            print(f"{index}，{buckets} 个非空桶")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,11 @@
 # 与 cfg_contract.py (动态路径) 和 cfg_transaction.py (跨合约流) 保持独立
 
 from typing import List, Dict, Tuple, Optional
+from collections import deque
 from basic_block import Block
+from evm_information import StandardizedTrace
 from cfg_structure import CFG, BlockNode, Edge
-from web3 import Web3
+from code_section import strip_non_code
 import logging
 import pyevmasm as evmasm  # 需要使用 pyevmasm 进行反汇编以获取操作数
 import re
@@ -31,7 +33,8 @@ class SimpleStackValueAnalyzer:
     """
     def __init__(self, bytecode: str):
         self.bytecode = bytecode
-        self.instructions = list(evmasm.disassemble_all(bytes.fromhex(bytecode[2:])))
+        # 只反汇编代码区：末尾的元数据/数据不会是跳转源，反汇编它们只会拖慢 index() 查找
+        self.instructions = list(evmasm.disassemble_all(bytes.fromhex(strip_non_code(bytecode)[2:])))
         self.instr_by_pc = {instr.pc: instr for instr in self.instructions} # 将指令按PC索引
 
     def get_jump_target(self, jump_pc: int) -> Optional[int]:
@@ -149,6 +152,10 @@ class StaticCompleteCFGBuilder:
 
         # 初始化栈值分析器
         self.sva = SimpleStackValueAnalyzer(contract_bytecode)
+        # start_pc -> 后继块列表（_successors 的缓存，整图和函数子图共用）
+        self._successor_cache: Dict[str, List[Tuple[Block, str]]] = {}
+        # 函数选择器 -> 函数入口块 start_pc（detect_dispatcher 的缓存）
+        self._dispatcher: Optional[Dict[str, str]] = None
 
     def _find_block_by_start_pc(self, address: str, start_pc: str) -> Block:
         """通过地址和起始PC查找基本块。"""
@@ -204,13 +211,69 @@ class StaticCompleteCFGBuilder:
         cfg.edges.append(edge)
         cfg._next_edge_id += 1
 
+    def _block_at(self, address: str, pc_int: int) -> Optional[Block]:
+        """PC所在的基本块，不属于任何块时返回 None"""
+        try:
+            return self._find_block_by_pc(address, hex(pc_int))
+        except ValueError:
+            return None
+
+    def _successors(self, block: Block) -> List[Tuple[Block, str]]:
+        """
+        根据基本块的终止指令和EVM规则计算其后继块。
+        
+        规则：
+        1. JUMPI：下一条指令所在块（CONDITION_FALSE）和栈值分析得到的跳转目标（CONDITION_TRUE）。
+        2. JUMP：栈值分析得到的跳转目标。
+        3. STOP/RETURN/REVERT/INVALID/SELFDESTRUCT：没有后继。
+        4. CALL/CREATE 等：执行后返回到下一条指令。
+        5. 其余指令（被 JUMPDEST 截断的块）：顺序流到下一条指令。
+        跳转目标与当前块相同时不连边（避免自环）。
+        
+        Returns:
+            List[Tuple[Block, str]]: (后继块, 边类型)，顺序即建图时的加边顺序。
+        """
+        cached = self._successor_cache.get(block.start_pc)
+        if cached is not None:
+            return cached
+
+        successors: List[Tuple[Block, str]] = []
+        last_instruction = block.instructions[-1] if block.instructions else None
+        if last_instruction:
+            pc, terminator_opcode = last_instruction[0], last_instruction[1]
+            pc_int = int(pc, 16)  # 转换为整数用于计算
+            next_pc_int = pc_int + self._get_opcode_length(terminator_opcode)
+
+            if terminator_opcode in {"JUMPI", "JUMP"}:
+                if terminator_opcode == "JUMPI":
+                    fallthrough_block = self._block_at(block.address, next_pc_int)
+                    if fallthrough_block is not None:
+                        successors.append((fallthrough_block, self._get_edge_type("CONDITION_FALSE")))
+                target_pc_int = self.sva.get_jump_target(pc_int)
+                if target_pc_int is not None:
+                    target_block = self._block_at(block.address, target_pc_int)
+                    if target_block is not None and target_block is not block:
+                        edge_opcode = "CONDITION_TRUE" if terminator_opcode == "JUMPI" else "JUMP"
+                        successors.append((target_block, self._get_edge_type(edge_opcode)))
+            elif terminator_opcode in {"STOP", "RETURN", "REVERT", "INVALID", "SELFDESTRUCT"}:
+                pass
+            else:
+                next_block = self._block_at(block.address, next_pc_int)
+                if next_block is not None:
+                    edge_opcode = terminator_opcode if terminator_opcode in {
+                        "CALL", "CALLCODE", "DELEGATECALL", "STATICCALL", "CREATE", "CREATE2"} else "SEQUENCE"
+                    successors.append((next_block, self._get_edge_type(edge_opcode)))
+
+        self._successor_cache[block.start_pc] = successors
+        return successors
+
     def build_static_cfg(self) -> CFG:
         """
         构建合约的静态完整控制流图。
         
         核心逻辑：
         1. 将所有基本块作为节点添加到图中。
-        2. 遍历每个基本块，根据其终止指令和EVM规则，建立到其他块的边。
+        2. 遍历每个基本块，根据其终止指令和EVM规则（见 _successors），建立到其他块的边。
         3. 对于 JUMP 和 JUMPI，使用 SimpleStackValueAnalyzer 精确推断跳转目标。
         4. 对于非跳转/终止指令，连接到下一个PC所在的块。
         
@@ -230,107 +293,11 @@ class StaticCompleteCFGBuilder:
 
         # 为每个节点建立出边
         for block in self.contract_blocks:
-            node_key = (block.address, block.start_pc)
-            current_node = node_map[node_key]
-            last_instruction = block.instructions[-1] if block.instructions else None
-            
-            if not last_instruction:
-                continue
-            
-            pc, terminator_opcode = last_instruction[0], last_instruction[1]
-            pc_int = int(pc, 16)  # 转换为整数用于计算
-
-            # --- 规则1: JUMPI 指令 ---
-            if terminator_opcode == "JUMPI":
-                # 后继1: 下一条指令 (fall-through) - CONDITION_FALSE
-                next_pc_int = pc_int + self._get_opcode_length("JUMPI")
-                next_pc_hex = Web3.to_hex(next_pc_int)
-                try:
-                    fallthrough_block = self._find_block_by_pc(block.address, next_pc_hex)
-                    fallthrough_key = (fallthrough_block.address, fallthrough_block.start_pc)
-                    if fallthrough_key in node_map:
-                        fallthrough_node = node_map[fallthrough_key]
-                        edge_type = self._get_edge_type("CONDITION_FALSE") # CONDITION_FALSE
-                        self._connect_blocks(cfg, current_node, fallthrough_node, edge_type)
-                except ValueError:
-                    pass  # 目标PC可能无效
-
-                # 后继2: 跳转目标 (jump target) - CONDITION_TRUE
-                # 使用栈值分析器获取目标PC
-                target_pc_int = self.sva.get_jump_target(pc_int)
-                if target_pc_int is not None:
-                    target_pc_hex = Web3.to_hex(target_pc_int)
-                    try:
-                        target_block = self._find_block_by_pc(block.address, target_pc_hex)
-                        target_key = (target_block.address, target_block.start_pc)
-                        if target_key in node_map:
-                            target_node = node_map[target_key]
-                            # 避免自环
-                            if target_node != current_node:
-                                edge_type = self._get_edge_type("CONDITION_TRUE") # CONDITION_TRUE
-                                self._connect_blocks(cfg, current_node, target_node, edge_type)
-                    except ValueError:
-                        # 目标PC可能不是一个有效的JUMPDEST块
-                        pass
-            # 如果是JUMPI命令，一条边连接到下一条指令，另一条边连接到跳转目标。
-            # --- 规则 2: JUMP 指令 ---
-            elif terminator_opcode == "JUMP":
-                # 使用栈值分析器获取目标PC
-                target_pc_int = self.sva.get_jump_target(pc_int)
-                if target_pc_int is not None:
-                    target_pc_hex = Web3.to_hex(target_pc_int)
-                    try:
-                        target_block = self._find_block_by_pc(block.address, target_pc_hex)
-                        target_key = (target_block.address, target_block.start_pc)
-                        if target_key in node_map:
-                            target_node = node_map[target_key]
-                            if target_node != current_node:
-                                edge_type = self._get_edge_type("JUMP")
-                                self._connect_blocks(cfg, current_node, target_node, edge_type)
-                    except ValueError:
-                        pass
-
-            # --- 规则 3: 终止指令 ---
-            # STOP, RETURN, REVERT, INVALID, SELFDESTRUCT 没有后继
-            elif terminator_opcode in {"STOP", "RETURN", "REVERT", "INVALID", "SELFDESTRUCT"}:
-                continue
-
-            # --- 规则 4: 调用和创建指令 ---
-            # CALL, CALLCODE, DELEGATECALL, STATICCALL, CREATE, CREATE2
-            # 执行后，控制流会返回到下一条指令
-            elif terminator_opcode in {"CALL", "CALLCODE", "DELEGATECALL", "STATICCALL", 
-                                     "CREATE", "CREATE2"}:
-                next_pc_int = pc_int + self._get_opcode_length(terminator_opcode)
-                next_pc_hex = Web3.to_hex(next_pc_int)
-                try:
-                    next_block = self._find_block_by_pc(block.address, next_pc_hex)
-                    next_key = (next_block.address, next_block.start_pc)
-                    if next_key in node_map:
-                        next_node = node_map[next_key]
-                        edge_type = self._get_edge_type(terminator_opcode)
-                        self._connect_blocks(cfg, current_node, next_node, edge_type)
-                except ValueError:
-                    pass
-
-            # --- 规则 5: 顺序执行流 (修正版) ---
-            # **核心改进**：只要不是上面处理过的指令（JUMP, JUMPI, 终止指令, 调用指令），
-            # 都应该有顺序流。这包括了 ADD, MUL, PUSH, POP 等所有普通指令。
-            # 这是连接由 JUMPDEST 分割产生的块的关键。
-            else:
-                # 计算下一条指令的PC
-                next_pc_int = pc_int + self._get_opcode_length(terminator_opcode)
-                next_pc_hex = Web3.to_hex(next_pc_int)
-                try:
-                    # 尝试找到下一个PC所在的块
-                    next_block = self._find_block_by_pc(block.address, next_pc_hex)
-                    next_key = (next_block.address, next_block.start_pc)
-                    if next_key in node_map:
-                        next_node = node_map[next_key]
-                        edge_type = self._get_edge_type("SEQUENCE")
-                        self._connect_blocks(cfg, current_node, next_node, edge_type)
-                except ValueError:
-                    # 下一个PC可能不属于任何块（例如在合约末尾），忽略
-                    pass
+            current_node = node_map[(block.address, block.start_pc)]
+            for target_block, edge_type in self._successors(block):
+                target_key = (target_block.address, target_block.start_pc)
+                if target_key in node_map:
+                    self._connect_blocks(cfg, current_node, node_map[target_key], edge_type)
         self.remove_unreachable_instruction_blocks(cfg, node_map)
         return cfg
     
@@ -357,13 +324,143 @@ class StaticCompleteCFGBuilder:
             cfg.remove_node(node)
             del node_map[(node.address, node.start_pc)]
 
-def render_static_complete(cfg: CFG, output_path: str, rankdir: str = "TB") -> None:
+    # ------------------------------------------------------------------
+    # 函数级划分：识别选择器分发表，按函数构建静态子图
+    # ------------------------------------------------------------------
+    def detect_dispatcher(self) -> Dict[str, str]:
+        """
+        识别 Solidity/Vyper 的函数选择器分发表。
+        
+        以 JUMPI 结尾、且包含 PUSH4 <selector> 比较的块视为分发表的一项：
+        - Solidity: DUP1 PUSH4 sel EQ PUSH2 dest JUMPI        -> 函数入口为跳转目标
+        - Vyper:    PUSH4 sel DUP2 XOR PUSH2 next JUMPI       -> 不相等时跳走，函数入口为顺序后继
+        PUSH4 之后只允许出现 DUP/SWAP/EQ/XOR/ISZERO（排除二分查找中的 GT/LT 和 AND 掩码）。
+        
+        Returns:
+            Dict[str, str]: 选择器（0x + 8位16进制） -> 函数入口块的 start_pc，按分发顺序排列。
+        """
+        if self._dispatcher is not None:
+            return self._dispatcher
+
+        dispatcher: Dict[str, str] = {}
+        for block in self.contract_blocks:
+            if block.terminator != "JUMPI":
+                continue
+            instrs = [self.sva.instr_by_pc.get(int(pc, 16)) for pc, _ in block.instructions]
+            if any(instr is None for instr in instrs) or len(instrs) < 4 or not instrs[-2].name.startswith("PUSH"):
+                continue
+            push4_idx = max((i for i, instr in enumerate(instrs) if instr.name == "PUSH4"), default=None)
+            if push4_idx is None:
+                continue
+            between = [instr.name for instr in instrs[push4_idx + 1:-2]]
+            if not between or not all(name in {"EQ", "XOR", "ISZERO"} or name.startswith(("DUP", "SWAP"))
+                                      for name in between):
+                continue
+            if ("EQ" in between) == ("XOR" in between):
+                continue
+            # EQ 为真时跳转；XOR 非零（不相等）时跳转；每个 ISZERO 取反一次
+            jumps_on_match = ("EQ" in between) ^ (between.count("ISZERO") % 2 == 1)
+            if jumps_on_match:
+                entry = self._block_at(block.address, instrs[-2].operand)
+            else:
+                entry = self._block_at(block.address, instrs[-1].pc + 1)
+            selector = f"0x{instrs[push4_idx].operand:08x}"
+            if entry is not None and selector not in dispatcher:
+                dispatcher[selector] = entry.start_pc
+
+        self._dispatcher = dispatcher
+        return dispatcher
+
+    def functions_in_trace(self, trace: StandardizedTrace) -> List[str]:
+        """轨迹中执行过的函数：该合约的执行步骤经过了哪些函数入口块"""
+        entries = self.detect_dispatcher()
+        address = self.contract_address.lower()
+        executed_pcs = {step["pc"] for step in trace["steps"] if step["address"].lower() == address}
+        return [selector for selector, entry_pc in entries.items() if entry_pc in executed_pcs]
+
+    def _pushed_jumpdests(self, block: Block) -> List[Block]:
+        """
+        块内 PUSH 的常量中指向 JUMPDEST 块的那些（通常是内部函数调用压入的返回地址）。
+        返回跳转的目标无法由栈值分析推断，划分函数时把它们视为可达，避免丢失调用之后的代码。
+        """
+        targets = []
+        for pc, opcode in block.instructions:
+            if not opcode.startswith("PUSH"):
+                continue
+            instr = self.sva.instr_by_pc.get(int(pc, 16))
+            if instr is None or instr.operand is None:
+                continue
+            target = self.block_by_start_pc.get((block.address, hex(instr.operand)))
+            if target is not None and target.instructions and target.instructions[0][1] == "JUMPDEST":
+                targets.append(target)
+        return targets
+
+    def _reachable_blocks(self, roots: List[Block], stop_pcs: set) -> set:
+        """从 roots 出发的可达块（start_pc 集合），不进入 stop_pcs 中的块"""
+        seen = {root.start_pc for root in roots}
+        queue = deque(roots)
+        while queue:
+            block = queue.popleft()
+            candidates = [target for target, _ in self._successors(block)] + self._pushed_jumpdests(block)
+            for target in candidates:
+                if target.start_pc not in seen and target.start_pc not in stop_pcs:
+                    seen.add(target.start_pc)
+                    queue.append(target)
+        return seen
+
+    def _build_subgraph(self, block_pcs: set, tx_hash: str) -> CFG:
+        """只包含 block_pcs 中的块及其之间的边，节点和边的顺序与整图一致"""
+        cfg = CFG(tx_hash=tx_hash)
+        node_map: Dict[Tuple[str, str], BlockNode] = {}
+        for block in self.contract_blocks:
+            if block.start_pc in block_pcs:
+                node = BlockNode(block)
+                node_map[(node.address, node.start_pc)] = node
+                cfg.nodes.append(node)  # 节点按块顺序且唯一，无需 add_node 的逐个查重
+        for block in self.contract_blocks:
+            if block.start_pc not in block_pcs:
+                continue
+            current_node = node_map[(block.address, block.start_pc)]
+            for target_block, edge_type in self._successors(block):
+                target_key = (target_block.address, target_block.start_pc)
+                if target_key in node_map:
+                    self._connect_blocks(cfg, current_node, node_map[target_key], edge_type)
+        return cfg
+
+    def build_function_cfg(self, selectors: List[str], include_dispatcher: bool = False) -> CFG:
+        """
+        只构建指定函数的静态子图：从函数入口出发的可达块（不进入其他函数的入口）。
+        只分析可达块的跳转，构建开销与所选函数的规模成正比。
+        
+        Args:
+            selectors (List[str]): 函数选择器（0x + 8位16进制），未识别的选择器会被忽略。
+            include_dispatcher (bool): 是否同时包含从入口 0x0 到各函数入口的分发部分。
+        
+        Returns:
+            CFG: 函数级静态控制流图。
+        """
+        entries = self.detect_dispatcher()
+        entry_pcs = set(entries.values())
+        roots = [self.block_by_start_pc[(self.contract_address, entries[s])] for s in selectors if s in entries]
+        block_pcs = self._reachable_blocks(roots, entry_pcs - {root.start_pc for root in roots})
+        if include_dispatcher and self.contract_blocks:
+            block_pcs |= self._reachable_blocks([self.contract_blocks[0]], entry_pcs)
+            block_pcs |= {root.start_pc for root in roots}
+        label = "_".join(s[2:] for s in selectors if s in entries) or "none"
+        return self._build_subgraph(block_pcs, f"static_function_{self.contract_address}_{label}")
+
+    def build_function_cfgs(self, selectors: Optional[List[str]] = None) -> Dict[str, CFG]:
+        """按函数划分静态CFG：选择器 -> 函数子图（默认为分发表中的全部函数）"""
+        selectors = list(self.detect_dispatcher()) if selectors is None else selectors
+        return {selector: self.build_function_cfg([selector]) for selector in selectors
+                if selector in self.detect_dispatcher()}
+
+def static_complete_dot(cfg: CFG, rankdir: str = "TB") -> str:
     """
-    将静态完整CFG渲染为DOT文件。
+    生成静态完整CFG的DOT文本。
     
     Args:
         cfg (CFG): 要渲染的静态完整控制流图。
-        output_path (str): 输出文件路径。
         rankdir (str): 布局方向 (TB: 从上到下, LR: 从左到右)。
     """
     edge_color_map = {
@@ -379,36 +476,50 @@ def render_static_complete(cfg: CFG, output_path: str, rankdir: str = "TB") -> N
         "CONDITION_FALSE": "#f7768e"
     }
     
+    lines = []
+    lines.append('digraph Static_Complete_CFG {\n')
+    lines.append(f'    rankdir={rankdir};\n')
+    lines.append('    node [shape=box, style="filled, rounded", '
+                 'fontname="Monospace", fontsize=9, margin=0.15];\n')
+    lines.append('    edge [fontname="Arial", fontsize=8, penwidth=1.2];\n')
+    # 前面的设置定义了节点和边的样式
+    # 写入节点
+    for node in cfg.nodes:
+        node_id = f"block_{node.start_pc.replace('0x', '')}"
+        instr_lines = [f"{pc}: {opcode}" for (pc, opcode) in node.instructions]
+        instr_str = "\n".join(instr_lines)
+        node_label = (f"合约: {node.address[:8]}...\n"
+                     f"起始PC: {node.start_pc}\n"
+                     f"终止PC: {node.end_pc}\n"
+                     f"终止指令: {node.terminator}\n"
+                     f"---------\n"
+                     f"{instr_str}")
+        node_label = node_label.replace('"', '\\"')
+        lines.append(f'    "{node_id}" [label="{node_label}", fillcolor="#e6f7ff"];\n')
+    
+    lines.append('\n')
+    # 写入边
+    for edge in cfg.edges:
+        source_id = f"block_{edge.source.start_pc.replace('0x', '')}"
+        target_id = f"block_{edge.target.start_pc.replace('0x', '')}"
+        edge_color = edge_color_map.get(edge.edge_type, "#bdbdbd")
+        edge_label = f"#{edge.edge_id} ({edge.edge_type})"
+        lines.append(f'    "{source_id}" -> "{target_id}" [label="{edge_label}", '
+                     f'color="{edge_color}"];\n')
+    lines.append('}')
+    return "".join(lines)
+
+
+def render_static_complete(cfg: CFG, output_path: str, rankdir: str = "TB") -> None:
+    """
+    将静态完整CFG渲染为DOT文件。
+    
+    Args:
+        cfg (CFG): 要渲染的静态完整控制流图。
+        output_path (str): 输出文件路径。
+        rankdir (str): 布局方向 (TB: 从上到下, LR: 从左到右)。
+    """
     with open(output_path, 'w', encoding='utf-8') as f:
-        f.write('digraph Static_Complete_CFG {\n')
-        f.write(f'    rankdir={rankdir};\n')
-        f.write('    node [shape=box, style="filled, rounded", '
-                'fontname="Monospace", fontsize=9, margin=0.15];\n')
-        f.write('    edge [fontname="Arial", fontsize=8, penwidth=1.2];\n')
-        # 前面的设置定义了节点和边的样式
-        # 写入节点
-        for node in cfg.nodes:
-            node_id = f"block_{node.start_pc.replace('0x', '')}"
-            instr_lines = [f"{pc}: {opcode}" for (pc, opcode) in node.instructions]
-            instr_str = "\n".join(instr_lines)
-            node_label = (f"合约: {node.address[:8]}...\n"
-                         f"起始PC: {node.start_pc}\n"
-                         f"终止PC: {node.end_pc}\n"
-                         f"终止指令: {node.terminator}\n"
-                         f"---------\n"
-                         f"{instr_str}")
-            node_label = node_label.replace('"', '\\"')
-            f.write(f'    "{node_id}" [label="{node_label}", fillcolor="#e6f7ff"];\n')
-        
-        f.write('\n')
-        # 写入边
-        for edge in cfg.edges:
-            source_id = f"block_{edge.source.start_pc.replace('0x', '')}"
-            target_id = f"block_{edge.target.start_pc.replace('0x', '')}"
-            edge_color = edge_color_map.get(edge.edge_type, "#bdbdbd")
-            edge_label = f"#{edge.edge_id} ({edge.edge_type})"
-            f.write(f'    "{source_id}" -> "{target_id}" [label="{edge_label}", '
-                    f'color="{edge_color}"];\n')
-        f.write('}')
+        f.write(static_complete_dot(cfg, rankdir))
     
     print(f"静态完整CFG已渲染至: {output_path}（布局方向: {rankdir}）")
\ No newline at end of file
@@ -1,6 +1,6 @@
 # cfg_structures.py负责定义CFG图的核心数据结构
 
-from typing import List
+from typing import List, Dict, Tuple, Iterable
 from basic_block import Block
 
 
@@ -37,6 +37,72 @@ class Edge:
         return f"Edge(id={self.edge_id}, {self.source.start_pc} -> {self.target.start_pc}, {self.edge_type})"
 
 
+class CSRGraph:
+    """
+    图的压缩稀疏行（CSR）邻接表（NumPy数组），供 cfg_analytics.py 的图算法使用：
+    节点 i 的后继为 indices[indptr[i]:indptr[i+1]]，对应边的类型为 edge_type_names[edge_types[...]]；
+    node_ids[i] 为节点标识（CFG.to_csr 为 "地址:start_pc"，静态CFG为 start_pc）。
+    """
+    def __init__(self, node_ids: List[str], indptr, indices, edge_types, edge_type_names: List[str]):
+        self.node_ids = node_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.edge_types = edge_types
+        self.edge_type_names = edge_type_names
+        self._positions: Dict[str, int] = {}
+
+    @classmethod
+    def from_edges(cls, node_ids: List[str], edges: Iterable[Tuple[str, str, str]]) -> "CSRGraph":
+        """由节点标识列表和 (源, 目标, 类型) 边建立；端点不在 node_ids 中的边（已移除的节点）被忽略"""
+        import numpy as np  # 延迟导入，不计入离线工具的启动时间
+        positions = {node_id: idx for idx, node_id in enumerate(node_ids)}
+        type_ids: Dict[str, int] = {}
+        sources, targets, types = [], [], []
+        for source, target, edge_type in edges:
+            if source in positions and target in positions:
+                sources.append(positions[source])
+                targets.append(positions[target])
+                types.append(type_ids.setdefault(edge_type, len(type_ids)))
+        sources = np.asarray(sources, dtype=np.int32)
+        order = np.argsort(sources, kind="stable")  # 同一节点的出边保持原顺序
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(sources, minlength=len(node_ids)), out=indptr[1:])
+        graph = cls(list(node_ids), indptr, np.asarray(targets, dtype=np.int32)[order],
+                    np.asarray(types, dtype=np.uint8)[order], list(type_ids))
+        graph._positions = positions
+        return graph
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices)
+
+    def index_of(self, node_id: str) -> int:
+        if not self._positions:
+            self._positions = {node_id: idx for idx, node_id in enumerate(self.node_ids)}
+        return self._positions[node_id]
+
+    def successors(self, node: int):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def transpose(self) -> "CSRGraph":
+        """反向图（节点 i 的后继为原图中的前驱）"""
+        import numpy as np
+        sources = np.repeat(np.arange(self.n_nodes, dtype=np.int32), np.diff(self.indptr))
+        order = np.argsort(self.indices, kind="stable")
+        indptr = np.zeros(self.n_nodes + 1, dtype=np.int32)
+        np.cumsum(np.bincount(self.indices, minlength=self.n_nodes), out=indptr[1:])
+        graph = CSRGraph(self.node_ids, indptr, sources[order], self.edge_types[order], self.edge_type_names)
+        graph._positions = self._positions
+        return graph
+
+    def __repr__(self) -> str:
+        return f"CSRGraph(nodes={self.n_nodes}, edges={self.n_edges})"
+
+
 class CFG:
     """控制流图（包含唯一节点和带编号的边，节点包含完整指令列表）"""
     def __init__(self, tx_hash: str):
@@ -75,5 +141,37 @@ class CFG:
         """移除节点"""
         self.nodes.remove(node)
 
+    def to_dict(self, include_instructions: bool = True) -> Dict:
+        """
+        结构化表示（JSON可序列化）：节点以 "地址:start_pc" 标识，边的两端引用节点标识；
+        边可能引用已被移除的节点（见 remove_unreachable_instruction_blocks），这些节点不在 nodes 中。
+        """
+        nodes = []
+        for node in self.nodes:
+            item = {
+                "id": f"{node.address}:{node.start_pc}",
+                "address": node.address,
+                "start_pc": node.start_pc,
+                "end_pc": node.end_pc,
+                "terminator": node.terminator,
+            }
+            if include_instructions:
+                item["instructions"] = [list(instr) for instr in node.instructions]
+            nodes.append(item)
+        edges = [{
+            "id": edge.edge_id,
+            "source": f"{edge.source.address}:{edge.source.start_pc}",
+            "target": f"{edge.target.address}:{edge.target.start_pc}",
+            "type": edge.edge_type,
+        } for edge in self.edges]
+        return {"tx_hash": self.tx_hash, "nodes": nodes, "edges": edges}
+
+    def to_csr(self) -> CSRGraph:
+        """压缩稀疏行邻接表：节点按 self.nodes 的顺序编号（0 为入口），标识为 "地址:start_pc"，见 cfg_analytics.py"""
+        return CSRGraph.from_edges(
+            [f"{node.address}:{node.start_pc}" for node in self.nodes],
+            ((f"{edge.source.address}:{edge.source.start_pc}", f"{edge.target.address}:{edge.target.start_pc}",
+              edge.edge_type) for edge in self.edges))
+
     def __repr__(self) -> str:
         return f"CFG(tx_hash={self.tx_hash}, nodes={len(self.nodes)}, edges={len(self.edges)})"
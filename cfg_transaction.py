@@ -2,10 +2,11 @@
 # 包含连接逻辑
 # 包含Transaction Execution CFG渲染
 
-from typing import List, Dict, Tuple, Optional, Set
+from typing import List, Dict, Tuple, Optional, Set, Iterable, Iterator
 from evm_information import StandardizedTrace, StandardizedStep
 from basic_block import Block, BasicBlockProcessor
 from cfg_structure import CFG, BlockNode, Edge
+from trace_compression import CompressedTrace
 
 
 class CFGConstructor:
@@ -34,17 +35,35 @@ class CFGConstructor:
         steps = trace["steps"]
         if not steps:
             return cfg
+        first_step = steps[0]
+        return self._construct_from_transitions(
+            cfg, first_step["address"], first_step["pc"], self._step_transitions(steps)
+        )
+
+    def construct_cfg_from_compressed(self, compressed: CompressedTrace) -> CFG:
+        """在块序列形式的trace上建图（见 trace_compression.py），结果与 construct_cfg 相同"""
+        cfg = CFG(tx_hash=compressed.tx_hash)
+        first = compressed.first_step()
+        if first is None:
+            return cfg
+        return self._construct_from_transitions(cfg, first[0], first[1], compressed.transitions(self.split_opcodes))
+
+    def _step_transitions(self, steps: List[StandardizedStep]) -> Iterator[Tuple[int, str, str, str]]:
+        """遇到分块触发指令时切换到下一个块：(下一步骤的下标, 分块指令, 下一步骤的地址, 下一步骤的pc)"""
+        for current_step_idx, current_step in enumerate(steps):
+            if current_step["opcode"] in self.split_opcodes:
+                if current_step_idx + 1 >= len(steps):
+                    break  # 已到 trace 末尾
+                next_step = steps[current_step_idx + 1]
+                yield current_step_idx + 1, current_step["opcode"], next_step["address"], next_step["pc"]
 
+    def _construct_from_transitions(self, cfg: CFG, first_address: str, first_pc: str,
+                                    transitions: Iterable[Tuple[int, str, str, str]]) -> CFG:
         processed_nodes: Dict[Tuple[str, str], BlockNode] = {}  # 复用节点
-        current_step_idx = 0  # 当前处理的 step 索引
 
         # 处理第一个块
-        first_step = steps[current_step_idx]
         try:
-            current_base_block = self._find_base_block(
-                address=first_step["address"],
-                pc=first_step["pc"]
-            )
+            current_base_block = self._find_base_block(address=first_address, pc=first_pc)
         except ValueError as e:
             raise RuntimeError(f"初始化第一个块失败：{e}")
 
@@ -54,47 +73,32 @@ class CFGConstructor:
         processed_nodes[current_node_key] = current_node
         cfg.add_node(current_node)
 
-        # 遍历 trace，按块处理
-        while current_step_idx < len(steps):
-            current_step = steps[current_step_idx]
-            current_opcode = current_step["opcode"]
-
-            # 遇到分块触发指令时，切换到下一个块
-            if current_opcode in self.split_opcodes:
-                if current_step_idx + 1 >= len(steps):
-                    break  # 已到 trace 末尾
+        # 按块切换处理
+        for next_step_idx, current_opcode, next_address, next_pc in transitions:
+            try:
+                next_base_block = self._find_base_block(address=next_address, pc=next_pc)
+            except ValueError as e:
+                print(f"警告：步骤 {next_step_idx} 对应的下一个块未找到：{e}")
+                continue
+
+            # 复用或创建下一个节点（包含完整指令列表）
+            next_node_key = (next_base_block.address, next_base_block.start_pc)
+            if next_node_key in processed_nodes:
+                next_node = processed_nodes[next_node_key]
+            else:
+                next_node = BlockNode(next_base_block)  # 指令列表自动包含
+                processed_nodes[next_node_key] = next_node
+                cfg.add_node(next_node)
+
+            # 创建边
+            edge_type = self._get_edge_type(current_opcode) # 根据当前指令确定边类型
+            cfg.add_edge(
+                source=current_node,
+                target=next_node,
+                edge_type=edge_type
+            )
 
-                next_step = steps[current_step_idx + 1]
-                try:
-                    next_base_block = self._find_base_block(
-                        address=next_step["address"],
-                        pc=next_step["pc"]
-                    )
-                except ValueError as e:
-                    print(f"警告：步骤 {current_step_idx + 1} 对应的下一个块未找到：{e}")
-                    current_step_idx += 1
-                    continue
-
-                # 复用或创建下一个节点（包含完整指令列表）
-                next_node_key = (next_base_block.address, next_base_block.start_pc)
-                if next_node_key in processed_nodes:
-                    next_node = processed_nodes[next_node_key]
-                else:
-                    next_node = BlockNode(next_base_block)  # 指令列表自动包含
-                    processed_nodes[next_node_key] = next_node
-                    cfg.add_node(next_node)
-
-                # 创建边
-                edge_type = self._get_edge_type(current_opcode) # 根据当前指令确定边类型
-                cfg.add_edge(
-                    source=current_node,
-                    target=next_node,
-                    edge_type=edge_type
-                )
-
-                current_node = next_node
-
-            current_step_idx += 1
+            current_node = next_node
 
         return cfg
 
@@ -116,6 +120,7 @@ class CFGConstructor:
             return "UNKNOWN"
 # 上面这段代码定义了一个名为`CFGConstructor`的类，它用于构建交易的控制流图（CFG）。这个类有一个构造函数`__init__`，它接收一个包含所有基础块的列表，并将这些块存储在一个字典中，以便快速查找。
 # 这个类还有一个`construct_cfg`方法，它接收一个标准化的交易跟踪（trace），并构建对应的CFG图。它会遍历交易的每个步骤，处理分块触发指令，并创建节点和边。
+# `construct_cfg_from_compressed`在压缩的块序列上完成同样的工作，两者共用`_construct_from_transitions`。
 # 该类还包含一个私有方法`_get_edge_type`，用于根据终止指令确定边的类型。
 
 # 渲染CFG为DOT文件（显示所有指令并按合约染色）
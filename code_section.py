@@ -0,0 +1,96 @@
+# code_section.py 负责在分块之前识别运行时字节码中的代码区；
+# Solidity/Vyper 会在代码末尾附加CBOR编码的元数据（最后2字节为其长度），部分合约还会在代码后嵌入常量数据；
+# 这些字节被反汇编后会产生无意义的指令和基本块。这里只截掉代码区之后的部分，代码区本身的PC保持不变。
+
+from typing import Optional
+from dataclasses import dataclass
+
+# 元数据CBOR中常见的键（ipfs/bzzr0/bzzr1/solc/experimental/vyper）
+_METADATA_KEYS = (b"ipfs", b"bzzr0", b"bzzr1", b"solc", b"experimental", b"vyper")
+
+# 使控制流无法顺序执行到下一条指令的opcode（按字节值判断，避免未定义opcode被当作INVALID）
+_HALTING_OPCODES = {
+    0x00,  # STOP
+    0x56,  # JUMP
+    0xf3,  # RETURN
+    0xfd,  # REVERT
+    0xfe,  # INVALID
+    0xff,  # SELFDESTRUCT
+}
+_JUMPDEST = 0x5b
+
+
+@dataclass
+class CodeSection:
+    """字节码的区域划分（单位均为字节）"""
+    total_size: int       # 字节码总长度
+    code_end: int         # 代码区结束偏移（不含），代码区为 [0, code_end)
+    metadata_size: int    # 末尾CBOR元数据长度（含2字节长度后缀）
+    data_size: int        # 代码区与元数据之间无法到达的数据长度
+
+    @property
+    def skipped_bytes(self) -> int:
+        return self.total_size - self.code_end
+
+    def code_bytecode(self, bytecode: str) -> str:
+        """返回只包含代码区的字节码（0x开头）"""
+        return bytecode[:2 + 2 * self.code_end]
+
+
+def _metadata_length(code: bytes) -> int:
+    """解析末尾的CBOR元数据长度；不存在时返回0"""
+    if len(code) < 2:
+        return 0
+    cbor_length = int.from_bytes(code[-2:], "big")
+    total = cbor_length + 2
+    if cbor_length == 0 or total > len(code):
+        return 0
+    cbor = code[-total:-2]
+    # CBOR map 的首字节：0xa1~0xbf（定长map）
+    if not 0xa1 <= cbor[0] <= 0xbf:
+        return 0
+    if not any(key in cbor for key in _METADATA_KEYS):
+        return 0
+    return total
+
+
+def _reachable_code_end(code: bytes, limit: int) -> int:
+    """
+    线性反汇编 [0, limit)，最后一个JUMPDEST之后的第一条终止指令即为代码区终点：
+    其后的字节既不能顺序执行到，也没有JUMPDEST可供跳转，只能是数据。
+    """
+    last_jumpdest = -1
+    halting_ends = []  # 每条终止指令之后的偏移
+    pc = 0
+    while pc < limit:
+        opcode = code[pc]
+        if opcode == _JUMPDEST:
+            last_jumpdest = pc
+        elif opcode in _HALTING_OPCODES:
+            halting_ends.append(pc + 1)
+        # PUSH1~PUSH32 跳过操作数
+        pc += 1 + (opcode - 0x5f if 0x60 <= opcode <= 0x7f else 0)
+    for end in halting_ends:
+        if end > last_jumpdest:
+            return min(end, limit)
+    return limit
+
+
+def detect_code_section(bytecode: str) -> CodeSection:
+    """识别代码区、元数据和尾部数据"""
+    code = bytes.fromhex(bytecode[2:]) if bytecode and bytecode != "0x" else b""
+    metadata_size = _metadata_length(code)
+    limit = len(code) - metadata_size
+    code_end = _reachable_code_end(code, limit)
+    return CodeSection(
+        total_size=len(code),
+        code_end=code_end,
+        metadata_size=metadata_size,
+        data_size=limit - code_end,
+    )
+
+
+def strip_non_code(bytecode: str, section: Optional[CodeSection] = None) -> str:
+    """去掉代码区之后的元数据与数据"""
+    section = section or detect_code_section(bytecode)
+    return section.code_bytecode(bytecode)
@@ -0,0 +1,286 @@
+# corpus_index.py 负责建立跨交易的语料库索引（SQLite）；
+# 把每个已处理交易的合约、基本块以及 CALL/SSTORE 步骤（含解码后的调用目标、函数选择器、存储槽）写入同一个数据库；
+# 合约按 proxy_detection.code_key 标识代码，可以与相似度索引、覆盖统计和结果库按 code_key 关联；
+# 支持增量导入：已导入的交易会被跳过，main.py 每处理完一笔交易就追加一次；
+# 用于跨交易查询 swap 模式，例如"所有合约A先CALL合约B、再SSTORE槽S的交易"。
+
+import argparse
+import os
+import sqlite3
+import time
+from typing import List, Dict, Optional, Tuple
+from basic_block import Block
+from evm_information import StandardizedTrace, StandardizedStep
+from result_store import load_result_blocks, result_code_keys
+from proxy_detection import blocks_code_key
+from stack_store import load_trace
+
+DEFAULT_DB_PATH = "corpus.db"
+
+CALL_OPCODES = {"CALL", "CALLCODE", "DELEGATECALL", "STATICCALL"}
+RECORDED_OPCODES = CALL_OPCODES | {"SSTORE"}
+# 在被调用合约的前若干步内寻找 CALLDATALOAD(0)，用来还原函数选择器（trace中未开启memory）
+SELECTOR_SCAN_LIMIT = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    tx_hash     TEXT PRIMARY KEY,
+    result_dir  TEXT,
+    step_count  INTEGER,
+    ingested_at REAL
+);
+CREATE TABLE IF NOT EXISTS contracts (
+    tx_hash TEXT NOT NULL,
+    address TEXT NOT NULL,
+    code_key TEXT,
+    PRIMARY KEY (tx_hash, address)
+);
+CREATE TABLE IF NOT EXISTS code_blocks (
+    code_key    TEXT NOT NULL,
+    start_pc    TEXT NOT NULL,
+    end_pc      TEXT,
+    terminator  TEXT,
+    opcodes     TEXT,
+    PRIMARY KEY (code_key, start_pc)
+);
+CREATE TABLE IF NOT EXISTS steps (
+    tx_hash  TEXT NOT NULL,
+    step_idx INTEGER NOT NULL,
+    address  TEXT NOT NULL,
+    pc       TEXT NOT NULL,
+    opcode   TEXT NOT NULL,
+    target   TEXT,
+    selector TEXT,
+    value    TEXT,
+    slot     TEXT,
+    PRIMARY KEY (tx_hash, step_idx)
+);
+CREATE INDEX IF NOT EXISTS idx_steps_address_opcode ON steps (address, opcode);
+CREATE INDEX IF NOT EXISTS idx_steps_target ON steps (target, opcode);
+CREATE INDEX IF NOT EXISTS idx_steps_slot ON steps (slot, address);
+CREATE INDEX IF NOT EXISTS idx_contracts_address ON contracts (address);
+CREATE INDEX IF NOT EXISTS idx_contracts_code ON contracts (code_key);
+"""
+
+
+def _normalize_word(item: str) -> str:
+    """栈元素统一为去掉前导0的小写十六进制（0x0 表示零）"""
+    if not item or item == "0x":
+        return "0x0"
+    return hex(int(item, 16))
+
+
+def _word_to_address(item: str) -> str:
+    """栈元素转换为40位十六进制地址"""
+    return "0x" + _normalize_word(item)[2:].rjust(40, "0")[-40:]
+
+
+def _selector_from_callee(steps: List[StandardizedStep], call_idx: int, target: str) -> Optional[str]:
+    """
+    在被调用合约开始执行的若干步内寻找 CALLDATALOAD(0)，
+    其结果（下一步的栈顶）的高4字节即为函数选择器。
+    """
+    end = min(len(steps) - 1, call_idx + 1 + SELECTOR_SCAN_LIMIT)
+    for idx in range(call_idx + 1, end):
+        step = steps[idx]
+        if step["address"] != target:
+            break
+        if step["opcode"] == "CALLDATALOAD" and step["stack"] and _normalize_word(step["stack"][-1]) == "0x0":
+            next_stack = steps[idx + 1]["stack"]
+            if not next_stack:
+                return None
+            return "0x" + _normalize_word(next_stack[-1])[2:].rjust(64, "0")[:8]
+    return None
+
+
+def extract_step_rows(trace: StandardizedTrace) -> List[Tuple]:
+    """从trace中提取需要入库的 CALL/SSTORE 步骤"""
+    tx_hash = trace["tx_hash"]
+    steps = trace["steps"]
+    rows = []
+    for idx, step in enumerate(steps):
+        opcode = step["opcode"]
+        if opcode not in RECORDED_OPCODES:
+            continue
+        stack = step.get("stack", [])
+        target = selector = value = slot = None
+        if opcode in CALL_OPCODES and len(stack) >= 2:
+            # 栈顶在列表末尾：gas, to, [value,] ...
+            target = _word_to_address(stack[-2])
+            if opcode in {"CALL", "CALLCODE"} and len(stack) >= 3:
+                value = _normalize_word(stack[-3])
+            selector = _selector_from_callee(steps, idx, target)
+        elif opcode == "SSTORE" and len(stack) >= 2:
+            slot = _normalize_word(stack[-1])
+            value = _normalize_word(stack[-2])
+        rows.append((tx_hash, idx, step["address"], step["pc"], opcode, target, selector, value, slot))
+    return rows
+
+
+class CorpusIndex:
+    """跨交易语料库索引（SQLite，可增量导入）"""
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(contracts)")}
+        if "code_id" in columns:
+            self.conn.close()
+            raise ValueError(f"{db_path} 是旧版本的语料库（按基本块内容标识代码，不能与 code_key 关联），请删除后重新导入")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def has_transaction(self, tx_hash: str) -> bool:
+        row = self.conn.execute("SELECT 1 FROM transactions WHERE tx_hash = ?", (tx_hash,)).fetchone()
+        return row is not None
+
+    def ingest(self, tx_hash: str, trace: Optional[StandardizedTrace], blocks: List[Block],
+               result_dir: str = "", force: bool = False, code_keys: Optional[Dict[str, str]] = None) -> bool:
+        """
+        导入一笔交易；trace 可以为空（旧结果目录中可能没有 trace.json）。
+        code_keys 为 地址 -> proxy_detection.code_key（例如 code_map.json），缺少的地址按基本块内容生成（blocks_code_key）。
+        返回 True 表示本次实际写入了数据，已导入过的交易默认跳过。
+        """
+        if not force and self.has_transaction(tx_hash):
+            return False
+
+        blocks_by_address: Dict[str, List[Block]] = {}
+        for block in blocks:
+            blocks_by_address.setdefault(block.address, []).append(block)
+
+        with self.conn:
+            self.conn.execute("DELETE FROM contracts WHERE tx_hash = ?", (tx_hash,))
+            self.conn.execute("DELETE FROM steps WHERE tx_hash = ?", (tx_hash,))
+            for address, contract_blocks in blocks_by_address.items():
+                key = (code_keys or {}).get(address) or blocks_code_key(contract_blocks)
+                self.conn.execute("INSERT OR REPLACE INTO contracts VALUES (?, ?, ?)", (tx_hash, address, key))
+                known = self.conn.execute("SELECT 1 FROM code_blocks WHERE code_key = ? LIMIT 1", (key,)).fetchone()
+                if known is None:
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO code_blocks VALUES (?, ?, ?, ?, ?)",
+                        [(key, b.start_pc, b.end_pc, b.terminator, " ".join(op for _, op in b.instructions))
+                         for b in contract_blocks]
+                    )
+            step_count = 0
+            if trace is not None:
+                step_count = len(trace["steps"])
+                self.conn.executemany("INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", extract_step_rows(trace))
+                # trace中出现但没有基本块的地址（例如无代码地址）也登记为合约
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO contracts VALUES (?, ?, NULL)",
+                    [(tx_hash, addr) for addr in {s["address"] for s in trace["steps"] if s["address"]}]
+                )
+            self.conn.execute("INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?)",
+                              (tx_hash, result_dir, step_count, time.time()))
+        return True
+
+    def ingest_result_dir(self, result_dir: str, force: bool = False) -> bool:
+        """导入 Result/<tx>/ 目录（blocks.json 与可选的 trace.json）"""
+        tx_hash = "0x" + os.path.basename(os.path.normpath(result_dir))
+        if not force and self.has_transaction(tx_hash):
+            return False
+        blocks = load_result_blocks(result_dir)
+        trace = None
+        trace_path = os.path.join(result_dir, "trace.json")
+        if os.path.exists(trace_path):
+            trace = load_trace(trace_path)
+            tx_hash = trace["tx_hash"]
+        return self.ingest(tx_hash, trace, blocks, result_dir=result_dir, force=force,
+                           code_keys=result_code_keys(result_dir, blocks))
+
+    def ingest_corpus(self, root: str = "Result", force: bool = False) -> int:
+        """增量导入 root 下的所有交易目录，返回新导入的交易数"""
+        count = 0
+        for name in sorted(os.listdir(root)):
+            result_dir = os.path.join(root, name)
+            if os.path.isdir(result_dir) and self.ingest_result_dir(result_dir, force=force):
+                count += 1
+                print(f"已导入: {result_dir}")
+        return count
+
+    # ------------------------- 查询接口 -------------------------
+    def find_call_then_sstore(self, caller: str, callee: Optional[str] = None,
+                              slot: Optional[str] = None, selector: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        """
+        查询"合约caller先CALL callee、之后在caller中SSTORE槽slot"的交易。
+        返回 [(tx_hash, call_step_idx, sstore_step_idx), ...]；callee/slot/selector 为 None 时不作限制。
+        """
+        sql = ("SELECT c.tx_hash, c.step_idx, MIN(s.step_idx) FROM steps c "
+               "JOIN steps s ON s.tx_hash = c.tx_hash AND s.step_idx > c.step_idx "
+               "WHERE c.address = ? AND c.opcode IN ('CALL', 'CALLCODE', 'DELEGATECALL', 'STATICCALL') "
+               "AND s.address = ? AND s.opcode = 'SSTORE'")
+        params: List = [caller.lower(), caller.lower()]
+        if callee is not None:
+            sql += " AND c.target = ?"
+            params.append(callee.lower())
+        if selector is not None:
+            sql += " AND c.selector = ?"
+            params.append(selector.lower())
+        if slot is not None:
+            sql += " AND s.slot = ?"
+            params.append(_normalize_word(slot))
+        sql += " GROUP BY c.tx_hash, c.step_idx ORDER BY c.tx_hash, c.step_idx"
+        return self.conn.execute(sql, params).fetchall()
+
+    def find_steps(self, address: Optional[str] = None, opcode: Optional[str] = None,
+                   target: Optional[str] = None, slot: Optional[str] = None) -> List[Tuple]:
+        """按条件查询 CALL/SSTORE 步骤"""
+        conditions, params = [], []
+        for column, value in (("address", address), ("opcode", opcode), ("target", target)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value if column == "opcode" else value.lower())
+        if slot is not None:
+            conditions.append("slot = ?")
+            params.append(_normalize_word(slot))
+        sql = "SELECT * FROM steps"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return self.conn.execute(sql + " ORDER BY tx_hash, step_idx", params).fetchall()
+
+    def transactions_with_contract(self, address: str) -> List[str]:
+        rows = self.conn.execute("SELECT tx_hash FROM contracts WHERE address = ? ORDER BY tx_hash",
+                                 (address.lower(),)).fetchall()
+        return [row[0] for row in rows]
+
+    def __repr__(self) -> str:
+        tx_count = self.conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        step_count = self.conn.execute("SELECT COUNT(*) FROM steps").fetchone()[0]
+        return f"CorpusIndex(db={self.db_path}, transactions={tx_count}, steps={step_count})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="跨交易语料库索引")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="SQLite数据库路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = sub.add_parser("ingest", help="增量导入结果目录")
+    ingest_parser.add_argument("root", nargs="?", default="Result")
+    ingest_parser.add_argument("--force", action="store_true", help="重新导入已存在的交易")
+
+    query_parser = sub.add_parser("query", help="查询 CALL 后 SSTORE 的模式")
+    query_parser.add_argument("--caller", required=True)
+    query_parser.add_argument("--callee")
+    query_parser.add_argument("--slot")
+    query_parser.add_argument("--selector")
+
+    args = parser.parse_args()
+    index = CorpusIndex(args.db)
+    try:
+        if args.command == "ingest":
+            start = time.perf_counter()
+            count = index.ingest_corpus(args.root, force=args.force)
+            print(f"新导入 {count} 笔交易，用时 {time.perf_counter() - start:.2f}s，{index}")
+        else:
+            for tx_hash, call_idx, sstore_idx in index.find_call_then_sstore(
+                    args.caller, args.callee, args.slot, args.selector):
+                print(f"{tx_hash}  CALL@step {call_idx}  ->  SSTORE@step {sstore_idx}")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,13 @@
 # 包含获取每个step对应的contract address的逻辑；
 # 不涉及其他对bytecode和trace的分析逻辑。
 
-from typing import List, Dict, TypedDict, Set # 标准化数据结构定义
+from typing import List, Dict, TypedDict, Set, Optional, Union, Iterator, NotRequired # 标准化数据结构定义
 import logging # 标准化数据结构定义
 import json
-from web3 import Web3 # 导入Web3库用于与以太坊节点交互
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+# web3 只在 TraceFormatter 连接节点时导入（导入开销约1.5s）；只分析已保存结果的工具不需要 web3
 
 logging.basicConfig(level=logging.INFO) # 设置日志级别为INFO
 logger = logging.getLogger(__name__) # 创建日志记录器
@@ -22,23 +25,83 @@ class StandardizedStep(TypedDict): # 定义一个字典类型，包含以下字
 class StandardizedTrace(TypedDict): # 定义一个字典类型，包含以下字段
     tx_hash: str               # 0x开头的十六进制交易哈希
     steps: List[StandardizedStep]
+    frames: NotRequired[List[Dict]]  # 调用栈帧树（call_frames.CallFrame），从节点获取时生成
 
 class ContractBytecode(TypedDict):
     address: str  # 0x开头的十六进制字符串
     bytecode: str  # 0x开头的十六进制字符串
 
+# debug_traceTransaction / debug_traceBlockBy* 的trace选项：不记录内存和返回数据，记录栈和存储
+TRACE_CONFIG = {
+    "enableMemory": False,
+    "disableStack": False,
+    "disableStorage": False,
+    "enableReturnData": False
+}
+
+# 按区块一次获取trace时允许的最大区块gasUsed，超过时逐笔获取（见 iter_block_traces）；
+# 默认高于主网区块的gas上限，正常区块都用 debug_traceBlockByHash 一次获取，只有超大区块（测试链、L2等）才逐笔获取
+BLOCK_TRACE_MAX_GAS = 150_000_000
+
 class TraceFormatter:
-    def __init__(self, provider_url: str): # 初始化函数，接收一个以太坊节点的URL
-        self.web3 = Web3(Web3.HTTPProvider(provider_url)) # 创建Web3实例
+    def __init__(self, provider_url: Union[str, List[str], None], measure_bytes: bool = False,
+                 rpc_store: Optional[str] = None, rpc_mode: str = "auto",
+                 rpc_concurrency: int = 4, rpc_rate: Optional[float] = None): # 初始化函数，接收以太坊节点的URL
+        from web3 import Web3 # 导入Web3库用于与以太坊节点交互
+        # 多个节点（列表或逗号分隔）时使用 rpc_pool.EndpointPool：每个节点最多 rpc_concurrency 个并发请求，
+        # 每秒最多 rpc_rate 个请求，慢/失败的节点自动绕开；
+        # 回放模式（rpc_mode="replay"）只读取录制的响应，不需要节点，provider_url 可以为 None
+        from rpc_pool import EndpointPool, parse_provider_urls
+        urls = parse_provider_urls(provider_url)
+        self.rpc_pool = None
+        if rpc_store and rpc_mode == "replay":
+            upstream = None
+        elif not urls:
+            raise ValueError("未指定节点URL（只有回放模式 rpc_mode=\"replay\" 可以不连接节点）")
+        elif len(urls) > 1:
+            self.rpc_pool = EndpointPool(urls, max_concurrency=rpc_concurrency, rate=rpc_rate)
+            upstream = self.rpc_pool
+        else:
+            upstream = Web3.HTTPProvider(urls[0])
+        if rpc_store: # 指定录制目录时，通过CachingProvider录制/回放RPC响应
+            from rpc_cache import CachingProvider
+            self.web3 = Web3(CachingProvider(upstream, rpc_store, rpc_mode))
+        else:
+            self.web3 = Web3(upstream) # 创建Web3实例
+        # RPC统计：method -> {"calls", "bytes", "seconds", "max_seconds"}；measure_bytes为True时统计响应字节数
+        self.rpc_stats: Dict[str, Dict] = {}
+        self.measure_bytes = measure_bytes
+        self._stats_lock = threading.Lock()
+        self._instrument_provider()
         if not self.web3.is_connected(): # 检查是否连接成功
             raise ConnectionError("无法连接到以太坊节点，请检查provider URL是否正确")
 
+    # 包装provider的make_request，记录每个RPC方法的调用次数、延迟和响应大小
+    def _instrument_provider(self) -> None:
+        provider = self.web3.provider
+        make_request = provider.make_request
+
+        def timed_make_request(method, params):
+            start = time.perf_counter()
+            response = make_request(method, params)
+            elapsed = time.perf_counter() - start
+            size = len(json.dumps(response, default=str)) if self.measure_bytes else 0
+            with self._stats_lock: # 使用连接池时字节码并行获取
+                stats = self.rpc_stats.setdefault(str(method), {"calls": 0, "bytes": 0, "seconds": 0.0, "max_seconds": 0.0})
+                stats["calls"] += 1
+                stats["seconds"] += elapsed
+                stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+                stats["bytes"] += size
+            return response
+
+        provider.make_request = timed_make_request
+
     # 地址标准化
     def _normalize_address(self, address: str) -> str: # 定义一个函数，接收一个地址字符串，返回一个标准化的地址字符串
         if not address:
             return ""
         try:
-            checksum_addr = Web3.to_checksum_address(address) # 使用Web3库将地址转换为校验和格式
+            checksum_addr = self.web3.to_checksum_address(address) # 使用Web3库将地址转换为校验和格式
             return checksum_addr.lower() # 返回小写格式的校验和地址
         except:
             return ""  # 无效地址返回空
@@ -68,81 +131,130 @@ class TraceFormatter:
         tx = self.web3.eth.get_transaction(tx_hash) # 使用Web3库获取指定交易哈希的交易信息
         return tx.get("to", "") # 获取交易的目标地址（合约或外部账户）
 
+    # 获取一笔交易的原始structLogs
+    def _fetch_struct_logs(self, tx_hash: str) -> List[Dict]:
+        raw_trace = self.web3.manager.request_blocking(
+            "debug_traceTransaction", 
+            [tx_hash, TRACE_CONFIG] # 使用Web3库的debug_traceTransaction方法获取交易的trace信息
+        ) # 使用Web3库的debug_traceTransaction方法获取交易的trace信息
+        return raw_trace.get("structLogs", []) # 获取结构化日志信息
+
     # 获取并标准化trace,计算contract address
     def get_standardized_trace(self, tx_hash: str) -> StandardizedTrace:
-        trace_config = {
-            "enableMemory": False,
-            "disableStack": False,
-            "disableStorage": False,
-            "enableReturnData": False
-        } # 配置trace选项，禁用内存、栈和存储的跟踪，启用返回数据跟踪
-        
         try:
-            raw_trace = self.web3.manager.request_blocking(
-                "debug_traceTransaction", 
-                [tx_hash, trace_config] # 使用Web3库的debug_traceTransaction方法获取交易的trace信息
-            ) # 使用Web3库的debug_traceTransaction方法获取交易的trace信息
-            struct_logs = raw_trace.get("structLogs", []) # 获取结构化日志信息
-            
-            steps = []
-            # 初始地址（交易直接调用的合约）
-            initial_address = self._normalize_address(self._get_initial_address(tx_hash))
-            current_address = initial_address  # 当前步骤的地址
-            next_address = initial_address     # 下一个步骤的地址（初始与当前相同）
-            # 调用栈：记录合约调用层级
-            call_stack = [initial_address] if initial_address else [] # 初始化调用栈，初始地址为交易直接调用的合约地址
-            
-            for step in struct_logs:
-                pc = step.get("pc", 0) # 获取当前步骤的PC
-                opcode = step.get("op", "").upper() # 获取当前步骤的opcode
-                raw_stack = step.get("stack", []) # 获取当前步骤的栈信息
-                
-                # 1. 处理合约调用：下一个步骤切换到新地址
-                if opcode in {"CALL", "CALLCODE", "DELEGATECALL", "STATICCALL"}:
-                    if len(raw_stack) >= 2:  # 确保栈中有目标地址参数
-                        to_address = self._normalize_address(raw_stack[-2])
-                        if to_address:  
-                            # 当前地址压入调用栈（记录调用者）
-                            call_stack.append(current_address)
-                            # 下一个步骤切换到新地址
-                            next_address = to_address
-                
-                # 2. 处理合约创建：下一个步骤切换到新合约地址
-                elif opcode in ["CREATE", "CREATE2"]:
-                    new_address = ""  # 实际需从step结果提取新地址，此处简化
-                    if new_address:
-                        call_stack.append(current_address)
-                        next_address = new_address  # 下一个步骤切换到新地址
-                
-                # 3. 处理终止指令：下一个步骤返回上一层地址
-                elif opcode in {"STOP", "RETURN", "REVERT", "INVALID", "SELFDESTRUCT"} and len(call_stack) > 1:
-                        next_address = call_stack[-1]  # 下一个步骤切换到上一层地址
-                        call_stack.pop()  # 移除当前层
-                
-                # 4. 其他指令：下一个步骤地址不变
-                else:
-                    next_address = current_address  # 保持当前地址
-                
-                # 记录当前步骤的信息（使用current_address，未切换）
-                steps.append({
-                    "address": current_address,
-                    "pc": self._normalize_pc(pc),
-                    "opcode": opcode,
-                    "stack": self._normalize_stack(raw_stack)
-                })
-                
-                # 5. 更新当前地址为next_address（为下一个步骤做准备）
-                current_address = next_address
-            
-            return {
-                "tx_hash": tx_hash,
-                "steps": steps
-            }
+            struct_logs = self._fetch_struct_logs(tx_hash)
+            return self._standardize_struct_logs(tx_hash, struct_logs, self._get_initial_address(tx_hash))
             
         except Exception as e: 
             logger.error(f"处理trace失败: {e}") # 记录错误信息
             raise
 
+    # 把一笔交易的structLogs标准化为StandardizedTrace，同时建立调用栈帧树（计算每个step的contract address）
+    def _standardize_struct_logs(self, tx_hash: str, struct_logs: List[Dict], initial_address: Optional[str]) -> StandardizedTrace:
+        from call_frames import CallFrameBuilder, CALL_OPCODES, CREATE_OPCODES, HALT_OPCODES
+        from stack_store import StackStore
+        # 初始地址（交易直接调用的合约）为根帧
+        frames = CallFrameBuilder(self._normalize_address(initial_address))
+        # structLogs 带 depth 时按调用深度切换栈帧：深度加深即进入上一步调用的合约，变浅即返回父帧，
+        # 对EOA/预编译合约的调用（深度不变）和异常终止也能正确处理；没有 depth 时按调用/终止指令推断
+        use_depth = bool(struct_logs) and "depth" in struct_logs[0]
+        base_depth = struct_logs[0]["depth"] - 1 if use_depth else 0
+        pending_call = None  # 上一步发起的调用：(调用类型, 目标地址, 步骤下标)
+        stacks = StackStore(tx_hash)  # 栈只以增量形式保存，步骤中的 "stack" 按需还原
+        steps = []
+        
+        for idx, step in enumerate(struct_logs):
+            pc = step.get("pc", 0) # 获取当前步骤的PC
+            opcode = step.get("op", "").upper() # 获取当前步骤的opcode
+            raw_stack = step.get("stack", []) # 获取当前步骤的栈信息
+            
+            # 1. 按深度进入/返回栈帧
+            if use_depth:
+                depth = step["depth"] - base_depth
+                if depth > frames.depth:
+                    frames.enter(idx, *(pending_call or ("CALL", "", idx - 1)))
+                while depth < frames.depth:
+                    # 直接返回到本帧时栈顶为 CREATE 得到的新合约地址
+                    created = self._normalize_address(raw_stack[-1]) if raw_stack and depth == frames.depth - 1 else ""
+                    frames.leave(idx, created)
+                pending_call = None
+            
+            # 记录当前步骤的信息（地址为当前栈帧执行的代码地址）
+            steps.append(stacks.add(
+                frames.current.code_address,
+                self._normalize_pc(pc),
+                opcode,
+                self._normalize_stack(raw_stack)
+            ))
+            
+            # 2. 处理合约调用：下一个步骤进入被调用的合约
+            if opcode in CALL_OPCODES:
+                if len(raw_stack) >= 2:  # 确保栈中有目标地址参数
+                    to_address = self._normalize_address(raw_stack[-2])
+                    if use_depth:
+                        pending_call = (opcode, to_address, idx)
+                    elif to_address:
+                        frames.enter(idx + 1, opcode, to_address, idx)
+            
+            # 3. 处理合约创建：初始化代码没有地址（没有 depth 时无法判断是否进入，保持当前地址）
+            elif opcode in CREATE_OPCODES:
+                if use_depth:
+                    pending_call = (opcode, "", idx)
+            
+            # 4. 没有 depth 时，终止指令返回上一层
+            elif not use_depth and opcode in HALT_OPCODES:
+                frames.leave(idx + 1)
+        
+        return {
+            "tx_hash": tx_hash,
+            "steps": steps,
+            "frames": frames.finish(len(steps)).to_list()
+        }
+
+    # 按区块获取trace：debug_traceBlockByHash 一次返回区块内所有交易的structLogs（节点只重放区块一次），逐笔标准化并依次产出。
+    # 区块号或标签（latest等）先解析为区块哈希，交易列表和trace都按该哈希获取，避免两次请求之间出了新块而错配；
+    # 每条trace的txHash（节点返回时）必须与交易列表一致。
+    # 注意：节点的响应一次性解析，峰值内存约为整个区块的原始structLogs；区块的gasUsed超过 max_block_gas 时
+    # （每个opcode至少消耗2 gas，gas限定了structLogs的数量）改为逐笔 debug_traceTransaction，峰值与单笔交易模式相同。
+    def iter_block_traces(self, block: Union[int, str], max_block_gas: Optional[int] = BLOCK_TRACE_MAX_GAS) -> Iterator[StandardizedTrace]:
+        # 区块号（int、十进制或0x十六进制字符串、latest等标签）或区块哈希（0x + 64位十六进制）
+        if isinstance(block, str) and block.startswith("0x") and len(block) == 66:
+            block_data = self.web3.manager.request_blocking("eth_getBlockByHash", [block, True])
+        else:
+            block_id = hex(int(block)) if isinstance(block, int) or block.isdigit() else block
+            block_data = self.web3.manager.request_blocking("eth_getBlockByNumber", [block_id, True])
+        if block_data is None:
+            raise ValueError(f"区块不存在: {block}")
+        block_hash, transactions = block_data["hash"], block_data["transactions"]
+        gas_used = int(block_data.get("gasUsed") or "0x0", 16)
+
+        if max_block_gas is not None and gas_used > max_block_gas:
+            logger.info(f"区块 {block} gasUsed={gas_used} 超过 {max_block_gas}，逐笔获取trace")
+            for tx in transactions:
+                try:
+                    struct_logs = self._fetch_struct_logs(tx["hash"])
+                except Exception as e:
+                    logger.warning(f"区块 {block} 中交易 {tx['hash']} 的trace失败: {e}")
+                    continue
+                yield self._standardize_struct_logs(tx["hash"], struct_logs, tx.get("to") or "")
+                del struct_logs
+            return
+
+        raw_traces = self.web3.manager.request_blocking("debug_traceBlockByHash", [block_hash, TRACE_CONFIG])
+        if len(raw_traces) != len(transactions):
+            raise ValueError(f"区块 {block} 的trace数量({len(raw_traces)})与交易数量({len(transactions)})不一致")
+        for idx, tx in enumerate(transactions):
+            trace_tx_hash = raw_traces[idx].get("txHash")
+            if trace_tx_hash and trace_tx_hash.lower() != tx["hash"].lower():
+                raise ValueError(f"区块 {block} 第 {idx} 条trace的交易 {trace_tx_hash} 与区块中的交易 {tx['hash']} 不一致")
+        for idx, tx in enumerate(transactions):
+            item, raw_traces[idx] = raw_traces[idx], None
+            tx_hash = tx["hash"]
+            if item.get("error") or "result" not in item:
+                logger.warning(f"区块 {block} 中交易 {tx_hash} 的trace失败: {item.get('error')}")
+                continue
+            yield self._standardize_struct_logs(tx_hash, item["result"].get("structLogs", []), tx.get("to") or "")
+
     # 提取合约地址
     def extract_contracts_from_trace(self, standardized_trace: StandardizedTrace) -> Set[str]:
         return {step["address"] for step in standardized_trace["steps"] if step["address"]}
@@ -154,7 +266,7 @@ class TraceFormatter:
             raise ValueError(f"无效地址（需0x开头的十六进制）: {contract_address}")
 
         try:
-            bytecode = self.web3.eth.get_code(Web3.to_checksum_address(normalized_addr))
+            bytecode = self.web3.eth.get_code(self.web3.to_checksum_address(normalized_addr))
             return {
                 "address": normalized_addr,
                 "bytecode": self.web3.to_hex(bytecode)
@@ -163,8 +275,17 @@ class TraceFormatter:
             logger.error(f"获取合约字节码失败: {e}")
             raise
 
-    # 获取所有涉及的合约字节码
-    def get_all_contracts_bytecode(self, tx_hash: str) -> List[ContractBytecode]:
-        trace = self.get_standardized_trace(tx_hash)
-        contracts = self.extract_contracts_from_trace(trace)
-        return [self.get_contract_bytecode(addr) for addr in contracts if addr]
\ No newline at end of file
+    # 获取所有涉及的合约字节码（已获取过trace时直接传入，避免重复请求debug_traceTransaction）
+    def get_all_contracts_bytecode(self, tx_hash: str, trace: Optional[StandardizedTrace] = None) -> List[ContractBytecode]:
+        if trace is None:
+            trace = self.get_standardized_trace(tx_hash)
+        contracts = [addr for addr in self.extract_contracts_from_trace(trace) if addr]
+        if self.rpc_pool is None or len(contracts) < 2:
+            return [self.get_contract_bytecode(addr) for addr in contracts]
+        # 多个节点时并行获取，由连接池按各节点的并发上限和限速分配
+        with ThreadPoolExecutor(max_workers=min(len(contracts), self.rpc_pool.max_concurrency)) as executor:
+            return list(executor.map(self.get_contract_bytecode, contracts))
+
+    # 各节点的延迟与健康状态（只有一个节点时为空）
+    def endpoint_stats(self) -> Dict[str, Dict]:
+        return self.rpc_pool.endpoint_stats() if self.rpc_pool else {}
\ No newline at end of file
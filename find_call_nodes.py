@@ -1,15 +1,20 @@
 import re
 import os # 导入os模块
-import glob
+import argparse
+import sys
+from opcode_index import OpcodeIndex, INDEX_FILE_NAME
+from batch_runner import expand_inputs, run_batch
+from result_store import MANIFEST_FILE_NAME, read_static_cfg_dot, stored_static_cfg_paths
 
 def find_call_nodes(dot_file):
     call_nodes = []
-    node_pattern = re.compile(r'"(block_[^"]+)" \[label="(.+?)"\]', re.DOTALL)
+    # 只匹配节点定义行（边定义行 "a" -> "b" [label=...] 不算）
+    node_pattern = re.compile(r'^\s*"(block_[^"]+)" \[label="((?:[^"\\]|\\.)*)"', re.DOTALL | re.MULTILINE)
     call_instrs = ['CALL', 'SSTORE']
 
     try:
-        with open(dot_file, encoding='utf-8') as f:
-            content = f.read()
+        # 静态CFG只保存在结果库中时（main.py 设置了 RESULT_STORE_DIR）按清单还原
+        content = read_static_cfg_dot(dot_file)
     except FileNotFoundError:
         print(f"Error: The file '{dot_file}' was not found.")
         return []
@@ -21,7 +26,7 @@ def find_call_nodes(dot_file):
         node_name = match.group(1)
         node_label = match.group(2)
         # 提取指令部分
-        instr_lines = node_label.split('---------')[-1].split('\\n')
+        instr_lines = re.split(r'\n|\\n', node_label.split('---------')[-1])
         for line in instr_lines:
             for instr in call_instrs:
                 # 只要行里有 CALL 相关指令
@@ -30,11 +35,81 @@ def find_call_nodes(dot_file):
                     break
     return call_nodes
 
-if __name__ == '__main__':
+def find_call_nodes_indexed(dot_file):
+    """
+    若DOT文件旁存在 opcode_index.json，则直接查表得到与 find_call_nodes 相同的结果；
+    只支持动态合约CFG（contract_<addr>_cfg.dot），无法使用索引时返回 None。
+    """
+    match = re.fullmatch(r'contract_([0-9a-f]+)_cfg\.dot', os.path.basename(dot_file))
+    index_path = os.path.join(os.path.dirname(dot_file), INDEX_FILE_NAME)
+    if not match or not os.path.exists(index_path):
+        return None
+
+    index = OpcodeIndex.load(index_path)
+    short_addr = match.group(1)
+    # 与 main.py 中生成文件名的方式保持一致
+    addresses = [addr for addr in index.cfg_blocks if addr.lstrip('0x')[:8] == short_addr]
+    if len(addresses) != 1:
+        return None
+
+    address = addresses[0]
+    opcode_by_pc = {pc: opcode for opcode in ['CALL', 'SSTORE']
+                    for _, pc in index.block_index.get(address, {}).get(opcode, [])}
+    call_nodes = []
+    for start_pc, pc in index.instructions_with(['CALL', 'SSTORE'], address, cfg_only=True).get(address, []):
+        call_nodes.append((f"block_{start_pc.replace('0x', '')}", f"{pc}: {opcode_by_pc[pc]}"))
+    return call_nodes
+
+
+def _contract_short_addr(dot_file):
+    """从 contract_<addr>_cfg.dot / contract_<addr>_static_cfg.dot 中取出合约地址前缀"""
+    match = re.match(r'contract_([0-9a-f]+)_', os.path.basename(dot_file))
+    return match.group(1) if match else ""
+
+
+def process_dot_file(dot_file):
+    """批处理worker：返回单个DOT文件中所有调用节点的JSONL记录"""
+    call_nodes = find_call_nodes_indexed(dot_file)
+    if call_nodes is None:
+        call_nodes = find_call_nodes(dot_file)
+    contract = _contract_short_addr(dot_file)
+    return [{"file": dot_file, "contract": contract, "node": node, "instruction": instr}
+            for node, instr in call_nodes]
+
+
+def cli_main(argv):
+    parser = argparse.ArgumentParser(description="从合约CFG的DOT文件中批量提取 CALL/SSTORE 节点")
+    parser.add_argument("inputs", nargs="+", help="DOT文件、目录（递归查找）或通配符")
+    parser.add_argument("-a", "--address", action="append", default=[],
+                        help="只处理这些合约（完整地址或地址前缀，可重复指定）")
+    parser.add_argument("--include-static", action="store_true", help="同时处理静态CFG（*_static_cfg.dot）")
+    parser.add_argument("-o", "--output", help="JSONL输出路径（默认输出到标准输出）")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="进程数（默认CPU核数）")
+    args = parser.parse_args(argv)
+
+    prefixes = [addr.lower().lstrip('0x')[:8] for addr in args.address]
+
+    def exclude(path):
+        if not args.include_static and path.endswith("_static_cfg.dot"):
+            return True
+        return bool(prefixes) and _contract_short_addr(path) not in prefixes
+
+    files = expand_inputs(args.inputs, "contract_*_cfg.dot", exclude)
+    if args.include_static:
+        # 结果库模式的交易目录中没有静态CFG文件，按 artifacts.json 补上
+        for manifest_path in expand_inputs(args.inputs, MANIFEST_FILE_NAME):
+            files.extend(path for path in stored_static_cfg_paths(os.path.dirname(manifest_path))
+                         if not exclude(path))
+    run_batch(process_dot_file, files, output=args.output, workers=args.workers)
+
+
+def interactive_main():
     dot_file_path = input("Please enter the path to the .dot file: ").strip('"')
     print(f'文件: {dot_file_path}')
 
-    call_nodes = find_call_nodes(dot_file_path)
+    call_nodes = find_call_nodes_indexed(dot_file_path)
+    if call_nodes is None:
+        call_nodes = find_call_nodes(dot_file_path)
 
     if call_nodes:
         # 获取原文件的文件名
@@ -59,4 +134,12 @@ if __name__ == '__main__':
         print(f"\n成功找到 {len(call_nodes)} 个调用节点，结果已保存到：{output_path}")
     else:
         print(f"\n在文件 '{dot_file_path}' 中未找到任何包含调用指令的节点。")
-    print('-' * 40)
\ No newline at end of file
+    print('-' * 40)
+
+
+if __name__ == '__main__':
+    # 不带参数时保留原有的交互式用法
+    if len(sys.argv) > 1:
+        cli_main(sys.argv[1:])
+    else:
+        interactive_main()
@@ -1,18 +1,45 @@
+import argparse
 import json
 import os
 import re
+import sys
+from opcode_index import OpcodeIndex, INDEX_FILE_NAME
+from batch_runner import expand_inputs, run_batch
+from stack_store import StackStore, STACK_STORE_FILE_NAME, load_trace
+
+CALL_SSTORE = ['CALL', 'STATICCALL', 'DELEGATECALL', 'CALLCODE', 'SSTORE']
+
+
+def _step_indices(trace_dir, stack_store, addresses=None):
+    """CALL/SSTORE 步骤下标：有 opcode 索引时查表，否则扫描增量栈存储的 opcode 列（不还原栈）"""
+    index_path = os.path.join(trace_dir, INDEX_FILE_NAME)
+    if os.path.exists(index_path):
+        by_address = OpcodeIndex.load(index_path).steps_with(CALL_SSTORE)
+        return sorted(idx for addr, indices in by_address.items()
+                      if not addresses or addr in addresses for idx in indices)
+    return stack_store.steps_with(CALL_SSTORE, addresses or None)
+
+
+def _load_stack_store(trace_file):
+    """trace 旁有增量栈存储（trace_stacks.json.gz）时读取它，只还原 CALL/SSTORE 步骤的栈，不读取完整的 trace.json"""
+    path = os.path.join(os.path.dirname(trace_file), STACK_STORE_FILE_NAME)
+    return StackStore.load(path) if os.path.exists(path) else None
 
 def extract_call_sstore_steps(trace_file, target_contract_address):
     """
     从 EVM trace JSON 文件中提取指定合约的 CALL 和 SSTORE 操作
     """
-    CALL_SSTORE = ['CALL', 'STATICCALL', 'DELEGATECALL', 'CALLCODE', 'SSTORE']
     call_sstore_steps = []
     normalized_address = target_contract_address.lower().strip()
 
+    stack_store = _load_stack_store(trace_file)
+    if stack_store is not None:
+        for idx in _step_indices(os.path.dirname(trace_file), stack_store, {normalized_address}):
+            call_sstore_steps.append(stack_store.step(idx))
+        return call_sstore_steps
+
     try:
-        with open(trace_file, 'r', encoding='utf-8') as f:
-            trace_data = json.load(f)
+        trace_data = load_trace(trace_file)
     except FileNotFoundError:
         print(f"❌ 错误：找不到文件 '{trace_file}'")
         return []
@@ -24,6 +51,21 @@ def extract_call_sstore_steps(trace_file, target_contract_address):
         print("❌ 错误：trace 文件中没有 'steps' 字段")
         return []
 
+    # trace 旁有 opcode 索引时，直接按步骤下标取出，无需遍历全部步骤
+    index_path = os.path.join(os.path.dirname(trace_file), INDEX_FILE_NAME)
+    if os.path.exists(index_path):
+        index = OpcodeIndex.load(index_path)
+        step_indices = index.steps_with(CALL_SSTORE, normalized_address).get(normalized_address, [])
+        for idx in step_indices:
+            step = trace_data['steps'][idx]
+            call_sstore_steps.append({
+                'address': step['address'],
+                'pc': step['pc'],
+                'opcode': step['opcode'],
+                'stack': step.get('stack', [])
+            })
+        return call_sstore_steps
+
     for step in trace_data['steps']:
         addr = step.get('address', '').lower()
         opcode = step.get('opcode', '')
@@ -40,6 +82,70 @@ def extract_call_sstore_steps(trace_file, target_contract_address):
     return call_sstore_steps
 
 
+def process_trace_file(trace_file, addresses):
+    """
+    批处理worker：trace只读取一次，提取所有目标合约（addresses为空时为全部合约）的 CALL/SSTORE 步骤，
+    返回带步骤下标的JSONL记录。
+    """
+    targets = set(addresses)
+    stack_store = _load_stack_store(trace_file)
+    if stack_store is not None:
+        records = []
+        for idx in _step_indices(os.path.dirname(trace_file), stack_store, targets):
+            records.append({'file': trace_file, 'tx_hash': stack_store.tx_hash, 'step_idx': idx,
+                            **stack_store.step(idx)})
+        return records
+
+    try:
+        trace_data = load_trace(trace_file)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ 跳过 {trace_file}：{e}", file=sys.stderr)
+        return []
+
+    steps = trace_data.get('steps', [])
+    index_path = os.path.join(os.path.dirname(trace_file), INDEX_FILE_NAME)
+    if os.path.exists(index_path):
+        by_address = OpcodeIndex.load(index_path).steps_with(CALL_SSTORE)
+        step_indices = sorted(idx for addr, indices in by_address.items()
+                              if not targets or addr in targets for idx in indices)
+    else:
+        step_indices = [idx for idx, step in enumerate(steps)
+                        if step.get('opcode', '') in CALL_SSTORE
+                        and (not targets or step.get('address', '').lower() in targets)]
+
+    records = []
+    for idx in step_indices:
+        step = steps[idx]
+        records.append({
+            'file': trace_file,
+            'tx_hash': trace_data.get('tx_hash', ''),
+            'step_idx': idx,
+            'address': step['address'],
+            'pc': step['pc'],
+            'opcode': step['opcode'],
+            'stack': step.get('stack', [])
+        })
+    return records
+
+
+def cli_main(argv):
+    parser = argparse.ArgumentParser(description="从 EVM trace 中批量提取 CALL/SSTORE 步骤")
+    parser.add_argument("inputs", nargs="+", help="trace.json文件、目录（递归查找）或通配符")
+    parser.add_argument("-a", "--address", action="append", default=[],
+                        help="目标合约地址（可重复指定，不指定则提取所有合约）")
+    parser.add_argument("-o", "--output", help="JSONL输出路径（默认输出到标准输出）")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="进程数（默认CPU核数）")
+    args = parser.parse_args(argv)
+
+    for addr in args.address:
+        if not re.match(r'^0x[a-fA-F0-9]{40}$', addr):
+            parser.error(f"地址格式错误，必须是 40 位十六进制地址（含 0x）：{addr}")
+    addresses = tuple(addr.lower() for addr in args.address)
+
+    files = expand_inputs(args.inputs, "trace.json")
+    run_batch(process_trace_file, files, output=args.output, workers=args.workers, worker_args=(addresses,))
+
+
 def main():
     # 第一次输入：trace 文件路径
     trace_path = input("请输入 EVM trace JSON 文件的路径：").strip().strip('"')
@@ -97,4 +203,8 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    # 不带参数时保留原有的交互式用法
+    if len(sys.argv) > 1:
+        cli_main(sys.argv[1:])
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,216 @@
+# graph_render.py 负责把 DOT 文件渲染成 SVG 等格式（调用 Graphviz 的 dot 命令）；
+# - 有界的子进程池：同时运行的 dot 进程数不超过 workers，提交后立即返回，不阻塞CFG构建；
+# - 每个图有超时：超时的 dot 进程会被杀掉，改为渲染摘要图（只保留块的头部信息，仍然超时再截断节点）；
+# - 超过节点/边/字节阈值的图直接渲染摘要图；
+# - 按 DOT 内容的哈希缓存输出，相同的图（例如同一份代码的静态CFG）只渲染一次。
+# 用法：python graph_render.py Result -j 4 --timeout 60
+
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+from batch_runner import expand_inputs
+
+DEFAULT_CACHE_DIR = "render_cache"
+DEFAULT_TIMEOUT = 60.0
+MAX_NODES = 1500
+MAX_EDGES = 3000
+MAX_BYTES = 4 * 1024 * 1024
+# 摘要图仍然超时时，最终只保留的节点数
+SUMMARY_NODES = 200
+
+_NODE_STATEMENT = re.compile(r'^(\s*)"([^"]+)" \[label="((?:[^"\\]|\\.)*)"(.*?)\];$', re.S | re.M)
+_EDGE_STATEMENT = re.compile(r'^\s*"([^"]+)" -> "([^"]+)" \[(.*?)\];$', re.M)
+# 块标签中头部信息与指令列表之间的分隔线（render_transaction / render_contract / render_static_complete 相同）
+_LABEL_SEPARATOR = "\n---------\n"
+
+
+@dataclass
+class RenderResult:
+    """单个图的渲染结果"""
+    dot_path: str
+    output_path: str
+    status: str            # rendered / cached / summarized / timeout / failed / unavailable
+    seconds: float = 0.0
+    message: str = ""
+
+
+def graph_size(dot: str) -> Dict[str, int]:
+    """DOT 文本中的节点数、边数和字节数"""
+    edges = len(_EDGE_STATEMENT.findall(dot))
+    nodes = len(_NODE_STATEMENT.findall(dot))
+    return {"nodes": nodes, "edges": edges, "bytes": len(dot.encode("utf-8"))}
+
+
+def summarize_dot(dot: str, max_nodes: int = MAX_NODES) -> str:
+    """
+    摘要图：节点标签只保留头部（去掉指令列表）；节点超过 max_nodes 时只保留前 max_nodes 个节点及其之间的边，
+    并用一个说明节点标出省略的数量。图的设置（rankdir、节点/边样式）保持不变。
+    """
+    nodes = _NODE_STATEMENT.findall(dot)
+    edges = _EDGE_STATEMENT.findall(dot)
+    first = _NODE_STATEMENT.search(dot) or _EDGE_STATEMENT.search(dot)
+    header = dot[:first.start()] if first else dot.rstrip().rstrip("}")
+    kept = {name for _, name, _, _ in nodes[:max_nodes]}
+
+    lines = [header.rstrip("\n")]
+    for indent, name, label, attrs in nodes[:max_nodes]:
+        lines.append(f'{indent}"{name}" [label="{label.split(_LABEL_SEPARATOR, 1)[0]}"{attrs}];')
+    kept_edges = 0
+    for src, dst, attrs in edges:
+        if src in kept and dst in kept:
+            lines.append(f'    "{src}" -> "{dst}" [{attrs}];')
+            kept_edges += 1
+    if len(nodes) > max_nodes:
+        lines.append(f'    "omitted" [label="摘要图：省略 {len(nodes) - max_nodes} 个节点、'
+                     f'{len(edges) - kept_edges} 条边", shape=note, fillcolor="#fff3cd"];')
+    lines.append("}")
+    return "\n".join(lines)
+
+
+class RenderService:
+    """
+    后台渲染服务：submit() 把渲染任务交给线程池，每个线程最多运行一个 dot 子进程；
+    close() 等待所有任务完成。找不到 dot 命令时所有任务返回 unavailable，不影响调用方。
+    """
+    def __init__(self, workers: int = 2, fmt: str = "svg", timeout: float = DEFAULT_TIMEOUT,
+                 max_nodes: int = MAX_NODES, max_edges: int = MAX_EDGES, max_bytes: int = MAX_BYTES,
+                 cache_dir: Optional[str] = DEFAULT_CACHE_DIR, dot_binary: str = "dot"):
+        self.fmt = fmt
+        self.timeout = timeout
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.dot_binary = shutil.which(dot_binary)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="render")
+        self._futures: List[Future] = []
+
+    @property
+    def available(self) -> bool:
+        return self.dot_binary is not None
+
+    def submit(self, dot_path: str, output_path: Optional[str] = None, dot: Optional[str] = None) -> Future:
+        """提交一个渲染任务；dot 为 None 时从 dot_path 读取。输出默认与 DOT 文件同名（扩展名改为格式名）"""
+        output_path = output_path or f"{os.path.splitext(dot_path)[0]}.{self.fmt}"
+        future = self._executor.submit(self._render, dot_path, output_path, dot)
+        self._futures.append(future)
+        return future
+
+    def close(self) -> List[RenderResult]:
+        """等待所有已提交的任务，返回结果（按提交顺序）"""
+        self._executor.shutdown(wait=True)
+        results = [future.result() for future in self._futures]
+        self._futures = []
+        return results
+
+    def __enter__(self) -> "RenderService":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # ------------------------- 渲染 -------------------------
+    def _render(self, dot_path: str, output_path: str, dot: Optional[str]) -> RenderResult:
+        start = time.perf_counter()
+        if not self.available:
+            return RenderResult(dot_path, output_path, "unavailable", message="找不到 Graphviz 的 dot 命令")
+        try:
+            if dot is None:
+                with open(dot_path, encoding="utf-8") as f:
+                    dot = f.read()
+            size = graph_size(dot)
+            oversized = (size["nodes"] > self.max_nodes or size["edges"] > self.max_edges
+                         or size["bytes"] > self.max_bytes)
+            # 依次尝试：原图（未超过阈值时）、只保留块头部的摘要图、节点截断到 SUMMARY_NODES 的摘要图
+            attempts = [] if oversized else [dot]
+            attempts.append(summarize_dot(dot, self.max_nodes))
+            if size["nodes"] > SUMMARY_NODES:
+                attempts.append(summarize_dot(dot, SUMMARY_NODES))
+            message = (f"超过阈值（{size['nodes']} 个节点，{size['edges']} 条边，{size['bytes']} 字节）"
+                       if oversized else "")
+            for attempt, text in enumerate(attempts):
+                status = self._render_cached(text, output_path)
+                if status != "timeout":
+                    if oversized or attempt > 0:
+                        status = "summarized"
+                    break
+                message = f"{message + '，' if message else ''}第 {attempt + 1} 次渲染超过 {self.timeout}s"
+        except subprocess.CalledProcessError as e:
+            status, message = "failed", e.stderr.decode("utf-8", "replace").strip()
+        except OSError as e:
+            status, message = "failed", str(e)
+        return RenderResult(dot_path, output_path, status, round(time.perf_counter() - start, 3), message)
+
+    def _cache_path(self, dot: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        digest = hashlib.sha256(f"{self.fmt}\n{dot}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.{self.fmt}")
+
+    def _render_cached(self, dot: str, output_path: str) -> str:
+        """渲染（或从缓存复制）到 output_path，返回 rendered / cached / timeout"""
+        cache_path = self._cache_path(dot)
+        if cache_path and os.path.exists(cache_path):
+            shutil.copyfile(cache_path, output_path)
+            return "cached"
+        try:
+            completed = subprocess.run([self.dot_binary, f"-T{self.fmt}"], input=dot.encode("utf-8"),
+                                       capture_output=True, timeout=self.timeout, check=True)
+        except subprocess.TimeoutExpired:
+            return "timeout"  # subprocess.run 已杀掉超时的 dot 进程
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(completed.stdout)
+        os.replace(tmp_path, output_path)
+        if cache_path:
+            shutil.copyfile(output_path, cache_path)
+        return "rendered"
+
+
+def summarize_results(results: List[RenderResult]) -> str:
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    return "，".join(f"{status} {count}" for status, count in sorted(counts.items())) or "没有渲染任务"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用 Graphviz 批量渲染 DOT 文件（有界进程数、超时、摘要回退、缓存）")
+    parser.add_argument("inputs", nargs="+", help="DOT 文件、目录（递归查找 *.dot）或通配符")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="同时运行的 dot 进程数")
+    parser.add_argument("-T", "--format", default="svg", help="输出格式")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="每个图的超时（秒）")
+    parser.add_argument("--max-nodes", type=int, default=MAX_NODES)
+    parser.add_argument("--max-edges", type=int, default=MAX_EDGES)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="渲染缓存目录（空字符串表示不缓存）")
+    args = parser.parse_args()
+
+    files = expand_inputs(args.inputs, "*.dot")
+    start = time.perf_counter()
+    service = RenderService(workers=args.workers, fmt=args.format, timeout=args.timeout,
+                            max_nodes=args.max_nodes, max_edges=args.max_edges, cache_dir=args.cache_dir or None)
+    if not service.available:
+        print("找不到 Graphviz 的 dot 命令，请先安装 Graphviz", file=sys.stderr)
+        sys.exit(1)
+    for path in files:
+        service.submit(path)
+    results = service.close()
+    for result in results:
+        if result.status not in {"rendered", "cached"}:
+            print(f"{result.dot_path}: {result.status} {result.message}", file=sys.stderr)
+    print(f"渲染 {len(files)} 个文件，用时 {time.perf_counter() - start:.2f}s（{summarize_results(results)}）",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# instrumentation.py 负责主流程的分阶段计时与内存统计；
+# 通过环境变量开启，无需修改代码：
+#   EVM_CFG_METRICS=1      记录每个阶段的耗时、峰值RSS，以及 TraceFormatter 的RPC字节数和延迟
+#   EVM_CFG_TRACEMALLOC=1  额外用 tracemalloc 记录每个阶段的Python内存峰值（有一定开销）
+# 每笔交易输出一份 metrics.json；批量运行后可汇总：python instrumentation.py Result
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import resource  # Windows 上没有 resource 模块
+except ImportError:
+    resource = None
+
+METRICS_FILE_NAME = "metrics.json"
+
+
+def metrics_enabled() -> bool:
+    return os.environ.get("EVM_CFG_METRICS", "") not in {"", "0", "false", "False"}
+
+
+def tracemalloc_enabled() -> bool:
+    return os.environ.get("EVM_CFG_TRACEMALLOC", "") not in {"", "0", "false", "False"}
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """进程峰值RSS（MB）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 单位为字节
+    return round(peak / 1024 / 1024, 2) if sys.platform == "darwin" else round(peak / 1024, 2)
+
+
+class Metrics:
+    """单笔交易的指标收集器"""
+    def __init__(self, tx_hash: str = "", use_tracemalloc: bool = False):
+        self.tx_hash = tx_hash
+        self.use_tracemalloc = use_tracemalloc
+        self.stages: List[Dict] = []          # 按执行顺序记录的阶段指标
+        self.rpc: Dict[str, Dict] = {}        # RPC方法 -> 调用次数/字节数/延迟
+        self.counters: Dict[str, int] = {}    # 其他计数（步骤数、块数等）
+        self._start = time.perf_counter()
+        if self.use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str):
+        """阶段计时器：with metrics.stage("block_split"): ..."""
+        if self.use_tracemalloc:
+            tracemalloc.reset_peak()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            record = {
+                "stage": name,
+                "seconds": round(time.perf_counter() - wall_start, 6),
+                "cpu_seconds": round(time.process_time() - cpu_start, 6),
+                "peak_rss_mb": _peak_rss_mb(),
+            }
+            if self.use_tracemalloc:
+                _, peak = tracemalloc.get_traced_memory()
+                record["tracemalloc_peak_mb"] = round(peak / 1024 / 1024, 2)
+            self.stages.append(record)
+
+    def count(self, name: str, value: int) -> None:
+        self.counters[name] = value
+
+    def add_rpc_stats(self, rpc_stats: Dict[str, Dict]) -> None:
+        """合并 TraceFormatter.rpc_stats"""
+        for method, stats in rpc_stats.items():
+            merged = self.rpc.setdefault(method, {"calls": 0, "bytes": 0, "seconds": 0.0, "max_seconds": 0.0})
+            merged["calls"] += stats["calls"]
+            merged["bytes"] += stats["bytes"]
+            merged["seconds"] = round(merged["seconds"] + stats["seconds"], 6)
+            merged["max_seconds"] = round(max(merged["max_seconds"], stats["max_seconds"]), 6)
+
+    def to_dict(self) -> Dict:
+        return {
+            "tx_hash": self.tx_hash,
+            "total_seconds": round(time.perf_counter() - self._start, 6),
+            "peak_rss_mb": _peak_rss_mb(),
+            "stages": self.stages,
+            "rpc": self.rpc,
+            "counters": self.counters,
+        }
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class NullMetrics(Metrics):
+    """未开启指标时使用：接口相同，不做任何记录"""
+    def __init__(self, tx_hash: str = ""):
+        self.tx_hash = tx_hash
+        self.use_tracemalloc = False
+        self.stages, self.rpc, self.counters = [], {}, {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        yield
+
+    def count(self, name: str, value: int) -> None:
+        pass
+
+    def add_rpc_stats(self, rpc_stats: Dict[str, Dict]) -> None:
+        pass
+
+    def save(self, path: str) -> None:
+        pass
+
+
+def create_metrics(tx_hash: str = "") -> Metrics:
+    """根据环境变量创建指标收集器"""
+    if metrics_enabled():
+        return Metrics(tx_hash, use_tracemalloc=tracemalloc_enabled())
+    return NullMetrics(tx_hash)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def aggregate_metrics(paths: List[str]) -> Dict:
+    """汇总多份 metrics.json：每个阶段的总耗时/均值/P50/P95/最大值，以及RPC总量"""
+    stage_times: Dict[str, List[float]] = {}
+    rpc_total: Dict[str, Dict] = {}
+    totals: List[float] = []
+    peak_rss = 0.0
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        totals.append(data.get("total_seconds", 0.0))
+        peak_rss = max(peak_rss, data.get("peak_rss_mb") or 0.0)
+        for record in data.get("stages", []):
+            stage_times.setdefault(record["stage"], []).append(record["seconds"])
+        for method, stats in data.get("rpc", {}).items():
+            merged = rpc_total.setdefault(method, {"calls": 0, "bytes": 0, "seconds": 0.0})
+            merged["calls"] += stats["calls"]
+            merged["bytes"] += stats["bytes"]
+            merged["seconds"] = round(merged["seconds"] + stats["seconds"], 6)
+
+    stages = {}
+    for name, values in stage_times.items():
+        stages[name] = {
+            "runs": len(values),
+            "total_seconds": round(sum(values), 6),
+            "mean_seconds": round(sum(values) / len(values), 6),
+            "p50_seconds": round(_percentile(values, 0.5), 6),
+            "p95_seconds": round(_percentile(values, 0.95), 6),
+            "max_seconds": round(max(values), 6),
+        }
+    return {
+        "transactions": len(paths),
+        "total_seconds": round(sum(totals), 6),
+        "peak_rss_mb": peak_rss,
+        "stages": stages,
+        "rpc": rpc_total,
+    }
+
+
+def print_report(report: Dict) -> None:
+    print(f"共 {report['transactions']} 笔交易，总耗时 {report['total_seconds']:.2f}s，峰值RSS {report['peak_rss_mb']} MB")
+    print(f"{'阶段':<20}{'次数':>6}{'总计(s)':>12}{'均值(s)':>12}{'P95(s)':>12}{'最大(s)':>12}")
+    for name, s in sorted(report["stages"].items(), key=lambda item: -item[1]["total_seconds"]):
+        print(f"{name:<20}{s['runs']:>6}{s['total_seconds']:>12.3f}{s['mean_seconds']:>12.3f}"
+              f"{s['p95_seconds']:>12.3f}{s['max_seconds']:>12.3f}")
+    for method, s in report["rpc"].items():
+        print(f"RPC {method}: {s['calls']} 次，{s['bytes'] / 1024 / 1024:.2f} MB，{s['seconds']:.2f}s")
+
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else "Result"
+    metric_paths = sorted(
+        os.path.join(dirpath, METRICS_FILE_NAME)
+        for dirpath, _, filenames in os.walk(root) if METRICS_FILE_NAME in filenames
+    )
+    if not metric_paths:
+        print(f"在 {root} 下未找到 {METRICS_FILE_NAME}（运行 main.py 前设置 EVM_CFG_METRICS=1）")
+    else:
+        aggregated = aggregate_metrics(metric_paths)
+        print_report(aggregated)
+        with open(os.path.join(root, "metrics_report.json"), "w", encoding="utf-8") as f:
+            json.dump(aggregated, f, indent=2)
@@ -1,10 +1,23 @@
 import json
 import os
+import time
 from evm_information import TraceFormatter
 from basic_block import BasicBlockProcessor
 from cfg_transaction import CFGConstructor, render_transaction
 from cfg_contract import ContractCFGConnector, render_contract
-from cfg_static_complete import StaticCompleteCFGBuilder, render_static_complete
+from cfg_static_complete import render_static_complete, static_complete_dot
+from parallel_static_cfg import build_static_cfgs
+from opcode_index import build_opcode_index, INDEX_FILE_NAME
+from corpus_index import CorpusIndex
+from instrumentation import create_metrics, metrics_enabled, METRICS_FILE_NAME
+from trace_compression import compress_trace, COMPRESSED_TRACE_FILE_NAME
+from stack_store import save_trace
+from call_frames import CallFrameIndex
+from proxy_detection import build_code_map, summarize_code_map, save_code_map, CODE_MAP_FILE_NAME
+from cfg_similarity import SimilarityIndex
+from static_coverage import CoverageStore, CoverageLayout, CodeCoverage
+from result_store import ResultStore, new_manifest, save_manifest, STATIC_CFG_ARTIFACT, MANIFEST_FILE_NAME
+from graph_render import RenderService, summarize_results
 
 def create_result_directory(tx_hash: str) -> str:
     """创建结果目录结构: Result/交易哈希/"""
@@ -18,124 +31,333 @@ def create_result_directory(tx_hash: str) -> str:
 
 def main():
     # 配置参数
+    # 节点URL；多个节点（列表或逗号分隔）时按延迟和健康状态分配请求（见 rpc_pool.py）
     PROVIDER_URL = "http://10.222.117.105:8545"
     TX_HASH = "0x476d0ae3e8229b7e85c6bf6103a4e4ab0d38e06fcce5dcc82aaeb2fb96bf21f2"
+    # 静态CFG范围："full"（默认）构建整个合约；"trace_functions" 只构建本交易执行过的函数（及选择器分发部分），
+    # 构建开销与执行过的函数成正比，识别不到分发表或没有执行任何函数入口时构建整图（部分图不进入相似度索引、覆盖统计和结果库）
+    STATIC_CFG_SCOPE = "full"
+    # 构建静态CFG的进程数：1 为串行，0 为使用全部CPU
+    STATIC_CFG_WORKERS = 1
+    # 静态CFG快照目录：设置后按地址增量重建（合约升级后只重新解析变化的块），None 表示不使用
+    STATIC_CFG_SNAPSHOT_DIR = None
+    # 按代码去重的结果库（例如 "Result_codes"）：基本块和整合约静态CFG按 code_key 压缩保存一次，交易目录只保存引用（artifacts.json），
+    # 可用 result_store.py materialize 还原；None（默认）表示每个交易目录都写完整的 blocks.json 和静态CFG DOT
+    RESULT_STORE_DIR = None
+    # 用 Graphviz 把DOT渲染成的格式（例如 "svg"；None 表示不渲染，默认只写DOT）；渲染在后台线程中调用 dot，
+    # 每个图有超时，超大的图渲染摘要图；区块模式下所有交易共用一个渲染池，处理完所有交易后才等待渲染结束
+    RENDER_FORMAT = None
+    RENDER_WORKERS = 2
+    RENDER_TIMEOUT = 60
+    # 跨交易语料库索引的SQLite路径（例如 "Result/corpus.db"），每笔交易处理完后增量导入；None（默认）表示不写入
+    CORPUS_DB = None
+    # 静态CFG相似度索引的SQLite路径（例如 "Result/similarity.db"），查询并追加本交易合约的整合约静态CFG；None（默认）表示不使用
+    SIMILARITY_DB = None
+    # 静态CFG覆盖统计的SQLite路径（例如 "Result/coverage.db"），按代码合并每笔交易的执行覆盖；None（默认）表示不统计
+    COVERAGE_DB = None
 
-    try:
-        # 创建结果目录
-        result_dir = create_result_directory(TX_HASH)
-        print(f"所有结果将保存到: {os.path.abspath(result_dir)}\n")
+    # 区块模式：设置为区块号或区块哈希时，用 debug_traceBlockByNumber/ByHash 一次获取区块内所有交易的trace
+    # （节点只重放一次区块），逐笔处理（忽略 TX_HASH）；None 表示只处理 TX_HASH
+    BLOCK = None
 
-        # 初始化工具
-        formatter = TraceFormatter(PROVIDER_URL)
-        processor = BasicBlockProcessor()
-        
-        # 1. 获取交易的标准化trace
-        print(f"正在获取交易 {TX_HASH} 的执行轨迹...")
-        standardized_trace = formatter.get_standardized_trace(TX_HASH)
-        print(f"成功获取轨迹，包含 {len(standardized_trace['steps'])} 个步骤\n")
-
-        # 2. 提取涉及的合约地址
-        contracts = formatter.extract_contracts_from_trace(standardized_trace)
-        print(f"交易涉及 {len(contracts)} 个合约地址: {[addr[:8] + '...' for addr in contracts]}\n")
-
-        # 3. 获取所有合约的字节码
-        print("正在获取合约字节码...")
-        contracts_bytecode = formatter.get_all_contracts_bytecode(TX_HASH)
-
-        # 4. 转换字节码为基本块
-        print("正在将字节码转换为基本块...")
-        all_blocks = processor.process_multiple_contracts(contracts_bytecode)
-        print(f"成功生成 {len(all_blocks)} 个基本块\n")
-
-        # 5. 构建交易级控制流图(CFG)
-        print("正在构建交易级控制流图...")
-        cfg_constructor = CFGConstructor(all_blocks)
-        tx_cfg = cfg_constructor.construct_cfg(standardized_trace)
-        print(f"成功构建交易级CFG，包含 {len(tx_cfg.nodes)} 个节点和 {len(tx_cfg.edges)} 条边\n")
-
-        # 6. 为每个合约构建独立的CFG
-        print("正在构建合约级控制流图...")
-        contract_cfgs = {}
+    # 处理一笔交易；standardized_trace 为 None 时用 debug_traceTransaction 获取
+    def process_transaction(tx_hash: str, standardized_trace=None):
+        try:
+            # 创建结果目录
+            result_dir = create_result_directory(tx_hash)
+            print(f"所有结果将保存到: {os.path.abspath(result_dir)}\n")
+
+            # 初始化工具（设置环境变量 EVM_CFG_METRICS=1 时记录各阶段耗时与内存）
+            metrics = create_metrics(tx_hash)
+            processor = BasicBlockProcessor()
         
-        for contract_addr in contracts:
-            contract_blocks = [b for b in all_blocks if b.address == contract_addr]
-            if not contract_blocks:
-                print(f"合约 {contract_addr[:8]}... 没有基本块，跳过...")
-                continue
+            # 1. 获取交易的标准化trace（区块模式下已随区块一起获取）
+            with metrics.stage("trace_fetch"):
+                if standardized_trace is None:
+                    print(f"正在获取交易 {tx_hash} 的执行轨迹...")
+                    standardized_trace = formatter.get_standardized_trace(tx_hash)
+                print(f"成功获取轨迹，包含 {len(standardized_trace['steps'])} 个步骤\n")
+
+            # 2. 提取涉及的合约地址
+            with metrics.stage("contract_extract"):
+                contracts = formatter.extract_contracts_from_trace(standardized_trace)
+                print(f"交易涉及 {len(contracts)} 个合约地址: {[addr[:8] + '...' for addr in contracts]}\n")
+
+            # 3. 获取所有合约的字节码
+            with metrics.stage("bytecode_fetch"):
+                print("正在获取合约字节码...")
+                contracts_bytecode = formatter.get_all_contracts_bytecode(tx_hash, standardized_trace)
+                # 识别代理合约与代码相同的合约：分块和静态CFG按代码只计算一次
+                code_map = build_code_map(contracts_bytecode, standardized_trace)
+                print(f"代码去重: {summarize_code_map(code_map)}")
+
+            # 4. 转换字节码为基本块
+            with metrics.stage("block_split"):
+                print("正在将字节码转换为基本块...")
+                all_blocks = processor.process_multiple_contracts(contracts_bytecode)
+                print(f"成功生成 {len(all_blocks)} 个基本块\n")
+
+            # 5. 构建交易级控制流图(CFG)
+            with metrics.stage("transaction_cfg"):
+                print("正在构建交易级控制流图...")
+                cfg_constructor = CFGConstructor(all_blocks)
+                tx_cfg = cfg_constructor.construct_cfg(standardized_trace)
+                print(f"成功构建交易级CFG，包含 {len(tx_cfg.nodes)} 个节点和 {len(tx_cfg.edges)} 条边\n")
+
+            # 6. 为每个合约构建独立的CFG
+            with metrics.stage("contract_cfgs"):
+                print("正在构建合约级控制流图...")
+                contract_cfgs = {}
+                frame_index = CallFrameIndex.from_trace(standardized_trace)
+            
+                for contract_addr in contracts:
+                    contract_blocks = [b for b in all_blocks if b.address == contract_addr]
+                    if not contract_blocks:
+                        print(f"合约 {contract_addr[:8]}... 没有基本块，跳过...")
+                        continue
+                    
+                    # 按调用栈帧树的步骤范围切片取出该合约的步骤
+                    contract_steps = frame_index.contract_steps(standardized_trace["steps"], contract_addr)
+                
+                    connector = ContractCFGConnector(contract_blocks)
+                    contract_cfg = connector.connect_contract_cfg(contract_steps)
+                    contract_cfgs[contract_addr] = contract_cfg
                 
-            contract_steps = [
-                step for step in standardized_trace["steps"] 
-                if step["address"] == contract_addr
-            ]
+                    print(f"合约 {contract_addr[:8]}... 的CFG构建完成，包含 {len(contract_cfg.nodes)} 个节点和 {len(contract_cfg.edges)} 条边")
+
+            # 7. 为每个合约构建静态完整的CFG
+            with metrics.stage("static_cfgs"):
+                print("正在构建静态完整的合约级控制流图...")
+                contract_cfgs_static = {}
+                executed_pcs = None
+                if STATIC_CFG_SCOPE == "trace_functions":
+                    executed_pcs = {}
+                    for step in standardized_trace["steps"]:
+                        executed_pcs.setdefault(step["address"], set()).add(step["pc"])
+                # 每个合约需要原始字节码和基本块；STATIC_CFG_WORKERS > 1 时按不同字节码并行构建
+                static_results = build_static_cfgs(contracts_bytecode, all_blocks, workers=STATIC_CFG_WORKERS,
+                                                   executed_pcs=executed_pcs, snapshot_dir=STATIC_CFG_SNAPSHOT_DIR)
+                for contract_data in contracts_bytecode:
+                    contract_addr = contract_data["address"]
+                    if contract_addr not in static_results:
+                        print(f"合约 {contract_addr[:8]}... 没有基本块，跳过...")
+                        continue
+                    static_cfg, selectors = static_results[contract_addr]
+                    if selectors:
+                        print(f"合约 {contract_addr[:8]}... 只构建执行过的函数: {', '.join(selectors)}")
+                    contract_cfgs_static[contract_addr] = static_cfg
+                    print(f"合约 {contract_addr[:8]}... 的静态CFG构建完成，包含 {len(static_cfg.nodes)} 个节点和 {len(static_cfg.edges)} 条边")
+
+            # 8. 保存轨迹数据
+            with metrics.stage("save_trace"):
+                # 栈以增量编码（定期保存完整栈作为检查点）保存在 trace_stacks.json.gz 中，trace.json 的步骤不带栈，
+                # 用 stack_store.load_trace 读回
+                trace_path = os.path.join(result_dir, f"trace.json")
+                stacks_path = save_trace(standardized_trace, trace_path)
+                print(f"\n轨迹数据已保存到: {trace_path}")
+                print(f"增量栈已保存到: {stacks_path}")
+                # 基本块序列形式的压缩trace（只保留 CALL/SSTORE 等步骤的栈），可用 CompressedTrace.load 读回
+                compressed_path = os.path.join(result_dir, COMPRESSED_TRACE_FILE_NAME)
+                compress_trace(standardized_trace, all_blocks).save(compressed_path)
+                print(f"压缩轨迹已保存到: {compressed_path}")
             
-            connector = ContractCFGConnector(contract_blocks)
-            contract_cfg = connector.connect_contract_cfg(contract_steps)
-            contract_cfgs[contract_addr] = contract_cfg
+            # 9. 保存基本块数据
+            with metrics.stage("save_blocks"):
+                blocks_path = os.path.join(result_dir, f"blocks.json")
+                if RESULT_STORE_DIR:
+                    result_store = ResultStore(RESULT_STORE_DIR)
+                    manifest = new_manifest(result_dir, result_store)
+                    blocks_by_address = {}
+                    for block in all_blocks:
+                        blocks_by_address.setdefault(block.address, []).append(block)
+                    for addr, blocks in blocks_by_address.items():
+                        key = code_map["contracts"][addr]["code_key"]
+                        if result_store.put_blocks(key, blocks):
+                            print(f"合约 {addr[:8]}... 的基本块已保存到结果库")
+                        manifest["contracts"].append({"address": addr, "code_key": key, "static_cfg": False})
+                    if os.path.exists(blocks_path):
+                        os.remove(blocks_path)  # 以前用旧目录结构保存的结果
+                    print(f"基本块数据引用 {len(manifest['contracts'])} 份结果库中的代码: {result_store.root}")
+                else:
+                    with open(blocks_path, "w") as f:
+                        blocks_data = []
+                        for block in all_blocks:
+                            blocks_data.append({
+                                "address": block.address,
+                                "start_pc": block.start_pc,
+                                "end_pc": block.end_pc,
+                                "terminator": block.terminator,
+                                "instructions": block.instructions
+                            })
+                        json.dump(blocks_data, f, indent=2)
+                    print(f"基本块数据已保存到: {blocks_path}")
+                code_map_path = os.path.join(result_dir, CODE_MAP_FILE_NAME)
+                save_code_map(code_map, code_map_path)
+                print(f"合约代码对应关系已保存到: {code_map_path}")
+
+            # 9.1 保存opcode倒排索引（供find_call_nodes.py/find_trace_opcode.py直接查表）
+            with metrics.stage("opcode_index"):
+                index_path = os.path.join(result_dir, INDEX_FILE_NAME)
+                build_opcode_index(all_blocks, standardized_trace, contract_cfgs).save(index_path)
+                print(f"opcode索引已保存到: {index_path}")
+
+            # 9.2 增量导入跨交易语料库索引
+            if CORPUS_DB:
+                with metrics.stage("corpus_index"):
+                    corpus = CorpusIndex(CORPUS_DB)
+                    try:
+                        corpus.ingest(tx_hash, standardized_trace, all_blocks, result_dir=result_dir, force=True,
+                                      code_keys={addr: info["code_key"] for addr, info in code_map["contracts"].items()})
+                        print(f"已导入语料库索引: {corpus}")
+                    finally:
+                        corpus.close()
+
+            # 9.3 静态CFG相似度索引：先查询与已知合约的相似度，再追加本交易的合约（只构建了部分函数的CFG不参与）
+            if SIMILARITY_DB:
+                with metrics.stage("similarity_index"):
+                    similarity = SimilarityIndex(SIMILARITY_DB)
+                    try:
+                        for addr, cfg in contract_cfgs_static.items():
+                            key = code_map["contracts"][addr]["code_key"]
+                            if static_results[addr][1]:
+                                continue
+                            matches = similarity.query_cfg(cfg, k=3, min_similarity=0.5, exclude=key)
+                            if matches:
+                                print(f"合约 {addr[:8]}... 相似的已知合约: " +
+                                      ", ".join(f"{address} ({score:.2f})" for _, score, address in matches))
+                            if not similarity.has_code(key):
+                                similarity.add_cfg(key, cfg, address=addr, source=tx_hash)
+                        print(f"已更新相似度索引: {similarity}")
+                    finally:
+                        similarity.close()
+
+            # 9.4 把合约级动态CFG的执行覆盖按代码累计到静态CFG的块/边编号上（按位或合并）
+            if COVERAGE_DB:
+                with metrics.stage("coverage"):
+                    coverage_store = CoverageStore(COVERAGE_DB)
+                    try:
+                        for addr, cfg in contract_cfgs.items():
+                            key = code_map["contracts"][addr]["code_key"]
+                            contract_blocks = [b for b in all_blocks if b.address == addr]
+                            layout = coverage_store.layout(key)
+                            if layout is None:
+                                # 编号以整个合约的静态CFG为准；第7步只构建了部分函数时不为此重建整图，
+                                # 该代码的覆盖从第一次得到整图时开始累计（STATIC_CFG_SCOPE="full" 或 static_coverage.py ingest）
+                                static_cfg = contract_cfgs_static.get(addr)
+                                if static_cfg is None or static_results[addr][1]:
+                                    print(f"合约 {addr[:8]}... 只构建了部分函数的静态CFG，尚无覆盖编号，跳过")
+                                    continue
+                                layout = CoverageLayout.from_static_cfg(contract_blocks, static_cfg)
+                            coverage = CodeCoverage(key, layout)
+                            coverage.record_cfg(cfg)
+                            merged = coverage_store.merge(coverage, tx_hash)
+                            print(f"合约 {addr[:8]}... 累计覆盖: {merged.summary()}")
+                    finally:
+                        coverage_store.close()
             
-            print(f"合约 {contract_addr[:8]}... 的CFG构建完成，包含 {len(contract_cfg.nodes)} 个节点和 {len(contract_cfg.edges)} 条边")
-
-        # 7. 为每个合约构建静态完整的CFG
-        print("正在构建静态完整的合约级控制流图...")
-        contract_cfgs_static = {}
-        # 我们需要同时遍历 contracts_bytecode 列表，以获取原始字节码
-        for contract_data in contracts_bytecode:
-            contract_addr = contract_data["address"]
-            contract_bytecode = contract_data["bytecode"] # 获取原始字节码
-            contract_blocks = [b for b in all_blocks if b.address == contract_addr]
-            if not contract_blocks:
-                print(f"合约 {contract_addr[:8]}... 没有基本块，跳过...")
-                continue
-            # 现在需要传入 contract_bytecode 和 contract_blocks
-            builder = StaticCompleteCFGBuilder(contract_bytecode, contract_blocks) # 修改：传递 contract_bytecode 和 contract_blocks
-            static_cfg = builder.build_static_cfg()
-            contract_cfgs_static[contract_addr] = static_cfg
-            print(f"合约 {contract_addr[:8]}... 的静态CFG构建完成，包含 {len(static_cfg.nodes)} 个节点和 {len(static_cfg.edges)} 条边")
-
-        # 8. 保存轨迹数据
-        trace_path = os.path.join(result_dir, f"trace.json")
-        with open(trace_path, "w") as f:
-            json.dump(standardized_trace, f, indent=2)
-        print(f"\n轨迹数据已保存到: {trace_path}")
-        
-        # 9. 保存基本块数据
-        blocks_path = os.path.join(result_dir, f"blocks.json")
-        with open(blocks_path, "w") as f:
-            blocks_data = []
-            for block in all_blocks:
-                blocks_data.append({
-                    "address": block.address,
-                    "start_pc": block.start_pc,
-                    "end_pc": block.end_pc,
-                    "terminator": block.terminator,
-                    "instructions": block.instructions
-                })
-            json.dump(blocks_data, f, indent=2)
-        print(f"基本块数据已保存到: {blocks_path}")
-        
-        # 10. 保存交易级CFG的DOT文件
-        tx_dot_path = os.path.join(result_dir, f"transaction_cfg.dot")
-        render_transaction(tx_cfg, tx_dot_path)
-        print(f"交易级CFG DOT文件已保存到: {tx_dot_path}")
-        
-        # 11. 保存每个合约的CFG DOT文件
-        for addr, cfg in contract_cfgs.items():
-            short_addr = addr.lstrip('0x')[:8]
-            contract_dot_path = os.path.join(result_dir, f"contract_{short_addr}_cfg.dot")
-            render_contract(cfg, contract_dot_path)
-            print(f"合约 {short_addr} CFG DOT文件已保存到: {contract_dot_path}")
-        # 12. 保存新的静态CFG DOT文件
-        for addr, cfg in contract_cfgs_static.items():
-            short_addr = addr.lstrip('0x')[:8]
-            static_dot_path = os.path.join(result_dir, f"contract_{short_addr}_static_cfg.dot")
-            render_static_complete(cfg, static_dot_path)
-            print(f"合约 {short_addr} 静态CFG DOT文件已保存到: {static_dot_path}")
-
-        print("\n===== 处理完成 =====")
-        print(f"所有结果已保存到: {os.path.abspath(result_dir)}")
+            # 10. 保存交易级CFG的DOT文件（写完的DOT立即提交给后台渲染，不等待 dot 完成）
+            with metrics.stage("render_transaction"):
+                tx_dot_path = os.path.join(result_dir, f"transaction_cfg.dot")
+                render_transaction(tx_cfg, tx_dot_path)
+                if renderer:
+                    renderer.submit(tx_dot_path)
+                print(f"交易级CFG DOT文件已保存到: {tx_dot_path}")
+            
+            # 11. 保存每个合约的CFG DOT文件
+            with metrics.stage("render_contracts"):
+                for addr, cfg in contract_cfgs.items():
+                    short_addr = addr.lstrip('0x')[:8]
+                    contract_dot_path = os.path.join(result_dir, f"contract_{short_addr}_cfg.dot")
+                    render_contract(cfg, contract_dot_path)
+                    if renderer:
+                        renderer.submit(contract_dot_path)
+                    print(f"合约 {short_addr} CFG DOT文件已保存到: {contract_dot_path}")
+            # 12. 保存新的静态CFG DOT文件
+            with metrics.stage("render_static"):
+                for addr, cfg in contract_cfgs_static.items():
+                    short_addr = addr.lstrip('0x')[:8]
+                    static_dot_path = os.path.join(result_dir, f"contract_{short_addr}_static_cfg.dot")
+                    if RESULT_STORE_DIR and not static_results[addr][1]:
+                        # 整合约静态CFG只与代码有关：结果库中已有时不再渲染
+                        key = code_map["contracts"][addr]["code_key"]
+                        if not result_store.has(key, STATIC_CFG_ARTIFACT):
+                            result_store.put_static_dot(key, static_complete_dot(cfg), addr)
+                            print(f"合约 {short_addr} 静态CFG已保存到结果库")
+                        if renderer:
+                            # 按代码渲染一次（标签中的地址为占位符），保存在结果库中
+                            output_path = result_store.output_path(key, f"static_cfg.{RENDER_FORMAT}")
+                            if not os.path.exists(output_path):
+                                renderer.submit(static_dot_path, output_path,
+                                                dot=result_store.get(key, STATIC_CFG_ARTIFACT))
+                        for entry in manifest["contracts"]:
+                            if entry["address"] == addr:
+                                entry["static_cfg"] = True
+                        if os.path.exists(static_dot_path):
+                            os.remove(static_dot_path)
+                        continue
+                    render_static_complete(cfg, static_dot_path)
+                    print(f"合约 {short_addr} 静态CFG DOT文件已保存到: {static_dot_path}")
+                    if renderer:
+                        renderer.submit(static_dot_path)
+                if RESULT_STORE_DIR:
+                    save_manifest(manifest, result_dir)
+                    print(f"结果引用清单已保存到: {os.path.join(result_dir, MANIFEST_FILE_NAME)}")
+
+            # 13. 保存性能指标
+            metrics.count("steps", len(standardized_trace["steps"]))
+            metrics.count("contracts", len(contracts))
+            metrics.count("blocks", len(all_blocks))
+            metrics.add_rpc_stats(formatter.rpc_stats)
+            for url, stats in formatter.endpoint_stats().items():
+                print(f"节点 {url}: {stats['state']}，{stats['calls']} 次请求，失败 {stats['failures']} 次，"
+                      f"平均 {stats['mean_ms']}ms")
+            if metrics_enabled():
+                metrics_path = os.path.join(result_dir, METRICS_FILE_NAME)
+                metrics.save(metrics_path)
+                print(f"性能指标已保存到: {metrics_path}")
+
+            print("\n===== 处理完成 =====")
+            print(f"所有结果已保存到: {os.path.abspath(result_dir)}")
         
+        except Exception as e:
+            print(f"执行失败: {str(e)}")
+
+    # 后台渲染（所有交易共用，见 RENDER_FORMAT）
+    renderer = None
+    if RENDER_FORMAT:
+        renderer = RenderService(workers=RENDER_WORKERS, fmt=RENDER_FORMAT, timeout=RENDER_TIMEOUT)
+        if not renderer.available:
+            print(f"未找到 Graphviz 的 dot 命令，跳过 {RENDER_FORMAT} 渲染")
+            renderer.close()
+            renderer = None
+
+    try:
+        # 设置 EVM_CFG_RPC_STORE=<目录> 时录制/回放RPC响应（EVM_CFG_RPC_MODE: auto/record/replay）
+        formatter = TraceFormatter(PROVIDER_URL, measure_bytes=metrics_enabled(),
+                                   rpc_store=os.environ.get("EVM_CFG_RPC_STORE"),
+                                   rpc_mode=os.environ.get("EVM_CFG_RPC_MODE", "auto"))
+        if BLOCK is None:
+            process_transaction(TX_HASH)
+        else:
+            print(f"正在获取区块 {BLOCK} 中所有交易的执行轨迹...")
+            count = 0
+            for standardized_trace in formatter.iter_block_traces(BLOCK):
+                print(f"\n===== 交易 {standardized_trace['tx_hash']} =====")
+                process_transaction(standardized_trace["tx_hash"], standardized_trace)
+                del standardized_trace  # 产出下一笔之前释放本笔，同一时间只保留一笔交易的trace
+                count += 1
+            print(f"\n区块 {BLOCK} 处理完成，共 {count} 笔交易")
     except Exception as e:
         print(f"执行失败: {str(e)}")
+    finally:
+        # 等待后台渲染结束
+        if renderer:
+            start = time.perf_counter()
+            render_results = renderer.close()
+            for result in render_results:
+                if result.status not in {"rendered", "cached"}:
+                    print(f"{result.dot_path}: {result.status} {result.message}")
+            print(f"Graphviz 渲染完成: {summarize_results(render_results)}，等待 {time.perf_counter() - start:.2f}s")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,184 @@
+# opcode_index.py 负责为基本块和交易trace建立opcode倒排索引；
+# 索引在构建CFG/获取trace时一次性生成，并与其他结果一起保存为 opcode_index.json；
+# 之后"合约X的所有SSTORE"、"所有包含DELEGATECALL的块"这类查询直接查表，不再线性扫描DOT或trace。
+
+import json
+import os
+from typing import List, Dict, Optional, Iterable, Union
+from basic_block import Block
+from evm_information import StandardizedTrace
+from cfg_structure import CFG
+from result_store import load_result_blocks
+from stack_store import load_trace
+
+INDEX_FILE_NAME = "opcode_index.json"
+
+
+class OpcodeIndex:
+    """
+    opcode 倒排索引（按合约地址分组）：
+    - block_index: address -> opcode -> [[start_pc, pc], ...]  指令所在块的起始PC以及指令自身PC
+    - step_index:  address -> opcode -> [step_idx, ...]         trace中该opcode出现的步骤下标
+    - cfg_blocks:  address -> [start_pc, ...]                   动态合约CFG中的节点（按节点顺序）
+    """
+    def __init__(self, tx_hash: str = ""):
+        self.tx_hash = tx_hash
+        self.block_index: Dict[str, Dict[str, List[List[str]]]] = {}
+        self.step_index: Dict[str, Dict[str, List[int]]] = {}
+        self.cfg_blocks: Dict[str, List[str]] = {}
+
+    def add_blocks(self, blocks: Iterable[Block]) -> None:
+        """把基本块中的每条指令登记到 block_index"""
+        for block in blocks:
+            by_opcode = self.block_index.setdefault(block.address, {})
+            for pc, opcode in block.instructions:
+                by_opcode.setdefault(opcode, []).append([block.start_pc, pc])
+
+    def add_trace(self, trace: StandardizedTrace) -> None:
+        """把trace中的每个步骤登记到 step_index"""
+        self.tx_hash = self.tx_hash or trace.get("tx_hash", "")
+        for idx, step in enumerate(trace["steps"]):
+            by_opcode = self.step_index.setdefault(step["address"], {})
+            by_opcode.setdefault(step["opcode"], []).append(idx)
+
+    def add_contract_cfgs(self, contract_cfgs: Dict[str, CFG]) -> None:
+        """记录每个合约动态CFG中的节点（按CFG中的节点顺序），用于只查询动态CFG中的块"""
+        for address, cfg in contract_cfgs.items():
+            self.cfg_blocks[address] = [node.start_pc for node in cfg.nodes]
+
+    # ------------------------- 查询接口 -------------------------
+    def instructions_with(self, opcodes: Union[str, Iterable[str]], address: Optional[str] = None,
+                          cfg_only: bool = False) -> Dict[str, List[List[str]]]:
+        """
+        返回 address -> [[start_pc, pc], ...]；address为None时查询所有合约。
+        cfg_only=True 时只保留动态CFG中的块，并按CFG节点顺序排列（与DOT文件中的顺序一致）。
+        """
+        opcodes = [opcodes] if isinstance(opcodes, str) else list(opcodes)
+        addresses = [address.lower()] if address else list(self.block_index.keys())
+        result = {}
+        for addr in addresses:
+            by_opcode = self.block_index.get(addr, {})
+            entries = [e for opcode in opcodes for e in by_opcode.get(opcode, [])]
+            if cfg_only:
+                node_order = {start_pc: i for i, start_pc in enumerate(self.cfg_blocks.get(addr, []))}
+                entries = [e for e in entries if e[0] in node_order]
+                entries.sort(key=lambda e: (node_order[e[0]], int(e[1], 16)))
+            else:
+                entries.sort(key=lambda e: int(e[1], 16))
+            if entries:
+                result[addr] = entries
+        return result
+
+    def blocks_with(self, opcodes: Union[str, Iterable[str]], address: Optional[str] = None,
+                    cfg_only: bool = False) -> Dict[str, List[str]]:
+        """返回 address -> [start_pc, ...]（每个块只出现一次）"""
+        result = {}
+        for addr, entries in self.instructions_with(opcodes, address, cfg_only).items():
+            result[addr] = list(dict.fromkeys(start_pc for start_pc, _ in entries))
+        return result
+
+    def steps_with(self, opcodes: Union[str, Iterable[str]], address: Optional[str] = None) -> Dict[str, List[int]]:
+        """返回 address -> [step_idx, ...]（升序）；address为None时查询所有合约"""
+        opcodes = [opcodes] if isinstance(opcodes, str) else list(opcodes)
+        addresses = [address.lower()] if address else list(self.step_index.keys())
+        result = {}
+        for addr in addresses:
+            by_opcode = self.step_index.get(addr, {})
+            indices = sorted(idx for opcode in opcodes for idx in by_opcode.get(opcode, []))
+            if indices:
+                result[addr] = indices
+        return result
+
+    # ------------------------- 持久化 -------------------------
+    def to_dict(self) -> Dict:
+        return {
+            "tx_hash": self.tx_hash,
+            "block_index": self.block_index,
+            "step_index": self.step_index,
+            "cfg_blocks": self.cfg_blocks,
+        }
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> "OpcodeIndex":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data.get("tx_hash", ""))
+        index.block_index = data.get("block_index", {})
+        index.step_index = data.get("step_index", {})
+        index.cfg_blocks = data.get("cfg_blocks", {})
+        return index
+
+    @classmethod
+    def from_result_dir(cls, result_dir: str) -> "OpcodeIndex":
+        """为旧的结果目录（只有 blocks.json / trace.json）补建索引"""
+        index = cls()
+        blocks = load_result_blocks(result_dir)
+        if blocks:
+            index.add_blocks(blocks)
+        trace_path = os.path.join(result_dir, "trace.json")
+        if os.path.exists(trace_path):
+            trace = load_trace(trace_path)
+            index.add_trace(trace)
+            if blocks:
+                index.add_contract_cfgs(_rebuild_contract_cfgs(blocks, trace))
+        return index
+
+    def __repr__(self) -> str:
+        return (f"OpcodeIndex(tx_hash={self.tx_hash}, contracts={len(self.block_index)}, "
+                f"traced_contracts={len(self.step_index)})")
+
+
+def _rebuild_contract_cfgs(blocks: List[Block], trace: StandardizedTrace) -> Dict[str, CFG]:
+    """按 main.py 第6步的方式重建每个合约的动态CFG（仅用于补建旧结果的索引）"""
+    from cfg_contract import ContractCFGConnector
+
+    blocks_by_address: Dict[str, List[Block]] = {}
+    for block in blocks:
+        blocks_by_address.setdefault(block.address, []).append(block)
+    steps_by_address: Dict[str, list] = {}
+    for step in trace["steps"]:
+        steps_by_address.setdefault(step["address"], []).append(step)
+
+    contract_cfgs = {}
+    for addr, contract_steps in steps_by_address.items():
+        if addr in blocks_by_address:
+            try:
+                contract_cfgs[addr] = ContractCFGConnector(blocks_by_address[addr]).connect_contract_cfg(contract_steps)
+            except RuntimeError:
+                continue
+    return contract_cfgs
+
+
+def build_opcode_index(all_blocks: List[Block], trace: Optional[StandardizedTrace] = None,
+                       contract_cfgs: Optional[Dict[str, CFG]] = None) -> OpcodeIndex:
+    """在CFG构建阶段一次性生成索引"""
+    index = OpcodeIndex(trace["tx_hash"] if trace else "")
+    index.add_blocks(all_blocks)
+    if trace is not None:
+        index.add_trace(trace)
+    if contract_cfgs is not None:
+        index.add_contract_cfgs(contract_cfgs)
+    return index
+
+
+def load_or_build_index(result_dir: str) -> OpcodeIndex:
+    """优先读取已保存的索引，不存在时根据结果目录现建并保存"""
+    index_path = os.path.join(result_dir, INDEX_FILE_NAME)
+    if os.path.exists(index_path):
+        return OpcodeIndex.load(index_path)
+    index = OpcodeIndex.from_result_dir(result_dir)
+    index.save(index_path)
+    return index
+
+
+if __name__ == "__main__":
+    # 为 Result/ 下所有缺少索引的交易目录补建索引
+    for tx_dir in sorted(os.listdir("Result")):
+        result_dir = os.path.join("Result", tx_dir)
+        if os.path.isdir(result_dir) and not os.path.exists(os.path.join(result_dir, INDEX_FILE_NAME)):
+            index = load_or_build_index(result_dir)
+            print(f"已为 {result_dir} 建立索引: {index}")
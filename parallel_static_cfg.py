@@ -0,0 +1,131 @@
+# parallel_static_cfg.py 负责在多个进程中并行构建静态完整CFG（main.py 第7步）；
+# 每份不同的代码只构建一次：基本块放在共享内存中（shared_block_store.py），任务只传递描述符和字节码字符串，
+# 不需要序列化 Block 对象；worker 只返回节点的 start_pc 列表和边的 (源, 目标, 类型, 编号)，
+# 由主进程按原顺序用自己的基本块重新组装，输出与串行构建完全一致。
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple, Optional, Set
+from basic_block import Block
+from cfg_structure import CFG, BlockNode, Edge
+from cfg_static_complete import StaticCompleteCFGBuilder
+from evm_information import ContractBytecode
+from proxy_detection import code_key
+from cfg_incremental import SnapshotCache, build_static_cfg_incremental
+
+# worker 返回的图结构：(tx_hash, 节点start_pc列表, [(源start_pc, 目标start_pc, 边类型, 边编号)], 下一个边编号, 函数选择器)
+CFGShape = Tuple[str, List[str], List[Tuple[str, str, str, int]], int, List[str]]
+
+
+def _build(address: str, bytecode: str, blocks: List[Block], executed_pcs: Optional[Set[str]],
+           snapshot_dir: Optional[str] = None) -> Tuple[CFG, List[str]]:
+    """
+    构建单个合约的静态CFG；给出 executed_pcs 时只构建其中执行过的函数（识别不到分发表时构建整图）；
+    给出 snapshot_dir 时整图构建复用该地址上一版的快照（见 cfg_incremental.py）。
+    """
+    builder = StaticCompleteCFGBuilder(bytecode, blocks)
+    selectors: List[str] = []
+    if executed_pcs is not None:
+        selectors = [s for s, entry_pc in builder.detect_dispatcher().items() if entry_pc in executed_pcs]
+    if selectors:
+        return builder.build_function_cfg(selectors, include_dispatcher=True), selectors
+    if snapshot_dir:
+        cfg, report = build_static_cfg_incremental(builder, SnapshotCache(snapshot_dir))
+        if report is not None:
+            print(f"合约 {address[:8]}... 增量重建：复用 {report['reused']} 个块，重新解析 {report['recomputed']} 个块")
+        return cfg, selectors
+    return builder.build_static_cfg(), selectors
+
+
+def static_cfg_shape(cfg: CFG, selectors: List[str]) -> CFGShape:
+    """只含 start_pc 的图结构：在进程间传递，或给代码相同的其他地址复用"""
+    edges = [(e.source.start_pc, e.target.start_pc, e.edge_type, e.edge_id) for e in cfg.edges]
+    return cfg.tx_hash, [node.start_pc for node in cfg.nodes], edges, cfg._next_edge_id, selectors
+
+
+def _static_cfg_worker(job: Tuple[Dict, Optional[str], str, str, Optional[Set[str]]]) -> CFGShape:
+    """worker 进程：从共享内存读取基本块并建图，只返回图结构"""
+    from shared_block_store import attached_store
+    descriptor, snapshot_dir, address, bytecode, executed_pcs = job
+    blocks = attached_store(descriptor).contract_blocks(address)
+    cfg, selectors = _build(address, bytecode, blocks, executed_pcs, snapshot_dir)
+    return static_cfg_shape(cfg, selectors)
+
+
+def assemble_static_cfg(shape: CFGShape, worker_address: str, address: str, blocks: List[Block]) -> Tuple[CFG, List[str]]:
+    """用 address 的基本块按图结构重建CFG（worker_address 为构建该结构时使用的地址）"""
+    tx_hash, node_pcs, edges, next_edge_id, selectors = shape
+    block_by_pc = {block.start_pc: block for block in blocks}
+    nodes: Dict[str, BlockNode] = {}
+
+    def node_for(start_pc: str) -> BlockNode:
+        node = nodes.get(start_pc)
+        if node is None:
+            node = nodes[start_pc] = BlockNode(block_by_pc[start_pc])
+        return node
+
+    cfg = CFG(tx_hash=tx_hash.replace(worker_address, address))
+    cfg.nodes = [node_for(pc) for pc in node_pcs]  # 节点已按串行构建的顺序去重
+    # 边可能引用已被 remove_unreachable_instruction_blocks 移除的节点，与串行结果保持一致
+    cfg.edges = [Edge(edge_id=edge_id, source=node_for(src), target=node_for(dst), edge_type=edge_type)
+                 for src, dst, edge_type, edge_id in edges]
+    cfg._next_edge_id = next_edge_id
+    return cfg, selectors
+
+
+def build_static_cfgs(contracts: List[ContractBytecode], all_blocks: List[Block], workers: int = 1,
+                      executed_pcs: Optional[Dict[str, Set[str]]] = None,
+                      snapshot_dir: Optional[str] = None) -> Dict[str, Tuple[CFG, List[str]]]:
+    """
+    为每个合约构建静态完整CFG。
+
+    Args:
+        contracts: 合约字节码列表（结果按该顺序返回）。
+        all_blocks: 主进程的基本块。
+        workers: 进程数；1 表示在当前进程串行构建，0 表示使用全部CPU。
+        executed_pcs: 地址 -> 该合约执行过的PC；给出时只构建执行过的函数。
+        snapshot_dir: 静态CFG快照目录；给出时按地址增量重建（合约升级后只重新解析变化的块）。
+
+    Returns:
+        地址 -> (CFG, 只构建了部分函数时的函数选择器)；没有基本块的合约不在结果中。
+    """
+    blocks_by_address: Dict[str, List[Block]] = {}
+    for block in all_blocks:
+        blocks_by_address.setdefault(block.address, []).append(block)
+    targets = [c for c in contracts if blocks_by_address.get(c["address"])]
+
+    # 代码相同的合约（且执行过的函数相同）只构建一次，其余地址按图结构复用（见 proxy_detection.code_key）
+    jobs: Dict[Tuple, Tuple[str, str, Optional[Set[str]]]] = {}
+    job_keys: Dict[str, Tuple] = {}
+    for c in targets:
+        pcs = executed_pcs.get(c["address"], set()) if executed_pcs is not None else None
+        key = (code_key(c["bytecode"]), frozenset(pcs) if pcs is not None else None)
+        job_keys[c["address"]] = key
+        jobs.setdefault(key, (c["address"], c["bytecode"], pcs))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        results: Dict[str, Tuple[CFG, List[str]]] = {}
+        built: Dict[Tuple, CFGShape] = {}
+        for c in targets:
+            address, key = c["address"], job_keys[c["address"]]
+            if key in built:
+                results[address] = assemble_static_cfg(built[key], jobs[key][0], address, blocks_by_address[address])
+            else:
+                cfg, selectors = _build(address, c["bytecode"], blocks_by_address[address], jobs[key][2], snapshot_dir)
+                results[address] = (cfg, selectors)
+                built[key] = static_cfg_shape(cfg, selectors)
+        return results
+
+    from shared_block_store import SharedBlockStore  # 只有并行构建时才需要 NumPy
+    job_list = list(jobs.items())
+    with SharedBlockStore.create([b for _, job in job_list for b in blocks_by_address[job[0]]]) as store:
+        with ProcessPoolExecutor(max_workers=min(workers, len(job_list))) as executor:
+            results = executor.map(_static_cfg_worker, ((store.descriptor, snapshot_dir) + job for _, job in job_list))
+            shapes = dict(zip((key for key, _ in job_list), results))
+
+    return {
+        c["address"]: assemble_static_cfg(shapes[job_keys[c["address"]]], jobs[job_keys[c["address"]]][0],
+                                c["address"], blocks_by_address[c["address"]])
+        for c in targets
+    }
@@ -0,0 +1,161 @@
+# proxy_detection.py 负责识别代理合约和代码相同的克隆合约；
+# - EIP-1167 最小代理：固定的字节码模板，只有内嵌的实现地址不同，块结构和跳转完全一致；
+# - EIP-1967 / EIP-1822 / Beacon 代理：字节码中包含标准存储槽常量，实现地址从trace中的 DELEGATECALL 目标得到；
+# - 代码相同的合约（例如同一工厂部署的交易对）按字节码的 sha256 归为一组。
+# 分块与静态CFG按 code_key 只计算一次，其余地址复用结果；对应关系保存为 code_map.json。
+# code_key 是所有按代码归组的数据（语料库索引、相似度索引、覆盖统计、结果库）共用的代码标识。
+
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Iterable
+from evm_information import StandardizedTrace, ContractBytecode
+
+CODE_MAP_FILE_NAME = "code_map.json"
+
+# EIP-1167：363d3d373d3d3d363d + PUSH1..PUSH20 <实现地址> + 5af43d82803e903d91602b57fd5bf3
+# （地址有前导零字节时，部分部署工具用更短的PUSH）
+_EIP1167_PATTERN = re.compile(
+    r"^363d3d373d3d3d363d(6[0-9a-f]|7[0-3])([0-9a-f]*)5af43d82803e903d91602b57fd5bf3$"
+)
+
+# 标准存储槽（以 PUSH32 常量的形式出现在代理合约的字节码中）
+PROXY_SLOTS = {
+    # bytes32(uint256(keccak256("eip1967.proxy.implementation")) - 1)
+    "eip1967": "360894a13ba1a3210667c828492db98dca3e2076cc3735a920a3ca505d382bbc",
+    # bytes32(uint256(keccak256("eip1967.proxy.beacon")) - 1)
+    "eip1967_beacon": "a3f0ad74e5423aebfd80d3ef4346578335a9a72aeaee59ff6cb3582b35133d50",
+    # keccak256("PROXIABLE")
+    "eip1822": "c5f16f0fcc639fa48a6947836d9850f504798523bf8c9a3a87d5876cf622bcf7",
+}
+
+
+@dataclass
+class ProxyInfo:
+    """代理合约信息"""
+    kind: str                              # eip1167 / eip1967 / eip1967_beacon / eip1822
+    implementation: Optional[str] = None   # 实现合约地址（EIP-1167 取自字节码，其余取自trace）
+
+
+def code_hash(bytecode: str) -> str:
+    """字节码的 sha256（十六进制）"""
+    return hashlib.sha256(bytes.fromhex(bytecode[2:] if bytecode.startswith("0x") else bytecode)).hexdigest()
+
+
+def _eip1167_match(bytecode: str) -> Optional[re.Match]:
+    match = _EIP1167_PATTERN.match(bytecode[2:].lower() if bytecode.startswith("0x") else bytecode.lower())
+    if match and len(match.group(2)) == 2 * (int(match.group(1), 16) - 0x5f):
+        return match
+    return None
+
+
+def detect_proxy(bytecode: str) -> Optional[ProxyInfo]:
+    """识别代理合约；不是代理时返回 None"""
+    if not bytecode or bytecode == "0x":
+        return None
+    match = _eip1167_match(bytecode)
+    if match:
+        return ProxyInfo(kind="eip1167", implementation="0x" + match.group(2).rjust(40, "0"))
+    code = bytecode.lower()
+    for kind, slot in PROXY_SLOTS.items():
+        if "7f" + slot in code:  # PUSH32 <slot>
+            return ProxyInfo(kind=kind)
+    return None
+
+
+def code_key(bytecode: str) -> str:
+    """
+    分块/静态CFG的复用键：代码相同的合约键相同；
+    所有 EIP-1167 最小代理（只有内嵌地址不同）共用一个键。
+    """
+    match = _eip1167_match(bytecode)
+    if match:
+        return f"eip1167:{len(match.group(2)) // 2}"
+    return code_hash(bytecode)
+
+
+def blocks_code_key(blocks: Iterable["Block"]) -> str:
+    """
+    没有字节码时（旧结果目录只有 blocks.json，没有 code_map.json）的代码标识：
+    基本块内容（不含地址和PUSH操作数）的 sha256，带 "blocks:" 前缀，不会与 code_key 混淆。
+    blocks 为 basic_block.Block（basic_block 导入了本模块，这里不反向导入）
+    """
+    digest = hashlib.sha256()
+    for block in blocks:
+        digest.update(f"{block.start_pc}|{block.end_pc}|{block.terminator}|".encode())
+        digest.update(" ".join(opcode for _, opcode in block.instructions).encode())
+        digest.update(b"\n")
+    return "blocks:" + digest.hexdigest()
+
+
+def _word_to_address(item: str) -> str:
+    """栈元素转换为40位十六进制地址"""
+    value = item[2:] if item.startswith("0x") else item
+    return "0x" + (value.lstrip("0") or "0").rjust(40, "0")[-40:]
+
+
+def delegate_targets(trace: StandardizedTrace) -> Dict[str, List[str]]:
+    """trace中每个地址发起 DELEGATECALL 的目标地址（按首次出现的顺序）"""
+    targets: Dict[str, List[str]] = {}
+    for step in trace["steps"]:
+        if step["opcode"] == "DELEGATECALL" and len(step["stack"]) >= 2:
+            target = _word_to_address(step["stack"][-2])
+            caller_targets = targets.setdefault(step["address"], [])
+            if target not in caller_targets:
+                caller_targets.append(target)
+    return targets
+
+
+def build_code_map(contracts: List[ContractBytecode], trace: Optional[StandardizedTrace] = None) -> Dict:
+    """
+    生成合约 -> 代码的对应关系：
+    {
+      "contracts": {地址: {"code_hash", "code_key", "size", "proxy", "implementation", "same_code_as"}},
+      "codes": {code_key: [地址, ...]}
+    }
+    same_code_as 为同组中第一个地址（分块和静态CFG实际计算的那个），自身即为首个地址时为 None。
+    """
+    delegates = delegate_targets(trace) if trace is not None else {}
+    contract_map: Dict[str, Dict] = {}
+    codes: Dict[str, List[str]] = {}
+    for contract in contracts:
+        address, bytecode = contract["address"], contract["bytecode"]
+        key = code_key(bytecode)
+        group = codes.setdefault(key, [])
+        proxy = detect_proxy(bytecode)
+        implementation = proxy.implementation if proxy else None
+        if proxy and implementation is None and delegates.get(address):
+            implementation = delegates[address][0]
+        contract_map[address] = {
+            "code_hash": code_hash(bytecode),
+            "code_key": key,
+            "size": len(bytecode) // 2 - 1,
+            "proxy": proxy.kind if proxy else None,
+            "implementation": implementation,
+            "same_code_as": group[0] if group else None,
+        }
+        group.append(address)
+    return {"contracts": contract_map, "codes": codes}
+
+
+def summarize_code_map(code_map: Dict) -> str:
+    contracts = code_map["contracts"].values()
+    proxies = sum(1 for info in contracts if info["proxy"])
+    shared = sum(1 for info in contracts if info["same_code_as"])
+    return f"{len(code_map['contracts'])} 个合约，{len(code_map['codes'])} 份不同代码，{proxies} 个代理合约，{shared} 个复用已有分析"
+
+
+def save_code_map(code_map: Dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(code_map, f, indent=2)
+
+
+def load_code_keys(result_dir: str) -> Dict[str, str]:
+    """结果目录中 code_map.json 记录的 地址 -> code_key；没有 code_map.json 时为空"""
+    path = os.path.join(result_dir, CODE_MAP_FILE_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {address: info["code_key"] for address, info in json.load(f)["contracts"].items()}
@@ -0,0 +1,350 @@
+# result_store.py 负责按代码去重保存静态分析结果；
+# 基本块（blocks.json 中的一个合约）和整合约静态CFG的DOT只与字节码有关，按 code_key（proxy_detection.code_key）在 Result_codes/<code_key>/ 下
+# 压缩保存一次（有 zstandard 时用 zstd，否则用 gzip），合约地址以占位符代替，同一份代码的其他地址直接引用；
+# 每笔交易的目录只保存与trace有关的结果和引用清单 artifacts.json。
+# 需要旧的目录结构时按清单还原：python result_store.py materialize Result/<tx>
+# 已有的旧结果目录可以转换：python result_store.py pack Result（校验还原结果与原文件内容一致后才删除原文件，不区分换行符）
+
+import argparse
+import gzip
+import json
+import os
+import sys
+from typing import List, Dict, Tuple, Optional
+from basic_block import Block
+from proxy_detection import blocks_code_key, load_code_keys
+
+DEFAULT_STORE_ROOT = "Result_codes"
+MANIFEST_FILE_NAME = "artifacts.json"
+BLOCKS_ARTIFACT = "blocks.json"
+STATIC_CFG_ARTIFACT = "static_cfg.dot"
+ADDRESS_PLACEHOLDER = "@ADDRESS@"
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_READERS = {".gz": gzip.decompress}
+if zstandard is not None:
+    _READERS[".zst"] = lambda data: zstandard.ZstdDecompressor().decompress(data)
+
+
+def _compress(data: bytes) -> Tuple[str, bytes]:
+    """(扩展名, 压缩后的数据)；mtime 固定为0，相同内容得到相同文件"""
+    if zstandard is not None:
+        return ".zst", zstandard.ZstdCompressor(level=10).compress(data)
+    return ".gz", gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _short_address(address: str) -> str:
+    """与 main.py 中DOT文件名的地址部分相同"""
+    return address.lstrip('0x')[:8]
+
+
+def _dot_label_prefix(address: str) -> str:
+    """render_static_complete 写入节点标签的合约地址"""
+    return f"合约: {address[:8]}..."
+
+
+def blocks_to_artifact(blocks: List[Block]) -> str:
+    """一个合约的基本块（不含地址），格式与 blocks.json 中的条目相同"""
+    return json.dumps([{
+        "start_pc": block.start_pc,
+        "end_pc": block.end_pc,
+        "terminator": block.terminator,
+        "instructions": block.instructions,
+    } for block in blocks])
+
+
+def _blocks_from_artifact(text: str, address: str) -> List[Dict]:
+    return [{"address": address, **item} for item in json.loads(text)]
+
+
+def dot_to_artifact(dot: str, address: str) -> str:
+    return dot.replace(_dot_label_prefix(address), _dot_label_prefix(ADDRESS_PLACEHOLDER))
+
+
+def dot_from_artifact(text: str, address: str) -> str:
+    return text.replace(_dot_label_prefix(ADDRESS_PLACEHOLDER), _dot_label_prefix(address))
+
+
+class ResultStore:
+    """按 code_key 保存的静态结果：<root>/<code_key>/<名称>.gz|.zst"""
+    def __init__(self, root: str = DEFAULT_STORE_ROOT):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _base_path(self, code_key: str, name: str) -> str:
+        return os.path.join(self.root, code_key.replace(":", "_"), name)
+
+    def _existing(self, code_key: str, name: str) -> Optional[str]:
+        base = self._base_path(code_key, name)
+        for ext in _READERS:
+            if os.path.exists(base + ext):
+                return base + ext
+        return None
+
+    def has(self, code_key: str, name: str) -> bool:
+        return self._existing(code_key, name) is not None
+
+    def put(self, code_key: str, name: str, text: str) -> bool:
+        """保存一份结果；已存在时不重复写入，返回是否新写入"""
+        if self.has(code_key, name):
+            return False
+        ext, data = _compress(text.encode("utf-8"))
+        path = self._base_path(code_key, name) + ext
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # 多个进程同时写同一份代码时结果相同，后写的直接覆盖
+        return True
+
+    def get(self, code_key: str, name: str) -> str:
+        path = self._existing(code_key, name)
+        if path is None:
+            raise FileNotFoundError(f"结果库中没有 {code_key}/{name}")
+        with open(path, "rb") as f:
+            return _READERS[os.path.splitext(path)[1]](f.read()).decode("utf-8")
+
+    def output_path(self, code_key: str, name: str) -> str:
+        """不压缩的派生文件（例如渲染出的SVG）在结果库中的路径"""
+        path = self._base_path(code_key, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def put_blocks(self, code_key: str, blocks: List[Block]) -> bool:
+        return self.put(code_key, BLOCKS_ARTIFACT, blocks_to_artifact(blocks))
+
+    def put_static_dot(self, code_key: str, dot: str, address: str) -> bool:
+        return self.put(code_key, STATIC_CFG_ARTIFACT, dot_to_artifact(dot, address))
+
+    def nbytes(self) -> int:
+        return sum(os.path.getsize(os.path.join(dirpath, name))
+                   for dirpath, _, names in os.walk(self.root) for name in names)
+
+    def __repr__(self) -> str:
+        codes = sum(1 for entry in os.scandir(self.root) if entry.is_dir())
+        return f"ResultStore(root={self.root}, codes={codes}, bytes={self.nbytes()})"
+
+
+# ------------------------- 交易目录的引用清单 -------------------------
+def new_manifest(result_dir: str, store: ResultStore) -> Dict:
+    """
+    清单格式：
+    {"store": 结果库相对交易目录的路径,
+     "contracts": [{"address", "code_key", "static_cfg"}, ...]}   # 按 blocks.json 中的合约顺序
+    """
+    return {"store": os.path.relpath(store.root, result_dir), "contracts": []}
+
+
+def save_manifest(manifest: Dict, result_dir: str) -> None:
+    with open(os.path.join(result_dir, MANIFEST_FILE_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_manifest(result_dir: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(result_dir, MANIFEST_FILE_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _manifest_store(result_dir: str, manifest: Dict) -> ResultStore:
+    return ResultStore(os.path.normpath(os.path.join(result_dir, manifest["store"])))
+
+
+def load_result_blocks(result_dir: str) -> List[Block]:
+    """交易目录的基本块：有 blocks.json 时直接读取，否则按清单从结果库还原"""
+    blocks_path = os.path.join(result_dir, "blocks.json")
+    if os.path.exists(blocks_path):
+        with open(blocks_path, encoding="utf-8") as f:
+            blocks_data = json.load(f)
+    else:
+        manifest = load_manifest(result_dir)
+        if manifest is None:
+            return []
+        blocks_data = _manifest_blocks_data(result_dir, manifest)
+    blocks = []
+    for item in blocks_data:
+        block = Block(start_pc=item["start_pc"], address=item["address"])
+        block.end_pc = item["end_pc"]
+        block.terminator = item["terminator"]
+        block.instructions = [tuple(instr) for instr in item["instructions"]]
+        blocks.append(block)
+    return blocks
+
+
+def result_code_keys(result_dir: str, blocks: Optional[List[Block]] = None) -> Dict[str, str]:
+    """
+    交易目录中各合约的 地址 -> code_key：取自 code_map.json 或 artifacts.json；
+    两者都没有的旧目录按基本块内容生成（proxy_detection.blocks_code_key）。
+    blocks 为该目录的基本块（已经读取时传入，避免重复读取）。
+    """
+    keys: Dict[str, str] = {}
+    manifest = load_manifest(result_dir)
+    if manifest is not None:
+        keys.update((entry["address"], entry["code_key"]) for entry in manifest["contracts"])
+    keys.update(load_code_keys(result_dir))
+    by_address: Dict[str, List[Block]] = {}
+    for block in load_result_blocks(result_dir) if blocks is None else blocks:
+        if block.address not in keys:
+            by_address.setdefault(block.address, []).append(block)
+    keys.update((address, blocks_code_key(contract_blocks)) for address, contract_blocks in by_address.items())
+    return keys
+
+
+def _manifest_blocks_data(result_dir: str, manifest: Dict) -> List[Dict]:
+    store = _manifest_store(result_dir, manifest)
+    blocks_data: List[Dict] = []
+    for entry in manifest["contracts"]:
+        blocks_data.extend(_blocks_from_artifact(store.get(entry["code_key"], BLOCKS_ARTIFACT), entry["address"]))
+    return blocks_data
+
+
+def result_static_dots(result_dir: str) -> List[Tuple[str, str]]:
+    """交易目录中所有整合约静态CFG的 [(短地址, DOT文本)]，包括结果库中引用的"""
+    dots: Dict[str, str] = {}
+    for name in sorted(os.listdir(result_dir)):
+        if name.startswith("contract_") and name.endswith("_static_cfg.dot"):
+            with open(os.path.join(result_dir, name), encoding="utf-8") as f:
+                dots[name[len("contract_"):-len("_static_cfg.dot")]] = f.read()
+    manifest = load_manifest(result_dir)
+    if manifest is not None:
+        store = _manifest_store(result_dir, manifest)
+        for entry in manifest["contracts"]:
+            short_addr = _short_address(entry["address"])
+            if entry["static_cfg"] and short_addr not in dots:
+                dots[short_addr] = dot_from_artifact(store.get(entry["code_key"], STATIC_CFG_ARTIFACT), entry["address"])
+    return sorted(dots.items())
+
+
+def read_static_cfg_dot(path: str) -> str:
+    """
+    读取 Result/<tx>/contract_<addr>_static_cfg.dot：文件不存在时（结果库模式）按该目录的清单从结果库还原，
+    使按旧目录结构给出的路径在两种模式下都可用
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        name = os.path.basename(path)
+        if not (name.startswith("contract_") and name.endswith("_static_cfg.dot")):
+            raise
+        short_addr = name[len("contract_"):-len("_static_cfg.dot")]
+        dots = dict(result_static_dots(os.path.dirname(path) or "."))
+        if short_addr not in dots:
+            raise
+        return dots[short_addr]
+
+
+def stored_static_cfg_paths(result_dir: str) -> List[str]:
+    """只保存在结果库中的静态CFG按旧目录结构对应的路径（可用 read_static_cfg_dot 读取）"""
+    manifest = load_manifest(result_dir)
+    if manifest is None:
+        return []
+    paths = []
+    for entry in manifest["contracts"]:
+        path = os.path.join(result_dir, f"contract_{_short_address(entry['address'])}_static_cfg.dot")
+        if entry["static_cfg"] and not os.path.exists(path):
+            paths.append(path)
+    return paths
+
+
+def materialize(result_dir: str) -> List[str]:
+    """按清单还原 blocks.json 和 contract_<addr>_static_cfg.dot（已存在的文件不覆盖），返回写入的文件"""
+    manifest = load_manifest(result_dir)
+    if manifest is None:
+        return []
+    written: List[str] = []
+    blocks_path = os.path.join(result_dir, "blocks.json")
+    if not os.path.exists(blocks_path):
+        with open(blocks_path, "w") as f:
+            json.dump(_manifest_blocks_data(result_dir, manifest), f, indent=2)
+        written.append(blocks_path)
+    store = _manifest_store(result_dir, manifest)
+    for entry in manifest["contracts"]:
+        dot_path = os.path.join(result_dir, f"contract_{_short_address(entry['address'])}_static_cfg.dot")
+        if entry["static_cfg"] and not os.path.exists(dot_path):
+            with open(dot_path, "w", encoding="utf-8") as f:
+                f.write(dot_from_artifact(store.get(entry["code_key"], STATIC_CFG_ARTIFACT), entry["address"]))
+            written.append(dot_path)
+    return written
+
+
+def pack(result_dir: str, store: ResultStore) -> int:
+    """
+    把旧目录结构的 blocks.json / 静态DOT 移入结果库，返回节省的字节数。
+    按 result_code_keys 的 code_key 归组（没有 code_map.json 的旧目录按基本块内容）；
+    只有按清单还原后与原文件内容相同（不区分换行符）的文件才会被删除；同一代码的静态DOT不同时保留原文件。
+    """
+    blocks_path = os.path.join(result_dir, "blocks.json")
+    if not os.path.exists(blocks_path) or load_manifest(result_dir) is not None:
+        return 0
+    with open(blocks_path, encoding="utf-8") as f:
+        original_blocks = f.read()
+    blocks = load_result_blocks(result_dir)
+    code_keys = result_code_keys(result_dir, blocks)
+    by_address: Dict[str, List[Block]] = {}
+    for block in blocks:
+        by_address.setdefault(block.address, []).append(block)
+    manifest = new_manifest(result_dir, store)
+    removable: List[str] = []
+    for address, blocks in by_address.items():
+        artifact = blocks_to_artifact(blocks)
+        key = code_keys[address]
+        store.put(key, BLOCKS_ARTIFACT, artifact)
+        entry = {"address": address, "code_key": key, "static_cfg": False}
+        dot_path = os.path.join(result_dir, f"contract_{_short_address(address)}_static_cfg.dot")
+        if os.path.exists(dot_path):
+            with open(dot_path, encoding="utf-8") as f:
+                dot = f.read()
+            store.put_static_dot(key, dot, address)
+            if dot_from_artifact(store.get(key, STATIC_CFG_ARTIFACT), address) == dot:
+                entry["static_cfg"] = True
+                removable.append(dot_path)
+        manifest["contracts"].append(entry)
+
+    if json.dumps(_manifest_blocks_data(result_dir, manifest), indent=2) == original_blocks:
+        removable.append(blocks_path)
+    else:
+        return 0
+    save_manifest(manifest, result_dir)
+    saved = 0
+    for path in removable:
+        saved += os.path.getsize(path)
+        os.remove(path)
+    return saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按代码去重的结果库")
+    sub = parser.add_subparsers(dest="command", required=True)
+    materialize_parser = sub.add_parser("materialize", help="按清单还原 blocks.json 与静态CFG DOT文件")
+    materialize_parser.add_argument("result_dirs", nargs="+")
+    pack_parser = sub.add_parser("pack", help="把旧结果目录中的静态结果移入结果库")
+    pack_parser.add_argument("root", nargs="?", default="Result")
+    pack_parser.add_argument("--store", default=DEFAULT_STORE_ROOT, help="结果库目录")
+    args = parser.parse_args()
+
+    if args.command == "materialize":
+        for result_dir in args.result_dirs:
+            if load_manifest(result_dir) is None:
+                print(f"{result_dir} 没有 {MANIFEST_FILE_NAME}，跳过", file=sys.stderr)
+                continue
+            for path in materialize(result_dir):
+                print(f"已还原: {path}")
+    else:
+        store = ResultStore(args.store)
+        saved = 0
+        for name in sorted(os.listdir(args.root)):
+            result_dir = os.path.join(args.root, name)
+            if os.path.isdir(result_dir):
+                saved += pack(result_dir, store)
+        print(f"删除了 {saved} 字节的重复结果，{store}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# rpc_cache.py 负责RPC响应的录制与回放；
+# RPCStore 把 debug_traceTransaction / eth_getTransactionByHash / eth_getCode 等响应以gzip压缩保存到本地目录；
+# CachingProvider 是一个web3 provider，可在 record / replay / auto 三种模式下工作，
+# 使对已经处理过的交易重新运行时不再访问节点（离线、仅受CPU限制）。
+# 同一个存储目录也可以由 rpc_replay_server.py 以JSON-RPC服务的形式提供。
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, Union
+from web3 import Web3
+from web3.providers.base import BaseProvider, JSONBaseProvider
+
+# 结果可复用的RPC方法（其余方法在回放模式下无法应答）
+CACHEABLE_METHODS = {
+    "eth_chainId",
+    "eth_getTransactionByHash",
+    "eth_getBlockByNumber",
+    "eth_getBlockByHash",
+    "eth_getCode",
+    "eth_getStorageAt",
+    "debug_traceTransaction",
+    "debug_traceBlockByNumber",
+    "debug_traceBlockByHash",
+}
+
+# 按区块号请求时，这些标签指向的区块会随链增长而变化，结果不能缓存
+BLOCK_TAGS = {"latest", "pending", "safe", "finalized"}
+
+
+def is_cacheable(method: str, params: Any) -> bool:
+    if method not in CACHEABLE_METHODS:
+        return False
+    if method in {"eth_getBlockByNumber", "debug_traceBlockByNumber"} and params:
+        return str(params[0]) not in BLOCK_TAGS
+    return True
+
+MODES = {"record", "replay", "auto"}
+
+
+class RecordNotFoundError(KeyError):
+    """回放模式下请求的响应未被录制"""
+
+
+class RPCStore:
+    """
+    压缩的本地RPC响应存储：<root>/<method>/<sha256(method+params)>.json.gz
+    每个文件只保存 result 字段；一个请求一个文件，便于增量录制和并发读取。
+    """
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def request_key(method: str, params: Any) -> str:
+        payload = json.dumps([method, params], sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, method: str, params: Any) -> str:
+        return os.path.join(self.root, method, f"{self.request_key(method, params)}.json.gz")
+
+    def contains(self, method: str, params: Any) -> bool:
+        return os.path.exists(self._path(method, params))
+
+    def get(self, method: str, params: Any) -> Any:
+        path = self._path(method, params)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return json.load(f)["result"]
+        except FileNotFoundError:
+            raise RecordNotFoundError(f"未录制的RPC请求: {method} {params}")
+
+    def put(self, method: str, params: Any, result: Any) -> None:
+        path = self._path(method, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump({"method": method, "params": params, "result": result}, f, default=str)
+        with self._lock:
+            os.replace(tmp_path, path)  # 原子替换，避免读到写了一半的文件
+
+
+class CachingProvider(JSONBaseProvider):
+    """
+    带录制/回放功能的provider：
+    - record: 总是请求上游节点，并把可缓存方法的结果写入存储
+    - replay: 只从存储读取，未录制的请求抛出 RecordNotFoundError
+    - auto:   存储命中则直接返回，否则请求上游并录制
+    """
+    def __init__(self, upstream: Union[str, BaseProvider, None], store_dir: str, mode: str = "auto"):
+        super().__init__()
+        if mode not in MODES:
+            raise ValueError(f"未知的RPC缓存模式: {mode}（可选: {sorted(MODES)}）")
+        self.mode = mode
+        self.store = RPCStore(store_dir)
+        # 上游可以是节点URL，也可以是provider（例如 rpc_pool.EndpointPool）
+        if isinstance(upstream, str):
+            upstream = Web3.HTTPProvider(upstream)
+        self.upstream = upstream if upstream is not None and mode != "replay" else None
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+        self._lock = threading.Lock()  # 守护进程和连接池会在多个线程中并发调用 make_request
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _response(self, result: Any) -> Dict:
+        return {"jsonrpc": "2.0", "id": next(self.request_counter), "result": result}
+
+    def make_request(self, method, params):
+        method = str(method)
+        # 按web3发往节点的JSON编码参数，保证与 rpc_replay_server.py 收到的参数一致
+        plain_params = json.loads(self.encode_rpc_request(method, params))["params"]
+        cacheable = is_cacheable(method, plain_params)
+
+        if cacheable and self.mode != "record" and self.store.contains(method, plain_params):
+            self._count("hits")
+            return self._response(self.store.get(method, plain_params))
+
+        self._count("misses")
+        if self.upstream is None:
+            if method == "web3_clientVersion":
+                return self._response("evm-cfg-py/replay")
+            raise RecordNotFoundError(f"回放模式下未录制的RPC请求: {method} {plain_params}")
+
+        response = self.upstream.make_request(method, params)
+        if cacheable and "error" not in response and response.get("result") is not None:
+            self.store.put(method, plain_params, response["result"])
+            self._count("recorded")
+        return response
@@ -0,0 +1,285 @@
+# rpc_pool.py 负责把RPC请求分散到多个节点；
+# EndpointPool 是一个web3 provider，每个端点有：并发上限（信号量）、令牌桶限速、按RPC方法统计的EWMA延迟、熔断状态；
+# 每个请求选择预计最快完成的端点（EWMA延迟 × 当前负载 + 限速等待），连接失败/超时/HTTP错误或节点无法应答
+# （例如已裁剪的状态）时换下一个端点重试；连续失败的端点暂停一段时间（每次熔断时间翻倍），之后再试一次；
+# 因为慢而长时间没有被选中的端点会被定期探测一次，恢复后重新分到请求。
+# TraceFormatter 传入多个节点URL（列表或逗号分隔）时自动使用。
+# 用法：python rpc_pool.py http://node-a:8545 http://node-b:8545 --tx 0x... --repeat 20
+
+import argparse
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+import requests
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 60.0
+# 连续失败该次数后熔断
+FAILURE_THRESHOLD = 3
+# 首次熔断的暂停时间（秒），之后每次翻倍，最多 MAX_COOLDOWN
+COOLDOWN = 5.0
+MAX_COOLDOWN = 300.0
+# EWMA 平滑系数（新样本的权重）
+EWMA_ALPHA = 0.3
+# 端点超过该时间未被选中时探测一次（刷新它的延迟）
+PROBE_INTERVAL = 30.0
+# 某方法的延迟超过所有端点中最快者的该倍数时，统计中标记为 slow
+SLOW_FACTOR = 3.0
+# 换一个节点可能成功的JSON-RPC错误（节点缺少历史状态、被限流等）
+RETRYABLE_ERRORS = (
+    "missing trie node",
+    "header not found",
+    "historical state",
+    "rate limit",
+    "too many requests",
+    "request timed out",
+)
+
+
+class TokenBucket:
+    """令牌桶：平均每秒 rate 个请求，最多累积 burst 个；rate 为 None 时不限速"""
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = float(burst or max(1.0, rate or 1.0))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """现在取令牌需要等待的秒数"""
+        if self.rate is None:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def acquire(self) -> float:
+        """取一个令牌，必要时等待；返回等待的秒数"""
+        if self.rate is None:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1  # 令牌可以为负：预订之后生成的令牌，等待到它生成为止
+            wait = max(0.0, -self.tokens / self.rate)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class Endpoint:
+    """单个节点：HTTPProvider（不在内部重试，由连接池换节点）、并发上限、令牌桶、延迟与健康状态"""
+    def __init__(self, url: str, max_concurrency: int = DEFAULT_CONCURRENCY, rate: Optional[float] = None,
+                 burst: Optional[float] = None, timeout: float = DEFAULT_TIMEOUT):
+        self.url = url
+        self.provider = Web3.HTTPProvider(url, request_kwargs={"timeout": timeout},
+                                          exception_retry_configuration=None)
+        self.max_concurrency = max(1, max_concurrency)
+        self.slots = threading.BoundedSemaphore(self.max_concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        # 以下状态由 EndpointPool 在锁内修改
+        self.inflight = 0
+        self.latency: Dict[str, float] = {}  # RPC方法 -> EWMA延迟（秒）
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.last_used = 0.0
+        self.stats = {"calls": 0, "failures": 0, "seconds": 0.0, "max_seconds": 0.0, "rate_limited_seconds": 0.0}
+        self.last_error = ""
+
+    def expected_latency(self, method: str) -> float:
+        if method in self.latency:
+            return self.latency[method]
+        return sum(self.latency.values()) / len(self.latency) if self.latency else 0.0
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.url}, inflight={self.inflight}/{self.max_concurrency})"
+
+
+def _retryable_error(response: Dict) -> bool:
+    error = response.get("error")
+    if not error:
+        return False
+    message = str(error.get("message", error) if isinstance(error, dict) else error).lower()
+    return any(pattern in message for pattern in RETRYABLE_ERRORS)
+
+
+class EndpointPool(JSONBaseProvider):
+    """
+    多节点provider：make_request 选择得分最低（预计最快完成）的端点，在其并发上限和令牌桶内发送请求；
+    失败时依次换其余端点，所有端点都失败时抛出最后一个异常（或返回最后一个错误响应）。
+    """
+    def __init__(self, endpoints: List[Union[str, Endpoint]], max_concurrency: int = DEFAULT_CONCURRENCY,
+                 rate: Optional[float] = None, burst: Optional[float] = None, timeout: float = DEFAULT_TIMEOUT,
+                 failure_threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN):
+        super().__init__()
+        self.endpoints = [e if isinstance(e, Endpoint) else Endpoint(e, max_concurrency, rate, burst, timeout)
+                          for e in endpoints]
+        if not self.endpoints:
+            raise ValueError("至少需要一个RPC端点")
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failovers = 0
+        self._lock = threading.Lock()
+
+    @property
+    def max_concurrency(self) -> int:
+        """所有端点的并发上限之和（调用方并行请求的合理线程数）"""
+        return sum(endpoint.max_concurrency for endpoint in self.endpoints)
+
+    def _score(self, endpoint: Endpoint, method: str, now: float) -> float:
+        if now - endpoint.last_used > PROBE_INTERVAL:
+            return 0.0  # 长时间未被选中（例如因为慢被绕开）的端点探测一次
+        load = 1 + endpoint.inflight / endpoint.max_concurrency
+        return endpoint.expected_latency(method) * load + endpoint.bucket.delay()
+
+    def _choose(self, method: str, tried: Set[Endpoint]) -> Optional[Endpoint]:
+        with self._lock:
+            now = time.monotonic()
+            candidates = [e for e in self.endpoints if e not in tried]
+            if not candidates:
+                return None
+            closed = [e for e in candidates if e.open_until <= now]
+            if closed:
+                endpoint = min(closed, key=lambda e: self._score(e, method, now))
+            else:
+                endpoint = min(candidates, key=lambda e: e.open_until)  # 全部熔断时试最早恢复的一个
+            endpoint.inflight += 1
+            endpoint.last_used = now
+            return endpoint
+
+    def _send(self, endpoint: Endpoint, method: str, params: Any) -> Tuple[Dict, float]:
+        """在端点的并发上限和令牌桶内发送请求，返回 (响应, 耗时)"""
+        with endpoint.slots:
+            waited = endpoint.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                return endpoint.provider.make_request(method, params), time.perf_counter() - start
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    endpoint.inflight -= 1
+                    endpoint.stats["calls"] += 1
+                    endpoint.stats["seconds"] += elapsed
+                    endpoint.stats["max_seconds"] = max(endpoint.stats["max_seconds"], elapsed)
+                    endpoint.stats["rate_limited_seconds"] += waited
+
+    def _record(self, endpoint: Endpoint, method: str, elapsed: float, error: Optional[str]) -> None:
+        with self._lock:
+            if error is None:
+                # 只用成功的请求更新延迟（快速失败的端点不应显得更快）
+                previous = endpoint.latency.get(method)
+                endpoint.latency[method] = elapsed if previous is None else (
+                    EWMA_ALPHA * elapsed + (1 - EWMA_ALPHA) * previous)
+                endpoint.consecutive_failures = 0
+                endpoint.trips = 0
+                endpoint.open_until = 0.0
+                return
+            endpoint.stats["failures"] += 1
+            endpoint.consecutive_failures += 1
+            endpoint.last_error = error
+            if endpoint.consecutive_failures >= self.failure_threshold or endpoint.open_until:
+                # 连续失败（或熔断后的试探请求失败）：暂停该端点，暂停时间逐次翻倍
+                endpoint.open_until = time.monotonic() + min(MAX_COOLDOWN, self.cooldown * 2 ** endpoint.trips)
+                endpoint.trips += 1
+
+    def make_request(self, method, params):
+        method = str(method)
+        tried: Set[Endpoint] = set()
+        last_error: Optional[Exception] = None
+        last_response: Optional[Dict] = None
+        while True:
+            endpoint = self._choose(method, tried)
+            if endpoint is None:
+                break
+            if tried:
+                self.failovers += 1
+            tried.add(endpoint)
+            try:
+                response, elapsed = self._send(endpoint, method, params)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                last_error = e
+                self._record(endpoint, method, 0.0, f"{type(e).__name__}: {e}")
+                continue
+            if _retryable_error(response):
+                last_response = response
+                self._record(endpoint, method, elapsed, json.dumps(response["error"], default=str))
+                continue
+            self._record(endpoint, method, elapsed, None)
+            return response
+        if last_response is not None:
+            return last_response
+        raise last_error
+
+    def endpoint_stats(self) -> Dict[str, Dict]:
+        """每个端点的状态（ok / slow / open）、调用次数、失败次数、各方法的EWMA延迟等"""
+        with self._lock:
+            now = time.monotonic()
+            fastest: Dict[str, float] = {}
+            for endpoint in self.endpoints:
+                for method, latency in endpoint.latency.items():
+                    fastest[method] = min(fastest.get(method, latency), latency)
+            result = {}
+            for endpoint in self.endpoints:
+                if endpoint.open_until > now:
+                    state = "open"
+                elif any(latency > SLOW_FACTOR * fastest[method] for method, latency in endpoint.latency.items()):
+                    state = "slow"
+                else:
+                    state = "ok"
+                stats = endpoint.stats
+                result[endpoint.url] = {
+                    "state": state,
+                    "inflight": endpoint.inflight,
+                    "calls": stats["calls"],
+                    "failures": stats["failures"],
+                    "mean_ms": round(stats["seconds"] / stats["calls"] * 1000, 2) if stats["calls"] else None,
+                    "max_ms": round(stats["max_seconds"] * 1000, 2),
+                    "ewma_ms": {method: round(latency * 1000, 2) for method, latency in sorted(endpoint.latency.items())},
+                    "rate_limited_seconds": round(stats["rate_limited_seconds"], 3),
+                    "last_error": endpoint.last_error,
+                }
+            return result
+
+    def __repr__(self) -> str:
+        return f"EndpointPool({[endpoint.url for endpoint in self.endpoints]}, failovers={self.failovers})"
+
+
+def parse_provider_urls(provider_url: Union[str, List[str], None]) -> List[str]:
+    """单个URL、逗号分隔的URL或URL列表 -> URL列表（None 为空列表）"""
+    if provider_url is None:
+        return []
+    urls = provider_url.split(",") if isinstance(provider_url, str) else list(provider_url)
+    return [url.strip() for url in urls if url and url.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多节点RPC连接池：并发请求同一笔交易，输出各端点的延迟统计")
+    parser.add_argument("urls", nargs="+", help="节点URL")
+    parser.add_argument("--tx", required=True, help="用于压测的交易哈希")
+    parser.add_argument("--repeat", type=int, default=10, help="请求次数")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="每个端点的并发上限")
+    parser.add_argument("--rate", type=float, help="每个端点每秒的请求数上限")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="单个请求的超时（秒）")
+    args = parser.parse_args()
+
+    from concurrent.futures import ThreadPoolExecutor
+    pool = EndpointPool(args.urls, max_concurrency=args.concurrency, rate=args.rate, timeout=args.timeout)
+    trace_config = {"enableMemory": False, "disableStack": False, "disableStorage": False, "enableReturnData": False}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=pool.max_concurrency) as executor:
+        responses = list(executor.map(lambda _: pool.make_request("debug_traceTransaction", [args.tx, trace_config]),
+                                      range(args.repeat)))
+    errors = sum(1 for response in responses if "error" in response)
+    print(f"{args.repeat} 次请求用时 {time.perf_counter() - start:.2f}s，错误 {errors} 次，换节点 {pool.failovers} 次")
+    print(json.dumps(pool.endpoint_stats(), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
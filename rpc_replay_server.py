@@ -0,0 +1,73 @@
+# rpc_replay_server.py 是一个极简的本地JSON-RPC服务，直接用 rpc_cache.RPCStore 中录制的响应应答请求；
+# 可以替代真实节点供 main.py 或其他工具使用（支持批量请求），未录制的请求返回JSON-RPC错误。
+# 用法：python rpc_replay_server.py --store rpc_store --port 8545
+
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+from rpc_cache import RPCStore, RecordNotFoundError
+
+
+def handle_rpc_request(store: RPCStore, request: Dict) -> Dict:
+    """应答单个JSON-RPC请求"""
+    method = request.get("method", "")
+    params = request.get("params", [])
+    response: Dict[str, Any] = {"jsonrpc": "2.0", "id": request.get("id")}
+    if method == "web3_clientVersion":
+        response["result"] = "evm-cfg-py/replay-server"
+        return response
+    try:
+        response["result"] = store.get(method, params)
+    except RecordNotFoundError as e:
+        response["error"] = {"code": -32000, "message": str(e)}
+    return response
+
+
+def create_server(store_dir: str, host: str = "127.0.0.1", port: int = 8545) -> ThreadingHTTPServer:
+    store = RPCStore(store_dir)
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass  # 不逐条打印请求日志
+
+        def do_POST(self):
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            except json.JSONDecodeError:
+                payload = None
+            if isinstance(payload, list):
+                result = [handle_rpc_request(store, item) for item in payload]
+            elif isinstance(payload, dict):
+                result = handle_rpc_request(store, payload)
+            else:
+                result = {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}}
+            body = json.dumps(result).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return ThreadingHTTPServer((host, port), ReplayHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用录制的RPC响应提供本地JSON-RPC服务")
+    parser.add_argument("--store", default="rpc_store", help="RPC录制目录")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8545)
+    args = parser.parse_args()
+
+    server = create_server(args.store, args.host, args.port)
+    print(f"回放服务已启动: http://{args.host}:{args.port}（数据目录: {args.store}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# shared_block_store.py 负责把基本块放入共享内存，供多个worker进程只读共享；
+# 所有合约的指令（PC、opcode编号）与块边界按数组排布在一个 multiprocessing.shared_memory 段中，
+# 传给worker的只是一个很小的描述符（段名、数组偏移、地址列表），worker 挂载后得到只读的 NumPy 视图，
+# 再以 BlockView（与 Block 属性相同）的形式交给 CFG 构建器，不需要序列化/反序列化 Block 对象。
+
+import sys
+from multiprocessing import shared_memory
+from typing import List, Dict, Tuple
+import numpy as np
+from basic_block import Block
+from basic_block_vectorized import BlockView, DecodedCode, default_opcode_table
+
+# 共享段中的数组：名称 -> dtype
+_ARRAYS = (
+    ("pcs", np.int64),            # 每条指令的PC
+    ("op_ids", np.int16),         # 每条指令的opcode名称编号（OpcodeTable）
+    ("block_starts", np.int64),   # 每个块的第一条指令下标
+    ("block_ends", np.int64),     # 每个块的结束指令下标（不含）
+    ("terminators", np.int16),    # 每个块的终止标记编号（descriptor["terminator_names"]）
+    ("contract_ranges", np.int64),  # 每个合约的块下标范围 [start, end)，形状 (n, 2)
+)
+
+
+class SharedBlockStore:
+    """
+    共享内存中的基本块集合。
+    主进程用 create() 创建（负责 unlink），worker 用 attach(descriptor) 挂载（只读）。
+    """
+    def __init__(self, shm: shared_memory.SharedMemory, descriptor: Dict, owner: bool):
+        self._shm = shm
+        self.descriptor = descriptor
+        self.owner = owner
+        self.addresses: List[str] = descriptor["addresses"]
+        self._address_index = {address: i for i, address in enumerate(self.addresses)}
+        self.arrays: Dict[str, np.ndarray] = {}
+        for name, dtype in _ARRAYS:
+            offset, shape = descriptor["layout"][name]
+            array = np.ndarray(tuple(shape), dtype=dtype, buffer=shm.buf, offset=offset)
+            if not owner:
+                array.flags.writeable = False
+            self.arrays[name] = array
+        self.table = default_opcode_table()
+        self._code = DecodedCode(self.arrays["pcs"], self.arrays["op_ids"], self.table)
+        self._views: Dict[str, List[BlockView]] = {}
+
+    @classmethod
+    def create(cls, all_blocks: List[Block]) -> "SharedBlockStore":
+        """把基本块写入新的共享内存段"""
+        table = default_opcode_table()
+        invalid_id = table.name_ids["INVALID"]
+        addresses: List[str] = []
+        blocks_by_address: Dict[str, List[Block]] = {}
+        for block in all_blocks:
+            if block.address not in blocks_by_address:
+                addresses.append(block.address)
+                blocks_by_address[block.address] = []
+            blocks_by_address[block.address].append(block)
+
+        pcs: List[int] = []
+        op_ids: List[int] = []
+        starts: List[int] = []
+        ends: List[int] = []
+        terminator_ids: List[int] = []
+        terminator_names: List[str] = []
+        terminator_index: Dict[str, int] = {}
+        ranges: List[Tuple[int, int]] = []
+        for address in addresses:
+            first_block = len(starts)
+            for block in blocks_by_address[address]:
+                starts.append(len(pcs))
+                for pc, opcode in block.instructions:
+                    pcs.append(int(pc, 16))
+                    op_ids.append(table.name_ids.get(opcode, invalid_id))
+                ends.append(len(pcs))
+                terminator = block.terminator or ""
+                if terminator not in terminator_index:
+                    terminator_index[terminator] = len(terminator_names)
+                    terminator_names.append(terminator)
+                terminator_ids.append(terminator_index[terminator])
+            ranges.append((first_block, len(starts)))
+
+        data = {
+            "pcs": np.array(pcs, dtype=np.int64),
+            "op_ids": np.array(op_ids, dtype=np.int16),
+            "block_starts": np.array(starts, dtype=np.int64),
+            "block_ends": np.array(ends, dtype=np.int64),
+            "terminators": np.array(terminator_ids, dtype=np.int16),
+            "contract_ranges": np.array(ranges, dtype=np.int64).reshape(len(ranges), 2),
+        }
+        layout: Dict[str, Tuple[int, Tuple[int, ...]]] = {}
+        offset = 0
+        for name, _ in _ARRAYS:
+            offset = (offset + 7) // 8 * 8  # 8字节对齐
+            layout[name] = (offset, data[name].shape)
+            offset += data[name].nbytes
+
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        descriptor = {
+            "name": shm.name,
+            "layout": layout,
+            "addresses": addresses,
+            "terminator_names": terminator_names,
+        }
+        store = cls(shm, descriptor, owner=True)
+        for name, _ in _ARRAYS:
+            store.arrays[name][...] = data[name]
+            store.arrays[name].flags.writeable = False
+        return store
+
+    @classmethod
+    def attach(cls, descriptor: Dict) -> "SharedBlockStore":
+        """在worker中按描述符挂载已有的共享内存段（只读）"""
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=descriptor["name"], track=False)
+        else:
+            # 旧版本会在resource_tracker中重复登记同名段；登记是集合语义，由创建者 unlink 时统一注销
+            shm = shared_memory.SharedMemory(name=descriptor["name"])
+        return cls(shm, descriptor, owner=False)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def __contains__(self, address: str) -> bool:
+        return address in self._address_index
+
+    def contract_blocks(self, address: str) -> List[BlockView]:
+        """某个合约的基本块视图（与 Block 属性相同，指令列表按需生成），同一合约返回同一组对象"""
+        views = self._views.get(address)
+        if views is None:
+            index = self._address_index.get(address)
+            if index is None:
+                return []
+            first, last = self.arrays["contract_ranges"][index].tolist()
+            starts = self.arrays["block_starts"][first:last].tolist()
+            ends = self.arrays["block_ends"][first:last].tolist()
+            terminators = self.arrays["terminators"][first:last].tolist()
+            names = self.descriptor["terminator_names"]
+            views = [BlockView(address, self._code, start, end, names[term])
+                     for start, end, term in zip(starts, ends, terminators)]
+            self._views[address] = views
+        return views
+
+    def close(self) -> None:
+        """释放本进程的映射；创建者同时删除共享内存段"""
+        self._views.clear()
+        self._code = None
+        self.arrays.clear()
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+    def __enter__(self) -> "SharedBlockStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return (f"SharedBlockStore(name={self.descriptor['name']}, contracts={len(self.addresses)}, "
+                f"blocks={len(self.arrays.get('block_starts', []))}, bytes={self.nbytes})")
+
+
+# worker 进程内按段名缓存已挂载的存储，同一进程处理多个任务时只挂载一次
+_ATTACHED: Dict[str, SharedBlockStore] = {}
+
+
+def attached_store(descriptor: Dict) -> SharedBlockStore:
+    store = _ATTACHED.get(descriptor["name"])
+    if store is None:
+        store = _ATTACHED[descriptor["name"]] = SharedBlockStore.attach(descriptor)
+    return store
@@ -0,0 +1,292 @@
+# stack_store.py 负责以增量方式保存trace中每一步的EVM栈；
+# 相邻步骤的栈只在栈顶相差几项：每一步只记录相对上一步弹出的项数和新压入的值
+# （弹出/压入数量按上一步opcode的栈输入/输出数推出，调用/返回切换栈帧等不符合时按最长公共前缀计算），
+# 每 CHECKPOINT_INTERVAL 步保存一次完整的栈，任意一步的栈最多从最近的检查点重放 CHECKPOINT_INTERVAL - 1 个增量得到。
+# 同时按列保存每一步的合约地址、PC和opcode，find_trace_opcode.py 等只需要少数步骤栈参数的工具不必读取完整的 trace.json。
+# 标准化trace的每一步是 StoredStep：只引用 StackStore 中的下标，取 step["stack"] 时才还原栈，
+# 因此内存和 trace.json 中都不再有逐步的完整栈。trace.json 用 save_trace 写入（步骤只有 address/pc/opcode，
+# 栈在旁边的 trace_stacks.json.gz 中），用 load_trace 读回。
+
+import gzip
+import json
+import os
+from collections.abc import Mapping
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator
+from evm_information import StandardizedTrace, StandardizedStep
+
+STACK_STORE_FILE_NAME = "trace_stacks.json.gz"
+CHECKPOINT_INTERVAL = 64
+
+
+def _stack_effects() -> Dict[str, Tuple[int, int]]:
+    """opcode名称 -> (栈输入数, 栈输出数)；pyevmasm 之后新增或改名的opcode单独补充"""
+    from pyevmasm.evmasm import instruction_tables, DEFAULT_FORK
+    table = instruction_tables[DEFAULT_FORK]
+    effects = {}
+    for op in range(256):
+        try:
+            instruction = table[op]
+        except KeyError:
+            continue
+        effects[instruction.name] = (instruction.pops, instruction.pushes)
+    effects.update({
+        "KECCAK256": (2, 1), "PUSH0": (0, 1), "BASEFEE": (0, 1), "PREVRANDAO": (0, 1),
+        "TLOAD": (1, 1), "TSTORE": (2, 0), "MCOPY": (3, 0), "BLOBHASH": (1, 1), "BLOBBASEFEE": (0, 1),
+    })
+    return effects
+
+
+STACK_EFFECTS = _stack_effects()
+
+
+def stack_delta(previous: List[str], current: List[str], opcode: str) -> Tuple[int, List[str]]:
+    """
+    current 相对 previous 的增量 (弹出项数, 压入的值)；opcode 为 previous 所在步骤执行的指令。
+    先按opcode的栈输入/输出数计算，与实际的栈不符时（进入/返回调用、异常终止）取最长公共前缀。
+    """
+    effect = STACK_EFFECTS.get(opcode)
+    if effect is not None:
+        keep = len(previous) - effect[0]
+        if keep >= 0 and len(current) == keep + effect[1] and current[:keep] == previous[:keep]:
+            return effect[0], current[keep:]
+    keep = 0
+    limit = min(len(previous), len(current))
+    while keep < limit and previous[keep] == current[keep]:
+        keep += 1
+    return len(previous) - keep, current[keep:]
+
+
+class StoredStep(Mapping):
+    """
+    trace 中的一步（只读映射）：键为 address/pc/opcode/stack，值都从 StackStore 的列中读取，
+    "stack" 每次读取时还原为新的列表。dict(step)、{**step}、copy() 和 deepcopy 都得到带栈的普通字典。
+    """
+    __slots__ = ("_store", "_idx")
+    KEYS = ("address", "pc", "opcode", "stack")
+
+    def __init__(self, store: "StackStore", idx: int):
+        self._store = store
+        self._idx = idx
+
+    def __getitem__(self, key):
+        store, idx = self._store, self._idx
+        if key == "address":
+            return store.contracts[store.addresses[idx]]
+        if key == "pc":
+            return store.pcs[idx]
+        if key == "opcode":
+            return store.opcodes[idx]
+        if key == "stack":
+            return store.stack(idx)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __contains__(self, key) -> bool:
+        return key in self.KEYS
+
+    def copy(self) -> StandardizedStep:
+        return dict(self)
+
+    def __deepcopy__(self, memo) -> StandardizedStep:
+        return dict(self)  # 栈是新的列表，其余值都是字符串
+
+    def __repr__(self) -> str:
+        return f"StoredStep({dict(self)!r})"
+
+
+class StackStore:
+    """
+    增量编码的栈存储（按列）：
+    - pops[i]:  第 i 步的栈相对第 i-1 步弹出的项数（检查点步骤为上一步栈的全部项数）
+    - values[offsets[i]:offsets[i+1]]: 第 i 步新压入的值（检查点步骤为完整的栈）
+    - contracts / addresses / pcs / opcodes: 每一步的合约（contracts 的下标）、PC 和 opcode
+    """
+    def __init__(self, tx_hash: str = "", interval: int = CHECKPOINT_INTERVAL):
+        self.tx_hash = tx_hash
+        self.interval = interval
+        self.pops: List[int] = []
+        self.offsets: List[int] = [0]
+        self.values: List[str] = []
+        self.contracts: List[str] = []
+        self.addresses: List[int] = []
+        self.pcs: List[str] = []
+        self.opcodes: List[str] = []
+        self._contract_ids: Dict[str, int] = {}
+        self._last_stack: List[str] = []
+        self._cursor: Optional[Tuple[int, List[str]]] = None  # 最近还原的 (步骤下标, 栈)，顺序读取时从这里继续重放
+
+    def __len__(self) -> int:
+        return len(self.pops)
+
+    def append(self, step: StandardizedStep) -> StoredStep:
+        return self.add(step["address"], step["pc"], step["opcode"], step.get("stack", []))
+
+    def add(self, address: str, pc: str, opcode: str, stack: List[str]) -> StoredStep:
+        """追加一步，返回引用本存储的 StoredStep（不保留 stack 本身）"""
+        idx = len(self.pops)
+        if idx % self.interval == 0:
+            pops, pushed = len(self._last_stack), stack
+        else:
+            pops, pushed = stack_delta(self._last_stack, stack, self.opcodes[-1])
+        self.pops.append(pops)
+        self.values.extend(pushed)
+        self.offsets.append(len(self.values))
+        if address not in self._contract_ids:
+            self._contract_ids[address] = len(self.contracts)
+            self.contracts.append(address)
+        self.addresses.append(self._contract_ids[address])
+        self.pcs.append(pc)
+        self.opcodes.append(opcode)
+        self._last_stack = stack
+        return StoredStep(self, idx)
+
+    @classmethod
+    def from_trace(cls, trace: StandardizedTrace, interval: int = CHECKPOINT_INTERVAL) -> "StackStore":
+        store = cls(trace.get("tx_hash", ""), interval)
+        for step in trace["steps"]:
+            store.append(step)
+        return store
+
+    # ------------------------- 读取 -------------------------
+    def _apply(self, stack: List[str], idx: int) -> List[str]:
+        pushed = self.values[self.offsets[idx]:self.offsets[idx + 1]]
+        pops = self.pops[idx]
+        if pops:
+            del stack[len(stack) - pops:]
+        stack.extend(pushed)
+        return stack
+
+    def stack(self, idx: int) -> List[str]:
+        """第 idx 步的栈（从最近的检查点或上次还原的步骤重放，最多 interval - 1 个增量）"""
+        if not 0 <= idx < len(self.pops):
+            raise IndexError(f"步骤下标越界: {idx}")
+        checkpoint = idx - idx % self.interval
+        cursor = self._cursor
+        if cursor is not None and checkpoint <= cursor[0] <= idx:
+            start, stack = cursor[0], list(cursor[1])
+        else:
+            start, stack = checkpoint, self.values[self.offsets[checkpoint]:self.offsets[checkpoint + 1]]
+        for i in range(start + 1, idx + 1):
+            self._apply(stack, i)
+        self._cursor = (idx, stack)
+        return list(stack)
+
+    def iter_stacks(self, start: int = 0, stop: Optional[int] = None) -> Iterator[List[str]]:
+        """顺序产出 [start, stop) 各步骤的栈（每个增量只应用一次）"""
+        stop = len(self.pops) if stop is None else min(stop, len(self.pops))
+        if start >= stop:
+            return
+        stack = self.stack(start)
+        yield list(stack)
+        for i in range(start + 1, stop):
+            yield list(self._apply(stack, i))
+
+    def stored_steps(self) -> List[StoredStep]:
+        return [StoredStep(self, idx) for idx in range(len(self.pops))]
+
+    def step(self, idx: int) -> StandardizedStep:
+        return {"address": self.contracts[self.addresses[idx]], "pc": self.pcs[idx],
+                "opcode": self.opcodes[idx], "stack": self.stack(idx)}
+
+    def steps_with(self, opcodes: Iterable[str], addresses: Optional[Iterable[str]] = None) -> List[int]:
+        """opcode 属于 opcodes（且合约属于 addresses）的步骤下标；只扫描opcode/地址列，不还原栈"""
+        opcodes = set(opcodes)
+        wanted = None
+        if addresses is not None:
+            wanted = {self._contract_ids[a] for a in addresses if a in self._contract_ids}
+        return [idx for idx, opcode in enumerate(self.opcodes)
+                if opcode in opcodes and (wanted is None or self.addresses[idx] in wanted)]
+
+    def to_trace(self) -> StandardizedTrace:
+        return {"tx_hash": self.tx_hash,
+                "steps": [{"address": self.contracts[self.addresses[idx]], "pc": self.pcs[idx],
+                           "opcode": self.opcodes[idx], "stack": stack}
+                          for idx, stack in enumerate(self.iter_stacks())]}
+
+    # ------------------------- 保存 -------------------------
+    def to_dict(self) -> Dict:
+        vocabulary = sorted(set(self.opcodes))
+        opcode_ids = {opcode: idx for idx, opcode in enumerate(vocabulary)}
+        return {
+            "tx_hash": self.tx_hash,
+            "interval": self.interval,
+            "contracts": self.contracts,
+            "opcode_names": vocabulary,
+            "addresses": self.addresses,
+            "pcs": [int(pc, 16) for pc in self.pcs],
+            "opcodes": [opcode_ids[opcode] for opcode in self.opcodes],
+            "pops": self.pops,
+            "push_counts": [self.offsets[i + 1] - self.offsets[i] for i in range(len(self.pops))],
+            "values": self.values,
+        }
+
+    def save(self, path: str) -> None:
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "StackStore":
+        store = cls(data.get("tx_hash", ""), data["interval"])
+        store.contracts = data["contracts"]
+        store._contract_ids = {address: idx for idx, address in enumerate(store.contracts)}
+        store.addresses = data["addresses"]
+        store.pcs = [hex(pc) for pc in data["pcs"]]
+        store.opcodes = [data["opcode_names"][idx] for idx in data["opcodes"]]
+        store.pops = data["pops"]
+        store.values = data["values"]
+        offsets = [0]
+        for count in data["push_counts"]:
+            offsets.append(offsets[-1] + count)
+        store.offsets = offsets
+        return store
+
+    @classmethod
+    def load(cls, path: str) -> "StackStore":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def __repr__(self) -> str:
+        return f"StackStore(tx_hash={self.tx_hash}, steps={len(self.pops)}, values={len(self.values)})"
+
+
+def stack_store_of(trace: StandardizedTrace) -> StackStore:
+    """trace 各步骤的栈所在的 StackStore；步骤是带完整栈的普通字典时先转存为增量编码，并把步骤换成 StoredStep"""
+    steps = trace["steps"]
+    if steps and isinstance(steps[0], StoredStep):
+        return steps[0]._store
+    store = StackStore(trace.get("tx_hash", ""))
+    trace["steps"] = [store.append(step) for step in steps]
+    return store
+
+
+def save_trace(trace: StandardizedTrace, path: str) -> str:
+    """
+    保存 trace：栈写入同目录的 trace_stacks.json.gz，path（trace.json）中的步骤只有 address/pc/opcode。
+    返回增量栈文件的路径。
+    """
+    store = stack_store_of(trace)
+    stacks_path = os.path.join(os.path.dirname(path), STACK_STORE_FILE_NAME)
+    store.save(stacks_path)
+    steps = [{"address": step["address"], "pc": step["pc"], "opcode": step["opcode"]} for step in trace["steps"]]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({key: steps if key == "steps" else value for key, value in trace.items()}, f, indent=2)
+    return stacks_path
+
+
+def load_trace(path: str) -> StandardizedTrace:
+    """
+    读取 save_trace 保存的 trace.json，步骤的栈从旁边的 trace_stacks.json.gz 按需还原；
+    旧格式（步骤中带完整栈）的 trace.json 原样返回
+    """
+    with open(path, encoding="utf-8") as f:
+        trace = json.load(f)
+    steps = trace.get("steps", [])
+    stacks_path = os.path.join(os.path.dirname(path), STACK_STORE_FILE_NAME)
+    if steps and "stack" not in steps[0] and os.path.exists(stacks_path):
+        trace["steps"] = StackStore.load(stacks_path).stored_steps()
+    return trace
@@ -0,0 +1,259 @@
+# static_coverage.py 负责把动态CFG的执行覆盖情况累计到静态CFG上；
+# 每份代码（proxy_detection.code_key）有一个固定的编号方案：基本块按字节码顺序编号，边按静态CFG中的出现顺序编号；
+# 每笔交易的合约级动态CFG（ContractCFGConnector）转换成两个位集（Python int）：执行过的块、执行过的边，
+# 多笔交易之间按位或合并，占用只与代码大小有关，与交易数无关；
+# 可查询块/边覆盖率和从未执行过的连续区域。结果保存在SQLite中（coverage.db），main.py 每处理一笔交易合并一次。
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional, Set
+from basic_block import Block
+from cfg_structure import CFG
+from cfg_similarity import load_static_cfg_dot, parse_static_cfg_dot, GraphShape
+from result_store import load_result_blocks, result_static_dots, result_code_keys
+
+DEFAULT_COVERAGE_DB_PATH = "coverage.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS code_coverage (
+    code_key    TEXT PRIMARY KEY,
+    layout      TEXT NOT NULL,
+    blocks      TEXT NOT NULL,
+    edges       TEXT NOT NULL,
+    extra_edges TEXT NOT NULL,
+    updated_at  REAL
+);
+CREATE TABLE IF NOT EXISTS coverage_transactions (
+    code_key TEXT NOT NULL,
+    tx_hash  TEXT NOT NULL,
+    PRIMARY KEY (code_key, tx_hash)
+) WITHOUT ROWID;
+"""
+
+
+@dataclass
+class CoverageLayout:
+    """一份代码的编号方案：块 (start_pc, end_pc) 按字节码顺序，静态边 (源块编号, 目标块编号) 按出现顺序去重"""
+    blocks: List[Tuple[str, str]]
+    edges: List[Tuple[int, int]]
+
+    def __post_init__(self):
+        self.block_index = {start_pc: idx for idx, (start_pc, _) in enumerate(self.blocks)}
+        self.edge_index = {edge: idx for idx, edge in enumerate(self.edges)}
+
+    @classmethod
+    def from_shape(cls, blocks: List[Block], static_shape: GraphShape) -> "CoverageLayout":
+        block_index = {block.start_pc: idx for idx, block in enumerate(blocks)}
+        edges: List[Tuple[int, int]] = []
+        seen: Set[Tuple[int, int]] = set()
+        for src, dst, _ in static_shape[1]:
+            edge = (block_index.get(src), block_index.get(dst))
+            if None not in edge and edge not in seen:
+                seen.add(edge)
+                edges.append(edge)
+        return cls([(block.start_pc, block.end_pc) for block in blocks], edges)
+
+    @classmethod
+    def from_static_cfg(cls, blocks: List[Block], static_cfg: CFG) -> "CoverageLayout":
+        edges = [(e.source.start_pc, e.target.start_pc, e.edge_type) for e in static_cfg.edges]
+        return cls.from_shape(blocks, ({}, edges))
+
+    def to_json(self) -> str:
+        return json.dumps({"blocks": self.blocks, "edges": self.edges}, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text: str) -> "CoverageLayout":
+        data = json.loads(text)
+        return cls([tuple(b) for b in data["blocks"]], [tuple(e) for e in data["edges"]])
+
+
+@dataclass
+class CodeCoverage:
+    """
+    一份代码的累计覆盖：blocks/edges 为位集（第 i 位对应编号 i 的块/边）；
+    extra_edges 记录执行过但不在静态CFG中的边（静态分析没有解析出的跳转）。
+    """
+    code_key: str
+    layout: CoverageLayout
+    blocks: int = 0
+    edges: int = 0
+    extra_edges: Set[Tuple[int, int]] = field(default_factory=set)
+    transactions: int = 0
+
+    def record_shape(self, dynamic_shape: GraphShape) -> None:
+        """合并一个动态CFG（节点 start_pc 与边 (源, 目标, 类型)）"""
+        nodes, edges = dynamic_shape
+        block_index = self.layout.block_index
+        for start_pc in nodes:
+            idx = block_index.get(start_pc)
+            if idx is not None:
+                self.blocks |= 1 << idx
+        for src, dst, _ in edges:
+            edge = (block_index.get(src), block_index.get(dst))
+            if None in edge:
+                continue
+            edge_idx = self.layout.edge_index.get(edge)
+            if edge_idx is None:
+                self.extra_edges.add(edge)
+            else:
+                self.edges |= 1 << edge_idx
+
+    def record_cfg(self, cfg: CFG) -> None:
+        self.record_shape(({node.start_pc: () for node in cfg.nodes},
+                           [(e.source.start_pc, e.target.start_pc, e.edge_type) for e in cfg.edges]))
+
+    def merge(self, other: "CodeCoverage") -> None:
+        self.blocks |= other.blocks
+        self.edges |= other.edges
+        self.extra_edges |= other.extra_edges
+        self.transactions += other.transactions
+
+    def block_coverage(self) -> float:
+        return self.blocks.bit_count() / len(self.layout.blocks) if self.layout.blocks else 0.0
+
+    def edge_coverage(self) -> float:
+        return self.edges.bit_count() / len(self.layout.edges) if self.layout.edges else 0.0
+
+    def uncovered_regions(self, min_blocks: int = 1) -> List[Tuple[str, str, int]]:
+        """从未执行过的连续块区域 [(起始PC, 终止PC, 块数)]，按字节码顺序"""
+        regions: List[Tuple[str, str, int]] = []
+        run_start = None
+        for idx in range(len(self.layout.blocks) + 1):
+            executed = idx == len(self.layout.blocks) or (self.blocks >> idx) & 1
+            if not executed and run_start is None:
+                run_start = idx
+            elif executed and run_start is not None:
+                if idx - run_start >= min_blocks:
+                    regions.append((self.layout.blocks[run_start][0], self.layout.blocks[idx - 1][1], idx - run_start))
+                run_start = None
+        return regions
+
+    def summary(self) -> str:
+        return (f"块覆盖 {self.blocks.bit_count()}/{len(self.layout.blocks)} ({self.block_coverage():.1%})，"
+                f"边覆盖 {self.edges.bit_count()}/{len(self.layout.edges)} ({self.edge_coverage():.1%})，"
+                f"静态CFG外的边 {len(self.extra_edges)} 条，{self.transactions} 笔交易")
+
+
+class CoverageStore:
+    """按 code_key 保存累计覆盖（SQLite）"""
+    def __init__(self, db_path: str = DEFAULT_COVERAGE_DB_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def layout(self, code_key: str) -> Optional[CoverageLayout]:
+        row = self.conn.execute("SELECT layout FROM code_coverage WHERE code_key = ?", (code_key,)).fetchone()
+        return CoverageLayout.from_json(row[0]) if row else None
+
+    def load(self, code_key: str) -> Optional[CodeCoverage]:
+        row = self.conn.execute("SELECT layout, blocks, edges, extra_edges FROM code_coverage WHERE code_key = ?",
+                                (code_key,)).fetchone()
+        if row is None:
+            return None
+        tx_count = self.conn.execute("SELECT COUNT(*) FROM coverage_transactions WHERE code_key = ?",
+                                     (code_key,)).fetchone()[0]
+        return CodeCoverage(code_key, CoverageLayout.from_json(row[0]), int(row[1], 16), int(row[2], 16),
+                            {tuple(e) for e in json.loads(row[3])}, tx_count)
+
+    def merge(self, coverage: CodeCoverage, tx_hash: str) -> CodeCoverage:
+        """按位或合并一笔交易的覆盖，返回合并后的累计覆盖；同一交易重复合并不改变结果"""
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            merged = self.load(coverage.code_key)
+            if merged is None:
+                merged = CodeCoverage(coverage.code_key, coverage.layout)
+            merged.merge(coverage)
+            self.conn.execute("INSERT OR IGNORE INTO coverage_transactions VALUES (?, ?)", (coverage.code_key, tx_hash))
+            merged.transactions = self.conn.execute("SELECT COUNT(*) FROM coverage_transactions WHERE code_key = ?",
+                                                    (coverage.code_key,)).fetchone()[0]
+            self.conn.execute("INSERT OR REPLACE INTO code_coverage VALUES (?, ?, ?, ?, ?, ?)",
+                              (merged.code_key, merged.layout.to_json(), format(merged.blocks, "x"),
+                               format(merged.edges, "x"), json.dumps(sorted(merged.extra_edges)), time.time()))
+        return merged
+
+    def code_keys(self) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT code_key FROM code_coverage ORDER BY code_key")]
+
+    def __repr__(self) -> str:
+        count = self.conn.execute("SELECT COUNT(*) FROM code_coverage").fetchone()[0]
+        return f"CoverageStore(db={self.db_path}, codes={count})"
+
+
+def ingest_result_dir(store: CoverageStore, result_dir: str) -> int:
+    """
+    从 Result/<tx>/ 合并覆盖：基本块给出块编号，静态DOT给出边编号，合约级DOT给出执行过的块和边。
+    代码按 result_code_keys 的 code_key 归组；返回合并的合约数。
+    """
+    blocks = load_result_blocks(result_dir)
+    code_keys = result_code_keys(result_dir, blocks)
+    blocks_by_address: Dict[str, List[Block]] = {}
+    for block in blocks:
+        blocks_by_address.setdefault(block.address, []).append(block)
+    static_dots = dict(result_static_dots(result_dir))
+    tx_hash = "0x" + os.path.basename(os.path.normpath(result_dir))
+    count = 0
+    for address, key in code_keys.items():
+        short_addr = address.lower().replace("0x", "", 1)[:8]
+        dynamic_path = os.path.join(result_dir, f"contract_{short_addr}_cfg.dot")
+        if not os.path.exists(dynamic_path) or address not in blocks_by_address:
+            continue
+        layout = store.layout(key)
+        if layout is None:
+            if short_addr not in static_dots:
+                continue
+            layout = CoverageLayout.from_shape(blocks_by_address[address], parse_static_cfg_dot(static_dots[short_addr]))
+        coverage = CodeCoverage(key, layout)
+        coverage.record_shape(load_static_cfg_dot(dynamic_path))
+        store.merge(coverage, tx_hash)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="静态CFG的跨交易执行覆盖")
+    parser.add_argument("--db", default=DEFAULT_COVERAGE_DB_PATH, help="SQLite数据库路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = sub.add_parser("ingest", help="从结果目录合并覆盖")
+    ingest_parser.add_argument("root", nargs="?", default="Result")
+
+    report_parser = sub.add_parser("report", help="覆盖率与从未执行的区域")
+    report_parser.add_argument("--code-key", help="只显示该代码，并列出从未执行的区域")
+    report_parser.add_argument("--min-blocks", type=int, default=1, help="只列出至少包含该数量块的区域")
+
+    args = parser.parse_args()
+    store = CoverageStore(args.db)
+    try:
+        if args.command == "ingest":
+            count = 0
+            for name in sorted(os.listdir(args.root)):
+                result_dir = os.path.join(args.root, name)
+                if os.path.isdir(result_dir):
+                    count += ingest_result_dir(store, result_dir)
+            print(f"合并了 {count} 个合约的覆盖，{store}")
+        elif args.code_key:
+            coverage = store.load(args.code_key)
+            if coverage is None:
+                print(f"没有 {args.code_key} 的覆盖记录")
+                return
+            print(f"{coverage.code_key}: {coverage.summary()}")
+            for start_pc, end_pc, n_blocks in coverage.uncovered_regions(args.min_blocks):
+                print(f"  未执行: {start_pc} - {end_pc}（{n_blocks} 个块）")
+        else:
+            for code_key in store.code_keys():
+                print(f"{code_key}: {store.load(code_key).summary()}")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
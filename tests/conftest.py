@@ -0,0 +1,255 @@
+# 测试共用的夹具；仓库的模块都是根目录下的脚本，测试前把根目录加入 sys.path
+
+import http.server
+import json
+import os
+import sys
+import threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _serve(handler, calls):
+    """在本地随机端口启动 JSON-RPC 服务，返回 (server, url)"""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            calls.append(request["method"])
+            reply = handler(request["method"], request.get("params", []))
+            status, body = reply if isinstance(reply, tuple) else (200, {"result": reply})
+            data = json.dumps({"jsonrpc": "2.0", "id": request.get("id"), **body}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+@pytest.fixture
+def rpc_stub():
+    """
+    启动本地 JSON-RPC 桩节点：rpc_stub(handler) 返回URL，handler(method, params) 返回 result，
+    或返回 (HTTP状态码, 响应体字典) 直接作为响应；每个桩的 calls 记录收到的方法
+    """
+    servers = []
+
+    def start(handler):
+        calls = []
+        server, url = _serve(handler, calls)
+        servers.append(server)
+        start.calls[url] = calls
+        return url
+
+    start.calls = {}
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+# ------------------------- 测试用的小型链 -------------------------
+# 两个手写合约：CALLER 带 Solidity 风格的分发表（0x11111111 进入循环后SSTORE，0x22222222 调用 CALLEE 后把槽0的值写入槽1），
+# 末尾附加CBOR元数据；CALLEE 写一个存储槽后返回。两笔交易在同一个区块中，trace 由下面的迷你EVM生成，
+# 经本地桩节点交给 TraceFormatter 标准化，与从真实节点获取的流程一致。
+
+CALLER = "0x" + "c0" * 20
+CALLEE = "0x" + "ce" * 20
+TX_STORE = "0x" + "a1" * 32
+TX_CALL = "0x" + "a2" * 32
+BLOCK_HASH = "0x" + "b1" * 32
+
+_OPCODES = {
+    "STOP": 0x00, "ADD": 0x01, "LT": 0x10, "GT": 0x11, "EQ": 0x14, "ISZERO": 0x15, "AND": 0x16, "XOR": 0x18, "SHR": 0x1c,
+    "CALLDATALOAD": 0x35, "POP": 0x50, "SLOAD": 0x54, "SSTORE": 0x55, "JUMP": 0x56, "JUMPI": 0x57,
+    "GAS": 0x5a, "JUMPDEST": 0x5b, "CALL": 0xf1, "RETURN": 0xf3, "REVERT": 0xfd, "INVALID": 0xfe,
+}
+_OPCODES.update({f"PUSH{n}": 0x5f + n for n in range(1, 33)})
+_OPCODES.update({f"DUP{n}": 0x7f + n for n in range(1, 17)})
+_OPCODES.update({f"SWAP{n}": 0x8f + n for n in range(1, 17)})
+_NAMES = {value: name for name, value in _OPCODES.items()}
+
+# solc 格式的元数据：{"ipfs": <34字节>, "solc": 0.8.19}，最后2字节为CBOR长度
+METADATA = "fe" + "a264697066735822" + "1220" + "ab" * 32 + "64736f6c6343000813" + "0033"
+
+
+def assemble(source: str) -> str:
+    """把 "name:" 标签和 "PUSH2 @name" 引用组成的汇编翻译为0x开头的字节码"""
+    tokens = source.split()
+    labels, pc = {}, 0
+    for token in tokens:
+        if token.endswith(":"):
+            labels[token[:-1]] = pc
+        elif token in _OPCODES:
+            pc += 1 + (_OPCODES[token] - 0x5f if token.startswith("PUSH") else 0)
+    code, operand_size = "", 0
+    for token in tokens:
+        if operand_size:
+            value = labels[token[1:]] if token.startswith("@") else int(token, 16)
+            code += f"{value:0{2 * operand_size}x}"
+            operand_size = 0
+        elif not token.endswith(":"):
+            code += f"{_OPCODES[token]:02x}"  # 未知的指令名直接报错
+            operand_size = _OPCODES[token] - 0x5f if token.startswith("PUSH") else 0
+    return "0x" + code
+
+
+CALLER_SOURCE = f"""
+    PUSH1 00 CALLDATALOAD PUSH1 e0 SHR
+    DUP1 PUSH4 11111111 EQ PUSH2 @store JUMPI
+    DUP1 PUSH4 22222222 EQ PUSH2 @call JUMPI
+    PUSH1 00 DUP1 REVERT
+    store: JUMPDEST PUSH1 00
+    loop: JUMPDEST PUSH1 01 ADD DUP1 PUSH1 03 GT PUSH2 @loop JUMPI
+    PUSH1 00 SSTORE STOP
+    call: JUMPDEST PUSH1 00 DUP1 DUP1 DUP1 DUP1 PUSH20 {CALLEE[2:]} GAS CALL POP PUSH1 00 SLOAD PUSH1 01 SSTORE STOP
+"""
+CALLER_CODE = assemble(CALLER_SOURCE) + METADATA
+CALLEE_CODE = assemble("PUSH1 01 PUSH1 00 SSTORE PUSH2 @end JUMP end: JUMPDEST STOP")
+CODES = {CALLER: CALLER_CODE, CALLEE: CALLEE_CODE}
+CALLDATA = {TX_STORE: "11111111", TX_CALL: "22222222"}
+
+
+def run_evm(address: str, calldata: str, depth: int = 1, logs=None):
+    """只支持上面合约用到的指令的迷你EVM，返回 geth 格式的 structLogs"""
+    logs = [] if logs is None else logs
+    code, data = bytes.fromhex(CODES[address][2:]), bytes.fromhex(calldata)
+    stack, storage, pc = [], {}, 0
+    while True:
+        name = _NAMES[code[pc]]
+        logs.append({"pc": pc, "op": name, "gas": 100000 - 3 * len(logs), "gasCost": 3, "depth": depth,
+                     "stack": [hex(v) for v in stack]})
+        next_pc = pc + 1
+        if name.startswith("PUSH"):
+            size = code[pc] - 0x5f
+            stack.append(int.from_bytes(code[pc + 1:pc + 1 + size], "big"))
+            next_pc += size
+        elif name.startswith("DUP"):
+            stack.append(stack[-int(name[3:])])
+        elif name.startswith("SWAP"):
+            n = int(name[4:])
+            stack[-1], stack[-1 - n] = stack[-1 - n], stack[-1]
+        elif name in ("ADD", "LT", "GT", "EQ", "SHR"):
+            a, b = stack.pop(), stack.pop()
+            stack.append({"ADD": a + b, "LT": int(a < b), "GT": int(a > b), "EQ": int(a == b), "SHR": b >> a}[name])
+        elif name == "ISZERO":
+            stack.append(int(stack.pop() == 0))
+        elif name == "CALLDATALOAD":
+            offset = stack.pop()
+            stack.append(int.from_bytes(data[offset:offset + 32].ljust(32, b"\0"), "big"))
+        elif name == "POP":
+            stack.pop()
+        elif name == "SLOAD":
+            stack.append(storage.get(stack.pop(), 0))
+        elif name == "SSTORE":
+            key, value = stack.pop(), stack.pop()
+            storage[key] = value
+        elif name == "JUMP":
+            next_pc = stack.pop()
+        elif name == "JUMPI":
+            dest, cond = stack.pop(), stack.pop()
+            next_pc = dest if cond else next_pc
+        elif name == "GAS":
+            stack.append(logs[-1]["gas"])
+        elif name == "CALL":
+            _, to = stack.pop(), stack.pop()
+            del stack[-5:]
+            run_evm(f"0x{to:040x}", "", depth + 1, logs)
+            stack.append(1)
+        elif name in ("STOP", "RETURN", "REVERT", "INVALID"):
+            return logs
+        pc = next_pc
+
+
+def chain_handler(method, params):
+    """桩节点：按上面的合约和交易回答 TraceFormatter 用到的RPC"""
+    transactions = [{"hash": tx, "to": CALLER, "input": "0x" + data} for tx, data in CALLDATA.items()]
+    if method == "web3_clientVersion":
+        return "stub/v1"
+    if method == "eth_chainId":
+        return "0x1"
+    if method == "eth_getTransactionByHash":
+        return next(tx for tx in transactions if tx["hash"] == params[0])
+    if method == "eth_getCode":
+        return CODES.get(params[0].lower(), "0x")
+    if method == "debug_traceTransaction":
+        return {"structLogs": run_evm(CALLER, CALLDATA[params[0]])}
+    if method in ("eth_getBlockByNumber", "eth_getBlockByHash"):
+        return {"hash": BLOCK_HASH, "number": "0x1", "gasUsed": "0x5208", "transactions": transactions}
+    if method == "debug_traceBlockByHash":
+        return [{"txHash": tx["hash"], "result": {"structLogs": run_evm(CALLER, CALLDATA[tx["hash"]])}}
+                for tx in transactions]
+    return 400, {"error": {"code": -32601, "message": f"method not found: {method}"}}
+
+
+@pytest.fixture(scope="session")
+def chain_url():
+    """会话内共用的桩节点URL"""
+    server, url = _serve(chain_handler, [])
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="session")
+def formatter(chain_url):
+    from evm_information import TraceFormatter
+    return TraceFormatter(chain_url)
+
+
+@pytest.fixture(scope="session")
+def call_trace(formatter):
+    """CALLER 调用 CALLEE 的交易的标准化trace"""
+    return formatter.get_standardized_trace(TX_CALL)
+
+
+@pytest.fixture(scope="session")
+def loop_trace(formatter):
+    """CALLER 中循环三次后SSTORE的交易的标准化trace"""
+    return formatter.get_standardized_trace(TX_STORE)
+
+
+@pytest.fixture(scope="session")
+def contracts(formatter, call_trace):
+    return sorted(formatter.get_all_contracts_bytecode(TX_CALL, call_trace), key=lambda c: c["address"])
+
+
+@pytest.fixture(scope="session")
+def blocks(contracts):
+    from basic_block import BasicBlockProcessor
+    return BasicBlockProcessor().process_multiple_contracts(contracts)
+
+
+@pytest.fixture
+def result_dir(tmp_path, call_trace, contracts, blocks):
+    """按 main.py 的目录结构保存 call_trace 的结果（blocks.json、trace.json、code_map.json、合约级与静态CFG）"""
+    from call_frames import CallFrameIndex
+    from cfg_contract import ContractCFGConnector, render_contract
+    from cfg_static_complete import StaticCompleteCFGBuilder, render_static_complete
+    from proxy_detection import build_code_map, save_code_map, CODE_MAP_FILE_NAME
+    from stack_store import save_trace
+    path = tmp_path / "Result" / TX_CALL
+    path.mkdir(parents=True)
+    with open(path / "blocks.json", "w") as f:
+        json.dump([{"address": b.address, "start_pc": b.start_pc, "end_pc": b.end_pc,
+                    "terminator": b.terminator, "instructions": b.instructions} for b in blocks], f)
+    save_trace(call_trace, str(path / "trace.json"))
+    save_code_map(build_code_map(contracts, call_trace), str(path / CODE_MAP_FILE_NAME))
+    frame_index = CallFrameIndex.from_trace(call_trace)
+    for contract in contracts:
+        address = contract["address"]
+        contract_blocks = [b for b in blocks if b.address == address]
+        contract_cfg = ContractCFGConnector(contract_blocks).connect_contract_cfg(
+            frame_index.contract_steps(call_trace["steps"], address))
+        render_contract(contract_cfg, str(path / f"contract_{address[2:10]}_cfg.dot"))
+        builder = StaticCompleteCFGBuilder(contract["bytecode"], contract_blocks)
+        render_static_complete(builder.build_static_cfg(), str(path / f"contract_{address[2:10]}_static_cfg.dot"))
+    return str(path)
@@ -0,0 +1,64 @@
+# analysis_daemon.py 的测试：缓存在多个 worker 并发访问时只构建一次
+
+import threading
+import time
+import analysis_daemon
+from analysis_daemon import AnalysisService
+
+# PUSH1 0x06; JUMP; PUSH1 0; PUSH1 0; REVERT; JUMPDEST; STOP
+BYTECODE = "0x60065660006000fd5b00"
+
+
+class FakeFormatter:
+    rpc_pool = None
+
+    def get_contract_bytecode(self, address):
+        return {"address": address, "bytecode": BYTECODE}
+
+
+class SlowBuilder(analysis_daemon.StaticCompleteCFGBuilder):
+    def build_static_cfg(self):
+        time.sleep(0.05)  # 让并发的 worker 都在构建期间到达
+        return super().build_static_cfg()
+
+
+def _run_concurrently(target, count):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(i):
+        barrier.wait()
+        results[i] = target(i)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_static_cfg_is_built_once_under_concurrency(monkeypatch):
+    monkeypatch.setattr(analysis_daemon, "StaticCompleteCFGBuilder", SlowBuilder)
+    service = AnalysisService(FakeFormatter())
+    address = "0x" + "11" * 20
+    _, entry = service._code_entry(address)
+    blocks = service._blocks_for(entry, address)
+
+    cfgs = _run_concurrently(lambda i: service._static_cfg(entry, address, blocks), 6)
+
+    assert service.stats["static_misses"] == 1
+    assert service.stats["static_hits"] == 5
+    assert entry.static_shape is not None
+    assert len({len(cfg.nodes) for cfg in cfgs}) == 1
+
+
+def test_code_entry_is_shared_between_clones():
+    service = AnalysisService(FakeFormatter())
+    addresses = ["0x" + f"{i:040x}" for i in range(1, 5)]
+    entries = _run_concurrently(lambda i: service._code_entry(addresses[i]), len(addresses))
+
+    assert len({key for key, _ in entries}) == 1
+    assert len({id(entry) for _, entry in entries}) == 1
+    assert service.stats["code_misses"] == 1
+    assert service.stats["code_hits"] == len(addresses) - 1
@@ -0,0 +1,57 @@
+# basic_block_vectorized.py 的测试：向量化分块与 BasicBlockProcessor 逐块一致，块按需生成
+
+import random
+import pytest
+from conftest import CALLER, CALLER_CODE, assemble
+from basic_block import BasicBlockProcessor
+from basic_block_vectorized import VectorizedBlockSplitter
+
+ADDRESS = "0x" + "11" * 20
+
+
+def _shape(blocks):
+    return [(b.address, b.start_pc, b.end_pc, b.terminator, list(b.instructions)) for b in blocks]
+
+
+def _reference(bytecode):
+    processor = BasicBlockProcessor()
+    return processor.split_into_blocks(ADDRESS, processor.bytecode_to_opcodes(bytecode))
+
+
+@pytest.mark.parametrize("bytecode", [
+    CALLER_CODE,  # 包含元数据（不去除非代码区时元数据也参与分块）
+    assemble("JUMPDEST JUMPDEST PUSH1 00 JUMP JUMPDEST STOP"),  # 开头和连续的 JUMPDEST
+    assemble("PUSH1 01 PUSH1 02 ADD"),  # 没有终止指令：NORMAL_END
+    assemble("PUSH1 01 JUMPDEST PUSH1 02 JUMPDEST"),  # JUMPDEST_PREV
+    "0x600160",  # 末尾被截断的 PUSH1
+    "0x0c0d0e5b0c",  # 未定义的opcode
+])
+def test_split_matches_basic_block_processor(bytecode):
+    assert _shape(VectorizedBlockSplitter().split_bytecode(ADDRESS, bytecode)) == _shape(_reference(bytecode))
+
+
+def test_random_bytecode_matches_basic_block_processor():
+    rng = random.Random(32)
+    splitter = VectorizedBlockSplitter()
+    for _ in range(50):
+        bytecode = "0x" + bytes(rng.choice([0x00, 0x56, 0x57, 0x5b, 0x60, 0x61, 0x01, 0xf1, 0xfd, rng.randrange(256)])
+                                for _ in range(rng.randrange(1, 200))).hex()
+        assert _shape(splitter.split_bytecode(ADDRESS, bytecode)) == _shape(_reference(bytecode))
+
+
+def test_process_contract_strips_metadata_like_processor(contracts):
+    for contract in contracts:
+        expected = BasicBlockProcessor().process_contract(contract)
+        assert _shape(VectorizedBlockSplitter().process_contract(contract)) == _shape(expected)
+
+
+def test_blocks_are_created_lazily():
+    blocks = VectorizedBlockSplitter().split_bytecode(CALLER, CALLER_CODE)
+    assert blocks._views == {}
+    last = blocks[-1]
+    assert list(blocks._views) == [len(blocks) - 1]
+    assert blocks[len(blocks) - 1] is last
+    assert [b.start_pc for b in blocks[:2]] == ["0x0", "0x11"]
+    with pytest.raises(IndexError):
+        blocks[len(blocks)]
+    assert len(VectorizedBlockSplitter().split_bytecode(ADDRESS, "0x")) == 0
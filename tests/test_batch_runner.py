@@ -0,0 +1,40 @@
+# batch_runner.py 的测试：输入展开，以及多进程处理后JSONL记录的顺序与单个文件逐一处理一致
+
+import json
+import os
+from batch_runner import expand_inputs, run_batch
+from find_trace_opcode import process_trace_file
+from stack_store import save_trace
+
+
+def test_expand_inputs(tmp_path):
+    for name in ("a/trace.json", "a/b/trace.json", "c/trace.json", "c/other.json"):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("{}")
+    root = str(tmp_path)
+
+    assert expand_inputs([f"{root}/a"], "trace.json") == [f"{root}/a/b/trace.json", f"{root}/a/trace.json"]
+    assert expand_inputs([f"{root}/*/trace.json", f"{root}/c/trace.json", f"{root}/missing.json"], "trace.json") == [
+        f"{root}/a/trace.json", f"{root}/c/trace.json", f"{root}/missing.json"]
+    assert expand_inputs([root], "*.json", exclude=lambda p: "/a/" in p) == [f"{root}/c/other.json", f"{root}/c/trace.json"]
+
+
+def test_run_batch_keeps_input_order(tmp_path, call_trace, loop_trace):
+    files = []
+    for i, trace in enumerate([call_trace, loop_trace, call_trace]):
+        path = tmp_path / str(i) / "trace.json"
+        path.parent.mkdir()
+        save_trace(trace, str(path))
+        files.append(str(path))
+    output = str(tmp_path / "out.jsonl")
+
+    stats = run_batch(process_trace_file, files, output=output, workers=2, worker_args=([],))
+
+    with open(output, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    expected = [record for path in files for record in process_trace_file(path, [])]
+    assert records == expected
+    assert [r["step_idx"] for r in records if r["file"] == files[0]] == [22, 25, 34]
+    assert stats["files"] == 3 and stats["records"] == len(expected)
+    assert stats["bytes"] == sum(os.path.getsize(path) for path in files)
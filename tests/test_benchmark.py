@@ -0,0 +1,41 @@
+# benchmark.py 的测试：从保存的基本块重建字节码，回放结果目录，并与基线比较
+
+import os
+from conftest import CALLER, CALLEE
+from benchmark import reconstruct_bytecode, load_cases, run_benchmark, compare_with_baseline, STAGES
+from basic_block import BasicBlockProcessor
+from code_section import strip_non_code
+
+
+def test_reconstruct_bytecode_keeps_pcs_and_opcodes(blocks, contracts):
+    processor = BasicBlockProcessor()
+    for contract in contracts:
+        contract_blocks = [b for b in blocks if b.address == contract["address"]]
+        rebuilt = reconstruct_bytecode(contract_blocks)
+        original = strip_non_code(contract["bytecode"])
+        assert len(rebuilt) == len(original)
+        # PUSH 操作数以0填充，其余与原字节码相同，重新分块结果一致
+        rebuilt_blocks = processor.split_into_blocks(contract["address"], processor.bytecode_to_opcodes(rebuilt))
+        assert [(b.start_pc, b.end_pc, b.terminator, b.instructions) for b in rebuilt_blocks] == \
+               [(b.start_pc, b.end_pc, b.terminator, b.instructions) for b in contract_blocks]
+
+
+def test_load_cases_and_run_benchmark(result_dir):
+    root = os.path.dirname(result_dir)
+    cases = load_cases(root)
+    assert sorted(case.address for case in cases) == [CALLER, CALLEE]
+    assert {case.address: len(case.steps) for case in cases} == {CALLER: 29, CALLEE: 7}
+    assert [case.address for case in load_cases(root, limit=1)] == [CALLER]
+
+    report = run_benchmark(root, repeat=1, measure_memory=False, verbose=False)
+    assert {c["address"] for c in report["contracts"]} == {CALLER, CALLEE}
+    for contract in report["contracts"]:
+        assert list(contract["stages"]) == STAGES  # split_vectorized 与 split 的结果逐块一致，否则抛出异常
+    assert report["buckets"]["small"]["split"]["contracts"] == 2
+
+
+def test_compare_with_baseline():
+    baseline = {"buckets": {"small": {"split": {"seconds": 1.0}, "render": {"seconds": 1.0}}}}
+    report = {"buckets": {"small": {"split": {"seconds": 1.5}, "render": {"seconds": 1.1},
+                                    "static_cfg": {"seconds": 9.0}}}}
+    assert compare_with_baseline(report, baseline, threshold=0.2) == ["small/split: 1.50x"]
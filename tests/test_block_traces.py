@@ -0,0 +1,53 @@
+# TraceFormatter.iter_block_traces 的测试：按区块一次获取trace、交易对应关系校验、区块标签解析与大区块回退
+
+import pytest
+from conftest import BLOCK_HASH, TX_CALL, TX_STORE, chain_handler
+from evm_information import TraceFormatter
+
+
+def _steps(trace):
+    return [dict(step) for step in trace["steps"]]
+
+
+def test_block_traces_match_per_transaction_traces(rpc_stub, call_trace, loop_trace):
+    url = rpc_stub(chain_handler)
+    traces = list(TraceFormatter(url).iter_block_traces(1))
+    by_hash = {trace["tx_hash"]: trace for trace in traces}
+    assert sorted(by_hash) == [TX_STORE, TX_CALL]
+    assert _steps(by_hash[TX_CALL]) == _steps(call_trace)
+    assert by_hash[TX_CALL]["frames"] == call_trace["frames"]
+    assert _steps(by_hash[TX_STORE]) == _steps(loop_trace)
+    assert "debug_traceTransaction" not in rpc_stub.calls[url]
+    assert rpc_stub.calls[url].count("debug_traceBlockByHash") == 1
+
+
+def test_block_tag_is_resolved_to_hash_and_not_cached(rpc_stub, tmp_path):
+    url = rpc_stub(chain_handler)
+    formatter = TraceFormatter(url, rpc_store=str(tmp_path / "rpc_store"), rpc_mode="auto")
+    assert len(list(formatter.iter_block_traces("latest"))) == 2
+    assert len(list(formatter.iter_block_traces("latest"))) == 2
+    # latest 每次都请求节点；按哈希获取的trace只请求一次
+    assert rpc_stub.calls[url].count("eth_getBlockByNumber") == 2
+    assert rpc_stub.calls[url].count("debug_traceBlockByHash") == 1
+    assert formatter.web3.provider.stats["hits"] == 1
+
+    assert len(list(TraceFormatter(url).iter_block_traces(BLOCK_HASH))) == 2
+    assert rpc_stub.calls[url][-2] == "eth_getBlockByHash"
+
+
+def test_large_block_falls_back_to_per_transaction_traces(rpc_stub):
+    url = rpc_stub(chain_handler)
+    traces = list(TraceFormatter(url).iter_block_traces("0x1", max_block_gas=21000 - 1))
+    assert len(traces) == 2
+    assert "debug_traceBlockByHash" not in rpc_stub.calls[url]
+    assert rpc_stub.calls[url].count("debug_traceTransaction") == 2
+
+
+def test_mismatched_transaction_order_raises(rpc_stub):
+    def swapped(method, params):
+        result = chain_handler(method, params)
+        return result[::-1] if method == "debug_traceBlockByHash" else result
+
+    formatter = TraceFormatter(rpc_stub(swapped))
+    with pytest.raises(ValueError, match="不一致"):
+        next(formatter.iter_block_traces(1))
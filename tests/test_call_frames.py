@@ -0,0 +1,42 @@
+# call_frames.py 的测试：标准化时建立的栈帧树、按范围切片与逐步比较地址一致、DELEGATECALL/CREATE 的地址
+
+from conftest import CALLER, CALLEE
+from call_frames import CallFrameBuilder, CallFrameIndex
+
+
+def test_frames_of_call_trace(call_trace):
+    index = CallFrameIndex.from_trace(call_trace)
+    root, callee = index.frames
+    assert (root.call_type, root.start_step, root.end_step, root.children) == ("ROOT", 0, 36, [1])
+    assert (callee.call_type, callee.caller, callee.storage_address) == ("CALL", CALLER, CALLEE)
+    assert (callee.call_step, callee.start_step, callee.end_step, callee.depth) == (22, 23, 30, 2)
+    assert index.own_ranges(0) == [(0, 23), (30, 36)]
+    assert index.contract_ranges(CALLEE) == [(23, 30)] and index.contract_ranges("0x" + "00" * 20) == []
+    for address in (CALLER, CALLEE):
+        assert index.contract_steps(call_trace["steps"], address) == [s for s in call_trace["steps"] if s["address"] == address]
+    assert [f.frame_id for f in index.frames_of(CALLEE)] == [1]
+
+
+def test_from_steps_matches_normalised_frames(call_trace, loop_trace):
+    for trace in (call_trace, loop_trace):
+        assert CallFrameIndex.from_steps(trace["steps"]).to_list() == trace["frames"]
+    assert CallFrameIndex.from_list(call_trace["frames"]).to_list() == call_trace["frames"]
+
+
+def test_builder_addresses():
+    proxy, logic, factory, created = ("0x" + c * 40 for c in "1234")
+    builder = CallFrameBuilder(proxy, sender="0x" + "ee" * 20)
+    delegate = builder.enter(1, "DELEGATECALL", logic, 0)
+    nested = builder.enter(3, "CALL", factory, 2)
+    create = builder.enter(5, "CREATE", "", 4)
+    builder.leave(7, created)
+    builder.leave(8)
+    index = builder.finish(12)  # 未结束的 DELEGATECALL 帧在最后一步结束
+
+    assert (delegate.caller, delegate.storage_address) == ("0x" + "ee" * 20, proxy)
+    assert (nested.caller, nested.storage_address) == (proxy, factory)
+    assert (create.storage_address, create.end_step) == (created, 7)
+    assert delegate.end_step == 12 and index.root.end_step == 12
+    assert index.own_ranges(1) == [(1, 3), (8, 12)]
+    assert index.own_ranges(2) == [(3, 5), (7, 8)]
+    assert index.contract_ranges("") == [(5, 7)]
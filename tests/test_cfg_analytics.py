@@ -0,0 +1,86 @@
+# cfg_analytics.py 的测试：CSR邻接表与CFG的边一致；在一个小的手工图上检查强连通分量、支配树、循环嵌套、可达性和最短路径
+
+import numpy as np
+from conftest import CALLER, CALLER_SOURCE, METADATA, assemble
+from basic_block import BasicBlockProcessor
+from cfg_static_complete import StaticCompleteCFGBuilder
+from cfg_similarity import cfg_shape
+from cfg_analytics import (csr_from_shape, strongly_connected_components, cyclic_components, dominator_tree,
+                           dominator_depths, loop_nesting, reachable_from, shortest_path, ReachabilityIndex,
+                           analyze_shape, process_result_dir)
+
+# 0 -> 1 -> 2 <-> 3 -> 4 -> 5，4 -> 1 为外层循环的回边；6 -> 5 从入口不可达；
+# 0 -> 7、0 -> 8、7 <-> 8 是有两个入口的环（不可归约）
+EDGES = [(0, 1), (1, 2), (2, 3), (3, 2), (3, 4), (4, 1), (4, 5), (6, 5), (0, 7), (0, 8), (7, 8), (8, 7)]
+OPCODES = {3: ["CALL"], 5: ["SSTORE"]}
+SHAPE = ({hex(n): OPCODES.get(n, ["JUMPDEST"]) for n in range(9)},
+         [(hex(src), hex(dst), "SEQUENCE") for src, dst in EDGES])
+
+
+def _csr_edges(csr):
+    return {(csr.node_ids[src], csr.node_ids[int(dst)]) for src in range(csr.n_nodes) for dst in csr.successors(src)}
+
+
+def test_csr_matches_cfg_edges():
+    bytecode = assemble(CALLER_SOURCE) + METADATA
+    blocks = BasicBlockProcessor().process_contract({"address": CALLER, "bytecode": bytecode})
+    cfg = StaticCompleteCFGBuilder(bytecode, blocks).build_static_cfg()
+    csr = cfg.to_csr()
+    assert csr.node_ids == [f"{node.address}:{node.start_pc}" for node in cfg.nodes]
+    assert csr.n_edges == len(cfg.edges)
+    assert _csr_edges(csr) == {(f"{e.source.address}:{e.source.start_pc}", f"{e.target.address}:{e.target.start_pc}")
+                               for e in cfg.edges}
+    assert sorted(csr.edge_type_names) == sorted({e.edge_type for e in cfg.edges})
+
+    shape_csr = csr_from_shape(cfg_shape(cfg))
+    assert shape_csr.node_ids[0] == "0x0"
+    assert _csr_edges(shape_csr) == {(e.source.start_pc, e.target.start_pc) for e in cfg.edges}
+    assert _csr_edges(shape_csr.transpose()) == {(dst, src) for src, dst in _csr_edges(shape_csr)}
+
+
+def test_components_dominators_and_loops():
+    csr = csr_from_shape(SHAPE)
+    components = strongly_connected_components(csr)
+    assert len({components[n] for n in (1, 2, 3, 4)}) == 1 and components[7] == components[8]
+    assert len(set(components.tolist())) == 5
+    assert sorted(cyclic_components(csr, components).tolist()) == sorted({int(components[1]), int(components[7])})
+    # 分量按逆拓扑序编号：后继分量编号更小
+    assert components[5] < components[4] < components[0]
+
+    idom = dominator_tree(csr)
+    assert idom.tolist() == [0, 0, 1, 2, 3, 4, -1, 0, 0]
+    assert dominator_depths(idom).tolist() == [0, 1, 2, 3, 4, 5, -1, 1, 1]
+
+    nest = loop_nesting(csr, idom)
+    loops = {loop.header: loop for loop in nest.loops}
+    assert sorted(loops) == [1, 2]
+    assert loops[1].body.tolist() == [1, 2, 3, 4] and loops[1].depth == 1 and loops[1].parent is None
+    assert loops[2].body.tolist() == [2, 3] and loops[2].depth == 2 and loops[2].parent == loops[1].loop_id
+    assert nest.loop_depths().tolist() == [0, 1, 2, 2, 1, 0, 0, 0, 0]
+    assert nest.irreducible.tolist() == [7, 8]
+
+
+def test_reachability_and_shortest_path():
+    csr = csr_from_shape(SHAPE)
+    assert np.flatnonzero(reachable_from(csr, [2])).tolist() == [1, 2, 3, 4, 5]
+    assert shortest_path(csr, [0], [5]) == [0, 1, 2, 3, 4, 5]
+    assert shortest_path(csr, [0, 4], [5]) == [4, 5]
+    assert shortest_path(csr, [5], [0]) is None and shortest_path(csr, [0], []) is None
+
+    index = ReachabilityIndex(csr)
+    for source in range(csr.n_nodes):
+        assert index.reachable_set(source).tolist() == np.flatnonzero(reachable_from(csr, [source])).tolist()
+    assert index.reaches(3, 1) and not index.reaches(5, 1) and not index.reaches(0, 6)
+
+
+def test_analyze_shape_and_result_dir(result_dir):
+    summary = analyze_shape(SHAPE)
+    assert (summary["blocks"], summary["edges"], summary["unreachable_blocks"]) == (9, 12, 1)
+    assert (summary["loops"], summary["max_loop_depth"], summary["irreducible_blocks"]) == (2, 2, 2)
+    assert summary["shortest_path"] == ["0x3", "0x4", "0x5"]
+    assert summary["reachable_target_blocks"] == 1
+
+    records = process_result_dir(result_dir, ["CALL"], ["SSTORE"])
+    assert [record["contract"] for record in records] == sorted([CALLER[2:10], "cececece"])
+    caller = next(record for record in records if record["contract"] == CALLER[2:10])
+    assert caller["blocks"] == 8 and caller["shortest_path"][0] == "0x33"
@@ -0,0 +1,48 @@
+# cfg_incremental.py 的测试：合约升级后增量重建的静态CFG与重新构建的完全一致，并能比较两版的差异
+
+from conftest import CALLER, CALLER_SOURCE, METADATA, assemble
+from basic_block import BasicBlockProcessor
+from cfg_static_complete import StaticCompleteCFGBuilder
+from cfg_incremental import (SnapshotCache, align_blocks, block_fingerprints, build_static_cfg_incremental,
+                             diff_snapshots, snapshot_from_bytecode)
+
+# 升级后的版本：在 revert 分支中插入两条指令，之后所有块的PC都向后偏移3字节
+V1 = assemble(CALLER_SOURCE) + METADATA
+V2 = assemble(CALLER_SOURCE.replace("PUSH1 00 DUP1 REVERT", "PUSH1 05 POP PUSH1 00 DUP1 REVERT")) + METADATA
+
+
+def _builder(bytecode):
+    blocks = BasicBlockProcessor().process_contract({"address": CALLER, "bytecode": bytecode})
+    return StaticCompleteCFGBuilder(bytecode, blocks)
+
+
+def test_fingerprints_ignore_shifted_jump_targets():
+    old, _ = block_fingerprints(_builder(V1))
+    new, _ = block_fingerprints(_builder(V2))
+    assert len(old) == len(new)
+    changed = [i for i, (a, b) in enumerate(zip(old, new)) if a != b]
+    assert [_builder(V2).contract_blocks[i].start_pc for i in changed] == ["0x1c"]
+    assert align_blocks(old, new) == {i: i for i in range(len(old)) if i not in changed}
+
+
+def test_incremental_rebuild_matches_full_build(tmp_path):
+    cache = SnapshotCache(str(tmp_path / "static_cfg_cache"))
+    cfg, report = build_static_cfg_incremental(_builder(V1), cache)
+    assert report is None
+    assert cfg.to_dict() == _builder(V1).build_static_cfg().to_dict()
+
+    cfg, report = build_static_cfg_incremental(_builder(V2), cache)
+    assert cfg.to_dict() == _builder(V2).build_static_cfg().to_dict()
+    assert report["changed_blocks"] == ["0x1c"]
+    assert report["added_blocks"] == report["removed_blocks"] == 1
+    assert report["reused"] >= report["recomputed"] > 0
+    assert cache.load(CALLER)["code_hash"] == snapshot_from_bytecode(V2, CALLER)["code_hash"]
+
+
+def test_diff_snapshots():
+    diff = diff_snapshots(snapshot_from_bytecode(V1), snapshot_from_bytecode(V2))
+    assert diff["removed_blocks"] == diff["added_blocks"] == ["0x1c"]
+    assert diff["removed_edges"] == [("0x11", "0x1c", "CONDITION_FALSE")]
+    assert diff["added_edges"] == [("0x11", "0x1c", "CONDITION_FALSE")]
+    unchanged = diff_snapshots(snapshot_from_bytecode(V1), snapshot_from_bytecode(V1))
+    assert unchanged["added_edges"] == unchanged["removed_edges"] == unchanged["added_blocks"] == []
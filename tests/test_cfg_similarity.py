@@ -0,0 +1,58 @@
+# cfg_similarity.py 的测试：结构特征与PC无关，相同的CFG相似度为1，LSH查询与DOT导入
+
+import os
+from conftest import CALLER, CALLEE, CALLER_SOURCE, METADATA, assemble
+from basic_block import BasicBlockProcessor
+from cfg_static_complete import StaticCompleteCFGBuilder, static_complete_dot
+from cfg_similarity import (SimilarityIndex, cfg_shape, shingles, minhash, estimate_similarity,
+                            parse_static_cfg_dot, ingest_result_dir)
+from proxy_detection import load_code_keys
+
+
+def _static_cfg(bytecode, address=CALLER):
+    blocks = BasicBlockProcessor().process_contract({"address": address, "bytecode": bytecode})
+    return StaticCompleteCFGBuilder(bytecode, blocks).build_static_cfg()
+
+
+CALLER_CFG = _static_cfg(assemble(CALLER_SOURCE) + METADATA)
+# 在开头插入一条指令：所有PC偏移，结构不变
+SHIFTED_CFG = _static_cfg(assemble("PUSH1 00 POP " + CALLER_SOURCE) + METADATA)
+CALLEE_CFG = _static_cfg(assemble("PUSH1 01 PUSH1 00 SSTORE PUSH2 @end JUMP end: JUMPDEST STOP"), CALLEE)
+
+
+def test_shingles_do_not_depend_on_pcs():
+    caller, shifted = shingles(cfg_shape(CALLER_CFG)), shingles(cfg_shape(SHIFTED_CFG))
+    # 只有入口块及其邻居的特征变了（多了 PUSH1 POP），其余特征与PC无关
+    assert caller & shifted and caller != shifted
+    assert estimate_similarity(minhash(caller), minhash(caller)) == 1.0
+    assert 0.3 < estimate_similarity(minhash(caller), minhash(shifted)) < 1.0
+    assert estimate_similarity(minhash(caller), minhash(shingles(cfg_shape(CALLEE_CFG)))) < 0.3
+
+
+def test_dot_round_trip_keeps_features():
+    shape = parse_static_cfg_dot(static_complete_dot(CALLER_CFG))
+    assert shingles(shape) == shingles(cfg_shape(CALLER_CFG))
+
+
+def test_index_query(tmp_path):
+    index = SimilarityIndex(str(tmp_path / "similarity.db"))
+    index.add_cfg("caller", CALLER_CFG, CALLER)
+    index.add_cfg("callee", CALLEE_CFG, CALLEE)
+    assert index.has_code("caller") and not index.has_code("shifted")
+
+    assert index.query_cfg(CALLER_CFG)[0] == ("caller", 1.0, CALLER)
+    assert [key for key, _, _ in index.query_cfg(SHIFTED_CFG, min_similarity=0.3)] == ["caller"]
+    assert index.query_cfg(CALLER_CFG, exclude="caller", min_similarity=0.5) == []
+    index.add_cfg("caller", CALLER_CFG, CALLER)  # 替换已有的签名，不重复写入桶
+    assert index.conn.execute("SELECT COUNT(*) FROM lsh_buckets WHERE code_key = 'caller'").fetchone()[0] <= 16
+    index.close()
+
+
+def test_ingest_result_dir(tmp_path, result_dir):
+    index = SimilarityIndex(str(tmp_path / "similarity.db"))
+    assert ingest_result_dir(index, result_dir) == 2
+    assert ingest_result_dir(index, result_dir) == 0  # 按 code_key 去重
+    keys = load_code_keys(result_dir)
+    assert index.query_cfg(CALLER_CFG)[0] == (keys[CALLER], 1.0, CALLER)
+    assert os.path.basename(result_dir) in index.conn.execute("SELECT source FROM cfg_signatures").fetchone()[0]
+    index.close()
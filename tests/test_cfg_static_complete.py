@@ -0,0 +1,51 @@
+# cfg_static_complete.py 中函数级划分的测试：识别选择器分发表，按函数构建静态子图
+
+from conftest import CALLER, CALLER_CODE, assemble
+from basic_block import BasicBlockProcessor
+from cfg_static_complete import StaticCompleteCFGBuilder
+
+
+def _builder(blocks):
+    return StaticCompleteCFGBuilder(CALLER_CODE, [b for b in blocks if b.address == CALLER])
+
+
+def _edges(cfg):
+    return {(e.source.start_pc, e.target.start_pc, e.edge_type) for e in cfg.edges}
+
+
+def test_detect_solidity_dispatcher(blocks, call_trace, loop_trace):
+    builder = _builder(blocks)
+    assert builder.detect_dispatcher() == {"0x11111111": "0x20", "0x22222222": "0x33"}
+    assert builder.functions_in_trace(call_trace) == ["0x22222222"]
+    assert builder.functions_in_trace(loop_trace) == ["0x11111111"]
+
+
+def test_detect_vyper_dispatcher():
+    # Vyper：选择器不相等时跳到下一项，函数入口为顺序后继
+    bytecode = assemble("""
+        PUSH1 00 CALLDATALOAD PUSH1 e0 SHR
+        PUSH4 aaaaaaaa DUP2 XOR PUSH2 @next JUMPI PUSH1 01 STOP
+        next: JUMPDEST PUSH1 00 DUP1 REVERT
+    """)
+    processor = BasicBlockProcessor()
+    blocks = processor.split_into_blocks(CALLER, processor.bytecode_to_opcodes(bytecode))
+    assert StaticCompleteCFGBuilder(bytecode, blocks).detect_dispatcher() == {"0xaaaaaaaa": "0x11"}
+
+
+def test_function_cfg_is_a_subgraph_of_the_full_cfg(blocks):
+    builder = _builder(blocks)
+    full = builder.build_static_cfg()
+
+    store = builder.build_function_cfg(["0x11111111"])
+    assert [n.start_pc for n in store.nodes] == ["0x20", "0x23", "0x2f"]
+    assert _edges(store) == {("0x20", "0x23", "SEQUENCE"), ("0x23", "0x2f", "CONDITION_FALSE")}
+    assert _edges(store) <= _edges(full)
+
+    with_dispatcher = builder.build_function_cfg(["0x11111111"], include_dispatcher=True)
+    assert [n.start_pc for n in with_dispatcher.nodes] == ["0x0", "0x11", "0x1c", "0x20", "0x23", "0x2f"]
+    assert ("0x0", "0x20", "CONDITION_TRUE") in _edges(with_dispatcher)
+
+    cfgs = builder.build_function_cfgs()
+    assert list(cfgs) == ["0x11111111", "0x22222222"]
+    assert [n.start_pc for n in cfgs["0x22222222"].nodes] == ["0x33", "0x51"]
+    assert builder.build_function_cfg(["0xdeadbeef"]).nodes == []
@@ -0,0 +1,46 @@
+# code_section.py 的测试：识别末尾的CBOR元数据和代码区之后的数据，代码区本身保持不变
+
+from conftest import CALLER, CALLER_CODE, CALLEE_CODE, METADATA, assemble
+from basic_block import BasicBlockProcessor
+from code_section import detect_code_section, strip_non_code
+
+
+def test_solc_metadata_and_invalid_marker_are_skipped():
+    section = detect_code_section(CALLER_CODE)
+    metadata_size = len(METADATA) // 2 - 1  # 元数据前的 0xfe 计入数据
+    assert (section.metadata_size, section.data_size) == (metadata_size, 1)
+    assert section.code_end == section.total_size - metadata_size - 1
+    assert strip_non_code(CALLER_CODE) == CALLER_CODE[:len(CALLER_CODE) - len(METADATA)]
+
+
+def test_code_without_metadata_is_unchanged():
+    section = detect_code_section(CALLEE_CODE)
+    assert section.skipped_bytes == 0
+    assert strip_non_code(CALLEE_CODE) == CALLEE_CODE
+    assert detect_code_section("0x").total_size == 0
+
+
+def test_constant_data_after_last_reachable_halt():
+    code = assemble("PUSH2 @end JUMP end: JUMPDEST STOP")
+    section = detect_code_section(code + "deadbeef")
+    assert (section.code_end, section.metadata_size, section.data_size) == (len(code) // 2 - 1, 0, 4)
+    # 数据中出现 0x5b 时无法排除跳转到那里的可能，保守地视为代码
+    assert detect_code_section(code + "dead5b00").data_size == 0
+    # 最后一个 JUMPDEST 之后才出现终止指令，之前的字节都视为代码
+    section = detect_code_section(assemble("STOP JUMPDEST PUSH1 01 STOP") + "aabb")
+    assert (section.code_end, section.data_size) == (5, 2)
+
+
+def test_trailer_that_is_not_metadata_is_kept():
+    # 长度后缀指向的字节不是CBOR map，或不包含已知的元数据键
+    assert detect_code_section(CALLEE_CODE + "00" * 4 + "0004").metadata_size == 0
+    assert detect_code_section(CALLEE_CODE + "a1616101" + "0004").metadata_size == 0
+
+
+def test_processor_records_skipped_region():
+    processor = BasicBlockProcessor()
+    blocks = processor.process_contract({"address": CALLER, "bytecode": CALLER_CODE})
+    assert max(int(b.end_pc, 16) for b in blocks) < detect_code_section(CALLER_CODE).code_end
+    assert processor.skipped[CALLER]["bytes"] == 54
+    assert processor.skipped[CALLER]["metadata_bytes"] == 53
+    assert processor.skipped[CALLER]["blocks"] > 0
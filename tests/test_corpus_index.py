@@ -0,0 +1,52 @@
+# corpus_index.py 的测试：CALL/SSTORE 步骤入库、跨交易查询，合约按 code_key 与其他数据库关联
+
+import sqlite3
+import pytest
+from conftest import CALLER, CALLEE, TX_CALL, TX_STORE
+from corpus_index import CorpusIndex, extract_step_rows
+from proxy_detection import code_key, load_code_keys
+
+
+def test_extract_step_rows(call_trace):
+    rows = extract_step_rows(call_trace)
+    assert [(row[1], row[2], row[4]) for row in rows] == [(22, CALLER, "CALL"), (25, CALLEE, "SSTORE"), (34, CALLER, "SSTORE")]
+    call, callee_store, caller_store = rows
+    assert call[5:8] == (CALLEE, None, "0x0")  # target, selector（CALLEE 不读 calldata）, value
+    assert callee_store[7:] == ("0x1", "0x0")  # value, slot
+    assert caller_store[7:] == ("0x0", "0x1")
+
+
+def test_ingest_and_query(tmp_path, call_trace, loop_trace, blocks, contracts):
+    index = CorpusIndex(str(tmp_path / "corpus.db"))
+    keys = {c["address"]: code_key(c["bytecode"]) for c in contracts}
+    assert index.ingest(TX_CALL, call_trace, blocks, code_keys=keys)
+    assert not index.ingest(TX_CALL, call_trace, blocks, code_keys=keys)  # 已导入过
+    assert index.ingest(TX_STORE, loop_trace, [b for b in blocks if b.address == CALLER], code_keys=keys)
+
+    assert index.find_call_then_sstore(CALLER) == [(TX_CALL, 22, 34)]
+    assert index.find_call_then_sstore(CALLER, callee=CALLEE, slot="0x01") == [(TX_CALL, 22, 34)]
+    assert index.find_call_then_sstore(CALLER, slot="0x0") == []
+    assert [row[0] for row in index.find_steps(address=CALLER, opcode="SSTORE")] == [TX_STORE, TX_CALL]
+    assert index.transactions_with_contract(CALLEE.upper()) == [TX_CALL]
+    rows = index.conn.execute("SELECT address, code_key FROM contracts WHERE tx_hash = ? ORDER BY address",
+                              (TX_CALL,)).fetchall()
+    assert rows == sorted(keys.items())
+    index.close()
+
+
+def test_ingest_result_dir_uses_code_map(tmp_path, result_dir):
+    index = CorpusIndex(str(tmp_path / "corpus.db"))
+    assert index.ingest_result_dir(result_dir)
+    rows = dict(index.conn.execute("SELECT address, code_key FROM contracts").fetchall())
+    assert rows == load_code_keys(result_dir)
+    assert index.find_call_then_sstore(CALLER) == [(TX_CALL, 22, 34)]
+    index.close()
+
+
+def test_old_schema_is_rejected(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE contracts (tx_hash TEXT, address TEXT, code_id TEXT)")
+    conn.close()
+    with pytest.raises(ValueError):
+        CorpusIndex(path)
@@ -0,0 +1,79 @@
+# graph_render.py 的测试：图大小、摘要图，以及用一个假的 dot 命令检查渲染、缓存、超时回退和找不到 dot 的情况
+
+import os
+import stat
+from conftest import CALLER
+from graph_render import RenderService, graph_size, summarize_dot, summarize_results
+
+# 假的 dot 命令：输入中有完整的指令列表（分隔线）时睡眠，模拟大图超时；否则把输入原样输出
+FAKE_DOT = """#!/bin/sh
+input=$(cat)
+case "$input" in
+  *---------*) [ -n "$SLOW" ] && sleep 5 ;;
+esac
+printf '%s' "$input"
+"""
+
+
+def _fake_dot(tmp_path):
+    path = tmp_path / "dot"
+    path.write_text(FAKE_DOT)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def _contract_dot(result_dir):
+    with open(os.path.join(result_dir, f"contract_{CALLER[2:10]}_cfg.dot"), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_graph_size_and_summary(result_dir):
+    dot = _contract_dot(result_dir)
+    size = graph_size(dot)
+    assert (size["nodes"], size["edges"]) == (4, 3)  # 0x0 -> 0x11 -> 0x33 -> 0x51
+
+    summary = summarize_dot(dot)
+    assert graph_size(summary)["nodes"] == 4 and graph_size(summary)["edges"] == 3
+    assert "PUSH1" in dot and "PUSH1" not in summary
+    assert summary.splitlines()[0] == dot.splitlines()[0]
+
+    truncated = summarize_dot(dot, max_nodes=2)
+    assert graph_size(truncated)["nodes"] == 3  # 保留的2个节点加一个说明节点
+    assert "省略 2 个节点、2 条边" in truncated
+
+
+def test_render_and_cache(tmp_path, result_dir):
+    dot_path = os.path.join(result_dir, f"contract_{CALLER[2:10]}_cfg.dot")
+    with RenderService(cache_dir=str(tmp_path / "cache"), dot_binary=_fake_dot(tmp_path)) as service:
+        first = service.submit(dot_path).result()
+        second = service.submit(dot_path, str(tmp_path / "copy.svg")).result()
+    assert (first.status, second.status) == ("rendered", "cached")
+    assert first.output_path == dot_path[:-4] + ".svg"
+    with open(first.output_path, encoding="utf-8") as f:
+        assert f.read() == _contract_dot(result_dir)
+    assert (tmp_path / "copy.svg").read_text(encoding="utf-8") == _contract_dot(result_dir)
+
+
+def test_timeout_falls_back_to_summary(tmp_path, result_dir, monkeypatch):
+    monkeypatch.setenv("SLOW", "1")
+    dot_path = os.path.join(result_dir, f"contract_{CALLER[2:10]}_cfg.dot")
+    service = RenderService(timeout=0.5, cache_dir=None, dot_binary=_fake_dot(tmp_path))
+    service.submit(dot_path)
+    # 超过阈值的图不尝试渲染原图
+    oversized = RenderService(timeout=0.5, cache_dir=None, max_nodes=2, dot_binary=_fake_dot(tmp_path))
+    oversized.submit(dot_path, str(tmp_path / "oversized.svg"))
+    [result], [limited] = service.close(), oversized.close()
+    assert result.status == "summarized" and "超过 0.5s" in result.message
+    with open(result.output_path, encoding="utf-8") as f:
+        assert "PUSH1" not in f.read()
+    assert limited.status == "summarized" and limited.message.startswith("超过阈值") and limited.seconds < 0.5
+
+
+def test_missing_dot_binary(tmp_path, result_dir):
+    service = RenderService(cache_dir=None, dot_binary="no-such-dot-binary")
+    assert not service.available
+    service.submit(os.path.join(result_dir, "missing.dot"))
+    results = service.close()
+    assert [r.status for r in results] == ["unavailable"]
+    assert summarize_results(results) == "unavailable 1"
+    assert summarize_results([]) == "没有渲染任务"
@@ -0,0 +1,55 @@
+# instrumentation.py 的测试：环境变量开关、阶段计时与多份 metrics.json 的汇总
+
+import pytest
+from instrumentation import Metrics, NullMetrics, create_metrics, aggregate_metrics
+
+
+def test_create_metrics_follows_environment(monkeypatch):
+    monkeypatch.delenv("EVM_CFG_METRICS", raising=False)
+    assert type(create_metrics("0x1")) is NullMetrics
+    monkeypatch.setenv("EVM_CFG_METRICS", "0")
+    assert type(create_metrics("0x1")) is NullMetrics
+    monkeypatch.setenv("EVM_CFG_METRICS", "1")
+    metrics = create_metrics("0x1")
+    assert type(metrics) is Metrics and not metrics.use_tracemalloc
+
+
+def test_stages_are_recorded_in_order_even_on_error():
+    metrics = Metrics("0x1")
+    with metrics.stage("fetch_trace"):
+        pass
+    with pytest.raises(RuntimeError):
+        with metrics.stage("block_split"):
+            raise RuntimeError("boom")
+    metrics.count("steps", 35)
+
+    data = metrics.to_dict()
+    assert [s["stage"] for s in data["stages"]] == ["fetch_trace", "block_split"]
+    assert all(s["seconds"] >= 0 and s["cpu_seconds"] >= 0 for s in data["stages"])
+    assert data["counters"] == {"steps": 35}
+
+
+def test_null_metrics_records_nothing(tmp_path):
+    metrics = NullMetrics("0x1")
+    with metrics.stage("fetch_trace"):
+        metrics.count("steps", 1)
+    metrics.save(str(tmp_path / "metrics.json"))
+    assert metrics.to_dict()["stages"] == [] and metrics.to_dict()["counters"] == {}
+    assert not (tmp_path / "metrics.json").exists()
+
+
+def test_aggregate_metrics(tmp_path, formatter, call_trace):
+    paths = []
+    for i, seconds in enumerate([1.0, 3.0]):
+        metrics = Metrics(f"0x{i}")
+        metrics.stages = [{"stage": "fetch_trace", "seconds": seconds, "cpu_seconds": 0.0, "peak_rss_mb": None}]
+        metrics.add_rpc_stats(formatter.rpc_stats)
+        paths.append(str(tmp_path / f"{i}.json"))
+        metrics.save(paths[-1])
+
+    report = aggregate_metrics(paths)
+    assert report["transactions"] == 2
+    stage = report["stages"]["fetch_trace"]
+    assert (stage["runs"], stage["total_seconds"], stage["mean_seconds"], stage["max_seconds"]) == (2, 4.0, 2.0, 3.0)
+    calls = formatter.rpc_stats["debug_traceTransaction"]["calls"]
+    assert report["rpc"]["debug_traceTransaction"]["calls"] == 2 * calls
@@ -0,0 +1,39 @@
+# opcode_index.py 的测试：索引查询与逐个扫描基本块/trace的结果一致，保存后可原样读回
+
+from conftest import CALLER, CALLEE
+from opcode_index import OpcodeIndex, build_opcode_index, load_or_build_index, INDEX_FILE_NAME
+
+
+def test_queries_match_linear_scan(blocks, call_trace):
+    index = build_opcode_index(blocks, call_trace)
+
+    assert index.tx_hash == call_trace["tx_hash"]
+    assert index.blocks_with("CALL") == {CALLER: ["0x33"]}
+    assert index.blocks_with(["SSTORE", "JUMP"], CALLEE) == {CALLEE: ["0x0"]}
+    assert index.instructions_with("SSTORE") == {CALLER: [["0x2f", "0x31"], ["0x51", "0x57"]], CALLEE: [["0x0", "0x4"]]}
+    for opcode in ("SSTORE", "SLOAD", "JUMPI", "PUSH1"):
+        expected = {}
+        for idx, step in enumerate(call_trace["steps"]):
+            if step["opcode"] == opcode:
+                expected.setdefault(step["address"], []).append(idx)
+        assert index.steps_with(opcode) == expected
+    assert index.steps_with(["SLOAD", "SSTORE"], CALLER.upper()) == {CALLER: [32, 34]}
+    assert index.steps_with("DELEGATECALL") == {}
+
+
+def test_save_load_round_trip(tmp_path, blocks, call_trace):
+    index = build_opcode_index(blocks, call_trace)
+    path = str(tmp_path / INDEX_FILE_NAME)
+    index.save(path)
+    assert OpcodeIndex.load(path).to_dict() == index.to_dict()
+
+
+def test_rebuilt_index_for_old_result_dir(result_dir, blocks, call_trace):
+    index = load_or_build_index(result_dir)
+
+    expected = build_opcode_index(blocks, call_trace)
+    assert index.block_index == expected.block_index
+    assert index.step_index == expected.step_index
+    # 补建的动态CFG只包含执行过的块：0x1c（REVERT）和 0x20 之后的存储分支没有执行
+    assert index.blocks_with("JUMPI", cfg_only=True) == {CALLER: ["0x0", "0x11"]}
+    assert OpcodeIndex.load(f"{result_dir}/{INDEX_FILE_NAME}").to_dict() == index.to_dict()
@@ -0,0 +1,52 @@
+# parallel_static_cfg.py 的测试：并行构建与串行构建结果完全一致，代码相同的合约只构建一次
+
+from conftest import CALLER, CALLEE, CALLER_CODE
+from cfg_static_complete import StaticCompleteCFGBuilder
+from parallel_static_cfg import build_static_cfgs
+
+CLONE = "0x" + "c1" * 20
+
+
+def _inputs(contracts, blocks):
+    """在测试合约之外再加一个与 CALLER 代码相同的地址"""
+    clone_blocks = [b.with_address(CLONE) for b in blocks if b.address == CALLER]
+    return contracts + [{"address": CLONE, "bytecode": CALLER_CODE}], blocks + clone_blocks
+
+
+def _dicts(results):
+    return {address: (cfg.to_dict(), selectors) for address, (cfg, selectors) in results.items()}
+
+
+def test_parallel_matches_serial(contracts, blocks):
+    contracts, blocks = _inputs(contracts, blocks)
+    serial = build_static_cfgs(contracts, blocks, workers=1)
+    parallel = build_static_cfgs(contracts, blocks, workers=2)
+
+    assert list(serial) == [CALLER, CALLEE, CLONE]
+    assert _dicts(parallel) == _dicts(serial)
+    expected = StaticCompleteCFGBuilder(CALLER_CODE, [b for b in blocks if b.address == CALLER]).build_static_cfg()
+    assert serial[CALLER][0].to_dict() == expected.to_dict()
+    # 复用的图结构换成了 CLONE 自己的基本块
+    clone_cfg = serial[CLONE][0]
+    assert clone_cfg.tx_hash == f"static_complete_{CLONE}"
+    assert {node.address for node in clone_cfg.nodes} == {CLONE}
+    assert clone_cfg.to_dict()["edges"] == [
+        {**edge, "source": edge["source"].replace(CALLER, CLONE), "target": edge["target"].replace(CALLER, CLONE)}
+        for edge in expected.to_dict()["edges"]]
+
+
+def test_only_executed_functions(contracts, blocks, call_trace):
+    contracts, blocks = _inputs(contracts, blocks)
+    executed = {}
+    for step in call_trace["steps"]:
+        executed.setdefault(step["address"], set()).add(step["pc"])
+    serial = build_static_cfgs(contracts, blocks, workers=1, executed_pcs=executed)
+    parallel = build_static_cfgs(contracts, blocks, workers=2, executed_pcs=executed)
+
+    assert _dicts(parallel) == _dicts(serial)
+    assert serial[CALLER][1] == ["0x22222222"]
+    assert [n.start_pc for n in serial[CALLER][0].nodes] == ["0x0", "0x11", "0x1c", "0x33", "0x51"]
+    # CLONE 没有执行过任何函数，构建整图
+    full = StaticCompleteCFGBuilder(CALLER_CODE, [b for b in blocks if b.address == CALLER]).build_static_cfg()
+    assert serial[CLONE][1] == []
+    assert [n.start_pc for n in serial[CLONE][0].nodes] == [n.start_pc for n in full.nodes]
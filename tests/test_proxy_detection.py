@@ -0,0 +1,78 @@
+# proxy_detection.py 的测试：识别 EIP-1167/EIP-1967 代理，按 code_key 归组代码相同的合约
+
+from conftest import CALLER, CALLEE, CALLER_CODE, CALLEE_CODE
+from basic_block import BasicBlockProcessor
+from proxy_detection import (detect_proxy, code_key, code_hash, blocks_code_key, build_code_map, load_code_keys,
+                             PROXY_SLOTS)
+
+IMPL_A = "0x" + "aa" * 20
+IMPL_B = "0x" + "bb" * 20
+IMPL_SHORT = "0x00" + "cc" * 19
+
+
+def eip1167(implementation: str, push_size: int = 20) -> str:
+    address = implementation[2:][-2 * push_size:]
+    return f"0x363d3d373d3d3d363d{0x5f + push_size:02x}{address}5af43d82803e903d91602b57fd5bf3"
+
+
+def test_eip1167_minimal_proxy():
+    assert detect_proxy(eip1167(IMPL_A)).kind == "eip1167"
+    assert detect_proxy(eip1167(IMPL_A)).implementation == IMPL_A
+    # 地址有前导零字节时用更短的PUSH
+    assert detect_proxy(eip1167(IMPL_SHORT, 19)).implementation == IMPL_SHORT
+    # PUSH 长度与内嵌地址长度不一致时不是 EIP-1167
+    broken = eip1167(IMPL_A).replace("73aaaa", "72aaaa")
+    assert detect_proxy(broken) is None and code_key(broken) == code_hash(broken)
+
+    # 所有最小代理共用一个键，键只与内嵌地址长度有关
+    assert code_key(eip1167(IMPL_A)) == code_key(eip1167(IMPL_B)) == "eip1167:20"
+    assert code_key(eip1167(IMPL_SHORT, 19)) == "eip1167:19"
+    assert code_key(CALLER_CODE) == code_hash(CALLER_CODE) != code_key(CALLEE_CODE)
+
+
+def test_eip1967_proxy_implementation_from_trace():
+    proxy = "0x" + "d0" * 20
+    bytecode = f"0x7f{PROXY_SLOTS['eip1967']}54600052"  # PUSH32 <slot> SLOAD ...
+    trace = {"tx_hash": "0x1", "steps": [
+        {"address": proxy, "pc": "0x0", "opcode": "DELEGATECALL", "stack": ["0x0", "0x" + IMPL_A[2:].rjust(64, "0"), "0x5"]},
+    ]}
+    assert detect_proxy(bytecode).kind == "eip1967" and detect_proxy(bytecode).implementation is None
+    code_map = build_code_map([{"address": proxy, "bytecode": bytecode}], trace)
+    assert code_map["contracts"][proxy]["proxy"] == "eip1967"
+    assert code_map["contracts"][proxy]["implementation"] == IMPL_A
+    assert detect_proxy(CALLER_CODE) is None and detect_proxy("0x") is None
+
+
+def test_build_code_map_groups_same_code():
+    clone = "0x" + "c1" * 20
+    proxies = ["0x" + "e1" * 20, "0x" + "e2" * 20]
+    contracts = [{"address": CALLER, "bytecode": CALLER_CODE}, {"address": CALLEE, "bytecode": CALLEE_CODE},
+                 {"address": clone, "bytecode": CALLER_CODE},
+                 {"address": proxies[0], "bytecode": eip1167(IMPL_A)}, {"address": proxies[1], "bytecode": eip1167(IMPL_B)}]
+    code_map = build_code_map(contracts)
+    assert code_map["codes"] == {code_key(CALLER_CODE): [CALLER, clone], code_key(CALLEE_CODE): [CALLEE],
+                                 "eip1167:20": proxies}
+    assert code_map["contracts"][clone]["same_code_as"] == CALLER
+    assert code_map["contracts"][CALLER]["same_code_as"] is None
+    assert code_map["contracts"][proxies[1]]["implementation"] == IMPL_B
+
+    # 分块时同组的合约只处理一次，其余复用基本块
+    blocks = BasicBlockProcessor().process_multiple_contracts(contracts)
+    by_address = {}
+    for block in blocks:
+        by_address.setdefault(block.address, []).append((block.start_pc, block.terminator, block.instructions))
+    assert by_address[clone] == by_address[CALLER]
+    assert by_address[proxies[0]] == by_address[proxies[1]]
+
+
+def test_blocks_code_key(blocks):
+    caller_blocks = [b for b in blocks if b.address == CALLER]
+    key = blocks_code_key(caller_blocks)
+    assert key.startswith("blocks:")
+    assert blocks_code_key([b.with_address(CALLEE) for b in caller_blocks]) == key  # 与地址无关
+    assert blocks_code_key(caller_blocks[:-1]) != key
+
+
+def test_load_code_keys(tmp_path, result_dir, contracts):
+    assert load_code_keys(result_dir) == {c["address"]: code_key(c["bytecode"]) for c in contracts}
+    assert load_code_keys(str(tmp_path)) == {}
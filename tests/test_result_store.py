@@ -0,0 +1,72 @@
+# result_store.py 的测试：按 code_key 去重保存、旧目录 pack / materialize 往返、清单模式下的读取
+
+import json
+import os
+import pytest
+from conftest import CALLER, CALLEE
+from proxy_detection import CODE_MAP_FILE_NAME, blocks_code_key, load_code_keys
+from result_store import (ResultStore, BLOCKS_ARTIFACT, STATIC_CFG_ARTIFACT, load_manifest, load_result_blocks,
+                          result_code_keys, result_static_dots, read_static_cfg_dot, stored_static_cfg_paths,
+                          materialize, pack)
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _legacy_dir(result_dir):
+    """main.py 旧目录结构中的 blocks.json 带缩进"""
+    blocks_path = os.path.join(result_dir, "blocks.json")
+    with open(blocks_path) as f:
+        data = json.load(f)
+    with open(blocks_path, "w") as f:
+        json.dump(data, f, indent=2)
+    return result_dir
+
+
+def test_put_get(tmp_path):
+    store = ResultStore(str(tmp_path / "codes"))
+    assert store.put("eip1167:" + "ab" * 20, "x.txt", "内容")
+    assert not store.put("eip1167:" + "ab" * 20, "x.txt", "其他")  # 已存在时不覆盖
+    assert store.get("eip1167:" + "ab" * 20, "x.txt") == "内容"
+    assert os.listdir(store.root) == ["eip1167_" + "ab" * 20]
+    with pytest.raises(FileNotFoundError):
+        store.get("missing", "x.txt")
+
+
+def test_pack_and_materialize_round_trip(tmp_path, result_dir):
+    _legacy_dir(result_dir)
+    names = ["blocks.json", f"contract_{CALLER[2:10]}_static_cfg.dot", f"contract_{CALLEE[2:10]}_static_cfg.dot"]
+    originals = {name: _read(os.path.join(result_dir, name)) for name in names}
+    blocks = load_result_blocks(result_dir)
+    static_dots = result_static_dots(result_dir)
+
+    store = ResultStore(str(tmp_path / "codes"))
+    assert pack(result_dir, store) > 0
+    assert not any(os.path.exists(os.path.join(result_dir, name)) for name in names)
+    keys = load_code_keys(result_dir)
+    assert [(e["address"], e["code_key"]) for e in load_manifest(result_dir)["contracts"]] == [(CALLER, keys[CALLER]), (CALLEE, keys[CALLEE])]
+    assert store.has(keys[CALLER], BLOCKS_ARTIFACT) and store.has(keys[CALLEE], STATIC_CFG_ARTIFACT)
+    assert CALLER[:8] not in store.get(keys[CALLER], STATIC_CFG_ARTIFACT)  # 地址以占位符保存
+
+    # 清单模式下的读取与旧目录结构相同
+    assert [(b.address, b.start_pc, b.instructions) for b in load_result_blocks(result_dir)] == \
+           [(b.address, b.start_pc, b.instructions) for b in blocks]
+    assert result_static_dots(result_dir) == static_dots
+    assert read_static_cfg_dot(os.path.join(result_dir, names[1])) == originals[names[1]]
+    assert len(stored_static_cfg_paths(result_dir)) == 2
+    assert pack(result_dir, store) == 0  # 已经转换过
+
+    assert sorted(os.path.basename(p) for p in materialize(result_dir)) == sorted(names)
+    assert {name: _read(os.path.join(result_dir, name)) for name in names} == originals
+    assert materialize(result_dir) == []
+
+
+def test_result_code_keys_without_code_map(result_dir):
+    assert result_code_keys(result_dir) == load_code_keys(result_dir)
+    os.remove(os.path.join(result_dir, CODE_MAP_FILE_NAME))
+    blocks = load_result_blocks(result_dir)
+    keys = result_code_keys(result_dir, blocks)
+    assert keys == {address: blocks_code_key([b for b in blocks if b.address == address]) for address in (CALLER, CALLEE)}
+    assert all(key.startswith("blocks:") for key in keys.values())
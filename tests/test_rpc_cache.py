@@ -0,0 +1,55 @@
+# rpc_cache.py 的测试
+
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from web3.providers.base import JSONBaseProvider
+from conftest import CALLER, TX_CALL
+from evm_information import TraceFormatter
+from rpc_cache import CachingProvider, RPCStore, RecordNotFoundError, is_cacheable
+from rpc_replay_server import handle_rpc_request
+
+
+class EchoUpstream(JSONBaseProvider):
+    def make_request(self, method, params):
+        return {"jsonrpc": "2.0", "id": 0, "result": f"code-{params[0]}"}
+
+
+def test_stats_are_consistent_under_concurrent_requests(tmp_path):
+    provider = CachingProvider(EchoUpstream(), str(tmp_path), mode="auto")
+    addresses = ["0x" + f"{i:040x}" for i in range(8)]
+    requests = [addresses[i % len(addresses)] for i in range(800)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda a: provider.make_request("eth_getCode", [a, "0x1"])["result"], requests))
+
+    assert results == [f"code-{a}" for a in requests]
+    assert provider.stats["hits"] + provider.stats["misses"] == len(requests)
+    assert provider.stats["recorded"] == provider.stats["misses"]
+
+
+def test_is_cacheable():
+    assert is_cacheable("debug_traceTransaction", [TX_CALL, {}])
+    assert is_cacheable("eth_getBlockByNumber", ["0x10", True])
+    assert not is_cacheable("eth_getBlockByNumber", ["latest", True])
+    assert not is_cacheable("eth_blockNumber", [])
+
+
+def test_recorded_responses_replay_offline(tmp_path, chain_url, call_trace):
+    store_dir = str(tmp_path / "rpc_store")
+    recorder = TraceFormatter(chain_url, rpc_store=store_dir, rpc_mode="record")
+    recorder.get_all_contracts_bytecode(TX_CALL, recorder.get_standardized_trace(TX_CALL))
+    assert recorder.web3.provider.stats["recorded"] == 4  # 交易、trace、两个合约的代码
+
+    replayer = TraceFormatter(None, rpc_store=store_dir, rpc_mode="replay")
+    trace = replayer.get_standardized_trace(TX_CALL)
+    assert [dict(step) for step in trace["steps"]] == [dict(step) for step in call_trace["steps"]]
+    assert trace["frames"] == call_trace["frames"]
+    assert replayer.get_contract_bytecode(CALLER)["bytecode"].startswith("0x6000")
+    assert replayer.web3.provider.stats["hits"] == 3
+    with pytest.raises(RecordNotFoundError):
+        replayer.web3.provider.make_request("eth_getCode", ["0x" + "00" * 20, "latest"])
+
+    # 同一个存储目录也可以由回放服务应答
+    store = RPCStore(store_dir)
+    assert handle_rpc_request(store, {"id": 1, "method": "eth_getTransactionByHash", "params": [TX_CALL]})["result"]["to"] == CALLER
+    # 参数不同（没有trace选项）的请求没有录制过
+    assert "error" in handle_rpc_request(store, {"id": 2, "method": "debug_traceTransaction", "params": [TX_CALL]})
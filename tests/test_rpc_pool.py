@@ -0,0 +1,94 @@
+# rpc_pool.py 的测试：用两个本地桩节点检查路由、限速、熔断和换节点
+
+import time
+import pytest
+import requests
+from rpc_pool import EndpointPool, TokenBucket, parse_provider_urls
+
+
+def _ok(method, params):
+    return "0x1"
+
+
+def _slow(method, params):
+    time.sleep(0.05)
+    return "0x1"
+
+
+def _http_error(method, params):
+    return 500, {"error": {"code": -32000, "message": "internal error"}}
+
+
+def _missing_state(method, params):
+    return 200, {"error": {"code": -32000, "message": "missing trie node abc"}}
+
+
+def test_failing_endpoint_fails_over_and_opens_circuit(rpc_stub):
+    bad, good = rpc_stub(_http_error), rpc_stub(_ok)
+    pool = EndpointPool([bad, good], failure_threshold=2, cooldown=60)
+    for _ in range(6):
+        assert pool.make_request("eth_chainId", [])["result"] == "0x1"
+
+    stats = pool.endpoint_stats()
+    assert stats[bad]["state"] == "open"
+    assert stats[bad]["failures"] == 2  # 熔断后不再分到请求
+    assert "HTTPError" in stats[bad]["last_error"]
+    assert stats[good]["state"] == "ok"
+    assert stats[good]["calls"] == 6
+    assert len(rpc_stub.calls[bad]) == 2
+    assert pool.failovers >= 1
+
+
+def test_slow_endpoint_gets_fewer_requests(rpc_stub):
+    slow, fast = rpc_stub(_slow), rpc_stub(_ok)
+    pool = EndpointPool([slow, fast])
+    for _ in range(12):
+        pool.make_request("eth_chainId", [])
+
+    stats = pool.endpoint_stats()
+    assert stats[slow]["calls"] <= 2  # 只在探测（还没有延迟数据）时被选中
+    assert stats[fast]["calls"] >= 10
+    assert stats[slow]["state"] == "slow"
+    assert stats[slow]["ewma_ms"]["eth_chainId"] > stats[fast]["ewma_ms"]["eth_chainId"]
+
+
+def test_retryable_rpc_error_goes_to_next_endpoint(rpc_stub):
+    pruned, archive = rpc_stub(_missing_state), rpc_stub(_ok)
+    pool = EndpointPool([pruned, archive])
+    for _ in range(3):
+        assert pool.make_request("eth_getStorageAt", ["0x" + "11" * 20, "0x0", "0x1"])["result"] == "0x1"
+    assert pool.endpoint_stats()[pruned]["failures"] == len(rpc_stub.calls[pruned]) >= 1
+    assert len(rpc_stub.calls[archive]) == 3
+
+
+def test_all_endpoints_failing_raises(rpc_stub):
+    pool = EndpointPool([rpc_stub(_http_error), rpc_stub(_http_error)])
+    with pytest.raises(requests.exceptions.HTTPError):
+        pool.make_request("eth_chainId", [])
+
+
+def test_all_endpoints_returning_retryable_errors_returns_last_error(rpc_stub):
+    pool = EndpointPool([rpc_stub(_missing_state), rpc_stub(_missing_state)])
+    assert "missing trie node" in pool.make_request("eth_chainId", [])["error"]["message"]
+
+
+def test_rate_limit_spaces_requests(rpc_stub):
+    url = rpc_stub(_ok)
+    pool = EndpointPool([url], rate=20, burst=1)
+    start = time.monotonic()
+    for _ in range(5):
+        pool.make_request("eth_chainId", [])
+    assert time.monotonic() - start >= 0.18  # 第一个请求用掉初始令牌，其余4个每个等待 1/20 秒
+    assert pool.endpoint_stats()[url]["rate_limited_seconds"] >= 0.15
+
+
+def test_token_bucket_without_rate_never_waits():
+    bucket = TokenBucket()
+    assert bucket.delay() == 0.0
+    assert all(bucket.acquire() == 0.0 for _ in range(100))
+
+
+def test_parse_provider_urls():
+    assert parse_provider_urls("http://a:8545, http://b:8545,") == ["http://a:8545", "http://b:8545"]
+    assert parse_provider_urls(["http://a:8545", ""]) == ["http://a:8545"]
+    assert parse_provider_urls(None) == []
@@ -0,0 +1,27 @@
+# shared_block_store.py 的测试：共享内存中的基本块与原始基本块一致，挂载方只读，创建者关闭时删除共享段
+
+import pytest
+from conftest import CALLER, CALLEE
+from shared_block_store import SharedBlockStore
+
+
+def _shape(blocks):
+    return [(b.address, b.start_pc, b.end_pc, b.terminator, list(b.instructions)) for b in blocks]
+
+
+def test_attached_store_matches_blocks(blocks):
+    with SharedBlockStore.create(blocks) as store:
+        attached = SharedBlockStore.attach(store.descriptor)
+        try:
+            assert attached.addresses == [CALLER, CALLEE]
+            for address in (CALLER, CALLEE):
+                assert _shape(attached.contract_blocks(address)) == _shape([b for b in blocks if b.address == address])
+            assert attached.contract_blocks(CALLER) is attached.contract_blocks(CALLER)
+            assert CALLEE in attached and attached.contract_blocks("0x" + "00" * 20) == []
+            with pytest.raises(ValueError):
+                attached.arrays["pcs"][0] = 1
+        finally:
+            attached.close()
+
+    with pytest.raises(FileNotFoundError):
+        SharedBlockStore.attach(store.descriptor)
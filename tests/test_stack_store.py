@@ -0,0 +1,70 @@
+# stack_store.py 的测试：增量编码的栈在任意读取顺序下还原一致，StoredStep 的映射语义，save_trace / load_trace 往返
+
+import copy
+import json
+import os
+import pickle
+import random
+from conftest import CALLER, CALLEE, TX_CALL
+from stack_store import StackStore, StoredStep, stack_delta, stack_store_of, save_trace, load_trace, STACK_STORE_FILE_NAME
+
+
+def _plain(trace):
+    return [dict(step) for step in trace["steps"]]
+
+
+def test_stack_delta():
+    assert stack_delta(["1", "2"], ["3"], "ADD") == (2, ["3"])
+    assert stack_delta(["1"], ["1", "1"], "DUP1") == (1, ["1", "1"])  # 按 pyevmasm 的输入/输出数
+    # CALL 进入被调用合约时栈换成新的栈帧，按最长公共前缀计算
+    assert stack_delta(["1", "2", "3"], [], "CALL") == (3, [])
+    assert stack_delta(["1", "2"], ["1", "5"], "UNKNOWN") == (1, ["5"])
+
+
+def test_round_trip_in_any_order(call_trace):
+    steps = _plain(call_trace)
+    store = StackStore.from_trace({"tx_hash": TX_CALL, "steps": steps}, interval=4)
+    assert len(store) == 36 and store.to_trace()["steps"] == steps
+    order = list(range(len(steps)))
+    random.Random(7).shuffle(order)
+    assert all(store.stack(idx) == steps[idx]["stack"] for idx in order + order[::-1])
+    assert list(store.iter_stacks(10, 20)) == [step["stack"] for step in steps[10:20]]
+    assert store.step(22) == steps[22] and steps[22]["opcode"] == "CALL"
+    assert store.steps_with(["SSTORE"]) == [25, 34]
+    assert store.steps_with(["SSTORE"], [CALLEE]) == [25]
+    # 每步只保存增量：值的总数小于完整栈的总项数
+    assert len(store.values) < sum(len(step["stack"]) for step in steps)
+
+    loaded = StackStore.from_dict(json.loads(json.dumps(store.to_dict())))
+    assert loaded.to_trace() == store.to_trace()
+
+
+def test_stored_step_is_a_mapping(call_trace):
+    store = StackStore.from_trace({"steps": _plain(call_trace)})
+    step = store.stored_steps()[22]
+    expected = store.step(22)
+    assert isinstance(step, StoredStep)
+    assert dict(step) == {**step} == step.copy() == copy.deepcopy(step) == expected
+    assert list(step) == ["address", "pc", "opcode", "stack"] and "stack" in step and "gas" not in step
+    assert step.get("gas") is None and step["address"] == CALLER
+    step["stack"].append("0x0")  # 每次读取得到新的列表
+    assert step["stack"] == expected["stack"]
+    assert dict(pickle.loads(pickle.dumps(step))) == expected
+
+
+def test_save_and_load_trace(tmp_path, call_trace):
+    trace = {"tx_hash": TX_CALL, "steps": _plain(call_trace)}
+    store = stack_store_of(trace)
+    assert isinstance(trace["steps"][0], StoredStep) and stack_store_of(trace) is store
+
+    path = str(tmp_path / "trace.json")
+    assert save_trace(trace, path) == str(tmp_path / STACK_STORE_FILE_NAME)
+    with open(path) as f:
+        assert "stack" not in json.load(f)["steps"][0]
+    assert _plain(load_trace(path)) == _plain(call_trace)
+
+    # 旧格式（步骤中带完整栈）原样读取
+    os.remove(tmp_path / STACK_STORE_FILE_NAME)
+    with open(path, "w") as f:
+        json.dump({"tx_hash": TX_CALL, "steps": _plain(call_trace)}, f)
+    assert load_trace(path)["steps"] == _plain(call_trace)
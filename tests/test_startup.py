@@ -0,0 +1,16 @@
+# 离线工具导入时间的测试：在新的解释器中导入，不加载 web3；benchmark.measure_startup 能发现违反的模块
+
+from benchmark import STARTUP_MODULES, measure_startup
+
+
+def test_offline_modules_do_not_import_web3():
+    # 导入时间与机器有关，这里只检查禁止的依赖，预算放宽
+    assert measure_startup(STARTUP_MODULES + ["evm_information"], budget=10.0) == []
+
+
+def test_measure_startup_reports_violations():
+    failures = measure_startup(["rpc_cache", "no_such_module"], budget=10.0)
+    assert len(failures) == 2
+    assert failures[0].startswith("rpc_cache: ") and "web3" in failures[0]
+    assert failures[1] == "no_such_module: 导入失败"
+    assert measure_startup(["basic_block"], budget=0.0) != []
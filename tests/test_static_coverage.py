@@ -0,0 +1,67 @@
+# static_coverage.py 的测试：位集按位或合并、覆盖率、从未执行的区域、SQLite累计与结果目录导入
+
+from conftest import CALLER, CALLEE, TX_CALL, TX_STORE
+from cfg_contract import ContractCFGConnector
+from cfg_static_complete import StaticCompleteCFGBuilder
+from call_frames import CallFrameIndex
+from proxy_detection import load_code_keys
+from static_coverage import CoverageLayout, CodeCoverage, CoverageStore, ingest_result_dir
+
+
+def _coverage(trace, contracts, blocks, address=CALLER):
+    bytecode = next(c["bytecode"] for c in contracts if c["address"] == address)
+    contract_blocks = [b for b in blocks if b.address == address]
+    layout = CoverageLayout.from_static_cfg(contract_blocks, StaticCompleteCFGBuilder(bytecode, contract_blocks).build_static_cfg())
+    steps = CallFrameIndex.from_trace(trace).contract_steps(trace["steps"], address)
+    coverage = CodeCoverage(address, layout)
+    coverage.record_cfg(ContractCFGConnector(contract_blocks).connect_contract_cfg(steps))
+    return coverage
+
+
+def test_coverage_of_one_transaction(call_trace, contracts, blocks):
+    coverage = _coverage(call_trace, contracts, blocks)
+    assert len(coverage.layout.blocks) == 8
+    assert [coverage.layout.blocks[i][0] for i in range(8) if coverage.blocks >> i & 1] == ["0x0", "0x11", "0x33", "0x51"]
+    assert coverage.block_coverage() == 0.5
+    # 0x11 的失败分支、store函数与循环从未执行
+    assert [(start, n) for start, _, n in coverage.uncovered_regions()] == [("0x1c", 4)]
+    assert coverage.uncovered_regions(min_blocks=5) == []
+    # CALL 返回后继续执行 0x51 的边在静态CFG中，没有额外的边
+    assert coverage.extra_edges == set()
+    assert _coverage(call_trace, contracts, blocks, CALLEE).block_coverage() == 1.0
+
+
+def test_merge_is_bitwise_or(call_trace, loop_trace, contracts, blocks):
+    call, store = _coverage(call_trace, contracts, blocks), _coverage(loop_trace, contracts, blocks)
+    merged = CodeCoverage(CALLER, call.layout)
+    merged.merge(call)
+    merged.merge(store)
+    assert merged.blocks == call.blocks | store.blocks
+    assert merged.edges == call.edges | store.edges
+    assert merged.edge_coverage() >= max(call.edge_coverage(), store.edge_coverage())
+    assert CoverageLayout.from_json(call.layout.to_json()).edges == call.layout.edges
+
+
+def test_store_accumulates_per_transaction(tmp_path, call_trace, loop_trace, contracts, blocks):
+    store = CoverageStore(str(tmp_path / "coverage.db"))
+    call, loop = _coverage(call_trace, contracts, blocks), _coverage(loop_trace, contracts, blocks)
+    store.merge(call, TX_CALL)
+    assert store.merge(call, TX_CALL).transactions == 1  # 同一交易重复合并不改变结果
+    merged = store.merge(loop, TX_STORE)
+    assert merged.transactions == 2
+    loaded = store.load(CALLER)
+    assert (loaded.blocks, loaded.edges, loaded.transactions) == (call.blocks | loop.blocks, call.edges | loop.edges, 2)
+    assert store.code_keys() == [CALLER] and store.load(CALLEE) is None
+    store.close()
+
+
+def test_ingest_result_dir(tmp_path, result_dir, call_trace, contracts, blocks):
+    store = CoverageStore(str(tmp_path / "coverage.db"))
+    assert ingest_result_dir(store, result_dir) == 2
+    keys = load_code_keys(result_dir)
+    assert sorted(store.code_keys()) == sorted(keys.values())
+    caller = store.load(keys[CALLER])
+    assert caller.blocks == _coverage(call_trace, contracts, blocks).blocks
+    assert caller.transactions == 1
+    assert store.load(keys[CALLEE]).block_coverage() == 1.0
+    store.close()
@@ -0,0 +1,88 @@
+# trace_compression.py 的测试：块序列与逐步trace可互相还原，块切换与逐步扫描一致，建图结果相同
+
+import pytest
+from conftest import CALLER, CALLEE
+from cfg_contract import ContractCFGConnector
+from cfg_transaction import CFGConstructor
+from trace_compression import CompressedTrace, compress_trace, run_length_encode, DEFAULT_STACK_OPCODES
+
+SPLIT_OPCODES = ContractCFGConnector([]).split_opcodes
+
+
+def _steps(trace):
+    return [dict(step) for step in trace["steps"]]
+
+
+def _expected_transitions(steps):
+    """逐步扫描分块指令（CFGConstructor 的做法）"""
+    return [(i + 1, step["opcode"], steps[i + 1]["address"], steps[i + 1]["pc"])
+            for i, step in enumerate(steps[:-1]) if step["opcode"] in SPLIT_OPCODES]
+
+
+def test_run_length_encode():
+    a, b, c = (0, 1, 3), (0, 2, 5), (0, 3, 1)
+    assert run_length_encode([a, b, b, b, c]) == [a, {"repeat": 3, "body": [b]}, c]
+    assert run_length_encode([a, b, a, b, a, b]) == [{"repeat": 3, "body": [a, b]}]
+    assert run_length_encode([a, b, c]) == [a, b, c]
+
+
+@pytest.mark.parametrize("trace_name", ["call_trace", "loop_trace"])
+def test_lossless_round_trip(request, blocks, trace_name):
+    trace = request.getfixturevalue(trace_name)
+    compressed = compress_trace(trace, blocks, stack_opcodes=None)
+    assert compressed.step_count == len(trace["steps"])
+    assert _steps(compressed.to_standardized_trace()) == _steps(trace)
+
+
+def test_loop_body_is_run_length_encoded(blocks, loop_trace):
+    compressed = compress_trace(loop_trace, blocks)
+    loops = [item for item in compressed.items if isinstance(item, dict)]
+    assert len(loops) == 1 and loops[0]["repeat"] == 3
+    # 默认只保留下游工具读取的栈
+    assert {loop_trace["steps"][idx]["opcode"] for idx in compressed.stacks} <= DEFAULT_STACK_OPCODES
+    restored = compressed.to_standardized_trace()["steps"]
+    assert [(s["address"], s["pc"], s["opcode"]) for s in restored] == \
+           [(s["address"], s["pc"], s["opcode"]) for s in loop_trace["steps"]]
+
+
+def test_transitions_match_step_scan(blocks, call_trace):
+    compressed = compress_trace(call_trace, blocks)
+    steps = _steps(call_trace)
+    assert list(compressed.transitions(SPLIT_OPCODES)) == _expected_transitions(steps)
+    for address in (CALLER, CALLEE):
+        contract_steps = [s for s in steps if s["address"] == address]
+        assert list(compressed.transitions(SPLIT_OPCODES, address)) == _expected_transitions(contract_steps)
+
+
+def test_cfgs_from_compressed_trace_match(blocks, call_trace):
+    compressed = compress_trace(call_trace, blocks)
+    constructor = CFGConstructor(blocks)
+    assert constructor.construct_cfg_from_compressed(compressed).to_dict() == \
+           constructor.construct_cfg(call_trace).to_dict()
+    for address in (CALLER, CALLEE):
+        connector = ContractCFGConnector([b for b in blocks if b.address == address])
+        contract_steps = [s for s in call_trace["steps"] if s["address"] == address]
+        assert connector.connect_contract_cfg_from_compressed(compressed).to_dict() == \
+               connector.connect_contract_cfg(contract_steps).to_dict()
+
+
+def test_steps_that_do_not_match_blocks(blocks, call_trace):
+    steps = _steps(call_trace)[1:]  # 从块中间开始
+    steps[-3]["opcode"] = "PUSH0"   # 与块内opcode名称不一致
+    trace = {"tx_hash": call_trace["tx_hash"], "steps": steps}
+    compressed = compress_trace(trace, blocks, stack_opcodes=None)
+    assert len(compressed.raw_steps) == 8  # 第一个块中剩下的步骤逐个保存
+    assert compressed.opcodes == {len(steps) - 3: "PUSH0"}
+    assert _steps(compressed.to_standardized_trace()) == steps
+    assert list(compressed.transitions(SPLIT_OPCODES)) == _expected_transitions(steps)
+
+
+def test_save_load(tmp_path, blocks, loop_trace):
+    compressed = compress_trace(loop_trace, blocks)
+    path = str(tmp_path / "trace_compressed.json")
+    compressed.save(path)
+    loaded = CompressedTrace.load(path, blocks)
+    assert loaded.to_dict() == compressed.to_dict()
+    assert list(loaded.iter_steps(CALLER)) == list(compressed.iter_steps(CALLER))
+    with pytest.raises(ValueError):
+        CompressedTrace.load(path, blocks[1:])
@@ -0,0 +1,291 @@
+# trace_compression.py 负责把逐步记录的trace压缩为基本块序列；
+# 同一基本块内连续的步骤完全由块的指令列表决定（PC、opcode），因此一段执行可以记为 (合约编号, 块编号, 步数)；
+# 只有无法从块中恢复的数据才单独保存：选定opcode处的栈快照、与块内opcode名称不一致的步骤（如PUSH0）、
+# 不从块起点开始的步骤；重复执行的循环体再做游程编码。
+# CFGConstructor / ContractCFGConnector 可直接在压缩形式上建图（结果与逐步建图完全一致），
+# 需要时也可以还原为 StandardizedTrace。
+
+import json
+from typing import List, Dict, Tuple, Optional, Iterator, Iterable, Set, Union
+from evm_information import StandardizedTrace, StandardizedStep
+from basic_block import Block
+
+COMPRESSED_TRACE_FILE_NAME = "trace_compressed.json"
+
+# 默认保留栈快照的opcode：下游工具（find_trace_opcode.py / corpus_index.py）读取栈的位置
+DEFAULT_STACK_OPCODES = {
+    "CALL", "CALLCODE", "DELEGATECALL", "STATICCALL", "CREATE", "CREATE2",
+    "SSTORE", "SLOAD", "CALLDATALOAD",
+}
+
+# 循环体的最大长度（块数）
+MAX_LOOP_PERIOD = 32
+
+# 序列中的一项：(合约编号, 块编号, 步数)；块编号为 -1 时第三项是 raw_steps 的下标（单个无法按块编码的步骤）
+Segment = Tuple[int, int, int]
+# 游程编码后的一项：Segment，或 {"repeat": 次数, "body": [Segment, ...]}
+Item = Union[Segment, Dict]
+
+
+def _blocks_by_address(all_blocks: List[Block]) -> Dict[str, List[Block]]:
+    """地址 -> 该合约的基本块列表（保持 all_blocks 中的顺序）"""
+    grouped: Dict[str, List[Block]] = {}
+    for block in all_blocks:
+        grouped.setdefault(block.address, []).append(block)
+    return grouped
+
+
+def run_length_encode(segments: List[Segment], max_period: int = MAX_LOOP_PERIOD) -> List[Item]:
+    """把连续重复的子序列（循环体）编码为 {"repeat", "body"}，每个位置取覆盖步骤最多的周期"""
+    items: List[Item] = []
+    i, n = 0, len(segments)
+    while i < n:
+        best_period, best_count = 1, 1
+        for period in range(1, min(max_period, (n - i) // 2) + 1):
+            body = segments[i:i + period]
+            count = 1
+            while segments[i + count * period:i + (count + 1) * period] == body:
+                count += 1
+            if count > 1 and period * count > best_period * best_count:
+                best_period, best_count = period, count
+        if best_count > 1:
+            items.append({"repeat": best_count, "body": segments[i:i + best_period]})
+            i += best_period * best_count
+        else:
+            items.append(segments[i])
+            i += 1
+    return items
+
+
+class CompressedTrace:
+    """
+    基本块序列形式的trace。
+
+    - contracts:   合约编号 -> 地址
+    - items:       游程编码后的块序列
+    - stacks:      全局步骤下标 -> 栈快照（只保留 stack_opcodes 中的opcode）
+    - opcodes:     全局步骤下标 -> opcode（trace中的名称与块内名称不一致时）
+    - raw_steps:   无法按块编码的步骤 {"pc", "opcode"}
+    """
+    def __init__(self, tx_hash: str, contracts: List[str], items: List[Item], step_count: int,
+                 stacks: Dict[int, List[str]], opcodes: Dict[int, str], raw_steps: List[Dict],
+                 block_lists: Dict[str, List[Block]], stack_opcodes: Optional[Set[str]]):
+        self.tx_hash = tx_hash
+        self.contracts = contracts
+        self.items = items
+        self.step_count = step_count
+        self.stacks = stacks
+        self.opcodes = opcodes
+        self.raw_steps = raw_steps
+        self.stack_opcodes = stack_opcodes
+        self.block_lists = [block_lists.get(address, []) for address in contracts]
+
+    def __repr__(self) -> str:
+        return (f"CompressedTrace(tx_hash={self.tx_hash}, steps={self.step_count}, "
+                f"items={len(self.items)}, stacks={len(self.stacks)})")
+
+    # ------------------------------------------------------------------
+    # 遍历
+    # ------------------------------------------------------------------
+    def segments(self) -> Iterator[Segment]:
+        """展开游程编码后的块序列"""
+        for item in self.items:
+            if isinstance(item, dict):
+                for _ in range(item["repeat"]):
+                    yield from item["body"]
+            else:
+                yield item
+
+    def _segment_steps(self, segment: Segment) -> List[Tuple[str, str]]:
+        """一段执行对应的 (pc, 块内opcode) 列表"""
+        cid, block_idx, count = segment
+        if block_idx < 0:
+            raw = self.raw_steps[count]
+            return [(raw["pc"], raw["opcode"])]
+        return self.block_lists[cid][block_idx].instructions[:count]
+
+    def iter_steps(self, address: Optional[str] = None) -> Iterator[Tuple[int, str, str, str]]:
+        """逐步遍历：(全局步骤下标, 地址, pc, opcode)；指定 address 时只返回该合约的步骤"""
+        step_idx = 0
+        for segment in self.segments():
+            steps = self._segment_steps(segment)
+            contract = self.contracts[segment[0]]
+            if address is None or contract == address:
+                for offset, (pc, opcode) in enumerate(steps):
+                    yield step_idx + offset, contract, pc, self.opcodes.get(step_idx + offset, opcode)
+            step_idx += len(steps)
+
+    def transitions(self, split_opcodes: Set[str], address: Optional[str] = None) -> Iterator[Tuple[int, str, str, str]]:
+        """
+        分块指令之后的块切换：(下一步骤的下标, 分块指令, 下一步骤的地址, 下一步骤的pc)。
+        与在逐步trace上扫描分块指令的结果完全相同，但只在每段的分块指令处检查，不逐步遍历。
+        指定 address 时步骤下标为该合约步骤列表中的下标（与 ContractCFGConnector 的输入一致）。
+        """
+        pending: Optional[Tuple[int, str]] = None  # 上一段末尾的分块指令：(步骤下标, opcode)
+        global_idx = local_idx = 0
+        split_cache: Dict[Tuple[int, int, int], List[int]] = {}
+        for segment in self.segments():
+            cid, block_idx, count = segment
+            if address is not None and self.contracts[cid] != address:
+                global_idx += 1 if block_idx < 0 else count
+                continue
+            steps = self._segment_steps(segment)
+            if pending is not None:
+                yield pending[0] + 1, pending[1], self.contracts[cid], steps[0][0]
+                pending = None
+
+            # 段内的分块指令位置（通常只有块的最后一条指令），再加上opcode被覆盖的步骤
+            positions = split_cache.get(segment)
+            if positions is None:
+                positions = [i for i, (_, opcode) in enumerate(steps) if opcode in split_opcodes]
+                split_cache[segment] = positions
+            if self.opcodes:
+                overridden = [i for i in range(len(steps)) if global_idx + i in self.opcodes]
+                if overridden:
+                    positions = sorted(
+                        {i for i in positions if global_idx + i not in self.opcodes}
+                        | {i for i in overridden if self.opcodes[global_idx + i] in split_opcodes}
+                    )
+            for i in positions:
+                opcode = self.opcodes.get(global_idx + i, steps[i][1])
+                if i + 1 < len(steps):
+                    yield local_idx + i + 1, opcode, self.contracts[cid], steps[i + 1][0]
+                else:
+                    pending = (local_idx + i, opcode)
+            global_idx += len(steps)
+            local_idx += len(steps)
+
+    def first_step(self, address: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """第一个步骤的 (地址, pc)"""
+        for _, contract, pc, _ in self.iter_steps(address):
+            return contract, pc
+        return None
+
+    # ------------------------------------------------------------------
+    # 还原与序列化
+    # ------------------------------------------------------------------
+    def to_standardized_trace(self) -> StandardizedTrace:
+        """还原为逐步的 StandardizedTrace（未保留栈快照的步骤 stack 为空列表）"""
+        steps: List[StandardizedStep] = [
+            {"address": address, "pc": pc, "opcode": opcode, "stack": self.stacks.get(idx, [])}
+            for idx, address, pc, opcode in self.iter_steps()
+        ]
+        return {"tx_hash": self.tx_hash, "steps": steps}
+
+    def to_dict(self) -> Dict:
+        return {
+            "tx_hash": self.tx_hash,
+            "step_count": self.step_count,
+            "contracts": self.contracts,
+            "block_counts": [len(blocks) for blocks in self.block_lists],
+            "stack_opcodes": sorted(self.stack_opcodes) if self.stack_opcodes is not None else None,
+            "items": [item if isinstance(item, dict) else list(item) for item in self.items],
+            "stacks": [[idx, stack] for idx, stack in sorted(self.stacks.items())],
+            "opcodes": [[idx, opcode] for idx, opcode in sorted(self.opcodes.items())],
+            "raw_steps": self.raw_steps,
+        }
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+
+    @classmethod
+    def from_dict(cls, data: Dict, all_blocks: List[Block]) -> "CompressedTrace":
+        """从 to_dict 的结果恢复，需要与压缩时相同的基本块（blocks.json）"""
+        block_lists = _blocks_by_address(all_blocks)
+        for address, expected in zip(data["contracts"], data["block_counts"]):
+            if len(block_lists.get(address, [])) != expected:
+                raise ValueError(f"合约 {address} 的基本块数量与压缩时不一致（期望 {expected} 个）")
+        items = [
+            {"repeat": item["repeat"], "body": [tuple(s) for s in item["body"]]} if isinstance(item, dict) else tuple(item)
+            for item in data["items"]
+        ]
+        stack_opcodes = set(data["stack_opcodes"]) if data.get("stack_opcodes") is not None else None
+        return cls(
+            tx_hash=data["tx_hash"],
+            contracts=data["contracts"],
+            items=items,
+            step_count=data["step_count"],
+            stacks={idx: stack for idx, stack in data["stacks"]},
+            opcodes={idx: opcode for idx, opcode in data["opcodes"]},
+            raw_steps=data["raw_steps"],
+            block_lists=block_lists,
+            stack_opcodes=stack_opcodes,
+        )
+
+    @classmethod
+    def load(cls, path: str, all_blocks: List[Block]) -> "CompressedTrace":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f), all_blocks)
+
+
+def compress_trace(trace: StandardizedTrace, all_blocks: List[Block],
+                   stack_opcodes: Optional[Iterable[str]] = DEFAULT_STACK_OPCODES,
+                   max_loop_period: int = MAX_LOOP_PERIOD) -> CompressedTrace:
+    """
+    把 StandardizedTrace 压缩为基本块序列。
+
+    Args:
+        trace: 标准化trace。
+        all_blocks: 交易涉及合约的基本块（BasicBlockProcessor 的输出）。
+        stack_opcodes: 保留栈快照的opcode；None 表示保留全部步骤的栈（无损）。
+        max_loop_period: 循环体的最大长度（块数），0 表示不做游程编码。
+    """
+    stack_opcodes = set(stack_opcodes) if stack_opcodes is not None else None
+    block_lists = _blocks_by_address(all_blocks)
+    # (地址, 块起始PC) -> 块编号
+    block_index = {
+        (address, block.start_pc): idx
+        for address, blocks in block_lists.items() for idx, block in enumerate(blocks)
+    }
+
+    contract_ids: Dict[str, int] = {}
+    contracts: List[str] = []
+    segments: List[Segment] = []
+    stacks: Dict[int, List[str]] = {}
+    opcodes: Dict[int, str] = {}
+    raw_steps: List[Dict] = []
+
+    steps = trace["steps"]
+    i, total = 0, len(steps)
+    while i < total:
+        step = steps[i]
+        address = step["address"]
+        cid = contract_ids.get(address)
+        if cid is None:
+            cid = contract_ids[address] = len(contracts)
+            contracts.append(address)
+
+        block_idx = block_index.get((address, step["pc"]))
+        if block_idx is None:
+            # 不在块起点：按单个步骤保存
+            segments.append((cid, -1, len(raw_steps)))
+            raw_steps.append({"pc": step["pc"], "opcode": step["opcode"]})
+            count = 1
+        else:
+            instructions = block_lists[address][block_idx].instructions
+            count = 0
+            while (count < len(instructions) and i + count < total
+                   and steps[i + count]["address"] == address and steps[i + count]["pc"] == instructions[count][0]):
+                if steps[i + count]["opcode"] != instructions[count][1]:
+                    opcodes[i + count] = steps[i + count]["opcode"]
+                count += 1
+            segments.append((cid, block_idx, count))
+
+        for idx in range(i, i + count):
+            if stack_opcodes is None or steps[idx]["opcode"] in stack_opcodes:
+                stacks[idx] = steps[idx]["stack"]
+        i += count
+
+    items = run_length_encode(segments, max_loop_period) if max_loop_period > 0 else list(segments)
+    return CompressedTrace(
+        tx_hash=trace["tx_hash"],
+        contracts=contracts,
+        items=items,
+        step_count=total,
+        stacks=stacks,
+        opcodes=opcodes,
+        raw_steps=raw_steps,
+        block_lists=block_lists,
+        stack_opcodes=stack_opcodes,
+    )